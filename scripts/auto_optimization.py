@@ -5,70 +5,82 @@ Tự động chạy tất cả các mô hình tối ưu hóa và hiển thị k
 
 import streamlit as st
 import logging
-from scripts.portfolio_models import (
-    markowitz_optimization,
-    max_sharpe,
-    min_volatility,
-    min_cvar,
-    min_cdar,
-    hrp_model
-)
 from scripts.optimization_comparison import render_optimization_comparison_tab
+from optimization.price_snapshot import PriceSnapshot
+from optimization.backtest import backtest_portfolios
+from optimization.hrp import DEFAULT_HRP_LINKAGE
+from optimization.results import REALIZED_METRICS_KEY
+from optimization.runner import run_models
 from utils.session_manager import save_optimization_result, get_optimization_results, clear_optimization_results
 
 logger = logging.getLogger(__name__)
 
 
-def run_all_models(data, total_investment, get_latest_prices_func, mode='manual'):
+def run_all_models(data, total_investment, get_latest_prices_func, mode='manual', exchanges=None,
+                   cov_estimator=None, sector_map=None, hrp_linkage=DEFAULT_HRP_LINKAGE):
     """
-    Chạy tất cả 6 mô hình tối ưu hóa và lưu kết quả.
+    Chạy tất cả 7 mô hình tối ưu hóa, backtest trọng số của chúng trên cùng dữ liệu và lưu kết quả.
     
     Args:
         data (pd.DataFrame): Dữ liệu giá cổ phiếu
         total_investment (float): Tổng số tiền đầu tư
         get_latest_prices_func (function): Hàm lấy giá cổ phiếu mới nhất
         mode (str): 'manual' hoặc 'auto'
+        exchanges (dict): Sàn của từng mã để phân bổ theo lô chẵn (mặc định: từng cổ phiếu)
+        cov_estimator (str): Bộ ước lượng hiệp phương sai dùng chung cho cả 7 mô hình
+        sector_map (dict): Ngành của từng mã; nếu có, Risk Parity chia ngân sách rủi ro theo ngành
+        hrp_linkage (str): Phương pháp liên kết của mô hình HRP (xem optimization.hrp)
         
     Returns:
         dict: Kết quả của tất cả các mô hình
     """
+    # Chụp giá một lần cho cả lượt chạy: 1 lượt gọi mạng, 7 mô hình định giá nhất quán
+    price_snapshot = PriceSnapshot.capture(data.columns.tolist(), get_latest_prices_func, data)
+    logger.info(f"Anh chup gia: {price_snapshot.fill_report()}")
+    if price_snapshot.filled:
+        st.warning(
+            "Không lấy được giá mới nhất, dùng giá lịch sử cho: "
+            + ", ".join(price_snapshot.filled)
+        )
+    
+    common = {'exchanges': exchanges, 'cov_estimator': cov_estimator}
     models = {
-        "Mô hình Markowitz": lambda d, ti: markowitz_optimization(d, ti, get_latest_prices_func),
-        "Mô hình Max Sharpe Ratio": lambda d, ti: max_sharpe(d, ti, get_latest_prices_func),
-        "Mô hình Min Volatility": lambda d, ti: min_volatility(d, ti, get_latest_prices_func),
-        "Mô hình HRP": lambda d, ti: hrp_model(d, ti, get_latest_prices_func),
-        "Mô hình Min CVaR": lambda d, ti: min_cvar(d, ti, get_latest_prices_func),
-        "Mô hình Min CDaR": lambda d, ti: min_cdar(d, ti, get_latest_prices_func),
+        "Mô hình Markowitz": ('markowitz', common),
+        "Mô hình Max Sharpe Ratio": ('max_sharpe', common),
+        "Mô hình Min Volatility": ('min_volatility', common),
+        "Mô hình HRP": ('hrp', {**common, 'linkage_method': hrp_linkage}),
+        "Mô hình Min CVaR": ('min_cvar', common),
+        "Mô hình Min CDaR": ('min_cdar', common),
+        "Mô hình Risk Parity": ('risk_parity', {**common, 'sector_map': sector_map}),
     }
     
-    results = {}
     progress_bar = st.progress(0)
     status_text = st.empty()
-    
-    total_models = len(models)
-    
-    for idx, (model_name, model_func) in enumerate(models.items(), 1):
+    status_text.text(f"🔄 Đang chạy {len(models)} mô hình...")
+
+    def on_progress(model_name, result, done, total):
+        if result:
+            status_text.text(f"✅ Hoàn thành {model_name} ({done}/{total})")
+        else:
+            status_text.text(f"❌ Lỗi khi chạy {model_name} ({done}/{total})")
+        progress_bar.progress(done / total)
+
+    # Tính toán chạy ở lõi optimization (có thể song song nhiều tiến trình), giao diện chỉ nhận tiến độ
+    results = run_models(data, total_investment, models, price_snapshot, progress_callback=on_progress)
+
+    # Backtest mọi mô hình trong một lượt: ma trận lợi suất dùng chung x ma trận trọng số
+    if results:
+        status_text.text(f"📈 Đang backtest {len(results)} danh mục...")
         try:
-            status_text.text(f"🔄 Đang chạy {model_name}... ({idx}/{total_models})")
-            
-            # Chạy mô hình
-            result = model_func(data, total_investment)
-            
-            if result:
-                # Lưu kết quả
-                save_optimization_result(model_name, result, mode=mode)
-                results[model_name] = result
-                status_text.text(f"✅ Hoàn thành {model_name}")
-            else:
-                status_text.text(f"❌ Lỗi khi chạy {model_name}")
-                logger.error(f"Không thể chạy {model_name}")
-                
+            _, realized = backtest_portfolios(data, {name: result.weights for name, result in results.items()})
+            for model_name, result in results.items():
+                result[REALIZED_METRICS_KEY] = realized[model_name].to_dict()
         except Exception as e:
-            status_text.text(f"❌ Lỗi {model_name}: {str(e)}")
-            logger.error(f"Lỗi khi chạy {model_name}: {e}")
-        
-        # Cập nhật progress bar
-        progress_bar.progress(idx / total_models)
+            logger.error(f"[BACKTEST] Loi khi backtest cac mo hinh: {e}")
+
+    # Lưu kết quả theo thứ tự khai báo (tiến trình con có thể xong theo thứ tự khác)
+    for model_name, result in results.items():
+        save_optimization_result(model_name, result, mode=mode)
     
     progress_bar.empty()
     status_text.empty()
@@ -94,7 +106,7 @@ def show_auto_optimization_results(data, total_investment, get_latest_prices_fun
     with col1:
         st.info("""
         💡 **Chức năng này sẽ:**
-        1. Tự động chạy cả 6 mô hình tối ưu hóa
+        1. Tự động chạy cả 7 mô hình tối ưu hóa
         2. Lưu kết quả vào bộ nhớ
         3. Hiển thị bảng so sánh chi tiết
         4. Đưa ra khuyến nghị đầu tư tốt nhất
@@ -111,7 +123,7 @@ def show_auto_optimization_results(data, total_investment, get_latest_prices_fun
             "▶️ Chạy Tất cả Mô hình",
             type="primary",
             use_container_width=True,
-            help="Chạy 6 mô hình tối ưu hóa một lượt"
+            help="Chạy 7 mô hình tối ưu hóa một lượt"
         )
     
     with col_btn2:
@@ -135,7 +147,7 @@ def show_auto_optimization_results(data, total_investment, get_latest_prices_fun
             results = run_all_models(data, total_investment, get_latest_prices_func, mode)
             
             if results:
-                st.success(f"✅ Hoàn thành! Đã chạy {len(results)}/{6} mô hình thành công.")
+                st.success(f"✅ Hoàn thành! Đã chạy {len(results)}/7 mô hình thành công.")
             else:
                 st.error("❌ Không thể chạy bất kỳ mô hình nào. Vui lòng kiểm tra dữ liệu.")
     
@@ -0,0 +1,103 @@
+"""
+Benchmark bộ phân bổ cổ phiếu nguyên: allocate_shares so với MILP của PyPortfolioOpt.
+
+Thời gian của allocate_shares được đo trên nhiều hạt giống (trung vị và trường hợp xấu nhất),
+kèm một lượt phân bổ theo lô chẵn 100 cổ phiếu.
+
+Chạy:
+    python scripts/benchmarks/bench_allocation.py --sizes 10 50 100 200 --amounts 1e8 1e10
+    python scripts/benchmarks/bench_allocation.py --sizes 100 --amounts 5e7 1e8 --seeds 100 --skip-milp
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from optimization.allocation import allocate_shares
+
+
+def _random_case(n_assets, seed):
+    """Tạo trọng số Dirichlet và giá ngẫu nhiên theo bước giá 100 VND."""
+    rng = np.random.default_rng(seed)
+    tickers = [f"S{i:03d}" for i in range(n_assets)]
+    weights = rng.dirichlet(np.ones(n_assets))
+    prices = np.round(rng.uniform(5_000, 150_000, n_assets), -2)
+    return dict(zip(tickers, weights)), pd.Series(prices, index=tickers)
+
+
+def _errors(allocation, weights, prices, total):
+    """Trả về (sai số L1, tổng bình phương sai số) theo giá trị VND."""
+    tickers = list(weights)
+    target = np.array([weights[t] for t in tickers]) * total
+    actual = np.array([allocation.get(t, 0) * prices[t] for t in tickers])
+    diff = target - actual
+    return float(np.abs(diff).sum()), float(np.dot(diff, diff))
+
+
+def _run_milp(weights, prices, total, solver):
+    from pypfopt import DiscreteAllocation
+
+    da = DiscreteAllocation(weights, prices, total_portfolio_value=total)
+    return da.lp_portfolio(reinvest=False, verbose=False, solver=solver)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark phân bổ cổ phiếu nguyên.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 100, 200])
+    parser.add_argument('--amounts', type=float, nargs='+', default=[1e8, 1e10])
+    parser.add_argument('--solver', default='ECOS_BB', help='Solver MILP để so sánh (vd: ECOS_BB, HIGHS)')
+    parser.add_argument('--method', choices=['exact', 'greedy'], default='exact',
+                        help='Phương pháp của allocate_shares')
+    parser.add_argument('--skip-milp', action='store_true', help='Chỉ đo allocate_shares')
+    parser.add_argument('--seeds', type=int, default=20, help='Số hạt giống để đo trung vị / xấu nhất')
+    parser.add_argument('--lot', type=int, default=100, help='Kích thước lô cho lượt lô chẵn')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    header = (f"{'N':>5} {'so tien':>10} | {'fast ms':>9} {'max ms':>9} {'fast L1':>12} | "
+              f"{'lo chan ms':>11} {'max ms':>9} | {'milp ms':>9} {'milp L1':>12}")
+    print(header)
+    print("-" * len(header))
+
+    for n_assets in args.sizes:
+        for amount in args.amounts:
+            weights, prices = _random_case(n_assets, seed=n_assets)
+            allocation, _ = allocate_shares(weights, prices, amount, method=args.method)
+            fast_l1, _ = _errors(allocation, weights, prices, amount)
+
+            fast_times, lot_times = [], []
+            lot_sizes = {t: args.lot for t in weights}
+            for seed in range(args.seeds):
+                case_weights, case_prices = _random_case(n_assets, seed=n_assets * 1000 + seed)
+                start = time.perf_counter()
+                allocate_shares(case_weights, case_prices, amount, method=args.method)
+                fast_times.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                allocate_shares(case_weights, case_prices, amount, method=args.method,
+                                lot_sizes=lot_sizes)
+                lot_times.append((time.perf_counter() - start) * 1000)
+
+            milp_ms, milp_l1 = float('nan'), float('nan')
+            if not args.skip_milp:
+                try:
+                    start = time.perf_counter()
+                    milp_allocation, _ = _run_milp(weights, prices, amount, args.solver)
+                    milp_ms = (time.perf_counter() - start) * 1000
+                    milp_l1, _ = _errors(milp_allocation, weights, prices, amount)
+                except Exception as exc:
+                    print(f"  MILP ({args.solver}) loi: {exc}")
+
+            print(f"{n_assets:>5} {amount:>10.0e} | {np.median(fast_times):>9.2f} {max(fast_times):>9.2f} "
+                  f"{fast_l1:>12,.0f} | {np.median(lot_times):>11.2f} {max(lot_times):>9.2f} | "
+                  f"{milp_ms:>9.2f} {milp_l1:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark mô phỏng tái cân bằng: các chế độ của simulate_rebalancing trên dữ liệu giả lập.
+
+Chạy:
+    python scripts/benchmarks/bench_backtest.py --years 10 --assets 100
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from optimization.backtest import BACKTEST_REBALANCE_OPTIONS, simulate_rebalancing
+
+
+def _random_prices(n_periods, n_assets, seed):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0004, 0.01, (n_periods, 1)) + rng.normal(0, 0.015, (n_periods, n_assets))
+    index = pd.bdate_range('2015-01-01', periods=n_periods)
+    tickers = [f"M{i:03d}" for i in range(n_assets)]
+    return pd.DataFrame(20_000 * np.exp(np.cumsum(returns, axis=0)), index=index, columns=tickers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mô phỏng tái cân bằng.")
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--assets', type=int, default=100)
+    parser.add_argument('--capital', type=float, default=1e10)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    prices = _random_prices(252 * args.years, args.assets, seed=1)
+    weights = np.random.default_rng(2).random(args.assets)
+    lots = {t: 100 for t in prices.columns}
+    print(f"{len(prices)} phien x {args.assets} ma")
+
+    for rebalance in [key for key in BACKTEST_REBALANCE_OPTIONS if key != 'ideal']:
+        for integer_shares in (False, True):
+            start = time.perf_counter()
+            result = simulate_rebalancing(prices, weights, rebalance=rebalance, initial_value=args.capital,
+                                          lot_sizes=lots, integer_shares=integer_shares)
+            elapsed = time.perf_counter() - start
+            summary = result.summary()
+            print(f"{rebalance:>5} {'lo 100' if integer_shares else 'co phieu le':>11}: {elapsed * 1000:7.1f} ms, "
+                  f"{summary['Số lần tái cân bằng']:4d} ky, chi phi {summary['Tổng chi phí giao dịch'] / args.capital:.2%}, "
+                  f"tien mat TB {summary['Tỷ lệ tiền mặt trung bình']:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark tối ưu hàng loạt: optimize_batch so với vòng lặp gọi từng tài khoản.
+
+Chạy:
+    python scripts/benchmarks/bench_batch.py --accounts 500 --pool 80 --basket 5 15
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from optimization.allocation import allocate_shares
+from optimization.batch import optimize_batch
+from optimization.price_snapshot import PriceSnapshot
+
+
+def _random_market(n_periods, n_assets, seed):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0005, 0.01, (n_periods, 1)) + rng.normal(0, 0.015, (n_periods, n_assets))
+    index = pd.bdate_range('2023-01-01', periods=n_periods)
+    tickers = [f"M{i:03d}" for i in range(n_assets)]
+    prices = pd.DataFrame(20_000 * np.exp(np.cumsum(returns, axis=0)), index=index, columns=tickers)
+    return prices
+
+
+def _random_requests(tickers, n_accounts, basket_range, seed):
+    rng = np.random.default_rng(seed)
+    # Nhiều khách hàng chọn cùng rổ phổ biến, phần còn lại chọn ngẫu nhiên
+    popular = [sorted(rng.choice(tickers, 8, replace=False).tolist()) for _ in range(10)]
+    requests = []
+    for i in range(n_accounts):
+        if rng.random() < 0.4:
+            basket = popular[rng.integers(len(popular))]
+        else:
+            basket = rng.choice(tickers, rng.integers(*basket_range), replace=False).tolist()
+        requests.append({'account': f"TK{i:04d}", 'tickers': basket,
+                         'amount': float(rng.choice([5e7, 1e8, 5e8, 2e9]))})
+    return requests
+
+
+def _loop(requests, prices, snapshot):
+    """Cách hiện tại: mỗi tài khoản tự tính lợi nhuận kỳ vọng, hiệp phương sai và giải."""
+    from pypfopt import EfficientFrontier, expected_returns, risk_models
+
+    for request in requests:
+        data = prices[request['tickers']]
+        try:
+            ef = EfficientFrontier(expected_returns.mean_historical_return(data), risk_models.sample_cov(data))
+            ef.max_sharpe()
+            allocate_shares(ef.clean_weights(), snapshot.series(request['tickers']), request['amount'])
+        except ValueError:
+            continue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tối ưu hàng loạt.")
+    parser.add_argument('--accounts', type=int, default=500)
+    parser.add_argument('--pool', type=int, default=80)
+    parser.add_argument('--basket', type=int, nargs=2, default=[5, 15])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--skip-loop', action='store_true')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    prices = _random_market(500, args.pool, seed=1)
+    snapshot = PriceSnapshot.from_prices(prices.columns, prices.iloc[-1].to_dict())
+    requests = _random_requests(prices.columns.to_numpy(), args.accounts, args.basket, seed=2)
+
+    start = time.perf_counter()
+    table = optimize_batch(requests, price_data=prices, price_snapshot=snapshot, max_workers=args.workers)
+    batch_s = time.perf_counter() - start
+    print(f"optimize_batch: {batch_s:.2f}s ({args.accounts / batch_s:.0f} tai khoan/s), "
+          f"{table.attrs['unique_baskets']} ro duy nhat, loi: {table['error'].notna().sum()}")
+    print("  " + ", ".join(f"{k}: {v:.2f}s" for k, v in table.attrs['timings'].items()))
+
+    if not args.skip_loop:
+        start = time.perf_counter()
+        _loop(requests, prices, snapshot)
+        loop_s = time.perf_counter() - start
+        print(f"vong lap tung tai khoan: {loop_s:.2f}s ({args.accounts / loop_s:.0f} tai khoan/s)")
+
+
+if __name__ == "__main__":
+    main()
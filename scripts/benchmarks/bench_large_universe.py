@@ -0,0 +1,65 @@
+"""
+Benchmark chế độ tối ưu toàn sàn: thời gian từng bước theo số mã trong universe.
+
+Chạy:
+    python scripts/benchmarks/bench_large_universe.py --sizes 400 800 1500 --max-assets 30
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from optimization.large_universe import optimize_large_universe
+
+SECTORS = 11
+
+
+def _random_universe(n_periods, n_assets, seed):
+    """Giá mô phỏng với một nhân tố thị trường và 11 nhân tố ngành, có mã thiếu dữ liệu đầu kỳ."""
+    rng = np.random.default_rng(seed)
+    sector_of = rng.integers(0, SECTORS, n_assets)
+    market = rng.normal(0.0003, 0.01, (n_periods, 1))
+    sector = rng.normal(0, 0.008, (n_periods, SECTORS))
+    returns = (market * rng.uniform(0.5, 1.5, n_assets) + sector[:, sector_of]
+               + rng.normal(0, 0.02, (n_periods, n_assets)))
+    tickers = [f"S{i:04d}" for i in range(n_assets)]
+    prices = pd.DataFrame(10_000 * np.exp(np.cumsum(returns, axis=0)), columns=tickers)
+    late_listed = rng.random(n_assets) < 0.1
+    prices.iloc[: n_periods // 3, late_listed] = np.nan
+    return prices, {t: f"Nganh {s}" for t, s in zip(tickers, sector_of)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tối ưu toàn sàn.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[400, 800, 1500])
+    parser.add_argument('--periods', type=int, default=500)
+    parser.add_argument('--max-assets', type=int, default=30)
+    parser.add_argument('--max-weight', type=float, default=0.08)
+    parser.add_argument('--sector-cap', type=float, default=0.25)
+    parser.add_argument('--risk-aversion', type=float, default=None)
+    parser.add_argument('--risk-model', choices=['pca', 'sector'], default='pca')
+    args = parser.parse_args()
+
+    for n_assets in args.sizes:
+        prices, sector_map = _random_universe(args.periods, n_assets, seed=n_assets)
+        result = optimize_large_universe(
+            prices, sector_map,
+            max_assets=args.max_assets,
+            max_weight=args.max_weight,
+            sector_cap=args.sector_cap,
+            risk_aversion=args.risk_aversion,
+            risk_model=args.risk_model,
+        )
+        timings = result["Thời gian theo bước"]
+        stages = ", ".join(f"{k}: {v * 1000:.0f}ms" for k, v in timings.items())
+        print(f"N={n_assets:>5} -> {len(result['Trọng số danh mục']):>3} ma | "
+              f"vol {result['Rủi ro (Độ lệch chuẩn)']:.4f} | tong {sum(timings.values()) * 1000:.0f}ms | {stages}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark đường biên lấy mẫu lại: thời gian bootstrap và giải QP theo số mẫu / số tiến trình.
+
+Chạy:
+    python scripts/benchmarks/bench_resampled.py --resamples 100 300 --assets 30 --workers 1 4
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from optimization.resampled import resampled_frontier
+
+
+def _random_returns(n_periods, n_assets, seed):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0005, 0.01, (n_periods, 1)) + rng.normal(0.0002, 0.015, (n_periods, n_assets))
+    return pd.DataFrame(returns, columns=[f"R{i:03d}" for i in range(n_assets)])
+
+
+def _naive(returns, n_resamples, seed):
+    """Cách làm trực tiếp: mỗi mẫu dựng DataFrame, ước lượng lại và giải bằng PyPortfolioOpt."""
+    from pypfopt import EfficientFrontier, expected_returns, risk_models
+
+    rng = np.random.default_rng(seed)
+    for _ in range(n_resamples):
+        sample = returns.iloc[rng.integers(0, len(returns), len(returns))].reset_index(drop=True)
+        mu = expected_returns.mean_historical_return(sample, returns_data=True)
+        try:
+            EfficientFrontier(mu, risk_models.sample_cov(sample, returns_data=True)).max_sharpe()
+        except Exception:
+            continue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark đường biên lấy mẫu lại.")
+    parser.add_argument('--resamples', type=int, nargs='+', default=[100, 300])
+    parser.add_argument('--assets', type=int, default=30)
+    parser.add_argument('--periods', type=int, default=750)
+    parser.add_argument('--points', type=int, default=20)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--skip-naive', action='store_true')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    returns = _random_returns(args.periods, args.assets, seed=1)
+    for n_resamples in args.resamples:
+        for workers in args.workers:
+            start = time.perf_counter()
+            result = resampled_frontier(returns, n_resamples, args.points, max_workers=workers)
+            elapsed = time.perf_counter() - start
+            stages = ", ".join(f"{k}: {v:.2f}s" for k, v in result['timings'].items())
+            print(f"B={n_resamples:>4} workers={workers}: {elapsed:.2f}s ({stages})")
+        if not args.skip_naive:
+            start = time.perf_counter()
+            _naive(returns, n_resamples, seed=1)
+            print(f"B={n_resamples:>4} vong lap PyPortfolioOpt (chi Max Sharpe): {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
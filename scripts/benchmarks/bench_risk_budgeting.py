@@ -0,0 +1,66 @@
+"""
+Benchmark Risk Parity: bộ giải Newton / hạ tọa độ so với SLSQP tổng quát.
+
+Chạy:
+    python scripts/benchmarks/bench_risk_budgeting.py --sizes 20 100 300 600
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.optimize import minimize
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from optimization.risk_budgeting import RISK_BUDGET_SOLVERS, risk_budget_weights, risk_contributions
+
+
+def _random_covariance(n_periods, n_assets, seed):
+    rng = np.random.default_rng(seed)
+    returns = (rng.normal(0, 0.01, (n_periods, 1))
+               + rng.normal(0, 0.015, (n_periods, n_assets)) * rng.uniform(0.5, 2.0, n_assets))
+    return np.cov(returns, rowvar=False) * 252
+
+
+def _slsqp(cov, budgets):
+    """Cách làm phổ biến: tối thiểu bình phương sai lệch đóng góp rủi ro bằng SLSQP."""
+    n_assets = len(budgets)
+
+    def objective(w):
+        return np.sum((risk_contributions(cov, w) - budgets) ** 2)
+
+    result = minimize(objective, np.full(n_assets, 1.0 / n_assets), method='SLSQP',
+                      bounds=[(1e-6, 1.0)] * n_assets,
+                      constraints={'type': 'eq', 'fun': lambda w: w.sum() - 1.0})
+    return result.x
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Risk Parity.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 100, 300, 600])
+    parser.add_argument('--periods', type=int, default=1000)
+    parser.add_argument('--slsqp-max', type=int, default=150, help="Bỏ qua SLSQP khi số mã lớn hơn")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    for n_assets in args.sizes:
+        cov = _random_covariance(args.periods, n_assets, seed=n_assets)
+        budgets = np.random.default_rng(n_assets).uniform(0.5, 2.0, n_assets)
+        budgets /= budgets.sum()
+        solvers = {m: (lambda c, b, m=m: risk_budget_weights(c, b, method=m)) for m in RISK_BUDGET_SOLVERS}
+        if n_assets <= args.slsqp_max:
+            solvers['slsqp'] = _slsqp
+        for name, solver in solvers.items():
+            start = time.perf_counter()
+            weights = solver(cov, budgets)
+            elapsed = time.perf_counter() - start
+            error = np.abs(risk_contributions(cov, weights) - budgets).max()
+            print(f"N={n_assets:>4} {name:>7}: {elapsed * 1000:8.1f}ms | sai lech dong gop rui ro {error:.1e}")
+
+
+if __name__ == "__main__":
+    main()
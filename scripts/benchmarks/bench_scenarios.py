@@ -0,0 +1,79 @@
+"""
+Benchmark Min CVaR rút gọn kịch bản so với LP đầy đủ của EfficientCVaR.
+
+Đo thời gian giải và độ lệch CVaR theo độ dài lịch sử và sai số cho phép.
+
+Chạy:
+    python scripts/benchmarks/bench_scenarios.py --years 2 5 10 --assets 20 50 --tols 1e-4 1e-6
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from optimization.scenarios import min_cvar_reduced, portfolio_cvar
+
+TRADING_DAYS = 250
+
+
+def _random_returns(n_periods, n_assets, seed):
+    """Lợi suất ngày có đuôi dày (Student-t) với ba nhân tố chung."""
+    rng = np.random.default_rng(seed)
+    factors = rng.standard_t(4, (n_periods, 3)) * 0.008
+    loadings = rng.normal(0, 1, (3, n_assets))
+    specific = rng.standard_t(4, (n_periods, n_assets)) * 0.012
+    returns = factors @ loadings * 0.5 + specific + 0.0003
+    return pd.DataFrame(returns, columns=[f"S{i:03d}" for i in range(n_assets)])
+
+
+def _run_full(returns, beta):
+    from pypfopt import EfficientCVaR
+
+    optimizer = EfficientCVaR(returns.mean() * TRADING_DAYS, returns, beta=beta)
+    weights = optimizer.min_cvar()
+    return np.array([weights[t] for t in returns.columns])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Min CVaR rút gọn kịch bản.")
+    parser.add_argument('--years', type=float, nargs='+', default=[2, 5, 10])
+    parser.add_argument('--assets', type=int, nargs='+', default=[20, 50])
+    parser.add_argument('--tols', type=float, nargs='+', default=[1e-4, 1e-5, 1e-6])
+    parser.add_argument('--beta', type=float, default=0.95)
+    parser.add_argument('--skip-full', action='store_true', help='Chỉ đo bản rút gọn')
+    args = parser.parse_args()
+
+    header = (f"{'nam':>4} {'N':>4} {'tol':>7} | {'full ms':>9} {'full CVaR':>10} | "
+              f"{'rut gon ms':>10} {'CVaR':>10} {'lech':>9} {'kich ban':>9} {'vong':>4}")
+    print(header)
+    print("-" * len(header))
+
+    for years in args.years:
+        n_periods = int(years * TRADING_DAYS)
+        for n_assets in args.assets:
+            returns = _random_returns(n_periods, n_assets, seed=n_periods + n_assets)
+
+            full_ms, full_cvar = float('nan'), float('nan')
+            if not args.skip_full:
+                start = time.perf_counter()
+                full_weights = _run_full(returns, args.beta)
+                full_ms = (time.perf_counter() - start) * 1000
+                full_cvar = portfolio_cvar(returns.to_numpy(), full_weights, args.beta)
+
+            for tol in args.tols:
+                start = time.perf_counter()
+                _, cvar, info = min_cvar_reduced(returns, beta=args.beta, tol=tol)
+                reduced_ms = (time.perf_counter() - start) * 1000
+                print(f"{years:>4g} {n_assets:>4} {tol:>7.0e} | {full_ms:>9.1f} {full_cvar:>10.6f} | "
+                      f"{reduced_ms:>10.1f} {cvar:>10.6f} {cvar - full_cvar:>9.1e} "
+                      f"{info['scenarios']:>4}/{n_periods:<4} {info['rounds']:>4}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark backtest toàn universe trên ma trận lợi suất ánh xạ bộ nhớ: thời gian và RSS đỉnh theo số mã.
+
+Mỗi cỡ universe chạy trong một tiến trình con để RSS đỉnh không cộng dồn giữa các lần đo.
+
+Chạy:
+    python scripts/benchmarks/bench_streaming.py --sizes 400 1580 3000 --years 10
+    python scripts/benchmarks/bench_streaming.py --sizes 1580 --dense   # so với DataFrame dày đặc
+"""
+
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from optimization.backtest import portfolio_path
+from optimization.streaming import build_return_store, stream_backtest
+
+
+def _chunk_prices(tickers, index, seed):
+    """Giá mô phỏng của một khối mã (sinh theo khối, không dựng cả universe)."""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.02, (len(index), len(tickers)))
+    return pd.DataFrame(10_000 * np.exp(np.cumsum(returns, axis=0)), index=index, columns=tickers)
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run(n_assets, years, holdings, chunk_rows, dense, queue):
+    logging.disable(logging.INFO)
+    index = pd.bdate_range('2015-01-01', periods=252 * years)
+    tickers = [f"S{i:04d}" for i in range(n_assets)]
+    weights = dict(zip(np.random.default_rng(0).choice(tickers, min(holdings, n_assets), replace=False),
+                       np.random.default_rng(1).random(holdings)))
+
+    def fetch(symbols, start_date, end_date):
+        return _chunk_prices(symbols, index, seed=tickers.index(symbols[0])), []
+
+    row = {'n_assets': n_assets, 'base': _peak_rss_mb()}
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        store = build_return_store(os.path.join(directory, 'returns.npy'), tickers, index[0], index[-1], fetch)
+        row['build'] = time.perf_counter() - start
+        row['build_rss'] = _peak_rss_mb()
+        for rebalance in ('ideal', 'M'):
+            start = time.perf_counter()
+            result = stream_backtest(store, weights, rebalance=rebalance, chunk_rows=chunk_rows)
+            row[rebalance] = time.perf_counter() - start
+            row['total_return'] = result.metrics['Total Return']
+        row['stream_rss'] = _peak_rss_mb()
+
+    if dense:
+        prices = pd.concat([_chunk_prices(tickers[i:i + 200], index, seed=i) for i in range(0, n_assets, 200)], axis=1)
+        target = pd.Series(weights).reindex(prices.columns).fillna(0.0)
+        start = time.perf_counter()
+        portfolio_path(prices, target / target.sum())
+        row['dense'] = time.perf_counter() - start
+        row['dense_rss'] = _peak_rss_mb()
+    queue.put(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backtest toàn universe theo cửa sổ.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[400, 1580, 3000])
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--holdings', type=int, default=50)
+    parser.add_argument('--chunk-rows', type=int, default=256)
+    parser.add_argument('--dense', action='store_true', help="Đo thêm backtest trên DataFrame dày đặc")
+    args = parser.parse_args()
+
+    queue = mp.Queue()
+    for n_assets in args.sizes:
+        process = mp.Process(target=_run, args=(n_assets, args.years, args.holdings, args.chunk_rows,
+                                                args.dense, queue))
+        process.start()
+        row = queue.get()
+        process.join()
+        line = (f"N={row['n_assets']:>5} x {252 * args.years} phien | ghi {row['build']:6.2f}s, "
+                f"ideal {row['ideal'] * 1000:7.1f}ms, M {row['M'] * 1000:7.1f}ms | "
+                f"RSS dinh: nen {row['base']:.0f}MB, sau ghi {row['build_rss']:.0f}MB, "
+                f"sau backtest {row['stream_rss']:.0f}MB")
+        if args.dense:
+            line += f" | day dac {row['dense'] * 1000:.0f}ms, RSS {row['dense_rss']:.0f}MB"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark quét tham số: lưới mô hình x cửa sổ ước lượng x chu kỳ tái cân bằng trên dữ liệu giả lập.
+
+Chạy:
+    python scripts/benchmarks/bench_sweep.py --assets 30 --workers 8
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from optimization.sweep import DEFAULT_SWEEP_WORKERS, SWEEP_MODELS, run_parameter_sweep
+
+
+def _random_prices(n_periods, n_assets, seed):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0004, 0.01, (n_periods, 1)) + rng.normal(0, 0.015, (n_periods, n_assets))
+    index = pd.bdate_range('2015-01-01', periods=n_periods)
+    tickers = [f"M{i:03d}" for i in range(n_assets)]
+    return pd.DataFrame(20_000 * np.exp(np.cumsum(returns, axis=0)), index=index, columns=tickers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quét tham số.")
+    parser.add_argument('--assets', type=int, default=30)
+    parser.add_argument('--years', type=int, default=6)
+    parser.add_argument('--workers', type=int, default=DEFAULT_SWEEP_WORKERS)
+    parser.add_argument('--models', nargs='+', default=list(SWEEP_MODELS))
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    prices = _random_prices(252 * args.years, args.assets, seed=1)
+    lookbacks = [21 * k for k in (3, 4, 6, 9, 12, 15, 18, 24, 30, 36)]
+    print(f"{len(prices)} phien x {args.assets} ma, {len(args.models)} mo hinh x {len(lookbacks)} cua so x 3 chu ky")
+
+    for workers in sorted({1, args.workers}):
+        start = time.perf_counter()
+        result = run_parameter_sweep(prices, args.models, lookbacks, ('M', 'Q', 'hold'), (1e9,),
+                                     max_workers=workers, lot_sizes={t: 100 for t in prices.columns})
+        elapsed = time.perf_counter() - start
+        best = result.best('Sharpe Ratio', top=1).index[0]
+        print(f"{workers:2d} tien trinh: {elapsed:7.2f} s, {len(result.frame)} to hop, "
+              f"{len(result.failed)} loi, tot nhat {best}")
+
+
+if __name__ == "__main__":
+    main()
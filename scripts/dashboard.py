@@ -30,8 +30,10 @@ from data_process.data_loader import (
     fetch_data_from_csv,
     fetch_stock_data2,
     get_latest_prices,
+    get_index_closes,
     calculate_metrics,
-    fetch_ohlc_data
+    fetch_ohlc_data,
+    fetch_ohlcv_panel
 )
 from scripts.portfolio_models import (
     markowitz_optimization,
@@ -39,7 +41,11 @@ from scripts.portfolio_models import (
     min_volatility,
     min_cvar,
     min_cdar,
-    hrp_model
+    hrp_model,
+    risk_parity_model,
+    resampled_frontier_model,
+    rebalance_model,
+    large_universe_model
 )
 from ui.visualization import (
     plot_interactive_stock_chart,
@@ -52,7 +58,10 @@ from ui.visualization import (
     plot_candlestick_chart,
     plot_min_cvar_analysis,
     plot_min_cdar_analysis,
-    visualize_hrp_model
+    visualize_hrp_model,
+    plot_risk_contributions,
+    plot_resampled_frontier,
+    display_rebalance_results
 )
 from ui.ui_components import (
     display_selected_stocks,
@@ -70,9 +79,25 @@ from utils.session_manager import (
     get_current_tab,
     save_optimization_result,
     get_optimization_results,
-    clear_optimization_results
+    clear_optimization_results,
+    save_sweep_result,
+    get_sweep_result
 )
 from scripts.optimization_comparison import render_optimization_comparison_tab
+from optimization.allocation import get_exchange_map, get_lot_sizes
+from optimization.large_universe import get_sector_map, max_total_weight, universe_from_company_info
+from optimization.hrp import DEFAULT_HRP_LINKAGE, HRP_LINKAGE_METHODS
+from optimization.backtest import BACKTEST_REBALANCE_OPTIONS, DEFAULT_BACKTEST_REBALANCE, DEFAULT_DRIFT_THRESHOLD
+from optimization.sweep import (
+    SWEEP_MODELS,
+    DEFAULT_SWEEP_LOOKBACKS,
+    DEFAULT_SWEEP_REBALANCES,
+    DEFAULT_EVALUATION_PERIODS,
+    run_parameter_sweep
+)
+from optimization.rebalance import BROKERAGE_FEE, SELL_TAX, REBALANCE_MODELS
+from optimization.price_snapshot import PriceSnapshot
+from optimization.covariance import COVARIANCE_ESTIMATORS, DEFAULT_COVARIANCE_ESTIMATOR
 from chatbot.chatbot_ui import (
     render_chatbot_page,
     render_chat_controls
@@ -127,6 +152,67 @@ def run_models(data):
     else:
         st.session_state.auto_investment_amount = total_investment
 
+    # Phân bổ theo lô chẵn (100 cổ phiếu) của sàn HOSE/HNX/UPCOM
+    use_board_lots = st.sidebar.checkbox(
+        "Phân bổ theo lô chẵn (100 cổ phiếu)",
+        value=False,
+        key=f"board_lot_{mode}",
+        help="Số cổ phiếu cần mua được làm tròn theo lô chẵn và bước giá của từng sàn"
+    )
+    exchanges = get_exchange_map(data.columns, df) if use_board_lots else None
+
+    # Bộ ước lượng hiệp phương sai dùng chung cho mọi mô hình
+    cov_estimator = st.sidebar.selectbox(
+        "Ước lượng hiệp phương sai",
+        list(COVARIANCE_ESTIMATORS),
+        index=list(COVARIANCE_ESTIMATORS).index(DEFAULT_COVARIANCE_ESTIMATOR),
+        format_func=COVARIANCE_ESTIMATORS.get,
+        key=f"cov_estimator_{mode}",
+        help="Co rút Ledoit-Wolf giúp ma trận ổn định hơn khi số mã lớn so với số phiên"
+    )
+
+    # Ngân sách rủi ro của mô hình Risk Parity: bằng nhau theo mã hoặc theo ngành ICB
+    use_sector_budgets = st.sidebar.checkbox(
+        "Risk Parity theo ngành",
+        value=False,
+        key=f"sector_budgets_{mode}",
+        help="Mỗi ngành (icb_name) nhận ngân sách rủi ro bằng nhau, chia đều cho các mã trong ngành"
+    )
+    sector_map = get_sector_map(data.columns, df) if use_sector_budgets else None
+
+    # Phương pháp liên kết của cây phân cấp HRP
+    hrp_linkage = st.sidebar.selectbox(
+        "Phương pháp liên kết HRP",
+        list(HRP_LINKAGE_METHODS),
+        index=list(HRP_LINKAGE_METHODS).index(DEFAULT_HRP_LINKAGE),
+        format_func=HRP_LINKAGE_METHODS.get,
+        key=f"hrp_linkage_{mode}",
+        help="Kết quả của các phương pháp single/ward/average được hiển thị cạnh nhau để so sánh"
+    )
+
+    # Cách tái cân bằng khi backtest từng chiến lược
+    backtest_rebalance = st.sidebar.selectbox(
+        "Tái cân bằng khi backtest",
+        list(BACKTEST_REBALANCE_OPTIONS),
+        index=list(BACKTEST_REBALANCE_OPTIONS).index(DEFAULT_BACKTEST_REBALANCE),
+        format_func=BACKTEST_REBALANCE_OPTIONS.get,
+        key=f"backtest_rebalance_{mode}",
+        help="Các chế độ khác 'lý thuyết' mô phỏng số cổ phiếu nguyên, phí môi giới, thuế bán và tiền mặt dư"
+    )
+    backtest_options = {'initial_value': total_investment, 'lot_sizes': get_lot_sizes(exchanges) if exchanges else None}
+    if backtest_rebalance == 'drift':
+        backtest_options['drift_threshold'] = st.sidebar.slider(
+            "Ngưỡng lệch trọng số (%)", 1, 20, int(DEFAULT_DRIFT_THRESHOLD * 100),
+            key=f"drift_threshold_{mode}"
+        ) / 100
+    elif backtest_rebalance != 'ideal' and st.sidebar.checkbox(
+        "Mô phỏng biên độ giá & tạm ngừng giao dịch",
+        key=f"price_limits_{mode}",
+        help="Không mua được mã đóng cửa ở giá trần, không bán được mã đóng cửa ở giá sàn "
+             "(±7% HOSE, ±10% HNX, ±15% UPCOM) hoặc đang tạm ngừng giao dịch; lệnh chưa khớp được giữ sang phiên sau"
+    ):
+        backtest_options.update(ohlcv_loader=fetch_ohlcv_panel, exchanges=exchanges)
+
     # Nút chạy tất cả mô hình
     st.sidebar.markdown("---")
     if st.sidebar.button("🚀 Chạy Tất cả Mô hình", type="primary", use_container_width=True):
@@ -137,10 +223,12 @@ def run_models(data):
             clear_optimization_results(mode)
             
             # Chạy tất cả mô hình
-            results = run_all_models(data, total_investment, get_latest_prices, mode)
+            results = run_all_models(data, total_investment, get_latest_prices, mode, exchanges=exchanges,
+                                     cov_estimator=cov_estimator, sector_map=sector_map,
+                                     hrp_linkage=hrp_linkage)
             
             if results:
-                st.success(f"✅ Hoàn thành! Đã chạy {len(results)}/6 mô hình thành công.")
+                st.success(f"✅ Hoàn thành! Đã chạy {len(results)}/7 mô hình thành công.")
                 st.info("💡 Vào tab **'Tổng hợp Kết quả Tối ưu hóa'** để xem so sánh chi tiết!")
                 # Chuyển sang tab so sánh
                 st.session_state.previous_tab = get_current_tab()
@@ -148,42 +236,135 @@ def run_models(data):
                 st.rerun()
             else:
                 st.error("❌ Không thể chạy bất kỳ mô hình nào. Vui lòng kiểm tra dữ liệu.")
+
+    # Quét tham số: tối ưu rồi backtest trên lưới mô hình x cửa sổ x chu kỳ x số vốn
+    with st.sidebar.expander("🧪 Quét tham số (backtest)"):
+        sweep_models = st.multiselect(
+            "Mô hình", list(SWEEP_MODELS), default=list(SWEEP_MODELS),
+            format_func=SWEEP_MODELS.get, key=f"sweep_models_{mode}"
+        )
+        sweep_lookbacks = st.multiselect(
+            "Cửa sổ ước lượng (phiên)", [21, 42, 63, 126, 189, 252, 378, 504, 756, 1008],
+            default=list(DEFAULT_SWEEP_LOOKBACKS), key=f"sweep_lookbacks_{mode}"
+        )
+        sweep_rebalances = st.multiselect(
+            "Tái cân bằng", list(BACKTEST_REBALANCE_OPTIONS), default=list(DEFAULT_SWEEP_REBALANCES),
+            format_func=BACKTEST_REBALANCE_OPTIONS.get, key=f"sweep_rebalances_{mode}"
+        )
+        sweep_multipliers = st.multiselect(
+            "Số vốn (bội số của số tiền đầu tư)", [0.1, 0.5, 1, 2, 5, 10], default=[1],
+            key=f"sweep_amounts_{mode}"
+        )
+        evaluation_periods = st.number_input(
+            "Số phiên backtest ngoài mẫu", min_value=20, value=DEFAULT_EVALUATION_PERIODS, step=21,
+            key=f"sweep_evaluation_{mode}",
+            help="Các phiên cuối của dữ liệu; cửa sổ ước lượng nằm ngay trước giai đoạn này"
+        )
+        if st.button("🧪 Quét tham số", use_container_width=True, key=f"run_sweep_{mode}"):
+            progress = st.progress(0.0)
+            try:
+                with st.spinner("⏳ Đang tối ưu và backtest trên lưới tham số..."):
+                    sweep_result = run_parameter_sweep(
+                        data, sweep_models, sweep_lookbacks, sweep_rebalances,
+                        [total_investment * m for m in sweep_multipliers],
+                        evaluation_periods=int(evaluation_periods), cov_estimator=cov_estimator,
+                        progress_callback=lambda done, total: progress.progress(done / total),
+                        lot_sizes=backtest_options['lot_sizes'],
+                    )
+                save_sweep_result(sweep_result, mode)
+                st.success(f"✅ Đã quét {len(sweep_result.frame)} tổ hợp trong {sweep_result.elapsed:.1f} giây. "
+                           "Xem ở tab **'Tổng hợp Kết quả Tối ưu hóa'**.")
+            except ValueError as e:
+                st.error(f"Không thể quét tham số: {e}")
+
+    # Tối ưu trên toàn bộ mã của một sàn thay vì rổ mã đã chọn
+    with st.sidebar.expander("🌐 Tối ưu toàn sàn"):
+        universe_exchange = st.selectbox("Sàn", ["HOSE", "HNX", "UPCOM"], key=f"universe_exchange_{mode}")
+        universe_max_assets = st.number_input("Số mã nắm giữ tối đa", min_value=1, value=30, step=5,
+                                              key=f"universe_max_assets_{mode}")
+        universe_max_weight = st.slider("Tỷ trọng tối đa mỗi mã (%)", 1, 50, 10,
+                                        key=f"universe_max_weight_{mode}") / 100
+        universe_sector_cap = st.slider("Trần tỷ trọng mỗi ngành (%)", 5, 100, 30,
+                                        key=f"universe_sector_cap_{mode}") / 100
+        universe_button = st.button("🌐 Tối ưu toàn sàn", use_container_width=True, key=f"run_universe_{mode}")
+
+    if universe_button:
+        universe = universe_from_company_info(df, (universe_exchange,))
+        universe_sectors = get_sector_map(universe, df)
+        reachable = max_total_weight([universe_sectors.get(t, 'Khác') for t in universe],
+                                     int(universe_max_assets), universe_max_weight, universe_sector_cap)
+        if reachable < 1:
+            st.error(f"Không thể đạt tổng tỷ trọng 100%: với các giới hạn đã chọn, tối đa chỉ {reachable:.0%}. "
+                     "Tăng số mã, tỷ trọng tối đa mỗi mã hoặc trần ngành.")
+        else:
+            with st.spinner(f"⏳ Đang tải giá {len(universe)} mã sàn {universe_exchange} và tối ưu..."):
+                universe_data, _ = fetch_stock_data2(universe, data.index[0].date(), data.index[-1].date(),
+                                                     verbose=False)
+                universe_result = large_universe_model(
+                    universe_data, total_investment, get_latest_prices, sector_map=universe_sectors,
+                    max_assets=int(universe_max_assets), max_weight=universe_max_weight,
+                    sector_cap=universe_sector_cap,
+                    exchanges=get_exchange_map(universe_data.columns, df) if use_board_lots else None
+                )
+            if universe_result:
+                save_optimization_result("Mô hình Toàn sàn", universe_result, mode=mode)
+                display_results("Mô hình Toàn sàn", universe_result)
+                st.caption(f"Đã xét {universe_result['Số mã xét']} mã sàn {universe_exchange}.")
+                st.dataframe(pd.Series(universe_result["Tỷ trọng theo ngành"], name="Tỷ trọng").to_frame()
+                             .style.format("{:.2%}"))
+            else:
+                st.error("Không thể tối ưu toàn sàn. Vui lòng kiểm tra dữ liệu giá.")
     
     st.sidebar.markdown("---")
     st.sidebar.markdown("### Chạy từng mô hình tối ưu hóa")
 
     models = {
         "Tối ưu hóa giữa lợi nhuận và rủi ro": {
-            "function": lambda d, ti: markowitz_optimization(d, ti, get_latest_prices),
+            "function": lambda d, ti, ps: markowitz_optimization(d, ti, get_latest_prices, exchanges=exchanges, price_snapshot=ps, cov_estimator=cov_estimator),
             "original_name": "Mô hình Markowitz"
         },
         "Hiệu suất tối đa": {
-            "function": lambda d, ti: max_sharpe(d, ti, get_latest_prices),
+            "function": lambda d, ti, ps: max_sharpe(d, ti, get_latest_prices, exchanges=exchanges, price_snapshot=ps, cov_estimator=cov_estimator),
             "original_name": "Mô hình Max Sharpe Ratio"
         },
         "Đầu tư an toàn": {
-            "function": lambda d, ti: min_volatility(d, ti, get_latest_prices),
+            "function": lambda d, ti, ps: min_volatility(d, ti, get_latest_prices, exchanges=exchanges, price_snapshot=ps, cov_estimator=cov_estimator),
             "original_name": "Mô hình Min Volatility"
         },
         "Đa dạng hóa thông minh": {
-            "function": lambda d, ti: hrp_model(d, ti, get_latest_prices),
+            "function": lambda d, ti, ps: hrp_model(d, ti, get_latest_prices, exchanges=exchanges, price_snapshot=ps, cov_estimator=cov_estimator, linkage_method=hrp_linkage),
             "original_name": "Mô hình HRP"
         },
         "Phòng ngừa tổn thất cực đại": {
-            "function": lambda d, ti: min_cvar(d, ti, get_latest_prices),
+            "function": lambda d, ti, ps: min_cvar(d, ti, get_latest_prices, exchanges=exchanges, price_snapshot=ps, cov_estimator=cov_estimator),
             "original_name": "Mô hình Min CVaR"
         },
         "Kiểm soát tổn thất kéo dài": {
-            "function": lambda d, ti: min_cdar(d, ti, get_latest_prices),
+            "function": lambda d, ti, ps: min_cdar(d, ti, get_latest_prices, exchanges=exchanges, price_snapshot=ps, cov_estimator=cov_estimator),
             "original_name": "Mô hình Min CDaR"
         },
+        "Cân bằng rủi ro": {
+            "function": lambda d, ti, ps: risk_parity_model(d, ti, get_latest_prices, sector_map=sector_map, exchanges=exchanges, price_snapshot=ps, cov_estimator=cov_estimator),
+            "original_name": "Mô hình Risk Parity"
+        },
+        "Ổn định trước sai số ước lượng": {
+            "function": lambda d, ti, ps: resampled_frontier_model(d, ti, get_latest_prices, exchanges=exchanges, price_snapshot=ps, cov_estimator=cov_estimator),
+            "original_name": "Mô hình Resampled Frontier"
+        },
     }
 
     for strategy_name, model_details in models.items():
         if st.sidebar.button(f"Chiến lược {strategy_name}"):
             try:
+                # Chụp giá một lần cho lượt chạy (dùng chung cả mô hình so sánh bên dưới)
+                price_snapshot = PriceSnapshot.capture(data.columns.tolist(), get_latest_prices, data)
+                if price_snapshot.filled:
+                    st.warning(
+                        "Không lấy được giá mới nhất, dùng giá lịch sử cho: "
+                        + ", ".join(price_snapshot.filled)
+                    )
                 # Chạy mô hình tối ưu hóa
-                result = model_details["function"](data, total_investment)
+                result = model_details["function"](data, total_investment, price_snapshot)
                 if result:
                     # Lưu kết quả vào session state
                     save_optimization_result(model_details["original_name"], result, mode=mode)
@@ -246,14 +427,26 @@ def run_models(data):
                     # Vẽ biểu đồ phân tích Min CDaR
                     elif strategy_name == "Kiểm soát tổn thất kéo dài":
                         # Tính Max Sharpe để so sánh
-                        max_sharpe_result = max_sharpe(data, total_investment, get_latest_prices)
+                        max_sharpe_result = max_sharpe(
+                            data, total_investment, get_latest_prices,
+                            exchanges=exchanges, price_snapshot=price_snapshot,
+                            cov_estimator=cov_estimator
+                        )
                         # Tính returns data từ price data
                         returns_data = data.pct_change().dropna()
                         plot_min_cdar_analysis(result, max_sharpe_result, returns_data)
                     
                     # Vẽ biểu đồ phân tích HRP với Dendrogram
                     elif strategy_name == "Đa dạng hóa thông minh":
-                        visualize_hrp_model(data, result)
+                        visualize_hrp_model(data, result, cov_estimator)
+
+                    # Vẽ đóng góp rủi ro so với ngân sách cho Risk Parity
+                    elif strategy_name == "Cân bằng rủi ro":
+                        plot_risk_contributions(result)
+
+                    # Vẽ đường biên lấy mẫu lại và độ ổn định trọng số
+                    elif strategy_name == "Ổn định trước sai số ước lượng":
+                        plot_resampled_frontier(result)
 
                     # Lấy thông tin cổ phiếu và trọng số từ kết quả
                     symbols = list(result["Trọng số danh mục"].keys())
@@ -270,7 +463,10 @@ def run_models(data):
                             weights, 
                             start_date, 
                             end_date,
-                            fetch_stock_data2
+                            fetch_stock_data2,
+                            rebalance=backtest_rebalance,
+                            benchmark_loader=get_index_closes,
+                            **(backtest_options if backtest_rebalance != 'ideal' else {})
                         )
 
                         # Hiển thị kết quả backtesting
@@ -283,6 +479,61 @@ def run_models(data):
             except Exception as e:
                 st.error(f"Lỗi khi chạy {strategy_name}: {e}")
 
+    # Tái cân bằng danh mục đang nắm giữ thay vì phân bổ lại từ đầu
+    st.sidebar.markdown("---")
+    with st.sidebar.expander("🔁 Tái cân bằng danh mục hiện có"):
+        holdings_text = st.text_area(
+            "Danh mục đang nắm giữ (mỗi dòng: MÃ, số lượng)",
+            key=f"rebalance_holdings_{mode}",
+            placeholder="FPT, 1000\nVNM, 500"
+        )
+        rebalance_cash = st.number_input(
+            "Tiền mặt hiện có (VND)", min_value=0.0, value=0.0, step=1_000_000.0,
+            key=f"rebalance_cash_{mode}"
+        )
+        rebalance_target = st.selectbox(
+            "Mô hình mục tiêu", list(REBALANCE_MODELS), format_func=REBALANCE_MODELS.get,
+            index=list(REBALANCE_MODELS).index('max_sharpe'), key=f"rebalance_model_{mode}"
+        )
+        turnover_penalty = st.number_input(
+            "Phạt vòng quay", min_value=0.0, value=0.0, step=0.0005, format="%.4f",
+            key=f"rebalance_penalty_{mode}",
+            help="Tính như một khoản phí thêm trên giá trị giao dịch (0.002 = 0,2%), ngoài phí "
+                 "môi giới và thuế bán; giá trị lớn hơn cho ít lệnh hơn"
+        )
+        min_trade_value = st.number_input(
+            "Bỏ lệnh nhỏ hơn (VND)", min_value=0.0, value=0.0, step=500_000.0,
+            key=f"rebalance_min_trade_{mode}"
+        )
+        st.caption(f"Phí môi giới {BROKERAGE_FEE:.2%} mỗi chiều, thuế bán {SELL_TAX:.1%}.")
+        rebalance_button = st.button("Tính lệnh tái cân bằng", key=f"rebalance_button_{mode}")
+
+    if rebalance_button:
+        holdings = {}
+        for line in holdings_text.splitlines():
+            parts = [p.strip() for p in line.replace(";", ",").split(",") if p.strip()]
+            if len(parts) == 2:
+                try:
+                    holdings[parts[0].upper()] = float(parts[1])
+                except ValueError:
+                    st.warning(f"Bỏ qua dòng không hợp lệ: {line}")
+        outside = [t for t in holdings if t not in data.columns]
+        if outside:
+            st.error("Các mã đang nắm giữ phải nằm trong danh sách mã đã chọn: " + ", ".join(outside))
+        elif not holdings and rebalance_cash <= 0:
+            st.error("Nhập danh mục đang nắm giữ hoặc tiền mặt để tái cân bằng.")
+        else:
+            with st.spinner("Đang tính lệnh tái cân bằng..."):
+                rebalance_result = rebalance_model(
+                    data, holdings, rebalance_cash, get_latest_prices,
+                    model=rebalance_target, turnover_penalty=turnover_penalty,
+                    min_trade_value=min_trade_value, exchanges=exchanges, cov_estimator=cov_estimator
+                )
+            if rebalance_result:
+                display_rebalance_results(rebalance_result)
+            else:
+                st.error("Không thể tái cân bằng danh mục. Vui lòng kiểm tra dữ liệu đầu vào.")
+
 
 def main_manual_selection():
     """
@@ -521,6 +772,7 @@ elif option == "Tổng hợp Kết quả Tối ưu hóa":
     st.sidebar.markdown("---")
     if st.sidebar.button("🗑️ Xóa tất cả kết quả", help="Xóa tất cả kết quả tối ưu hóa đã lưu", use_container_width=True):
         clear_optimization_results(mode)
+        save_sweep_result(None, mode)
         st.sidebar.success("✅ Đã xóa tất cả kết quả!")
         st.rerun()
     
@@ -528,7 +780,7 @@ elif option == "Tổng hợp Kết quả Tối ưu hóa":
     results = get_optimization_results(mode)
     
     # Hiển thị tab so sánh
-    render_optimization_comparison_tab(results)
+    render_optimization_comparison_tab(results, get_sweep_result(mode))
 
 elif option == "Tổng quan Thị trường & Ngành":
     render_bang_dieu_hanh()
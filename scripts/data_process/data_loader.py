@@ -10,7 +10,10 @@ from data_process.fetchers import (
     fetch_stock_data2,
     get_latest_prices,
     fetch_ohlc_data,
+    fetch_ohlcv_panel,
     get_index_history,
+    get_index_histories,
+    get_index_closes,
     get_sector_snapshot,
     get_realtime_index_board,
 )
@@ -40,7 +43,10 @@ __all__ = [
     'fetch_stock_data2',
     'get_latest_prices',
     'fetch_ohlc_data',
+    'fetch_ohlcv_panel',
     'get_index_history',
+    'get_index_histories',
+    'get_index_closes',
     'get_sector_snapshot',
     'get_realtime_index_board',
     'fetch_fundamental_data',
@@ -246,45 +246,143 @@ def fetch_ohlc_data(ticker: str, start_date: str, end_date: str) -> pd.DataFrame
         return pd.DataFrame()
 
 
-def get_index_history(symbol: str = "VNINDEX", start_date: Optional[str] = None,
-                      end_date: Optional[str] = None, months: int = 6,
-                      source: str = "VCI") -> pd.DataFrame:
-    """Fetch historical quotes for a market index."""
-    # Xử lý ngày tháng
+OHLCV_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+@lru_cache(maxsize=128)
+def _fetch_ohlcv_single_cached(ticker: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """Fetch OHLCV history of one ticker (DatetimeIndex, lower-case columns) and cache the response."""
+    stock = Vnstock().stock(symbol=ticker, source='VCI')
+    stock_data = stock.quote.history(start=str(start_date), end=str(end_date))
+    if stock_data is None or stock_data.empty:
+        raise ValueError("Không có dữ liệu")
+
+    stock_data.columns = [c.lower() for c in stock_data.columns]
+    df = stock_data[['time'] + [c for c in OHLCV_FIELDS if c in stock_data.columns]].copy()
+    df['time'] = pd.to_datetime(df['time'])
+    return df.set_index('time')
+
+
+def fetch_ohlcv_panel(symbols: Iterable[str], start_date: str, end_date: str) -> Tuple[Dict[str, pd.DataFrame], List[str]]:
+    """
+    Fetch OHLCV for many tickers in parallel as one table per field.
+
+    Unlike fetch_stock_data2 the panel is not interpolated: sessions without trades
+    (suspensions) stay NaN so the backtest can detect them.
+
+    Returns:
+        (dict field -> DataFrame (sessions x tickers), list of skipped tickers)
+    """
+    unique_symbols, _ = _normalize_symbols(symbols)
+    start_str, end_str = str(start_date), str(end_date)
+    frames: Dict[str, pd.DataFrame] = {}
+    skipped_tickers: List[str] = []
+
+    def worker(ticker: str):
+        try:
+            return ticker, _fetch_ohlcv_single_cached(ticker, start_str, end_str)
+        except Exception:
+            return ticker, None
+
+    with ThreadPoolExecutor(max_workers=min(8, max(1, len(unique_symbols)))) as executor:
+        for ticker, df in executor.map(worker, unique_symbols):
+            if df is None or df.empty:
+                skipped_tickers.append(ticker)
+            else:
+                frames[ticker] = df
+
+    if not frames:
+        return {}, skipped_tickers
+    panel = pd.concat(frames, axis=1).sort_index()
+    fields = panel.columns.get_level_values(1)
+    return {field: panel.xs(field, axis=1, level=1) for field in OHLCV_FIELDS if field in fields}, skipped_tickers
+
+
+def _resolve_index_dates(start_date, end_date, months: int) -> Tuple[str, str]:
+    """Normalize (start, end) to 'YYYY-MM-DD' strings so cache keys match across callers."""
     today = datetime.datetime.now(VN_TZ).date()
-    e_date = datetime.datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else today
-    
+    e_date = pd.to_datetime(end_date).date() if end_date else today
+
     if start_date:
-        s_date = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
+        s_date = pd.to_datetime(start_date).date()
     else:
         s_date = e_date - datetime.timedelta(days=months * 30)
-    
+
     # Đảm bảo start < end
     if s_date > e_date:
-         s_date = e_date - datetime.timedelta(days=30)
+        s_date = e_date - datetime.timedelta(days=30)
+    return s_date.strftime("%Y-%m-%d"), e_date.strftime("%Y-%m-%d")
 
-    try:
-        # Không dùng cache ở đây vì start/end date thay đổi liên tục theo ngày
-        # Nếu muốn cache, phải cache theo logic _fetch_single_stock_cached
-        stock = Vnstock().stock(symbol=symbol, source=source)
-        history = stock.quote.history(start=s_date.strftime("%Y-%m-%d"), 
-                                      end=e_date.strftime("%Y-%m-%d"))
-        
-        if history is None or history.empty:
-            return pd.DataFrame()
 
-        history = history.copy()
-        history['time'] = pd.to_datetime(history['time'])
-        history['symbol'] = symbol
-        
-        cols = ['time', 'close', 'volume', 'symbol']
-        return history[[c for c in cols if c in history.columns]]
-        
+@lru_cache(maxsize=64)
+def _fetch_index_history_cached(symbol: str, start_date: str, end_date: str, source: str) -> pd.DataFrame:
+    """
+    Fetch an index history for a resolved date range and cache the response.
+    Shared by the market overview and the backtest benchmarks; callers must copy before mutating.
+    """
+    stock = Vnstock().stock(symbol=symbol, source=source)
+    history = stock.quote.history(start=start_date, end=end_date)
+
+    if history is None or history.empty:
+        # Không cache kết quả rỗng (có thể do API tạm lỗi)
+        raise ValueError("Không có dữ liệu")
+
+    history = history.copy()
+    history['time'] = pd.to_datetime(history['time'])
+    history['symbol'] = symbol
+
+    cols = ['time', 'close', 'volume', 'symbol']
+    return history[[c for c in cols if c in history.columns]]
+
+
+def get_index_history(symbol: str = "VNINDEX", start_date: Optional[str] = None,
+                      end_date: Optional[str] = None, months: int = 6,
+                      source: str = "VCI") -> pd.DataFrame:
+    """Fetch historical quotes for a market index."""
+    s_date, e_date = _resolve_index_dates(start_date, end_date, months)
+    try:
+        # Cache theo khoảng ngày đã chuẩn hóa: ngày kết thúc mặc định là hôm nay nên khóa tự đổi theo ngày
+        return _fetch_index_history_cached(symbol, s_date, e_date, source).copy()
+    except ValueError:
+        return pd.DataFrame()
     except Exception as exc:
         print(f"Lỗi khi lấy dữ liệu chỉ số {symbol}: {exc}")
         return pd.DataFrame()
 
 
+def get_index_histories(symbols: Iterable[str], start_date: Optional[str] = None,
+                        end_date: Optional[str] = None, months: int = 6,
+                        source: str = "VCI") -> Dict[str, pd.DataFrame]:
+    """Fetch several index histories in one parallel batch (through the shared cache)."""
+    unique_symbols, _ = _normalize_symbols(symbols)
+    if not unique_symbols:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(8, len(unique_symbols))) as executor:
+        histories = executor.map(
+            lambda symbol: get_index_history(symbol, start_date=start_date, end_date=end_date,
+                                             months=months, source=source),
+            unique_symbols
+        )
+        return dict(zip(unique_symbols, histories))
+
+
+def get_index_closes(symbols: Iterable[str], start_date: Optional[str] = None,
+                     end_date: Optional[str] = None, source: str = "VCI") -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Close prices of several indices as one wide frame (index = time, columns = symbols).
+
+    Returns:
+        tuple: (DataFrame, list of symbols without data)
+    """
+    histories = get_index_histories(symbols, start_date=start_date, end_date=end_date, source=source)
+    closes = {symbol: df.set_index('time')['close'] for symbol, df in histories.items()
+              if not df.empty and 'close' in df.columns}
+    missing = [symbol for symbol in histories if symbol not in closes]
+    if not closes:
+        return pd.DataFrame(), missing
+    return pd.DataFrame(closes).sort_index(), missing
+
+
 @lru_cache(maxsize=4)
 def _get_sector_snapshot_cached(exchange: str, size: int, source: str) -> pd.DataFrame:
     """Helper cached function for screener."""
@@ -4,7 +4,7 @@ from typing import Iterable, List, Optional
 
 import pandas as pd
 
-from data_process.fetchers import get_index_history
+from data_process.fetchers import get_index_histories, get_index_history
 
 INDEX_LABELS = {
     "VNINDEX": "VN-Index",
@@ -31,9 +31,9 @@ def get_indices_history(symbols: Iterable[str] = DEFAULT_INDEX_SYMBOLS, months:
                         end_date: Optional[str] = None) -> pd.DataFrame:
     """Return long-format historical quotes for a list of indices."""
     frames = []
-    for symbol in symbols:
-        df = get_index_history(symbol, start_date=start_date, end_date=end_date,
-                                months=months, source=source)
+    histories = get_index_histories(symbols, start_date=start_date, end_date=end_date,
+                                    months=months, source=source)
+    for symbol, df in histories.items():
         if df.empty:
             continue
         df = df.copy()
@@ -0,0 +1,410 @@
+"""
+Module allocation.py
+Chuyển trọng số lý thuyết thành số lượng cổ phiếu nguyên trong giới hạn ngân sách.
+
+Thay cho bài toán MILP (DiscreteAllocation.lp_portfolio + ECOS_BB) và vòng lặp mua
+từng cổ phiếu: nới lỏng Lagrange cho bài toán knapsack bậc hai (có cận dưới chứng nhận),
+làm tròn tham lam, sau đó tìm kiếm cục bộ (thêm / bớt / hoán đổi một cổ phiếu) để giảm
+sai số bám trọng số mục tiêu. Mọi bước đánh giá đều vector hóa bằng numpy nên chạy
+trong vài mili-giây kể cả với hơn 100 mã.
+"""
+
+import logging
+import time
+from typing import Dict, Iterable, Mapping, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PriceInput = Union[Mapping[str, float], pd.Series]
+
+# Lô chẵn (board lot) theo sàn; lô lẻ 1-99 cổ phiếu khớp trên sổ lệnh riêng, thanh khoản mỏng
+BOARD_LOT_SIZES = {'HOSE': 100, 'HNX': 100, 'UPCOM': 100}
+
+# Bước giá (VND): HOSE theo vùng giá, HNX/UPCOM cố định 100 VND
+HOSE_PRICE_STEPS = ((10_000, 10), (50_000, 50), (float('inf'), 100))
+FLAT_PRICE_STEPS = {'HNX': 100, 'UPCOM': 100}
+
+# Giới hạn của nhánh cận trong solve_integer_least_squares (số nút, giây)
+BNB_MAX_NODES = 20_000
+BNB_TIME_LIMIT = 0.05
+
+
+def get_exchange_map(tickers: Iterable[str], company_info: pd.DataFrame) -> Dict[str, str]:
+    """Tra sàn giao dịch của từng mã từ cột ``exchange`` của company_info.csv."""
+    if company_info is None or company_info.empty or 'exchange' not in company_info.columns:
+        return {}
+    mapping = (
+        company_info.assign(symbol=company_info['symbol'].astype(str).str.upper())
+        .drop_duplicates('symbol')
+        .set_index('symbol')['exchange']
+        .astype(str).str.upper()
+    )
+    return {t: mapping[t] for t in tickers if t in mapping.index}
+
+
+def get_lot_sizes(exchanges: Mapping[str, str]) -> Dict[str, int]:
+    """Kích thước lô chẵn của từng mã theo sàn (mặc định 1 nếu sàn không xác định)."""
+    return {t: BOARD_LOT_SIZES.get(ex, 1) for t, ex in exchanges.items()}
+
+
+def price_step(price: float, exchange: str) -> float:
+    """Bước giá hợp lệ của một mức giá trên sàn tương ứng."""
+    if exchange == 'HOSE':
+        for threshold, step in HOSE_PRICE_STEPS:
+            if price < threshold:
+                return step
+    return FLAT_PRICE_STEPS.get(exchange, 1)
+
+
+def round_to_price_step(latest_prices: PriceInput, exchanges: Mapping[str, str]) -> pd.Series:
+    """Làm tròn lên giá mua theo bước giá của sàn để ngân sách không bị vượt khi đặt lệnh."""
+    price_series = pd.Series(latest_prices, dtype=float).copy()
+    for ticker, exchange in exchanges.items():
+        if ticker in price_series.index and pd.notna(price_series[ticker]):
+            step = price_step(price_series[ticker], exchange)
+            price_series[ticker] = np.ceil(price_series[ticker] / step - 1e-9) * step
+    return price_series
+
+
+def _prepare_inputs(weights: Mapping[str, float], latest_prices: PriceInput,
+                    total_investment: float) -> Tuple[list, np.ndarray, np.ndarray]:
+    """Chuẩn hóa đầu vào thành (tickers, giá trị mục tiêu, giá) dạng mảng."""
+    if total_investment <= 0:
+        raise ValueError(f"So tien dau tu phai lon hon 0. Nhan duoc: {total_investment:,.0f} VND")
+
+    weight_series = pd.Series(dict(weights), dtype=float).fillna(0.0)
+    weight_series = weight_series[weight_series > 0]
+    if weight_series.empty:
+        raise ValueError("Khong co trong so duong de phan bo")
+
+    price_series = pd.Series(latest_prices, dtype=float)
+    tickers = weight_series.index.tolist()
+    missing = [t for t in tickers if t not in price_series.index
+               or pd.isna(price_series[t]) or price_series[t] <= 0]
+    if missing:
+        raise ValueError(f"Thieu gia hop le cho cac ma: {', '.join(missing)}")
+
+    weight_arr = weight_series.to_numpy()
+    weight_arr = weight_arr / weight_arr.sum()
+    target_values = weight_arr * float(total_investment)
+    price_arr = price_series.reindex(tickers).to_numpy(dtype=float)
+    return tickers, target_values, price_arr
+
+
+def tracking_error(shares: np.ndarray, target_values: np.ndarray, prices: np.ndarray) -> float:
+    """Tổng bình phương sai số (VND^2) giữa giá trị mục tiêu và giá trị thực tế."""
+    residual = target_values - shares * prices
+    return float(np.dot(residual, residual))
+
+
+def _upper_bounds(upper: Optional[np.ndarray], n: int) -> np.ndarray:
+    """Giới hạn trên số cổ phiếu mỗi mã (mặc định không giới hạn)."""
+    if upper is None:
+        return np.full(n, np.inf)
+    return np.asarray(upper, dtype=float)
+
+
+def greedy_fill(shares: np.ndarray, target_values: np.ndarray, prices: np.ndarray,
+                budget: float, upper: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Mua thêm từng cổ phiếu cho mã có lợi ích cận biên lớn nhất khi còn tiền.
+
+    Lợi ích cận biên được giữ trong một mảng và chỉ cập nhật phần tử vừa thay đổi,
+    nên mỗi bước chỉ là một argmax thay vì sắp xếp lại toàn bộ danh sách.
+    """
+    shares = shares.astype(float).copy()
+    upper = _upper_bounds(upper, len(prices))
+    remaining = budget - float(np.dot(shares, prices))
+    residual = target_values - shares * prices
+    # Lợi ích khi mua thêm 1 cổ phiếu: mức giảm bình phương sai số
+    gain = 2 * prices * residual - prices ** 2
+    gain[shares >= upper] = -np.inf
+
+    while True:
+        candidate = np.where(prices <= remaining + 1e-9, gain, -np.inf)
+        idx = int(np.argmax(candidate))
+        if candidate[idx] <= 0:
+            break
+        shares[idx] += 1
+        remaining -= prices[idx]
+        residual[idx] -= prices[idx]
+        gain[idx] = 2 * prices[idx] * residual[idx] - prices[idx] ** 2 if shares[idx] < upper[idx] else -np.inf
+
+    return shares
+
+
+def greedy_allocation(target_values: np.ndarray, prices: np.ndarray, budget: float,
+                      upper: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Làm tròn xuống rồi mua thêm từng cổ phiếu cho mã đang thiếu nhiều nhất.
+
+    Sau khi làm tròn xuống, mỗi mã thiếu ít hơn một cổ phiếu nên vòng lặp mua thêm
+    chạy tối đa N bước.
+    """
+    shares = np.minimum(np.floor(target_values / prices), _upper_bounds(upper, len(prices)))
+    return greedy_fill(shares, target_values, prices, budget, upper)
+
+
+def local_search(shares: np.ndarray, target_values: np.ndarray, prices: np.ndarray,
+                 budget: float, max_moves: int = None,
+                 upper: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Cải thiện phân bổ bằng các bước thêm / bớt / hoán đổi một cổ phiếu.
+
+    Vì hàm mục tiêu tách được theo từng mã, độ thay đổi của một bước hoán đổi
+    (mua i, bán j) bằng tổng độ thay đổi của hai bước đơn lẻ. Toàn bộ N x N
+    bước hoán đổi được đánh giá một lần bằng broadcasting, rồi áp dụng bước tốt nhất.
+    """
+    shares = shares.astype(float).copy()
+    n = len(prices)
+    upper = _upper_bounds(upper, n)
+    if max_moves is None:
+        max_moves = 10 * n + 100
+
+    residual = target_values - shares * prices
+    remaining = budget - float(np.dot(shares, prices))
+    off_diagonal = ~np.eye(n, dtype=bool)
+
+    for _ in range(max_moves):
+        delta_add = np.where(shares < upper, prices ** 2 - 2 * prices * residual, np.inf)
+        delta_remove = np.where(shares >= 1, prices ** 2 + 2 * prices * residual, np.inf)
+
+        add_ok = prices <= remaining + 1e-9
+        best_add = np.where(add_ok, delta_add, np.inf)
+
+        swap = delta_add[:, None] + delta_remove[None, :]
+        swap_ok = (prices[:, None] <= remaining + prices[None, :] + 1e-9) & off_diagonal
+        swap = np.where(swap_ok, swap, np.inf)
+
+        candidates = (best_add.min(), delta_remove.min(), swap.min())
+        move = int(np.argmin(candidates))
+        if candidates[move] >= -1e-9:
+            break
+
+        if move == 0:
+            i = int(np.argmin(best_add))
+            shares[i] += 1
+            residual[i] -= prices[i]
+            remaining -= prices[i]
+        elif move == 1:
+            j = int(np.argmin(delta_remove))
+            shares[j] -= 1
+            residual[j] += prices[j]
+            remaining += prices[j]
+        else:
+            i, j = np.unravel_index(int(np.argmin(swap)), swap.shape)
+            shares[i] += 1
+            shares[j] -= 1
+            residual[i] -= prices[i]
+            residual[j] += prices[j]
+            remaining += prices[j] - prices[i]
+
+    return shares
+
+
+def _lagrangian_shares(target_values: np.ndarray, prices: np.ndarray, lam: float,
+                       upper: np.ndarray) -> np.ndarray:
+    """Nghiệm nguyên của bài toán nới lỏng Lagrange với nhân tử ``lam``."""
+    # (a - p*x)^2 + lam*p*x = p^2 * (x - (a - lam/2)/p)^2 + hằng số
+    return np.clip(np.rint((target_values - lam / 2) / prices), 0, upper)
+
+
+def _lagrangian_bound(shares: np.ndarray, target_values: np.ndarray, prices: np.ndarray,
+                      budget: float, lam: float) -> float:
+    """Giá trị hàm đối ngẫu g(lam): cận dưới của tối ưu nguyên."""
+    spent = shares * prices
+    return float(np.sum((target_values - spent) ** 2) + lam * (spent.sum() - budget))
+
+
+def _branch_and_bound(target_values: np.ndarray, prices: np.ndarray, budget: float,
+                      upper: np.ndarray, incumbent: np.ndarray, max_nodes: int,
+                      time_limit: float) -> Tuple[np.ndarray, bool]:
+    """
+    Nhánh cận trên từng mã (giá giảm dần) để đóng khoảng cách khi ngân sách chỉ đủ
+    vài cổ phiếu - trường hợp các bước dịch chuyển một cổ phiếu không thoát được
+    cực tiểu địa phương.
+
+    Cận dưới của phần còn lại: mỗi mã tự tối ưu với ngân sách còn lại (bỏ qua việc
+    các mã dùng chung ngân sách). Duyệt theo chiều sâu bằng ngăn xếp (không đệ quy, nên
+    không giới hạn bởi số mã), dừng khi hết ``max_nodes`` nút hoặc ``time_limit`` giây.
+    Trả về (nghiệm tốt nhất, đã duyệt hết cây hay chưa).
+    """
+    order = np.argsort(-prices)
+    a, p, u = target_values[order], prices[order], upper[order]
+    n = len(p)
+
+    best = incumbent[order].copy()
+    best_cost = tracking_error(best, a, p)
+    current = np.zeros(n)
+    nodes = 0
+    deadline = time.perf_counter() + time_limit
+
+    def rest_bound(start, remaining):
+        if start >= n:
+            return 0.0
+        cap = np.minimum(np.floor((remaining + 1e-9) / p[start:]), u[start:])
+        x = np.clip(np.rint(a[start:] / p[start:]), 0, cap)
+        return float(np.sum((a[start:] - p[start:] * x) ** 2))
+
+    def frame(i, remaining, cost):
+        cap = min(np.floor((remaining + 1e-9) / p[i]), u[i])
+        center = min(max(np.rint(a[i] / p[i]), 0), cap)
+        # [mã, tiền còn lại, chi phí, cận phần sau, trần, tâm, hướng duyệt, x kế tiếp]
+        return [i, remaining, cost, rest_bound(i + 1, remaining), cap, center, 1, center]
+
+    stack = [frame(0, budget, 0.0)]
+    while stack:
+        if nodes >= max_nodes or time.perf_counter() > deadline:
+            return _unsort(best, order), False
+        top = stack[-1]
+        i, remaining, cost, bound_after, cap, center, direction, x = top
+        # Hàm chi phí lồi theo x_i: duyệt từ tâm ra hai phía, đổi hướng khi vượt cận
+        child = None
+        while direction != 0:
+            if 0 <= x <= cap:
+                step_cost = (a[i] - p[i] * x) ** 2
+                if cost + step_cost + bound_after < best_cost - 1e-9:
+                    child = x
+                    break
+            direction, x = (-1, center - 1) if direction == 1 else (0, 0)
+        if child is None:
+            stack.pop()
+            continue
+        top[6], top[7] = direction, x + direction
+
+        nodes += 1
+        current[i] = child
+        if i + 1 == n:
+            best_cost, best = cost + step_cost, current.copy()
+        else:
+            stack.append(frame(i + 1, remaining - p[i] * child, cost + step_cost))
+
+    return _unsort(best, order), True
+
+
+def _unsort(values: np.ndarray, order: np.ndarray) -> np.ndarray:
+    """Đưa mảng theo thứ tự ``order`` về thứ tự ban đầu."""
+    result = np.empty(len(values))
+    result[order] = values
+    return result
+
+
+def solve_integer_least_squares(target_values: np.ndarray, prices: np.ndarray, budget: float,
+                                upper: Optional[np.ndarray] = None, max_iter: int = 100,
+                                gap_tol: float = 1e-8, max_nodes: int = BNB_MAX_NODES,
+                                time_limit: float = BNB_TIME_LIMIT) -> Tuple[np.ndarray, float]:
+    """
+    Giải bài toán knapsack bậc hai có chặn:
+        min  sum_i (a_i - p_i * x_i)^2
+        s.t. sum_i p_i * x_i <= budget,  0 <= x_i <= u_i,  x_i nguyên.
+
+    Hàm mục tiêu tách được theo từng mã nên nới lỏng Lagrange của ràng buộc ngân sách
+    có nghiệm nguyên dạng đóng (làm tròn + cắt). Nhân tử được tìm bằng chia đôi, nghiệm
+    khả thi được lấp đầy bằng lợi ích cận biên rồi tinh chỉnh bằng tìm kiếm cục bộ.
+    Nếu khoảng cách tương đối tới cận dưới còn lớn hơn ``gap_tol`` (thường khi ngân sách
+    chỉ đủ vài cổ phiếu), chạy thêm nhánh cận giới hạn ``max_nodes`` nút và ``time_limit`` giây;
+    hết giới hạn thì trả nghiệm tốt nhất đã có cùng cận dưới Lagrange.
+
+    Returns:
+        tuple: (shares, lower_bound) - lower_bound là cận dưới chứng nhận của giá trị
+        tối ưu, nên ``tracking_error(shares) - lower_bound`` là khoảng cách tối đa tới tối ưu.
+    """
+    n = len(prices)
+    upper = _upper_bounds(upper, n)
+
+    shares = _lagrangian_shares(target_values, prices, 0.0, upper)
+    if float(np.dot(shares, prices)) <= budget + 1e-9:
+        # Nghiệm tối ưu không ràng buộc đã khả thi -> tối ưu toàn cục
+        return shares, tracking_error(shares, target_values, prices)
+
+    lower_bound = _lagrangian_bound(shares, target_values, prices, budget, 0.0)
+    lam_lo, lam_hi = 0.0, 2 * float(np.max(target_values)) + float(np.max(prices))
+    feasible = _lagrangian_shares(target_values, prices, lam_hi, upper)
+
+    for _ in range(max_iter):
+        lam = (lam_lo + lam_hi) / 2
+        candidate = _lagrangian_shares(target_values, prices, lam, upper)
+        lower_bound = max(lower_bound, _lagrangian_bound(candidate, target_values, prices, budget, lam))
+        if float(np.dot(candidate, prices)) <= budget + 1e-9:
+            lam_hi, feasible = lam, candidate
+        else:
+            lam_lo = lam
+        if lam_hi - lam_lo <= 1e-9 * max(1.0, lam_hi):
+            break
+
+    shares = greedy_fill(feasible, target_values, prices, budget, upper)
+    shares = local_search(shares, target_values, prices, budget, upper=upper)
+
+    gap = tracking_error(shares, target_values, prices) - lower_bound
+    if gap > gap_tol * budget ** 2 and max_nodes > 0:
+        shares, complete = _branch_and_bound(target_values, prices, budget, upper, shares, max_nodes, time_limit)
+        if complete:
+            # Cây đã duyệt hết -> nghiệm tối ưu, cận dưới bằng chính giá trị hàm mục tiêu
+            lower_bound = tracking_error(shares, target_values, prices)
+    return shares, lower_bound
+
+
+def allocate_shares(weights: Mapping[str, float], latest_prices: PriceInput,
+                    total_investment: float, method: str = 'exact',
+                    max_moves: int = None,
+                    lot_sizes: Optional[Mapping[str, int]] = None) -> Tuple[Dict[str, int], float]:
+    """
+    Phân bổ số cổ phiếu nguyên bám sát trọng số mục tiêu trong ngân sách.
+
+    Khi có ``lot_sizes``, bài toán được giải theo đơn vị lô (giá lô = giá * kích thước lô),
+    không gian tìm kiếm nhỏ đi theo kích thước lô.
+
+    Args:
+        weights (dict): Trọng số mục tiêu {ticker: weight}
+        latest_prices (pd.Series | dict): Giá mới nhất của từng mã (VND)
+        total_investment (float): Tổng số tiền đầu tư
+        method (str): 'exact' (nới lỏng Lagrange, có cận sai số) hoặc 'greedy'
+            (làm tròn tham lam + tìm kiếm cục bộ)
+        max_moves (int): Số bước tìm kiếm cục bộ tối đa cho 'greedy' (mặc định 10*N + 100)
+        lot_sizes (dict): Kích thước lô của từng mã {ticker: lot}, mặc định 1
+
+    Returns:
+        tuple: (allocation_dict, leftover) giống DiscreteAllocation.lp_portfolio
+    """
+    tickers, target_values, price_arr = _prepare_inputs(weights, latest_prices, total_investment)
+    budget = float(total_investment)
+
+    lots = np.ones(len(tickers))
+    if lot_sizes:
+        lots = np.array([max(int(lot_sizes.get(t, 1)), 1) for t in tickers], dtype=float)
+    lot_prices = price_arr * lots
+
+    if method == 'exact':
+        units, lower_bound = solve_integer_least_squares(target_values, lot_prices, budget)
+        gap = tracking_error(units, target_values, lot_prices) - lower_bound
+        logger.info(f"Khoang cach toi da toi nghiem toi uu: {max(gap, 0.0):,.0f} VND^2")
+    elif method == 'greedy':
+        units = greedy_allocation(target_values, lot_prices, budget)
+        units = local_search(units, target_values, lot_prices, budget, max_moves=max_moves)
+    else:
+        raise ValueError(f"Phuong phap phan bo khong hop le: {method}")
+
+    shares = units * lots
+    allocation = {tickers[i]: int(shares[i]) for i in range(len(tickers)) if shares[i] > 0}
+    leftover = budget - float(np.dot(shares, price_arr))
+    return allocation, leftover
+
+
+__all__ = [
+    'BNB_MAX_NODES',
+    'BNB_TIME_LIMIT',
+    'BOARD_LOT_SIZES',
+    'allocate_shares',
+    'get_exchange_map',
+    'get_lot_sizes',
+    'price_step',
+    'round_to_price_step',
+    'greedy_allocation',
+    'greedy_fill',
+    'local_search',
+    'solve_integer_least_squares',
+    'tracking_error',
+]
@@ -0,0 +1,334 @@
+"""
+Module analytics.py
+Các chỉ số hiệu suất và rủi ro của chuỗi lợi suất, không phụ thuộc giao diện.
+
+Mọi hàm nhận lợi suất theo kỳ dưới dạng pd.Series (một danh mục), pd.DataFrame hoặc mảng 2 chiều
+(phiên x danh mục: nhiều danh mục cùng lúc, mỗi cột một danh mục) và tính theo cột bằng numpy,
+độ phức tạp O(n) theo số phiên:
+    - Chỉ số lăn (độ biến động, Sharpe, Sortino, beta) dùng hiệu của tổng tích lũy thay vì
+      tính lại từng cửa sổ.
+    - Thời gian sụt giảm là khoảng cách tới đỉnh gần nhất (np.maximum.accumulate trên vị trí đỉnh).
+Kết quả giữ dạng đầu vào: Series -> số / Series, DataFrame -> Series theo cột / DataFrame.
+Giá trị NaN được coi là lợi suất 0 (phiên không giao dịch).
+
+Sortino dùng độ lệch chuẩn của riêng các phiên lỗ, như bảng thống kê backtest từ trước tới nay.
+"""
+
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+DEFAULT_ROLLING_WINDOW = 63
+DEFAULT_VAR_CONFIDENCE = 0.95
+
+Returns = Union[pd.Series, pd.DataFrame, np.ndarray]
+
+
+def _as_matrix(returns: Returns) -> np.ndarray:
+    values = np.asarray(returns, dtype=float)
+    values = values.reshape(len(values), -1)
+    return np.where(np.isfinite(values), values, 0.0)
+
+
+def _per_column(returns: Returns, values: np.ndarray):
+    """Kết quả một giá trị mỗi cột, theo dạng của đầu vào."""
+    if isinstance(returns, pd.Series):
+        return float(values[0])
+    if isinstance(returns, pd.DataFrame):
+        return pd.Series(values, index=returns.columns)
+    return values if np.ndim(returns) > 1 else float(values[0])
+
+
+def _like(returns: Returns, values: np.ndarray):
+    """Kết quả cùng kích thước với đầu vào (phiên x danh mục)."""
+    if isinstance(returns, pd.Series):
+        return pd.Series(values[:, 0], index=returns.index, name=returns.name)
+    if isinstance(returns, pd.DataFrame):
+        return pd.DataFrame(values, index=returns.index, columns=returns.columns)
+    return values if np.ndim(returns) > 1 else values[:, 0]
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Tổng lăn theo cột bằng hiệu tổng tích lũy; NaN cho window - 1 phiên đầu."""
+    cumulative = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+    result = np.full(values.shape, np.nan)
+    result[window - 1:] = cumulative[window:] - cumulative[:-window]
+    return result
+
+
+def _sample_std(count: np.ndarray, total: np.ndarray, squares: np.ndarray) -> np.ndarray:
+    """Độ lệch chuẩn mẫu (ddof=1) từ số phần tử, tổng và tổng bình phương; NaN khi count < 2."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = (squares - total * total / count) / (count - 1)
+    return np.where(count > 1, np.sqrt(np.clip(variance, 0, None)), np.nan)
+
+
+def _downside_moments(values: np.ndarray, window: Optional[int] = None):
+    negative = values < 0
+    parts = (negative.astype(float), np.where(negative, values, 0.0), np.where(negative, values * values, 0.0))
+    if window is None:
+        return tuple(part.sum(axis=0) for part in parts)
+    return tuple(_rolling_sum(part, window) for part in parts)
+
+
+def _benchmark_vector(returns: Returns, benchmark: Union[pd.Series, np.ndarray]) -> np.ndarray:
+    """Lợi suất chỉ số tham chiếu trên đúng các phiên của danh mục (phiên thiếu: 0)."""
+    if isinstance(benchmark, pd.Series) and isinstance(returns, (pd.Series, pd.DataFrame)):
+        benchmark = benchmark.reindex(returns.index)
+    return _as_matrix(benchmark)[:, 0]
+
+
+def cumulative_returns(returns: Returns):
+    """Giá trị tích lũy của 1 đồng đầu tư."""
+    return _like(returns, np.cumprod(1 + _as_matrix(returns), axis=0))
+
+
+def drawdown_series(returns: Returns):
+    """Mức sụt giảm so với đỉnh trước đó tại mỗi phiên (tỷ lệ âm, 0 tại đỉnh)."""
+    growth = np.cumprod(1 + _as_matrix(returns), axis=0)
+    return _like(returns, growth / np.maximum.accumulate(growth, axis=0) - 1)
+
+
+def max_drawdown(returns: Returns):
+    """Mức sụt giảm tối đa (tỷ lệ âm)."""
+    growth = np.cumprod(1 + _as_matrix(returns), axis=0)
+    return _per_column(returns, (growth / np.maximum.accumulate(growth, axis=0) - 1).min(axis=0))
+
+
+def drawdown_duration(returns: Returns):
+    """Số phiên kể từ đỉnh gần nhất tại mỗi phiên (0 khi đang ở đỉnh)."""
+    growth = np.cumprod(1 + _as_matrix(returns), axis=0)
+    at_peak = growth >= np.maximum.accumulate(growth, axis=0)
+    positions = np.arange(len(growth))[:, None]
+    last_peak = np.maximum.accumulate(np.where(at_peak, positions, -1), axis=0)
+    return _like(returns, (positions - last_peak).astype(float))
+
+
+def max_drawdown_duration(returns: Returns):
+    """Thời gian nằm dưới đỉnh dài nhất (số phiên)."""
+    durations = np.asarray(drawdown_duration(_as_matrix(returns)))
+    return _per_column(returns, durations.max(axis=0) if len(durations) else np.zeros(durations.shape[1]))
+
+
+def underwater_periods(returns: pd.Series) -> pd.DataFrame:
+    """
+    Các giai đoạn nằm dưới đỉnh của một danh mục.
+
+    Returns:
+        pd.DataFrame: Mỗi dòng một giai đoạn với "Bắt đầu" (phiên đầu tiên dưới đỉnh), "Đáy",
+        "Kết thúc" (phiên trở lại đỉnh, NaT nếu chưa hồi phục), "Mức sụt giảm" (tỷ lệ âm) và
+        "Số phiên"; sắp xếp theo mức sụt giảm sâu nhất trước
+    """
+    drawdown = np.asarray(drawdown_series(_as_matrix(returns)))[:, 0]
+    index = returns.index if isinstance(returns, pd.Series) else pd.RangeIndex(len(drawdown))
+    columns = ["Bắt đầu", "Đáy", "Kết thúc", "Mức sụt giảm", "Số phiên"]
+    underwater = drawdown < 0
+    if not underwater.any():
+        return pd.DataFrame(columns=columns)
+
+    edges = np.diff(np.r_[0, underwater.astype(int), 0])
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)  # phiên đầu tiên trở lại đỉnh (có thể bằng len)
+    # Đáy của từng giai đoạn: argmin trên từng đoạn bằng reduceat
+    depths = np.minimum.reduceat(drawdown, starts)
+    segment_id = np.cumsum(edges[:-1] == 1) - 1
+    is_trough = underwater & (drawdown == depths[np.clip(segment_id, 0, None)])
+    trough_positions = np.flatnonzero(is_trough)
+    troughs = trough_positions[np.searchsorted(trough_positions, starts)]
+
+    end_labels = [index[end] if end < len(index) else pd.NaT for end in ends]
+    periods = pd.DataFrame({
+        "Bắt đầu": index[starts],
+        "Đáy": index[troughs],
+        "Kết thúc": end_labels,
+        "Mức sụt giảm": depths,
+        "Số phiên": ends - starts,
+    })
+    return periods.sort_values("Mức sụt giảm").reset_index(drop=True)
+
+
+def annualized_volatility(returns: Returns, frequency: int = TRADING_DAYS):
+    """Độ lệch chuẩn năm hóa (ddof=1)."""
+    return _per_column(returns, _as_matrix(returns).std(axis=0, ddof=1) * np.sqrt(frequency))
+
+
+def sharpe_ratio(returns: Returns, risk_free_rate: float = 0.0, frequency: int = TRADING_DAYS):
+    """Tỷ lệ Sharpe năm hóa; risk_free_rate là lãi suất năm."""
+    excess = _as_matrix(returns) - risk_free_rate / frequency
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = excess.mean(axis=0) / excess.std(axis=0, ddof=1) * np.sqrt(frequency)
+    return _per_column(returns, ratio)
+
+
+def sortino_ratio(returns: Returns, risk_free_rate: float = 0.0, frequency: int = TRADING_DAYS):
+    """Tỷ lệ Sortino năm hóa (0 khi không đủ 2 phiên lỗ)."""
+    values = _as_matrix(returns)
+    downside_std = _sample_std(*_downside_moments(values)) * np.sqrt(frequency)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(downside_std > 0, (values.mean(axis=0) * frequency - risk_free_rate) / downside_std, 0.0)
+    return _per_column(returns, ratio)
+
+
+def rolling_volatility(returns: Returns, window: int = DEFAULT_ROLLING_WINDOW, frequency: int = TRADING_DAYS):
+    """Độ biến động năm hóa trên cửa sổ lăn ``window`` phiên."""
+    values = _as_matrix(returns)
+    count = np.full(values.shape, float(window))
+    std = _sample_std(count, _rolling_sum(values, window), _rolling_sum(values * values, window))
+    return _like(returns, std * np.sqrt(frequency))
+
+
+def rolling_sharpe(returns: Returns, window: int = DEFAULT_ROLLING_WINDOW, risk_free_rate: float = 0.0,
+                   frequency: int = TRADING_DAYS):
+    """Tỷ lệ Sharpe năm hóa trên cửa sổ lăn."""
+    values = _as_matrix(returns) - risk_free_rate / frequency
+    total = _rolling_sum(values, window)
+    std = _sample_std(np.full(values.shape, float(window)), total, _rolling_sum(values * values, window))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _like(returns, total / window / std * np.sqrt(frequency))
+
+
+def rolling_sortino(returns: Returns, window: int = DEFAULT_ROLLING_WINDOW, risk_free_rate: float = 0.0,
+                    frequency: int = TRADING_DAYS):
+    """Tỷ lệ Sortino năm hóa trên cửa sổ lăn (NaN khi cửa sổ có dưới 2 phiên lỗ)."""
+    values = _as_matrix(returns)
+    downside_std = _sample_std(*_downside_moments(values, window)) * np.sqrt(frequency)
+    mean = _rolling_sum(values, window) / window
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(downside_std > 0, (mean * frequency - risk_free_rate) / downside_std, np.nan)
+    return _like(returns, ratio)
+
+
+def beta_alpha(returns: Returns, benchmark: Union[pd.Series, np.ndarray], risk_free_rate: float = 0.0,
+               frequency: int = TRADING_DAYS) -> pd.DataFrame:
+    """
+    Beta và Alpha Jensen (năm hóa) của từng danh mục so với một chỉ số tham chiếu.
+
+    Args:
+        returns: Lợi suất danh mục (phiên x danh mục)
+        benchmark: Lợi suất chỉ số tham chiếu cùng các phiên
+        risk_free_rate (float): Lãi suất phi rủi ro năm
+
+    Returns:
+        pd.DataFrame: Cột "Beta", "Alpha"; mỗi dòng một danh mục
+    """
+    daily_rf = risk_free_rate / frequency
+    values = _as_matrix(returns) - daily_rf
+    market = _benchmark_vector(returns, benchmark) - daily_rf
+    market_centered = market - market.mean()
+    variance = market_centered @ market_centered
+    beta = (market_centered @ (values - values.mean(axis=0))) / variance if variance > 0 else np.full(values.shape[1], np.nan)
+    alpha = (values.mean(axis=0) - beta * market.mean()) * frequency
+    if isinstance(returns, pd.DataFrame):
+        names = returns.columns
+    elif isinstance(returns, pd.Series):
+        names = [returns.name if returns.name is not None else 0]
+    else:
+        names = range(values.shape[1])
+    return pd.DataFrame({"Beta": beta, "Alpha": alpha}, index=names)
+
+
+def rolling_beta(returns: Returns, benchmark: Union[pd.Series, np.ndarray], window: int = DEFAULT_ROLLING_WINDOW):
+    """Beta trên cửa sổ lăn."""
+    values = _as_matrix(returns)
+    market = _benchmark_vector(returns, benchmark)[:, None]
+    sum_xy = _rolling_sum(values * market, window)
+    sum_x = _rolling_sum(market, window)
+    sum_y = _rolling_sum(values, window)
+    sum_xx = _rolling_sum(market * market, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = (sum_xy - sum_x * sum_y / window) / (sum_xx - sum_x * sum_x / window)
+    return _like(returns, beta)
+
+
+def value_at_risk(returns: Returns, confidence: float = DEFAULT_VAR_CONFIDENCE, method: str = 'historical'):
+    """
+    Giá trị rủi ro (VaR) một phiên, dạng mức lỗ dương.
+
+    Args:
+        confidence (float): Mức tin cậy (ví dụ 0.95)
+        method (str): 'historical' (phân vị thực nghiệm) hoặc 'gaussian' (phân phối chuẩn)
+    """
+    values = _as_matrix(returns)
+    if method == 'gaussian':
+        from scipy.stats import norm
+        var = -(values.mean(axis=0) + norm.ppf(1 - confidence) * values.std(axis=0, ddof=1))
+    elif method == 'historical':
+        var = -np.quantile(values, 1 - confidence, axis=0)
+    else:
+        raise ValueError(f"Phuong phap VaR khong hop le: {method}")
+    return _per_column(returns, var)
+
+
+def conditional_value_at_risk(returns: Returns, confidence: float = DEFAULT_VAR_CONFIDENCE,
+                              method: str = 'historical'):
+    """Giá trị rủi ro có điều kiện (CVaR / Expected Shortfall) một phiên, dạng mức lỗ dương."""
+    values = _as_matrix(returns)
+    if method == 'gaussian':
+        from scipy.stats import norm
+        z = norm.ppf(1 - confidence)
+        cvar = -(values.mean(axis=0) - values.std(axis=0, ddof=1) * norm.pdf(z) / (1 - confidence))
+    elif method == 'historical':
+        # Trung bình của (1 - confidence) phần lợi suất thấp nhất
+        tail = max(int(np.ceil(len(values) * (1 - confidence))), 1)
+        cvar = -np.sort(values, axis=0)[:tail].mean(axis=0)
+    else:
+        raise ValueError(f"Phuong phap CVaR khong hop le: {method}")
+    return _per_column(returns, cvar)
+
+
+def performance_summary(returns: Returns, benchmark: Optional[pd.Series] = None, risk_free_rate: float = 0.0,
+                        confidence: float = DEFAULT_VAR_CONFIDENCE, frequency: int = TRADING_DAYS) -> pd.DataFrame:
+    """
+    Bảng chỉ số của nhiều danh mục (mỗi cột một danh mục).
+
+    Returns:
+        pd.DataFrame: Dòng là chỉ số, cột là danh mục
+    """
+    frame = returns if isinstance(returns, pd.DataFrame) else pd.DataFrame(
+        _as_matrix(returns), index=getattr(returns, 'index', None),
+        columns=[getattr(returns, 'name', None) or 0] if np.ndim(returns) == 1 else None)
+    values = _as_matrix(frame)
+    final = np.cumprod(1 + values, axis=0)[-1]
+    years = len(values) / frequency
+    summary = {
+        "Tổng lợi nhuận": final - 1,
+        "Lợi nhuận năm hóa": np.clip(final, 0, None) ** (1 / years) - 1 if years > 0 else np.zeros(len(final)),
+        "Độ biến động": annualized_volatility(values, frequency),
+        "Tỷ lệ Sharpe": sharpe_ratio(values, risk_free_rate, frequency),
+        "Tỷ lệ Sortino": sortino_ratio(values, risk_free_rate, frequency),
+        "Mức sụt giảm tối đa": max_drawdown(values),
+        "Thời gian sụt giảm dài nhất (phiên)": max_drawdown_duration(values),
+        f"VaR {confidence:.0%}": value_at_risk(values, confidence),
+        f"CVaR {confidence:.0%}": conditional_value_at_risk(values, confidence),
+    }
+    if benchmark is not None:
+        ratios = beta_alpha(frame, benchmark, risk_free_rate, frequency)
+        summary["Beta"] = ratios["Beta"].to_numpy()
+        summary["Alpha"] = ratios["Alpha"].to_numpy()
+    return pd.DataFrame(summary, index=frame.columns).T
+
+
+__all__ = [
+    'TRADING_DAYS',
+    'DEFAULT_ROLLING_WINDOW',
+    'DEFAULT_VAR_CONFIDENCE',
+    'cumulative_returns',
+    'drawdown_series',
+    'max_drawdown',
+    'drawdown_duration',
+    'max_drawdown_duration',
+    'underwater_periods',
+    'annualized_volatility',
+    'sharpe_ratio',
+    'sortino_ratio',
+    'rolling_volatility',
+    'rolling_sharpe',
+    'rolling_sortino',
+    'beta_alpha',
+    'rolling_beta',
+    'value_at_risk',
+    'conditional_value_at_risk',
+    'performance_summary',
+]
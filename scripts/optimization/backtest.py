@@ -0,0 +1,1042 @@
+"""
+Module backtest.py
+Backtest danh mục so với các chỉ số tham chiếu, không phụ thuộc giao diện.
+
+run_backtest tải dữ liệu và tính toán, trả về BacktestResult; phần hiển thị (biểu đồ, bảng)
+nằm ở ui.visualization.backtest_portfolio.
+
+Mặc định ('ideal') danh mục giữ đúng trọng số mỗi phiên, không phí: returns.dot(weights).
+simulate_rebalancing mô phỏng thực tế hơn: tái cân bằng hằng ngày/tuần/tháng/quý hoặc khi
+trọng số lệch quá ngưỡng, số cổ phiếu nguyên theo lô, phí môi giới, thuế bán và tiền mặt dư
+(có thể hưởng lãi). Không có vòng lặp theo phiên:
+    - Cổ phiếu lẻ + tái cân bằng định kỳ: danh mục bất biến theo quy mô, nên tăng trưởng của
+      từng đoạn và tỷ lệ chi phí của từng kỳ được tính cùng lúc trên mảng, rồi nhân dồn.
+    - Cổ phiếu nguyên / theo ngưỡng lệch: chỉ lặp theo kỳ tái cân bằng (kỳ sau phụ thuộc giá
+      trị sau làm tròn của kỳ trước); phiên kích hoạt kế tiếp được tìm theo khối phiên và giá
+      trị hằng ngày được định giá một lần bằng phép nhân mảng ở cuối.
+
+run_backtest_incremental giữ BacktestState của chế độ 'ideal' (giá cuối, giá trị tích lũy, đỉnh
+đang chạy, mô-men lợi suất) theo mã, trọng số, ngày bắt đầu và chỉ số tham chiếu; khi ngày kết thúc
+dịch về sau chỉ các phiên mới được tải và cộng dồn. Phiên cuối của trạng thái được coi là đã chốt.
+
+Biên độ giá và tạm ngừng giao dịch: trading_masks dựng từ OHLCV hai mặt nạ (phiên x mã) - mua được
+khi mã có giao dịch và không đóng cửa ở giá trần, bán được khi không đóng cửa ở giá sàn (±7% HOSE,
+±10% HNX, ±15% UPCOM so với giá tham chiếu). Truyền masks cho simulate_rebalancing thì lệnh bị chặn
+được giữ sang phiên sau; mỗi phiên khớp mọi lệnh bằng phép toán trên mặt nạ, không tạo đối tượng lệnh.
+
+backtest_portfolios chạy 'ideal' cho nhiều danh mục cùng lúc (ví dụ kết quả của mọi mô hình):
+một ma trận lợi suất dùng chung nhân với ma trận trọng số (mã x danh mục).
+"""
+
+import logging
+import pickle
+from collections import OrderedDict
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from optimization import analytics
+from optimization.bootstrap import DEFAULT_BOOTSTRAP_PATHS, DEFAULT_CONFIDENCE, bootstrap_metrics
+from optimization.rebalance import BROKERAGE_FEE, SELL_TAX
+from optimization.walk_forward import rebalance_positions
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+DEFAULT_BENCHMARKS = ("VNINDEX", "VN30", "HNX30", "HNXINDEX")
+
+BACKTEST_REBALANCE_OPTIONS = {
+    'ideal': 'Trọng số cố định mỗi phiên, không phí (lý thuyết)',
+    'D': 'Hằng ngày',
+    'W': 'Hằng tuần',
+    'M': 'Hằng tháng',
+    'Q': 'Hằng quý',
+    'drift': 'Khi trọng số lệch quá ngưỡng',
+    'hold': 'Không tái cân bằng (mua và nắm giữ)',
+}
+DEFAULT_BACKTEST_REBALANCE = 'ideal'
+DEFAULT_DRIFT_THRESHOLD = 0.05
+DRIFT_SEARCH_BLOCK = 64
+# Biên độ dao động giá trong phiên so với giá tham chiếu (giá đóng cửa phiên trước)
+PRICE_LIMITS = {'HOSE': 0.07, 'HNX': 0.10, 'UPCOM': 0.15}
+# Sai số khi nhận biết giá trần/sàn (giá trần/sàn được làm tròn theo bước giá, giá đã điều chỉnh)
+LIMIT_TOLERANCE = 0.003
+_STATE_CACHE_MAXSIZE = 32
+
+_state_cache: "OrderedDict[tuple, BacktestState]" = OrderedDict()
+
+
+class BacktestResult:
+    """
+    Kết quả backtest.
+
+    Attributes:
+        portfolio_returns (pd.Series): Lợi suất ngày của danh mục
+        cumulative_returns (pd.Series): Giá trị tích lũy của 1 đồng đầu tư
+        benchmark_cumulative (dict): Giá trị tích lũy của từng chỉ số tham chiếu
+        metrics (dict): Các chỉ số hiệu suất (xem backtest_metrics)
+        skipped_tickers (list): Mã không tải được dữ liệu
+        missing_benchmarks (list): Chỉ số tham chiếu không có dữ liệu
+    """
+
+    __slots__ = ('portfolio_returns', 'cumulative_returns', 'benchmark_cumulative', 'metrics',
+                 'skipped_tickers', 'missing_benchmarks', 'simulation')
+
+    def __init__(self, portfolio_returns: pd.Series, cumulative_returns: pd.Series,
+                 benchmark_cumulative: Dict[str, pd.Series], metrics: Dict[str, float],
+                 skipped_tickers: Optional[List[str]] = None, missing_benchmarks: Optional[List[str]] = None,
+                 simulation: Optional['SimulationResult'] = None):
+        self.portfolio_returns = portfolio_returns
+        self.cumulative_returns = cumulative_returns
+        self.benchmark_cumulative = benchmark_cumulative
+        self.metrics = metrics
+        self.skipped_tickers = skipped_tickers or []
+        self.missing_benchmarks = missing_benchmarks or []
+        # Chi tiết mô phỏng tái cân bằng (None với chế độ 'ideal')
+        self.simulation = simulation
+
+    def cumulative_frame(self, portfolio_label: str = "Danh mục đầu tư") -> pd.DataFrame:
+        """Giá trị tích lũy của danh mục và các chỉ số tham chiếu trong một bảng (cột = chuỗi)."""
+        frame = pd.DataFrame({portfolio_label: self.cumulative_returns})
+        for benchmark, cumulative in self.benchmark_cumulative.items():
+            frame[benchmark] = cumulative
+        return frame
+
+    def returns_frame(self, portfolio_label: str = "Danh mục đầu tư") -> pd.DataFrame:
+        """Lợi suất ngày của danh mục và các chỉ số tham chiếu (cột = chuỗi), để phân tích cùng lúc."""
+        cumulative = self.cumulative_frame(portfolio_label)
+        returns = cumulative.pct_change()
+        returns.iloc[0] = cumulative.iloc[0] - 1
+        return returns
+
+    def confidence_intervals(self, n_paths: int = DEFAULT_BOOTSTRAP_PATHS, confidence: float = DEFAULT_CONFIDENCE,
+                             mean_block: Optional[float] = None, seed: Optional[int] = 42) -> pd.DataFrame:
+        """Khoảng tin cậy bootstrap khối dừng của các chỉ số, trên chính lợi suất của backtest."""
+        return bootstrap_metrics(self.portfolio_returns, n_paths=n_paths, confidence=confidence,
+                                 mean_block=mean_block, seed=seed)
+
+    def to_dict(self) -> Dict[str, object]:
+        """Dạng dict mà giao diện và bảng so sánh đang dùng."""
+        return {
+            **self.metrics,
+            "Cumulative Returns": self.cumulative_returns,
+            "Skipped Tickers": self.skipped_tickers,
+        }
+
+
+class SimulationResult:
+    """
+    Kết quả mô phỏng tái cân bằng.
+
+    Attributes:
+        value (pd.Series): Tổng giá trị danh mục (cổ phiếu + tiền mặt) cuối mỗi phiên
+        cash (pd.Series): Tiền mặt cuối mỗi phiên
+        holdings (pd.DataFrame): Số cổ phiếu nắm giữ sau mỗi kỳ tái cân bằng
+        trades (pd.DataFrame): Số cổ phiếu mua (+) / bán (-) tại mỗi kỳ
+        costs (pd.Series): Phí môi giới + thuế bán tại mỗi kỳ (VND)
+        turnover (pd.Series): Giá trị giao dịch / giá trị danh mục tại mỗi kỳ
+        unfilled (pd.DataFrame | None): Số cổ phiếu còn chờ mua (+) / bán (-) cuối các phiên có lệnh
+            bị chặn bởi biên độ giá hoặc tạm ngừng giao dịch (None khi không mô phỏng biên độ).
+            Khi có mặt nạ, holdings/trades/costs/turnover tính theo các phiên có khớp lệnh.
+    """
+
+    __slots__ = ('value', 'cash', 'holdings', 'trades', 'costs', 'turnover', 'unfilled')
+
+    def __init__(self, value: pd.Series, cash: pd.Series, holdings: pd.DataFrame, trades: pd.DataFrame,
+                 costs: pd.Series, turnover: pd.Series, unfilled: Optional[pd.DataFrame] = None):
+        self.value = value
+        self.cash = cash
+        self.holdings = holdings
+        self.trades = trades
+        self.costs = costs
+        self.turnover = turnover
+        self.unfilled = unfilled
+
+    @property
+    def returns(self) -> pd.Series:
+        """Lợi suất ngày sau phí."""
+        return self.value.pct_change().dropna()
+
+    def summary(self) -> Dict[str, float]:
+        """Tổng hợp chi phí, vòng quay và tiền mặt (kèm lệnh treo nếu mô phỏng biên độ giá)."""
+        summary = {
+            'Số lần tái cân bằng': int(len(self.holdings)),
+            'Tổng chi phí giao dịch': float(self.costs.sum()),
+            # Kỳ đầu là lần mua từ tiền mặt, không tính vào vòng quay tái cân bằng
+            'Vòng quay trung bình': float(self.turnover.iloc[1:].mean()) if len(self.turnover) > 1 else 0.0,
+            'Tỷ lệ tiền mặt trung bình': float((self.cash / self.value).mean()),
+        }
+        if self.unfilled is not None:
+            summary['Số phiên có lệnh treo'] = int(len(self.unfilled))
+            summary['Số lệnh bị chặn'] = int((self.unfilled != 0).to_numpy().sum())
+        return summary
+
+
+class TradingMasks:
+    """
+    Khả năng khớp lệnh ở giá đóng cửa theo phiên x mã.
+
+    Attributes:
+        index (pd.DatetimeIndex): Các phiên
+        tickers (pd.Index): Các mã
+        can_buy (np.ndarray): False khi tạm ngừng giao dịch hoặc đóng cửa ở giá trần (dư mua)
+        can_sell (np.ndarray): False khi tạm ngừng giao dịch hoặc đóng cửa ở giá sàn (dư bán)
+        suspended (np.ndarray): True khi không có giao dịch (không có giá hoặc khối lượng bằng 0)
+    """
+
+    __slots__ = ('index', 'tickers', 'can_buy', 'can_sell', 'suspended')
+
+    def __init__(self, index: pd.Index, tickers: pd.Index, can_buy: np.ndarray, can_sell: np.ndarray,
+                 suspended: np.ndarray):
+        self.index = index
+        self.tickers = tickers
+        self.can_buy = can_buy
+        self.can_sell = can_sell
+        self.suspended = suspended
+
+    def reindex(self, index: pd.Index, tickers: Sequence[str]) -> 'TradingMasks':
+        """Căn theo phiên và mã của bảng giá; phiên/mã không có trong OHLCV coi như không giao dịch."""
+        rows = self.index.get_indexer(index)
+        cols = self.tickers.get_indexer(pd.Index(tickers))
+        found = (rows >= 0)[:, None] & (cols >= 0)[None, :]
+
+        def take(mask: np.ndarray, missing: bool) -> np.ndarray:
+            return np.where(found, mask[rows[:, None], cols[None, :]], missing)
+
+        return TradingMasks(pd.Index(index), pd.Index(tickers), take(self.can_buy, False),
+                            take(self.can_sell, False), take(self.suspended, True))
+
+    def summary(self) -> Dict[str, int]:
+        """Số phiên x mã bị chặn mua, chặn bán và tạm ngừng giao dịch."""
+        return {
+            'Chặn mua (trần)': int((~self.can_buy & ~self.suspended).sum()),
+            'Chặn bán (sàn)': int((~self.can_sell & ~self.suspended).sum()),
+            'Tạm ngừng giao dịch': int(self.suspended.sum()),
+        }
+
+
+def trading_masks(ohlcv: Mapping[str, pd.DataFrame], exchanges: Optional[Mapping[str, str]] = None,
+                  limits: Mapping[str, float] = PRICE_LIMITS, tolerance: float = LIMIT_TOLERANCE) -> TradingMasks:
+    """
+    Mặt nạ mua/bán từ dữ liệu OHLCV (data_process.fetchers.fetch_ohlcv_panel).
+
+    Giá tham chiếu là giá đóng cửa gần nhất trước phiên; lệnh khớp ở giá đóng cửa nên mã đóng
+    cửa ở giá trần không mua được, ở giá sàn không bán được.
+
+    Args:
+        ohlcv (dict): {'close': DataFrame phiên x mã, 'volume': ... (tùy chọn)}; không nội suy
+        exchanges (dict): Sàn của từng mã; mã không rõ sàn dùng biên độ HOSE
+        limits (dict): Biên độ theo sàn
+        tolerance (float): Sai số tuyệt đối khi so mức thay đổi giá với biên độ
+
+    Returns:
+        TradingMasks
+    """
+    close = ohlcv['close'].sort_index()
+    tickers = close.columns
+    price = close.to_numpy(dtype=float)
+    suspended = ~np.isfinite(price)
+    volume = ohlcv.get('volume')
+    if volume is not None:
+        volume = volume.reindex(index=close.index, columns=tickers).to_numpy(dtype=float)
+        suspended |= ~(volume > 0)
+
+    reference = close.ffill().shift(1).to_numpy(dtype=float)
+    limit = np.array([limits.get((exchanges or {}).get(t), limits['HOSE']) for t in tickers]) - tolerance
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change = price / reference - 1
+    at_ceiling = change >= limit
+    at_floor = change <= -limit
+    masks = TradingMasks(close.index, tickers, ~suspended & ~at_ceiling, ~suspended & ~at_floor, suspended)
+    logger.info(f"[BACKTEST] Mat na giao dich {len(close)} phien x {len(tickers)} ma: {masks.summary()}")
+    return masks
+
+
+def _event_positions(index: pd.DatetimeIndex, rebalance: Union[str, int]) -> Optional[np.ndarray]:
+    """Các phiên tái cân bằng định kỳ (None với 'drift'/'hold': xác định trong lúc mô phỏng)."""
+    if rebalance in ('drift', 'hold'):
+        return None
+    return rebalance_positions(index, 1 if rebalance == 'D' else rebalance, 0)
+
+
+def _solve_cost_fraction(target: np.ndarray, drifted: np.ndarray, fee: float, sell_tax: float,
+                         iterations: int = 8) -> np.ndarray:
+    """
+    Tỷ lệ chi phí c của từng kỳ (theo dòng) khi đưa trọng số trôi ``drifted`` về ``target``.
+
+    Sau giao dịch giá trị còn (1 - c), nên lệnh là (1 - c)·target - drifted và
+    c = phí·(mua + bán) + thuế·bán. Ánh xạ co (hệ số ≤ phí + thuế), vài vòng lặp là hội tụ.
+    """
+    cost = np.zeros(len(drifted))
+    for _ in range(iterations):
+        trades = (1 - cost)[:, None] * target - drifted
+        sells = np.clip(-trades, 0, None).sum(axis=1)
+        cost = fee * np.abs(trades).sum(axis=1) + sell_tax * sells
+    return cost
+
+
+def _simulate_periodic_fractional(price_arr: np.ndarray, target: np.ndarray, events: np.ndarray,
+                                  initial_value: float, fee: float, sell_tax: float):
+    """Tái cân bằng định kỳ với cổ phiếu lẻ: toàn bộ tính trên mảng, không lặp."""
+    n_days = len(price_arr)
+    event_prices = price_arr[events]
+    # Trọng số trôi ngay trước mỗi kỳ k >= 1 và tăng trưởng của đoạn [e_{k-1}, e_k]
+    drifted = target * price_arr[events[1:]] / event_prices[:-1]
+    growth = drifted.sum(axis=1)
+    drifted /= growth[:, None]
+
+    # Kỳ đầu mua từ tiền mặt: trọng số trôi = 0 (toàn tiền mặt)
+    start_cost = _solve_cost_fraction(target, np.zeros((1, len(target))), fee, sell_tax)
+    costs = np.r_[start_cost, _solve_cost_fraction(target, drifted, fee, sell_tax)]
+    # Giá trị trước giao dịch kỳ k: V0 · Π_{j<k} (1 - c_j) · g_j
+    pre_value = initial_value * np.r_[1.0, np.cumprod((1 - costs[:-1]) * growth)]
+    post_value = pre_value * (1 - costs)
+
+    holdings = post_value[:, None] * target / event_prices
+    segment = np.searchsorted(events, np.arange(n_days), side='right') - 1
+    value = (price_arr * holdings[segment]).sum(axis=1)
+    trades = holdings - np.vstack([np.zeros(len(target)), holdings[:-1]])
+    turnover = (np.abs(trades) * event_prices).sum(axis=1) / pre_value
+    return value, np.zeros(n_days), holdings, trades, costs * pre_value, turnover
+
+
+def _target_shares(budget: float, target: np.ndarray, prices: np.ndarray, lots: Optional[np.ndarray]) -> np.ndarray:
+    if lots is None:
+        return budget * target / prices
+    return np.floor(budget * target / (prices * lots)) * lots
+
+
+def _trade_to_target(holdings: np.ndarray, cash: float, prices: np.ndarray, target: np.ndarray,
+                     lots: Optional[np.ndarray], fee: float, sell_tax: float) -> Tuple[np.ndarray, float]:
+    """Số cổ phiếu sau tái cân bằng và chi phí; tiền mặt sau giao dịch luôn không âm."""
+    value = float(holdings @ prices) + cash
+    budget = value
+    for _ in range(3 if lots is not None else 8):
+        new_holdings = _target_shares(budget, target, prices, lots)
+        trade_values = (new_holdings - holdings) * prices
+        cost = fee * np.abs(trade_values).sum() + sell_tax * np.clip(-trade_values, 0, None).sum()
+        budget = value - cost
+    if lots is not None:
+        # Làm tròn xuống hiếm khi thiếu tiền; nếu có, bớt lô của lệnh mua lớn nhất
+        while float(new_holdings @ prices) + cost > value + 1e-6:
+            buys = (new_holdings - holdings) * prices
+            i = int(np.argmax(buys))
+            if buys[i] <= 0:
+                break
+            new_holdings[i] -= lots[i]
+            trade_values = (new_holdings - holdings) * prices
+            cost = fee * np.abs(trade_values).sum() + sell_tax * np.clip(-trade_values, 0, None).sum()
+    return new_holdings, cost
+
+
+def _next_drift_event(price_arr: np.ndarray, start: int, holdings: np.ndarray, cash: float,
+                      cash_growth: np.ndarray, target: np.ndarray, threshold: float) -> Optional[int]:
+    """Phiên đầu tiên sau ``start`` có trọng số lệch mục tiêu quá ngưỡng (tìm theo khối phiên)."""
+    n_days = len(price_arr)
+    lo = start + 1
+    while lo < n_days:
+        hi = min(lo + DRIFT_SEARCH_BLOCK, n_days)
+        values = price_arr[lo:hi] * holdings
+        total = values.sum(axis=1) + cash * cash_growth[lo:hi] / cash_growth[start]
+        drift = np.abs(values / total[:, None] - target).max(axis=1)
+        hits = np.flatnonzero(drift > threshold)
+        if len(hits):
+            return lo + int(hits[0])
+        lo = hi
+    return None
+
+
+def _simulate_events(price_arr: np.ndarray, target: np.ndarray, events: Optional[np.ndarray], mode: str,
+                     threshold: float, initial_value: float, lots: Optional[np.ndarray], fee: float,
+                     sell_tax: float, cash_growth: np.ndarray):
+    """Mô phỏng theo kỳ tái cân bằng (cổ phiếu nguyên hoặc kỳ phụ thuộc đường giá)."""
+    n_days, n_assets = price_arr.shape
+    holdings = np.zeros(n_assets)
+    cash = float(initial_value)
+    day, last_day = 0, 0
+    event_days, event_holdings, event_trades, event_cash, costs, turnover = [], [], [], [], [], []
+    upcoming = iter(events[1:]) if events is not None else None
+
+    while day is not None:
+        cash *= cash_growth[day] / cash_growth[last_day]
+        prices = price_arr[day]
+        pre_value = float(holdings @ prices) + cash
+        new_holdings, cost = _trade_to_target(holdings, cash, prices, target, lots, fee, sell_tax)
+        trades = new_holdings - holdings
+        cash = cash - float(trades @ prices) - cost
+        if abs(cash) < 1e-9 * pre_value:
+            cash = 0.0  # sai số làm tròn khi giao dịch cổ phiếu lẻ
+
+        event_days.append(day)
+        event_holdings.append(new_holdings)
+        event_trades.append(trades)
+        event_cash.append(cash)
+        costs.append(cost)
+        turnover.append(float(np.abs(trades) @ prices) / pre_value)
+        holdings, last_day = new_holdings, day
+
+        if upcoming is not None:
+            day = next(upcoming, None)
+        elif mode == 'drift':
+            day = _next_drift_event(price_arr, day, holdings, cash, cash_growth, target, threshold)
+        else:
+            day = None
+
+    event_days = np.asarray(event_days)
+    event_holdings = np.asarray(event_holdings)
+    segment = np.searchsorted(event_days, np.arange(n_days), side='right') - 1
+    cash_path = np.asarray(event_cash)[segment] * cash_growth / cash_growth[event_days[segment]]
+    value = (price_arr * event_holdings[segment]).sum(axis=1) + cash_path
+    return (value, cash_path, event_holdings, np.asarray(event_trades), np.asarray(costs),
+            np.asarray(turnover), event_days)
+
+
+def _simulate_with_limits(price_arr: np.ndarray, target: np.ndarray, events: np.ndarray, initial_value: float,
+                          lots: Optional[np.ndarray], fee: float, sell_tax: float, cash_growth: np.ndarray,
+                          can_buy: np.ndarray, can_sell: np.ndarray):
+    """
+    Tái cân bằng định kỳ khi lệnh có thể bị chặn (giá trần/sàn, tạm ngừng giao dịch).
+
+    Mỗi kỳ đặt lệnh về mục tiêu; mỗi phiên khớp phần lệnh mặt nạ cho phép (bán trước, mua trong
+    giới hạn tiền mặt), phần còn lại giữ sang phiên sau tới khi khớp hết hoặc tới kỳ kế tiếp.
+    Chỉ lặp theo phiên còn lệnh treo; trong phiên mọi mã được xử lý cùng lúc trên mảng.
+    """
+    n_days, n_assets = price_arr.shape
+    holdings = np.zeros(n_assets)
+    pending = np.zeros(n_assets)
+    cash = float(initial_value)
+    last_day, position = 0, 0
+    fill_days, fill_holdings, fill_trades, fill_cash, costs, turnover = [], [], [], [], [], []
+    carried_days, carried = [], []
+
+    day = int(events[0])
+    while day is not None:
+        cash *= cash_growth[day] / cash_growth[last_day]
+        last_day = day
+        prices = price_arr[day]
+        if position < len(events) and day == events[position]:
+            desired, _ = _trade_to_target(holdings, cash, prices, target, lots, fee, sell_tax)
+            pending = desired - holdings
+            position += 1
+        pre_value = float(holdings @ prices) + cash
+
+        sells = np.where((pending < 0) & can_sell[day], pending, 0.0)
+        sell_value = -float(sells @ prices)
+        cash += sell_value * (1 - fee - sell_tax)
+        buy_mask = (pending > 0) & can_buy[day]
+        buys = np.where(buy_mask, pending, 0.0)
+        buy_value = float(buys @ prices)
+        if buy_value * (1 + fee) > cash:
+            buys *= max(cash, 0.0) / (buy_value * (1 + fee))
+            if lots is not None:
+                buys = np.floor(buys / lots) * lots
+            buy_value = float(buys @ prices)
+        cash -= buy_value * (1 + fee)
+        trades = sells + buys
+        pending = pending - trades
+        if not (pending < 0).any():
+            # Phần mua thiếu tiền chỉ chờ khi còn lệnh bán treo (tiền bán sẽ về sau)
+            pending[buy_mask] = 0.0
+        holdings = holdings + trades
+
+        if trades.any():
+            fill_days.append(day)
+            fill_holdings.append(holdings)
+            fill_trades.append(trades)
+            fill_cash.append(cash)
+            costs.append(fee * (sell_value + buy_value) + sell_tax * sell_value)
+            turnover.append(float(np.abs(trades) @ prices) / pre_value)
+        if pending.any():
+            carried_days.append(day)
+            carried.append(pending.copy())
+
+        next_event = int(events[position]) if position < len(events) else None
+        if pending.any() and day + 1 < n_days:
+            day = day + 1
+        else:
+            day = next_event
+
+    # Định giá hằng ngày một lần: trạng thái sau phiên khớp gần nhất (trước phiên khớp đầu: toàn tiền mặt)
+    fill_days = np.asarray(fill_days, dtype=int)
+    segment = np.searchsorted(fill_days, np.arange(n_days), side='right')
+    holdings_path = np.vstack([np.zeros((1, n_assets))] + ([np.asarray(fill_holdings)] if len(fill_days) else []))
+    cash_at = np.r_[float(initial_value), fill_cash]
+    base_day = np.r_[0, fill_days]
+    cash_path = cash_at[segment] * cash_growth / cash_growth[base_day[segment]]
+    value = (price_arr * holdings_path[segment]).sum(axis=1) + cash_path
+    return (value, cash_path, holdings_path[1:], np.asarray(fill_trades).reshape(-1, n_assets),
+            np.asarray(costs), np.asarray(turnover), fill_days,
+            np.asarray(carried_days, dtype=int), np.asarray(carried).reshape(-1, n_assets))
+
+
+def simulate_rebalancing(prices: pd.DataFrame, weights: Union[Mapping[str, float], Sequence[float]],
+                         rebalance: Union[str, int] = 'M', drift_threshold: float = DEFAULT_DRIFT_THRESHOLD,
+                         initial_value: float = 1e9, lot_sizes: Optional[Mapping[str, int]] = None,
+                         integer_shares: bool = True, fee: float = BROKERAGE_FEE, sell_tax: float = SELL_TAX,
+                         cash_rate: float = 0.0, frequency: int = TRADING_DAYS,
+                         masks: Optional[TradingMasks] = None) -> SimulationResult:
+    """
+    Mô phỏng danh mục được tái cân bằng về trọng số mục tiêu.
+
+    Args:
+        prices (pd.DataFrame): Giá đóng cửa (phiên x mã)
+        weights: Trọng số mục tiêu (dict theo mã, hoặc danh sách cùng thứ tự cột của prices)
+        rebalance: 'D', 'W', 'M', 'Q' (phiên đầu mỗi chu kỳ), số phiên (int), 'drift' (khi độ lệch
+            trọng số lớn nhất vượt ``drift_threshold``) hoặc 'hold' (chỉ mua lần đầu)
+        drift_threshold (float): Ngưỡng lệch tuyệt đối của trọng số cho chế độ 'drift'
+        initial_value (float): Vốn ban đầu (VND)
+        lot_sizes (dict): Lô giao dịch của từng mã (xem optimization.allocation.get_lot_sizes);
+            mã không có trong dict giao dịch theo từng cổ phiếu
+        integer_shares (bool): False để cho phép cổ phiếu lẻ (bỏ qua lot_sizes)
+        fee (float): Phí môi giới mỗi chiều
+        sell_tax (float): Thuế trên giá trị bán
+        cash_rate (float): Lãi suất năm của tiền mặt dư (0: tiền mặt không sinh lời)
+        frequency (int): Số phiên mỗi năm
+        masks (TradingMasks): Mặt nạ mua/bán (xem trading_masks); khi có, lệnh bị chặn bởi biên độ
+            giá hoặc tạm ngừng giao dịch được giữ sang phiên sau (không hỗ trợ 'drift')
+
+    Returns:
+        SimulationResult
+    """
+    if rebalance not in BACKTEST_REBALANCE_OPTIONS and not isinstance(rebalance, (int, np.integer)):
+        raise ValueError(f"rebalance phải là một trong {list(BACKTEST_REBALANCE_OPTIONS)} hoặc số phiên")
+    if rebalance == 'ideal':
+        raise ValueError("Chế độ 'ideal' không cần mô phỏng: dùng returns.dot(weights)")
+    if masks is not None and rebalance == 'drift':
+        raise ValueError("Chế độ 'drift' chưa hỗ trợ mô phỏng biên độ giá / tạm ngừng giao dịch")
+    prices = prices.ffill().bfill().dropna(axis=1, how='all')
+    tickers = prices.columns
+    if isinstance(weights, Mapping):
+        target = np.array([float(weights.get(t, 0.0)) for t in tickers])
+    else:
+        target = np.asarray(weights, dtype=float)
+    if target.shape != (len(tickers),) or np.any(target < 0) or target.sum() <= 0:
+        raise ValueError("Trọng số mục tiêu phải không âm, cùng số phần tử với số mã có giá")
+    target = target / target.sum()
+
+    index = prices.index
+    price_arr = prices.to_numpy(dtype=float)
+    events = _event_positions(index, rebalance)
+    lots = None
+    if integer_shares:
+        lots = np.array([(lot_sizes or {}).get(t, 1) for t in tickers], dtype=float)
+
+    unfilled = None
+    if masks is not None:
+        aligned = masks.reindex(index, tickers)
+        cash_growth = (1 + cash_rate) ** (np.arange(len(index)) / frequency)
+        (value, cash, holdings, trades, costs, turnover, events,
+         carried_days, carried) = _simulate_with_limits(
+            price_arr, target, events if events is not None else np.array([0]), initial_value, lots,
+            fee, sell_tax, cash_growth, aligned.can_buy, aligned.can_sell
+        )
+        unfilled = pd.DataFrame(carried, index=index[carried_days], columns=tickers)
+    elif lots is None and events is not None:
+        value, cash, holdings, trades, costs, turnover = _simulate_periodic_fractional(
+            price_arr, target, events, initial_value, fee, sell_tax
+        )
+    else:
+        cash_growth = (1 + cash_rate) ** (np.arange(len(index)) / frequency)
+        mode = 'drift' if rebalance == 'drift' else 'periodic'
+        value, cash, holdings, trades, costs, turnover, events = _simulate_events(
+            price_arr, target, events, mode, drift_threshold, initial_value, lots, fee, sell_tax, cash_growth
+        )
+
+    event_index = index[events]
+    logger.info(f"[BACKTEST] Mo phong {len(index)} phien, {len(tickers)} ma, {len(events)} ky tai can bang, "
+                f"chi phi {float(np.sum(costs)):,.0f} VND"
+                + (f", {len(unfilled)} phien co lenh treo" if unfilled is not None else ""))
+    return SimulationResult(
+        pd.Series(value, index=index),
+        pd.Series(cash, index=index),
+        pd.DataFrame(holdings, index=event_index, columns=tickers),
+        pd.DataFrame(trades, index=event_index, columns=tickers),
+        pd.Series(costs, index=event_index),
+        pd.Series(turnover, index=event_index),
+        unfilled=unfilled,
+    )
+
+
+def backtest_metrics(portfolio_returns: pd.Series, benchmark_returns: Optional[pd.Series] = None,
+                     frequency: int = TRADING_DAYS) -> Dict[str, float]:
+    """
+    Chỉ số hiệu suất từ lợi suất ngày của danh mục.
+
+    Args:
+        portfolio_returns (pd.Series): Lợi suất ngày của danh mục
+        benchmark_returns (pd.Series): Lợi suất ngày của chỉ số tham chiếu để tính Alpha
+        frequency (int): Số phiên mỗi năm
+
+    Returns:
+        dict: "Sharpe Ratio", "Sortino Ratio", "Maximum Drawdown" (tỷ lệ âm), "Total Return",
+        "Annualized Return", "Volatility", "Alpha" (các chỉ số lợi nhuận/biến động tính theo %)
+    """
+    final_value = float((1 + portfolio_returns).prod())
+    total_return = (final_value - 1) * 100
+    num_years = len(portfolio_returns) / frequency
+    annualized_return = (final_value ** (1 / num_years) - 1) * 100 if num_years > 0 else 0
+
+    # Alpha: chênh lệch lợi nhuận năm hóa so với chỉ số tham chiếu trên các phiên chung
+    alpha = 0
+    if benchmark_returns is not None and not benchmark_returns.empty:
+        common_index = portfolio_returns.index.intersection(benchmark_returns.index)
+        alpha = (portfolio_returns.loc[common_index].mean() - benchmark_returns.loc[common_index].mean()) * frequency * 100
+
+    return {
+        "Sharpe Ratio": analytics.sharpe_ratio(portfolio_returns, frequency=frequency),
+        "Sortino Ratio": analytics.sortino_ratio(portfolio_returns, frequency=frequency),
+        "Maximum Drawdown": analytics.max_drawdown(portfolio_returns),
+        "Total Return": total_return,
+        "Annualized Return": annualized_return,
+        "Volatility": analytics.annualized_volatility(portfolio_returns, frequency) * 100,
+        "Alpha": alpha,
+    }
+
+
+def _load_benchmark_closes(benchmark_symbols: Sequence[str], start_date, end_date, fetch_stock_data_func: Callable,
+                           benchmark_loader: Optional[Callable]) -> Tuple[pd.DataFrame, List[str]]:
+    """Giá đóng cửa của các chỉ số tham chiếu (cột = chỉ số) và danh sách chỉ số không có dữ liệu."""
+    if not benchmark_symbols:
+        return pd.DataFrame(), []
+    if benchmark_loader is not None:
+        closes, missing = benchmark_loader(list(benchmark_symbols), start_date, end_date)
+        return closes, list(missing)
+
+    # Không có bộ tải theo lô: tải từng chỉ số bằng hàm tải giá cổ phiếu
+    closes, missing = {}, []
+    for benchmark in benchmark_symbols:
+        benchmark_df, _ = fetch_stock_data_func([benchmark], start_date, end_date)
+        if benchmark_df.empty:
+            missing.append(benchmark)
+        else:
+            closes[benchmark] = benchmark_df[benchmark]
+    return pd.DataFrame(closes), missing
+
+
+def align_benchmark_returns(closes: pd.DataFrame, price_index: pd.Index, return_index: pd.Index) -> pd.DataFrame:
+    """
+    Lợi suất ngày của các chỉ số tham chiếu trên đúng lịch phiên của danh mục.
+
+    Giá chỉ số được đưa về lịch giá của danh mục (giữ giá phiên trước khi chỉ số thiếu phiên)
+    rồi lấy lợi suất một lần cho mọi chỉ số, cắt theo các phiên có lợi suất danh mục.
+    """
+    if closes.empty:
+        return pd.DataFrame(index=return_index)
+    aligned = closes.sort_index().reindex(closes.index.union(price_index)).ffill().reindex(price_index)
+    return aligned.pct_change().reindex(return_index).fillna(0.0)
+
+
+def portfolio_path(prices: pd.DataFrame, target: pd.Series, rebalance: Union[str, int] = DEFAULT_BACKTEST_REBALANCE,
+                   initial_value: float = 1e9, **simulation_kwargs) -> Tuple[pd.Series, pd.Series, Optional[SimulationResult]]:
+    """
+    Lợi suất và giá trị tương đối của danh mục theo trọng số mục tiêu.
+
+    Args:
+        prices (pd.DataFrame): Giá đóng cửa (phiên x mã)
+        target (pd.Series): Trọng số mục tiêu theo mã (tổng bằng 1)
+        rebalance: 'ideal' hoặc chế độ của simulate_rebalancing
+        initial_value (float): Vốn ban đầu cho mô phỏng (VND)
+        **simulation_kwargs: Tham số khác của simulate_rebalancing
+
+    Returns:
+        tuple: (lợi suất ngày, giá trị tương đối so với vốn ban đầu, SimulationResult hoặc None)
+    """
+    if rebalance == 'ideal':
+        portfolio_returns = prices.pct_change().dropna().dot(target)
+        return portfolio_returns, (1 + portfolio_returns).cumprod(), None
+
+    simulation = simulate_rebalancing(prices, target.to_dict(), rebalance=rebalance,
+                                      initial_value=initial_value, **simulation_kwargs)
+    # Tính cả chi phí mua ở phiên đầu: giá trị tương đối so với vốn ban đầu
+    cumulative_returns = simulation.value / initial_value
+    portfolio_returns = cumulative_returns.pct_change().fillna(cumulative_returns.iloc[0] - 1)
+    return portfolio_returns, cumulative_returns, simulation
+
+
+def backtest_portfolios(prices: pd.DataFrame, weights_by_name: Mapping[str, Mapping[str, float]],
+                        benchmark_returns: Optional[pd.Series] = None, risk_free_rate: float = 0.0,
+                        frequency: int = TRADING_DAYS) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Backtest 'ideal' nhiều danh mục trên cùng dữ liệu giá trong một phép nhân ma trận.
+
+    Trọng số được xếp thành ma trận (mã x danh mục); lợi suất của mọi danh mục là
+    returns @ W, tương đương portfolio_path(..., rebalance='ideal') cho từng danh mục.
+
+    Args:
+        prices (pd.DataFrame): Giá đóng cửa (phiên x mã), dùng chung cho mọi danh mục
+        weights_by_name (dict): {tên danh mục: {mã: trọng số}}; mã không có trong prices bị bỏ qua
+        benchmark_returns (pd.Series): Lợi suất chỉ số tham chiếu (để tính Beta, Alpha)
+        risk_free_rate (float): Lãi suất phi rủi ro năm cho Sharpe, Sortino
+        frequency (int): Số phiên mỗi năm
+
+    Returns:
+        tuple: (lợi suất ngày - phiên x danh mục, bảng analytics.performance_summary - chỉ số x danh mục)
+    """
+    weight_matrix = pd.DataFrame({name: pd.Series(weights, dtype=float) for name, weights in weights_by_name.items()})
+    weight_matrix = weight_matrix.reindex(prices.columns).fillna(0.0)
+    totals = weight_matrix.sum()
+    if (totals <= 0).any():
+        raise ValueError(f"Danh mục không có trọng số trên dữ liệu giá: {list(totals.index[totals <= 0])}")
+    weight_matrix /= totals
+
+    asset_returns = prices.pct_change().dropna()
+    portfolio_returns = pd.DataFrame(asset_returns.to_numpy() @ weight_matrix.to_numpy(),
+                                     index=asset_returns.index, columns=weight_matrix.columns)
+    summary = analytics.performance_summary(portfolio_returns, benchmark_returns, risk_free_rate,
+                                            frequency=frequency)
+    return portfolio_returns, summary
+
+
+def run_backtest(symbols: Sequence[str], weights, start_date, end_date, fetch_stock_data_func: Callable,
+                 benchmark_symbols: Sequence[str] = DEFAULT_BENCHMARKS, rebalance: Union[str, int] = DEFAULT_BACKTEST_REBALANCE,
+                 initial_value: float = 1e9, benchmark_loader: Optional[Callable] = None,
+                 ohlcv_loader: Optional[Callable] = None, exchanges: Optional[Mapping[str, str]] = None,
+                 **simulation_kwargs) -> Optional[BacktestResult]:
+    """
+    Backtest danh mục so với các chỉ số tham chiếu.
+
+    Args:
+        symbols (list): Danh sách mã cổ phiếu trong danh mục
+        weights (list): Trọng số của mỗi mã, cùng thứ tự với symbols
+        start_date (str): Ngày bắt đầu (định dạng 'YYYY-MM-DD')
+        end_date (str): Ngày kết thúc (định dạng 'YYYY-MM-DD')
+        fetch_stock_data_func (function): Hàm lấy dữ liệu giá, trả về (DataFrame, danh sách mã lỗi)
+        benchmark_symbols (list): Các chỉ số tham chiếu; chỉ số đầu tiên có dữ liệu dùng để tính Alpha
+        rebalance: 'ideal' (giữ đúng trọng số mỗi phiên, không phí) hoặc chế độ của simulate_rebalancing
+        initial_value (float): Vốn ban đầu cho mô phỏng tái cân bằng (VND)
+        benchmark_loader (function): Tải giá đóng cửa của nhiều chỉ số trong một lượt,
+            (symbols, start, end) -> (DataFrame cột = chỉ số, danh sách thiếu), ví dụ
+            data_process.fetchers.get_index_closes; mặc định tải từng chỉ số bằng fetch_stock_data_func
+        ohlcv_loader (function): Tải OHLCV (symbols, start, end) -> ({trường: DataFrame}, danh sách lỗi),
+            ví dụ data_process.fetchers.fetch_ohlcv_panel; khi có (và rebalance khác 'ideal'), mô phỏng
+            chặn lệnh ở giá trần/sàn và khi tạm ngừng giao dịch (xem trading_masks)
+        exchanges (dict): Sàn của từng mã để chọn biên độ giá
+        **simulation_kwargs: Tham số khác của simulate_rebalancing (lot_sizes, fee, sell_tax,
+            drift_threshold, cash_rate, integer_shares)
+
+    Returns:
+        BacktestResult | None: None nếu không có dữ liệu giá
+    """
+    stock_data, skipped_tickers = fetch_stock_data_func(list(symbols), start_date, end_date)
+    if skipped_tickers:
+        logger.warning(f"[BACKTEST] Khong tai duoc du lieu: {skipped_tickers}")
+    if stock_data.empty:
+        logger.error("[BACKTEST] Khong co du lieu de backtest")
+        return None
+
+    if ohlcv_loader is not None and rebalance != 'ideal':
+        ohlcv, _ = ohlcv_loader(list(stock_data.columns), start_date, end_date)
+        if ohlcv:
+            simulation_kwargs['masks'] = trading_masks(ohlcv, exchanges)
+        else:
+            logger.warning("[BACKTEST] Khong co du lieu OHLCV, bo qua bien do gia / tam ngung giao dich")
+
+    # Trọng số theo đúng các cột tải được (mã bị bỏ qua không còn trong dữ liệu)
+    target = pd.Series(np.asarray(weights, dtype=float), index=list(symbols)).reindex(stock_data.columns).fillna(0.0)
+    target /= target.sum()
+
+    portfolio_returns, cumulative_returns, simulation = portfolio_path(
+        stock_data, target, rebalance=rebalance, initial_value=initial_value, **simulation_kwargs
+    )
+
+    closes, missing_benchmarks = _load_benchmark_closes(benchmark_symbols, start_date, end_date,
+                                                        fetch_stock_data_func, benchmark_loader)
+    benchmark_returns = align_benchmark_returns(closes, stock_data.index, portfolio_returns.index)
+
+    first_benchmark = benchmark_returns.iloc[:, 0] if benchmark_returns.shape[1] else None
+    metrics = backtest_metrics(portfolio_returns, first_benchmark)
+    if simulation is not None:
+        metrics.update(simulation.summary())
+    return BacktestResult(
+        portfolio_returns,
+        cumulative_returns,
+        {name: series for name, series in (1 + benchmark_returns).cumprod().items()},
+        metrics,
+        skipped_tickers=list(skipped_tickers or []),
+        missing_benchmarks=missing_benchmarks,
+        simulation=simulation,
+    )
+
+
+class RunningMoments:
+    """Số phần tử, trung bình và tổng bình phương độ lệch của một chuỗi, gộp theo khối (Chan và cộng sự)."""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, values: np.ndarray) -> None:
+        if not len(values):
+            return
+        block_mean = float(values.mean())
+        block_m2 = float(((values - block_mean) ** 2).sum())
+        total = self.count + len(values)
+        delta = block_mean - self.mean
+        self.m2 += block_m2 + delta * delta * self.count * len(values) / total
+        self.mean += delta * len(values) / total
+        self.count = total
+
+    def std(self) -> float:
+        """Độ lệch chuẩn mẫu (ddof=1); NaN khi chưa đủ 2 phần tử, như pandas."""
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else float('nan')
+
+    def copy(self) -> 'RunningMoments':
+        return RunningMoments(self.count, self.mean, self.m2)
+
+
+class BacktestState:
+    """
+    Trạng thái backtest 'ideal' có thể nối thêm phiên mới mà không tính lại từ đầu.
+
+    Giữ giá đóng cửa cuối của các mã và chỉ số (để tính lợi suất phiên mới), giá trị tích lũy,
+    đỉnh đang chạy và mức sụt giảm tối đa, mô-men của lợi suất (Sharpe), của riêng lợi suất âm
+    (Sortino) và tổng lợi suất chỉ số tham chiếu (Alpha). Nối k phiên tốn O(k); chuỗi lợi suất
+    và giá trị tích lũy được giữ để vẽ biểu đồ và bootstrap.
+
+    Attributes:
+        target (pd.Series): Trọng số theo các mã có dữ liệu
+        start_date (pd.Timestamp): Ngày bắt đầu đã yêu cầu
+        end_date (pd.Timestamp): Ngày kết thúc đã yêu cầu gần nhất
+        benchmark_symbols (list): Các chỉ số tham chiếu có dữ liệu (chỉ số đầu tiên dùng cho Alpha)
+    """
+
+    __slots__ = ('target', 'start_date', 'end_date', 'benchmark_symbols', 'last_prices', 'last_benchmark_closes',
+                 'portfolio_returns', 'cumulative_returns', 'benchmark_cumulative', 'moments', 'downside',
+                 'benchmark_sum', 'peak', 'max_drawdown', 'skipped_tickers', 'missing_benchmarks')
+
+    def __init__(self, target: pd.Series, start_date, benchmark_symbols: Sequence[str],
+                 skipped_tickers: Optional[List[str]] = None, missing_benchmarks: Optional[List[str]] = None):
+        self.target = target
+        self.start_date = pd.Timestamp(start_date)
+        self.end_date = self.start_date
+        self.benchmark_symbols = list(benchmark_symbols)
+        self.last_prices = None
+        self.last_benchmark_closes = None
+        self.portfolio_returns = pd.Series(dtype=float)
+        self.cumulative_returns = pd.Series(dtype=float)
+        self.benchmark_cumulative = pd.DataFrame(columns=self.benchmark_symbols, dtype=float)
+        self.moments = RunningMoments()
+        self.downside = RunningMoments()
+        self.benchmark_sum = 0.0
+        self.peak = 0.0
+        self.max_drawdown = 0.0
+        self.skipped_tickers = skipped_tickers or []
+        self.missing_benchmarks = missing_benchmarks or []
+
+    @property
+    def last_date(self) -> Optional[pd.Timestamp]:
+        return self.last_prices.name if self.last_prices is not None else None
+
+    def copy(self) -> 'BacktestState':
+        """Bản sao để nối thêm (bản trong cache không bị sửa khi đang được đọc)."""
+        state = BacktestState.__new__(BacktestState)
+        for name in self.__slots__:
+            setattr(state, name, getattr(self, name))
+        state.moments = self.moments.copy()
+        state.downside = self.downside.copy()
+        return state
+
+    def extend(self, prices: pd.DataFrame, closes: pd.DataFrame) -> None:
+        """
+        Nối các phiên mới.
+
+        Args:
+            prices (pd.DataFrame): Giá đóng cửa các mã tại các phiên sau last_date
+            closes (pd.DataFrame): Giá đóng cửa các chỉ số tham chiếu trên cùng khoảng thời gian
+        """
+        tickers = self.target.index
+        if self.last_prices is not None:
+            if prices.empty:
+                return
+            prices = prices[prices.index > self.last_date].reindex(columns=tickers)
+            if prices.empty:
+                return
+            prices = pd.concat([self.last_prices.to_frame().T, prices]).ffill()
+            if not closes.empty:
+                closes = closes[closes.index > self.last_date]
+            closes = pd.concat([self.last_benchmark_closes.to_frame().T,
+                                closes.reindex(columns=self.benchmark_symbols)])
+            asset_returns = prices.pct_change().iloc[1:]
+        else:
+            asset_returns = prices.pct_change().dropna()
+            closes = closes.reindex(columns=self.benchmark_symbols)
+        if asset_returns.empty:
+            return
+
+        returns = asset_returns.dot(self.target)
+        benchmark_returns = align_benchmark_returns(closes, prices.index, returns.index)
+        values = returns.to_numpy(dtype=float)
+
+        previous_value = self.cumulative_returns.iloc[-1] if len(self.cumulative_returns) else 1.0
+        cumulative = previous_value * np.cumprod(1 + values)
+        running_peak = np.maximum.accumulate(np.maximum(cumulative, self.peak))
+        self.peak = float(running_peak[-1])
+        self.max_drawdown = min(self.max_drawdown, float((cumulative / running_peak - 1).min()))
+        self.moments.update(values)
+        self.downside.update(values[values < 0])
+
+        previous_benchmark = (self.benchmark_cumulative.iloc[-1] if len(self.benchmark_cumulative)
+                              else pd.Series(1.0, index=self.benchmark_symbols))
+        benchmark_cumulative = (1 + benchmark_returns).cumprod() * previous_benchmark
+        if self.benchmark_symbols:
+            self.benchmark_sum += float(benchmark_returns.iloc[:, 0].sum())
+
+        frames = [frame for frame in (self.portfolio_returns, returns) if len(frame)]
+        self.portfolio_returns = pd.concat(frames)
+        self.cumulative_returns = pd.concat([frame for frame in (self.cumulative_returns,
+                                                                 pd.Series(cumulative, index=returns.index))
+                                             if len(frame)])
+        self.benchmark_cumulative = pd.concat([frame for frame in (self.benchmark_cumulative, benchmark_cumulative)
+                                               if len(frame)])
+        self.last_prices = prices.ffill().iloc[-1]
+        self.last_benchmark_closes = (closes.reindex(closes.index.union(prices.index)).ffill()
+                                      .reindex(prices.index).iloc[-1])
+
+    def metrics(self, frequency: int = TRADING_DAYS) -> Dict[str, float]:
+        """Các chỉ số như backtest_metrics, tính từ trạng thái đang chạy."""
+        count = self.moments.count
+        std = self.moments.std()
+        final = float(self.cumulative_returns.iloc[-1]) if count else 1.0
+        num_years = count / frequency
+        downside_std = self.downside.std() * np.sqrt(frequency)
+        alpha = 0
+        if self.benchmark_symbols and count:
+            alpha = (self.moments.mean - self.benchmark_sum / count) * frequency * 100
+        return {
+            "Sharpe Ratio": self.moments.mean / std * np.sqrt(frequency),
+            "Sortino Ratio": (self.moments.mean * frequency) / downside_std if downside_std > 0 else 0,
+            "Maximum Drawdown": self.max_drawdown,
+            "Total Return": (final - 1) * 100,
+            "Annualized Return": (final ** (1 / num_years) - 1) * 100 if num_years > 0 else 0,
+            "Volatility": std * np.sqrt(frequency) * 100,
+            "Alpha": alpha,
+        }
+
+    def result(self) -> BacktestResult:
+        return BacktestResult(
+            self.portfolio_returns,
+            self.cumulative_returns,
+            {name: series for name, series in self.benchmark_cumulative.items()},
+            self.metrics(),
+            skipped_tickers=list(self.skipped_tickers),
+            missing_benchmarks=list(self.missing_benchmarks),
+        )
+
+    def to_bytes(self) -> bytes:
+        """Tuần tự hóa để lưu giữa các lần chạy (pickle protocol 5)."""
+        return pickle.dumps(self, protocol=5)
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> 'BacktestState':
+        state = pickle.loads(payload)
+        if not isinstance(state, cls):
+            raise TypeError(f"Dữ liệu không phải {cls.__name__}")
+        return state
+
+
+def _state_key(symbols: Sequence[str], weights, start_date, benchmark_symbols: Sequence[str]) -> tuple:
+    return (tuple(symbols), tuple(np.round(np.asarray(weights, dtype=float), 12).tolist()),
+            pd.Timestamp(start_date).strftime('%Y-%m-%d'), tuple(benchmark_symbols))
+
+
+def run_backtest_incremental(symbols: Sequence[str], weights, start_date, end_date, fetch_stock_data_func: Callable,
+                             benchmark_symbols: Sequence[str] = DEFAULT_BENCHMARKS,
+                             rebalance: Union[str, int] = DEFAULT_BACKTEST_REBALANCE, initial_value: float = 1e9,
+                             benchmark_loader: Optional[Callable] = None, **simulation_kwargs) -> Optional[BacktestResult]:
+    """
+    Như run_backtest, nhưng với chế độ 'ideal' giữ trạng thái và chỉ tải, tính các phiên mới
+    khi ngày kết thúc dịch về sau (cùng mã, trọng số, ngày bắt đầu và chỉ số tham chiếu).
+
+    Ngày kết thúc lùi lại hoặc chưa có trạng thái: chạy toàn bộ rồi lưu trạng thái. Các chế độ
+    mô phỏng tái cân bằng luôn chạy lại toàn bộ bằng run_backtest.
+
+    Returns:
+        BacktestResult | None: None nếu không có dữ liệu giá
+    """
+    if rebalance != 'ideal':
+        return run_backtest(symbols, weights, start_date, end_date, fetch_stock_data_func, benchmark_symbols,
+                            rebalance=rebalance, initial_value=initial_value, benchmark_loader=benchmark_loader,
+                            **simulation_kwargs)
+
+    key = _state_key(symbols, weights, start_date, benchmark_symbols)
+    end = pd.Timestamp(end_date)
+    state = _state_cache.get(key)
+
+    if state is not None and end >= state.end_date:
+        if end > state.end_date:
+            state = state.copy()
+            next_day = (state.last_date + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+            new_prices, new_skipped = fetch_stock_data_func(list(state.target.index), next_day,
+                                                            end.strftime('%Y-%m-%d'))
+            # Mã nắm giữ không tải được ở đoạn nối thêm được giữ giá cũ (lợi suất 0%): báo lại như
+            # lần chạy đầy đủ để giao diện vẫn cảnh báo
+            unavailable = set(new_skipped or [])
+            if not new_prices.empty:
+                unavailable |= set(state.target.index) - set(new_prices.columns)
+            newly_skipped = [t for t in state.target.index[state.target > 0]
+                             if t in unavailable and t not in state.skipped_tickers]
+            if newly_skipped:
+                logger.warning(f"[BACKTEST] Khong tai duoc du lieu noi them: {newly_skipped}")
+                state.skipped_tickers = state.skipped_tickers + newly_skipped
+            closes, _ = _load_benchmark_closes(state.benchmark_symbols, next_day, end.strftime('%Y-%m-%d'),
+                                               fetch_stock_data_func, benchmark_loader)
+            previous_count = state.moments.count
+            state.extend(new_prices, closes)
+            state.end_date = end
+            logger.info(f"[BACKTEST] Noi them {state.moments.count - previous_count} phien vao backtest tu "
+                        f"{state.start_date:%Y-%m-%d}")
+    else:
+        stock_data, skipped_tickers = fetch_stock_data_func(list(symbols), start_date, end_date)
+        if skipped_tickers:
+            logger.warning(f"[BACKTEST] Khong tai duoc du lieu: {skipped_tickers}")
+        if stock_data.empty:
+            logger.error("[BACKTEST] Khong co du lieu de backtest")
+            return None
+        target = pd.Series(np.asarray(weights, dtype=float), index=list(symbols)).reindex(stock_data.columns).fillna(0.0)
+        target /= target.sum()
+        closes, missing_benchmarks = _load_benchmark_closes(benchmark_symbols, start_date, end_date,
+                                                            fetch_stock_data_func, benchmark_loader)
+        state = BacktestState(target, start_date, [b for b in benchmark_symbols if b in closes.columns],
+                              skipped_tickers=list(skipped_tickers or []), missing_benchmarks=missing_benchmarks)
+        state.extend(stock_data, closes)
+        state.end_date = end
+
+    _state_cache[key] = state
+    _state_cache.move_to_end(key)
+    if len(_state_cache) > _STATE_CACHE_MAXSIZE:
+        _state_cache.popitem(last=False)
+    return state.result()
+
+
+def clear_backtest_states():
+    """Xóa các trạng thái backtest đã lưu."""
+    _state_cache.clear()
+
+
+__all__ = [
+    'TRADING_DAYS',
+    'DEFAULT_BENCHMARKS',
+    'BACKTEST_REBALANCE_OPTIONS',
+    'DEFAULT_BACKTEST_REBALANCE',
+    'DEFAULT_DRIFT_THRESHOLD',
+    'PRICE_LIMITS',
+    'LIMIT_TOLERANCE',
+    'BacktestResult',
+    'SimulationResult',
+    'TradingMasks',
+    'trading_masks',
+    'simulate_rebalancing',
+    'backtest_metrics',
+    'portfolio_path',
+    'backtest_portfolios',
+    'align_benchmark_returns',
+    'run_backtest',
+    'RunningMoments',
+    'BacktestState',
+    'run_backtest_incremental',
+    'clear_backtest_states',
+]
@@ -0,0 +1,357 @@
+"""
+Module batch.py
+Tối ưu hóa hàng loạt cho nhiều tài khoản khách hàng.
+
+Thay vì gọi max_sharpe(data, total_investment, get_latest_prices) cho từng tài khoản (mỗi
+lần một lượt tải giá, một lượt lấy giá mới nhất và một ma trận hiệp phương sai), lô yêu cầu
+được xử lý theo ba bước:
+    1. Hợp tất cả mã của mọi tài khoản, tải giá lịch sử và chụp giá mới nhất một lần.
+    2. Tính lợi nhuận kỳ vọng và hiệp phương sai một lần trên universe hợp; mỗi rổ chỉ cắt
+       ma trận con tương ứng.
+    3. Các rổ trùng nhau (cùng mã, mô hình, ràng buộc) chỉ giải một lần; các rổ khác nhau
+       được giải song song, sau đó phân bổ cổ phiếu nguyên theo số tiền của từng tài khoản.
+
+Max Sharpe / Min Volatility được giải trực tiếp bằng OSQP với ma trận dựng sẵn, bỏ qua
+bước biên dịch của cvxpy vốn chiếm phần lớn thời gian với rổ nhỏ.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Union
+
+import numpy as np
+import osqp
+import pandas as pd
+from pypfopt import expected_returns
+from scipy import sparse
+
+from optimization.allocation import allocate_shares, get_lot_sizes, round_to_price_step
+from optimization.covariance import covariance_matrix
+from optimization.hrp import HRP_LINKAGE_METHODS, hrp_weights
+from optimization.price_snapshot import PriceSnapshot
+from optimization.scenarios import min_cvar_reduced
+
+logger = logging.getLogger(__name__)
+
+BATCH_MODELS = ('max_sharpe', 'min_volatility', 'hrp', 'min_cvar')
+DEFAULT_BATCH_WORKERS = 8
+# Ràng buộc mỗi mô hình nhận (risk_free_rate còn dùng để tính Sharpe của mọi mô hình)
+BATCH_CONSTRAINTS = {
+    'max_sharpe': ('max_weight', 'min_weight', 'risk_free_rate'),
+    'min_volatility': ('max_weight', 'min_weight', 'risk_free_rate'),
+    'hrp': ('max_weight', 'min_weight', 'risk_free_rate', 'linkage_method'),
+    'min_cvar': ('max_weight', 'min_weight', 'risk_free_rate', 'beta'),
+}
+
+
+def _normalize_constraints(model: str, raw) -> dict:
+    """Kiểm tra ràng buộc của một mô hình và ép về giá trị băm được (số thực / chuỗi)."""
+    if raw is None or (isinstance(raw, float) and np.isnan(raw)):
+        return {}
+    if not isinstance(raw, dict):
+        raise ValueError(f"constraints phai la dict, nhan {type(raw).__name__}")
+    unsupported = sorted(set(raw) - set(BATCH_CONSTRAINTS[model]))
+    if unsupported:
+        raise ValueError(f"Rang buoc khong ho tro cho {model}: {', '.join(map(str, unsupported))}")
+
+    constraints = {}
+    for name, value in raw.items():
+        if name == 'linkage_method':
+            if value not in HRP_LINKAGE_METHODS:
+                raise ValueError(f"linkage_method khong hop le: {value}")
+            constraints[name] = value
+            continue
+        try:
+            constraints[name] = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Rang buoc {name} phai la so, nhan {value!r}") from None
+    if constraints.get('min_weight', 0.0) > constraints.get('max_weight', 1.0):
+        raise ValueError("min_weight lon hon max_weight")
+    return constraints
+
+
+def _normalize_request(raw: dict, position: int) -> dict:
+    """
+    Chuẩn hóa một yêu cầu: mã in hoa, không trùng, có mô hình và ràng buộc mặc định.
+
+    Yêu cầu không hợp lệ không làm hỏng cả lô: lỗi được ghi vào khóa 'error' và báo trên
+    dòng của tài khoản đó.
+    """
+    tickers = []
+    for ticker in raw.get('tickers', []):
+        ticker = str(ticker).strip().upper()
+        if ticker and ticker not in tickers:
+            tickers.append(ticker)
+    request = {
+        'account': raw.get('account', position),
+        'tickers': tickers,
+        'amount': raw.get('amount'),
+        'model': raw.get('model', 'max_sharpe'),
+        'constraints': {},
+        'error': None,
+    }
+    try:
+        if request['model'] not in BATCH_MODELS:
+            raise ValueError(f"Mo hinh khong ho tro trong batch: {request['model']}")
+        request['amount'] = float(raw['amount'])
+        request['constraints'] = _normalize_constraints(request['model'], raw.get('constraints'))
+    except KeyError:
+        request['error'] = "Thieu so tien (amount)"
+    except (TypeError, ValueError) as exc:
+        request['error'] = str(exc)
+    return request
+
+
+def _basket_key(request: dict) -> tuple:
+    """Khóa khử trùng lặp: cùng tập mã, mô hình và ràng buộc thì cùng trọng số."""
+    return (tuple(sorted(request['tickers'])), request['model'],
+            tuple(sorted(request['constraints'].items())))
+
+
+def _osqp_solve(cov: np.ndarray, a_rows: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """min x' cov x  s.t. lower <= A x <= upper, giải trực tiếp bằng OSQP (không qua cvxpy)."""
+    solver = osqp.OSQP()
+    solver.setup(sparse.csc_matrix(np.triu(2 * cov)), np.zeros(len(cov)), sparse.csc_matrix(a_rows),
+                 lower, upper, verbose=False, eps_abs=1e-9, eps_rel=1e-9, polishing=True, max_iter=20000)
+    result = solver.solve()
+    if result.info.status not in ('solved', 'solved inaccurate'):
+        raise ValueError(f"OSQP khong giai duoc: {result.info.status}")
+    return result.x
+
+
+def min_volatility_weights(cov: np.ndarray, min_weight: float = 0.0, max_weight: float = 1.0) -> np.ndarray:
+    """Min Volatility: min w' cov w với sum(w) = 1, min_weight <= w <= max_weight."""
+    n_assets = len(cov)
+    a_rows = np.vstack([np.ones(n_assets), np.eye(n_assets)])
+    lower = np.r_[1.0, np.full(n_assets, min_weight)]
+    upper = np.r_[1.0, np.full(n_assets, max_weight)]
+    return _clean(_osqp_solve(cov, a_rows, lower, upper))
+
+
+def max_sharpe_weights(mu: np.ndarray, cov: np.ndarray, risk_free_rate: float = 0.02,
+                       min_weight: float = 0.0, max_weight: float = 1.0) -> np.ndarray:
+    """
+    Max Sharpe dạng lồi (như EfficientFrontier.max_sharpe): min y' cov y với (mu - rf)'y = 1,
+    y >= 0, cận trọng số viết thành min_weight * sum(y) <= y_i <= max_weight * sum(y); w = y / sum(y).
+    """
+    excess = mu - risk_free_rate
+    if not (excess > 0).any():
+        raise ValueError("at least one of the assets must have an expected return exceeding the risk-free rate")
+    n_assets = len(cov)
+    eye, ones = np.eye(n_assets), np.ones((n_assets, n_assets))
+    a_rows = np.vstack([excess, eye, eye - max_weight * ones, eye - min_weight * ones])
+    lower = np.r_[1.0, np.zeros(n_assets), np.full(n_assets, -np.inf), np.zeros(n_assets)]
+    upper = np.r_[1.0, np.full(n_assets, np.inf), np.zeros(n_assets), np.full(n_assets, np.inf)]
+    y = _osqp_solve(cov, a_rows, lower, upper)
+    return _clean(y / y.sum())
+
+
+def bounded_weights(weights: np.ndarray, min_weight: float = 0.0, max_weight: float = 1.0,
+                    max_iter: int = 100) -> np.ndarray:
+    """
+    Đưa trọng số (tổng bằng 1) về khoảng [min_weight, max_weight]: cắt các mã vượt cận rồi
+    chia phần dư cho các mã còn lại theo tỷ lệ trọng số ban đầu, lặp tới khi không còn mã vượt.
+    """
+    weights = np.asarray(weights, dtype=float)
+    n_assets = len(weights)
+    if n_assets * max_weight < 1 - 1e-9 or n_assets * min_weight > 1 + 1e-9:
+        raise ValueError(f"Khong the dat tong trong so 1 voi {n_assets} ma trong "
+                         f"[{min_weight:.2%}, {max_weight:.2%}]")
+    result = weights.copy()
+    fixed = np.zeros(n_assets, dtype=bool)
+    for _ in range(max_iter):
+        over, under = ~fixed & (result > max_weight + 1e-12), ~fixed & (result < min_weight - 1e-12)
+        if not (over.any() or under.any()):
+            break
+        result[over], result[under] = max_weight, min_weight
+        fixed |= over | under
+        free = ~fixed
+        remaining = 1.0 - result[fixed].sum()
+        base = weights[free]
+        result[free] = remaining * (base / base.sum() if base.sum() > 0 else np.full(free.sum(), 1 / free.sum()))
+    return result
+
+
+def _clean(weights: np.ndarray) -> np.ndarray:
+    """Làm sạch như clean_weights: bỏ trọng số rất nhỏ, làm tròn 5 chữ số."""
+    weights = np.where(np.abs(weights) < 1e-4, 0.0, weights)
+    return np.round(weights / weights.sum(), 5)
+
+
+def _solve_basket(key: tuple, mu: pd.Series, cov: pd.DataFrame, returns: pd.DataFrame) -> Dict[str, float]:
+    """Trọng số tối ưu của một rổ từ các ma trận con của universe hợp."""
+    tickers, model, constraints = list(key[0]), key[1], dict(key[2])
+    max_weight = constraints.get('max_weight', 1.0)
+    min_weight = constraints.get('min_weight', 0.0)
+    sub_cov = cov.loc[tickers, tickers]
+
+    if model == 'hrp':
+        weights = hrp_weights(sub_cov.to_numpy(), constraints.get('linkage_method', 'single'))
+        return dict(zip(tickers, bounded_weights(weights, min_weight, max_weight)))
+    if model == 'min_cvar':
+        weights, _, _ = min_cvar_reduced(returns[tickers].dropna(), beta=constraints.get('beta', 0.95),
+                                         min_weight=min_weight, max_weight=max_weight)
+        return weights
+
+    if model == 'min_volatility':
+        weights = min_volatility_weights(sub_cov.to_numpy(), min_weight, max_weight)
+    else:
+        weights = max_sharpe_weights(mu[tickers].to_numpy(), sub_cov.to_numpy(),
+                                     constraints.get('risk_free_rate', 0.02), min_weight, max_weight)
+    return dict(zip(tickers, weights))
+
+
+def _performance(weights: Dict[str, float], mu: pd.Series, cov: pd.DataFrame,
+                 risk_free_rate: float = 0.02) -> tuple:
+    tickers = list(weights)
+    w = np.array([weights[t] for t in tickers])
+    expected = float(mu[tickers].to_numpy() @ w)
+    volatility = float(np.sqrt(max(w @ cov.loc[tickers, tickers].to_numpy() @ w, 0)))
+    sharpe = (expected - risk_free_rate) / volatility if volatility > 0 else 0.0
+    return expected, volatility, sharpe
+
+
+def optimize_batch(requests: Union[Iterable[dict], pd.DataFrame],
+                   price_data: Optional[pd.DataFrame] = None,
+                   fetch_prices_func: Optional[Callable] = None,
+                   get_latest_prices_func: Optional[Callable] = None,
+                   start_date=None, end_date=None,
+                   price_snapshot: Optional[PriceSnapshot] = None,
+                   cov_estimator: Optional[str] = None,
+                   exchanges: Optional[Dict[str, str]] = None,
+                   max_workers: int = DEFAULT_BATCH_WORKERS) -> pd.DataFrame:
+    """
+    Tối ưu và phân bổ cho nhiều tài khoản trong một lượt.
+
+    Args:
+        requests (list[dict] | pd.DataFrame): Mỗi yêu cầu gồm 'account', 'tickers', 'amount',
+            tùy chọn 'model' (BATCH_MODELS, mặc định 'max_sharpe') và 'constraints'
+            (xem BATCH_CONSTRAINTS; ràng buộc không hợp lệ được báo trong cột 'error')
+        price_data (pd.DataFrame): Giá lịch sử của universe hợp (nếu đã có sẵn)
+        fetch_prices_func (function): Hàm tải giá như fetch_stock_data2(symbols, start, end)
+            dùng khi không truyền price_data
+        get_latest_prices_func (function): Hàm lấy giá mới nhất (khi không truyền price_snapshot)
+        start_date, end_date: Khoảng thời gian tải giá
+        price_snapshot (PriceSnapshot): Ảnh chụp giá dùng chung
+        cov_estimator (str): Bộ ước lượng hiệp phương sai (xem optimization.covariance)
+        exchanges (dict): Sàn của từng mã để phân bổ theo lô chẵn
+        max_workers (int): Số luồng giải song song
+
+    Returns:
+        pd.DataFrame: Mỗi dòng một tài khoản với trọng số, phân bổ, hiệu suất và trạng thái
+    """
+    timings = {}
+    start = time.perf_counter()
+    if isinstance(requests, pd.DataFrame):
+        requests = requests.to_dict('records')
+    requests = [_normalize_request(raw, i) for i, raw in enumerate(requests)]
+    universe = sorted({t for request in requests if request['error'] is None for t in request['tickers']})
+    if not universe:
+        return pd.DataFrame([
+            {'account': r['account'], 'model': r['model'], 'tickers': len(r['tickers']), 'amount': r['amount'],
+             'error': r['error'] or "Ro rong"}
+            for r in requests
+        ])
+
+    if price_data is None:
+        if fetch_prices_func is None:
+            raise ValueError("Can price_data hoac fetch_prices_func")
+        price_data, skipped = fetch_prices_func(universe, start_date, end_date)
+        if skipped:
+            logger.warning(f"[BATCH] Khong tai duoc gia: {', '.join(skipped)}")
+    available = [t for t in universe if t in price_data.columns]
+    price_data = price_data[available]
+    if price_snapshot is None:
+        price_snapshot = PriceSnapshot.capture(available, get_latest_prices_func, price_data)
+    timings['Dữ liệu'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mu = expected_returns.mean_historical_return(price_data)
+    cov = covariance_matrix(price_data, cov_estimator)
+    returns = expected_returns.returns_from_prices(price_data)
+    timings['Hiệp phương sai'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    baskets = {}
+    for request in requests:
+        if request['error'] is not None:
+            continue
+        missing = [t for t in request['tickers'] if t not in price_data.columns]
+        request['missing'] = missing
+        if not missing and request['tickers']:
+            baskets.setdefault(_basket_key(request), []).append(request)
+
+    def solve(key):
+        try:
+            return key, _solve_basket(key, mu, cov, returns), None
+        except Exception as exc:
+            return key, None, str(exc)
+
+    solved = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(baskets) or 1))) as executor:
+        for key, weights, error in executor.map(solve, baskets):
+            solved[key] = (weights, error)
+    timings['Tối ưu'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    latest_prices = price_snapshot.prices
+    if exchanges:
+        latest_prices = round_to_price_step(latest_prices, {t: exchanges[t] for t in available if t in exchanges})
+
+    rows = []
+    for request in requests:
+        row = {
+            'account': request['account'],
+            'model': request['model'],
+            'tickers': len(request['tickers']),
+            'amount': request['amount'],
+        }
+        if request['error'] is not None:
+            row['error'] = request['error']
+            rows.append(row)
+            continue
+        if request['missing'] or not request['tickers']:
+            row['error'] = f"Thieu du lieu gia: {', '.join(request['missing'])}" if request['missing'] else "Ro rong"
+            rows.append(row)
+            continue
+        weights, error = solved[_basket_key(request)]
+        if weights is None:
+            row['error'] = error
+            rows.append(row)
+            continue
+        try:
+            basket_prices = latest_prices.reindex(request['tickers'])
+            lot_sizes = get_lot_sizes({t: exchanges[t] for t in request['tickers'] if t in exchanges}) if exchanges else None
+            allocation, leftover = allocate_shares(weights, basket_prices, request['amount'], lot_sizes=lot_sizes)
+        except Exception as exc:
+            row['error'] = str(exc)
+            rows.append(row)
+            continue
+        expected, volatility, sharpe = _performance(weights, mu, cov,
+                                                    request['constraints'].get('risk_free_rate', 0.02))
+        row.update({
+            'expected_return': expected,
+            'volatility': volatility,
+            'sharpe': sharpe,
+            'invested': request['amount'] - leftover,
+            'leftover': leftover,
+            'weights': {t: w for t, w in weights.items() if w > 0},
+            'allocation': allocation,
+            'error': None,
+        })
+        rows.append(row)
+    timings['Phân bổ'] = time.perf_counter() - start
+
+    table = pd.DataFrame(rows)
+    table.attrs['timings'] = timings
+    table.attrs['unique_baskets'] = len(baskets)
+    logger.info(
+        f"[BATCH] {len(requests)} tai khoan, {len(universe)} ma, {len(baskets)} ro duy nhat, "
+        f"thoi gian: {', '.join(f'{k}={v:.3f}s' for k, v in timings.items())}"
+    )
+    return table
+
+
+__all__ = ['BATCH_MODELS', 'BATCH_CONSTRAINTS', 'bounded_weights', 'max_sharpe_weights', 'min_volatility_weights',
+           'optimize_batch']
@@ -0,0 +1,138 @@
+"""
+Module bootstrap.py
+Khoảng tin cậy của các chỉ số backtest bằng bootstrap khối dừng (stationary block bootstrap,
+Politis & Romano 1994).
+
+Mỗi đường mô phỏng ghép các khối lợi suất liên tiếp có độ dài ngẫu nhiên (phân phối hình học,
+trung bình ``mean_block``), nên giữ được tự tương quan và cụm biến động trong ngắn hạn. Không có
+vòng lặp theo đường hay theo phiên:
+    - Phiên bắt đầu khối mới được rút cùng lúc cho cả ma trận (đường x phiên); vị trí bắt đầu
+      của khối hiện tại là np.maximum.accumulate theo phiên, chỉ số lấy mẫu là điểm xuất phát
+      ngẫu nhiên của khối cộng độ lệch trong khối (vòng tròn).
+    - Các chỉ số (Sharpe, Sortino, sụt giảm tối đa...) được tính cho mọi đường cùng lúc bằng
+      optimization.analytics, như optimization.backtest.backtest_metrics.
+Các đường được xử lý theo lô để bộ nhớ không tăng theo số đường.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from optimization import analytics
+
+TRADING_DAYS = 252
+DEFAULT_BOOTSTRAP_PATHS = 2000
+DEFAULT_CONFIDENCE = 0.90
+BOOTSTRAP_CHUNK_ELEMENTS = 4_000_000
+BOOTSTRAP_METRICS = (
+    "Total Return", "Annualized Return", "Volatility", "Sharpe Ratio", "Sortino Ratio", "Maximum Drawdown",
+)
+
+
+def default_block_length(n_periods: int) -> int:
+    """Độ dài khối trung bình mặc định: n^(1/3) phiên."""
+    return max(1, int(round(n_periods ** (1 / 3))))
+
+
+def stationary_bootstrap_indices(n_periods: int, n_paths: int, mean_block: float,
+                                 rng: np.random.Generator) -> np.ndarray:
+    """
+    Chỉ số lấy mẫu (n_paths x n_periods) của bootstrap khối dừng.
+
+    Args:
+        n_periods (int): Độ dài chuỗi gốc (và của mỗi đường)
+        n_paths (int): Số đường
+        mean_block (float): Độ dài khối trung bình (xác suất mở khối mới mỗi phiên là 1 / mean_block)
+        rng (np.random.Generator): Bộ sinh số ngẫu nhiên
+
+    Returns:
+        np.ndarray: Ma trận chỉ số trong [0, n_periods)
+    """
+    positions = np.arange(n_periods)
+    new_block = rng.random((n_paths, n_periods)) < 1.0 / mean_block
+    new_block[:, 0] = True
+    block_starts = rng.integers(0, n_periods, size=(n_paths, n_periods))
+    # Phiên mở khối gần nhất (tính tới phiên hiện tại) của mỗi đường
+    last_open = np.maximum.accumulate(np.where(new_block, positions, 0), axis=1)
+    origin = np.take_along_axis(block_starts, last_open, axis=1)
+    return (origin + positions - last_open) % n_periods
+
+
+def path_metrics(paths: np.ndarray, frequency: int = TRADING_DAYS) -> Dict[str, np.ndarray]:
+    """
+    Chỉ số hiệu suất của từng đường lợi suất (mỗi hàng một đường).
+
+    Cùng định nghĩa với backtest_metrics: "Total Return", "Annualized Return", "Volatility" tính
+    theo %, "Maximum Drawdown" là tỷ lệ âm.
+    """
+    # analytics tính theo cột (phiên x danh mục): paths.T là view, không sao chép
+    columns = paths.T
+    final = np.cumprod(1 + columns, axis=0)[-1]
+    years = paths.shape[1] / frequency
+    return {
+        "Total Return": (final - 1) * 100,
+        "Annualized Return": (np.clip(final, 0, None) ** (1 / years) - 1) * 100,
+        "Volatility": analytics.annualized_volatility(columns, frequency) * 100,
+        "Sharpe Ratio": analytics.sharpe_ratio(columns, frequency=frequency),
+        "Sortino Ratio": analytics.sortino_ratio(columns, frequency=frequency),
+        "Maximum Drawdown": analytics.max_drawdown(columns),
+    }
+
+
+def bootstrap_metrics(portfolio_returns, n_paths: int = DEFAULT_BOOTSTRAP_PATHS,
+                      confidence: float = DEFAULT_CONFIDENCE, mean_block: Optional[float] = None,
+                      seed: Optional[int] = 42, frequency: int = TRADING_DAYS,
+                      return_samples: bool = False):
+    """
+    Khoảng tin cậy bootstrap của các chỉ số backtest.
+
+    Args:
+        portfolio_returns (pd.Series | np.ndarray): Lợi suất ngày của danh mục (như BacktestResult.portfolio_returns)
+        n_paths (int): Số đường bootstrap
+        confidence (float): Mức tin cậy của khoảng (ví dụ 0.90: phân vị 5% và 95%)
+        mean_block (float): Độ dài khối trung bình (phiên); mặc định default_block_length
+        seed (int): Hạt giống (None: ngẫu nhiên)
+        frequency (int): Số phiên mỗi năm
+        return_samples (bool): True để trả thêm phân phối đầy đủ {chỉ số: mảng n_paths}
+
+    Returns:
+        pd.DataFrame: Chỉ mục BOOTSTRAP_METRICS, cột "Cận dưới", "Trung vị", "Cận trên";
+        kèm dict phân phối nếu return_samples
+    """
+    returns = np.asarray(portfolio_returns, dtype=float)
+    returns = returns[np.isfinite(returns)]
+    if len(returns) < 2:
+        raise ValueError("Cần ít nhất 2 phiên lợi suất để bootstrap")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence phải nằm trong (0, 1)")
+    n_periods = len(returns)
+    mean_block = default_block_length(n_periods) if mean_block is None else max(float(mean_block), 1.0)
+    rng = np.random.default_rng(seed)
+
+    chunk = max(1, BOOTSTRAP_CHUNK_ELEMENTS // n_periods)
+    samples = {name: np.empty(n_paths) for name in BOOTSTRAP_METRICS}
+    for start in range(0, n_paths, chunk):
+        stop = min(start + chunk, n_paths)
+        paths = returns[stationary_bootstrap_indices(n_periods, stop - start, mean_block, rng)]
+        for name, values in path_metrics(paths, frequency).items():
+            samples[name][start:stop] = values
+
+    tail = (1 - confidence) / 2 * 100
+    stacked = np.vstack([samples[name] for name in BOOTSTRAP_METRICS])
+    bands = np.nanpercentile(stacked, [tail, 50, 100 - tail], axis=1).T
+    intervals = pd.DataFrame(bands, index=list(BOOTSTRAP_METRICS), columns=["Cận dưới", "Trung vị", "Cận trên"])
+    if return_samples:
+        return intervals, samples
+    return intervals
+
+
+__all__ = [
+    'DEFAULT_BOOTSTRAP_PATHS',
+    'DEFAULT_CONFIDENCE',
+    'BOOTSTRAP_METRICS',
+    'default_block_length',
+    'stationary_bootstrap_indices',
+    'path_metrics',
+    'bootstrap_metrics',
+]
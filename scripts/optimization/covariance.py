@@ -0,0 +1,184 @@
+"""
+Module covariance.py
+Dịch vụ ước lượng ma trận hiệp phương sai dùng chung cho mọi mô hình.
+
+Các mô hình trước đây tự tính hiệp phương sai theo nhiều cách (sample_cov, log_ret.cov() * 252,
+returns.corr()), nên cùng một rổ mã lại có các ma trận khác nhau. Module này cung cấp một điểm
+tính duy nhất với các bộ ước lượng sample, Ledoit-Wolf, EWMA và nhân tố, lưu cache theo
+(mã băm dữ liệu giá, bộ ước lượng, cửa sổ) để các mô hình trong cùng một lượt chạy nhận
+đúng cùng một ma trận mà không phải tính lại.
+"""
+
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+COVARIANCE_ESTIMATORS = {
+    'sample': 'Mẫu (sample)',
+    'ledoit_wolf': 'Co rút Ledoit-Wolf',
+    'ewma': 'EWMA (trọng số mũ)',
+    'factor': 'Mô hình nhân tố',
+}
+DEFAULT_COVARIANCE_ESTIMATOR = 'sample'
+DEFAULT_EWMA_SPAN = 60
+DEFAULT_FACTOR_COUNT = 5
+_CACHE_MAXSIZE = 64
+
+_cache: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+
+
+def prices_hash(prices: pd.DataFrame) -> str:
+    """Mã băm nội dung bảng giá (chỉ mục, tên cột và giá trị)."""
+    digest = hashlib.sha1()
+    digest.update(pd.util.hash_pandas_object(prices, index=True).to_numpy().tobytes())
+    digest.update('|'.join(map(str, prices.columns)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _returns(prices: pd.DataFrame, window: Optional[int]) -> pd.DataFrame:
+    """Lợi suất đơn ngày (như risk_models.sample_cov), giới hạn ``window`` phiên gần nhất."""
+    prices = prices.apply(pd.to_numeric, errors='coerce')
+    returns = prices.pct_change(fill_method=None).dropna(how='all')
+    if window:
+        returns = returns.iloc[-window:]
+    return returns
+
+
+def _make_psd(matrix: np.ndarray) -> np.ndarray:
+    """Cắt trị riêng âm (do dữ liệu thiếu) để ma trận nửa xác định dương."""
+    matrix = (matrix + matrix.T) / 2
+    eigval, eigvec = np.linalg.eigh(matrix)
+    if eigval.min() >= 0:
+        return matrix
+    logger.warning("Ma tran hiep phuong sai khong nua xac dinh duong, da cat tri rieng am")
+    return (eigvec * np.clip(eigval, 0, None)) @ eigvec.T
+
+
+def sample_covariance(returns: pd.DataFrame) -> np.ndarray:
+    """Hiệp phương sai mẫu theo từng cặp (bỏ qua ô thiếu)."""
+    return returns.cov().to_numpy()
+
+
+def ledoit_wolf_covariance(returns: pd.DataFrame) -> np.ndarray:
+    """
+    Co rút Ledoit-Wolf (2004) về ma trận đơn vị có tỷ lệ: (1 - d) S + d * mu * I.
+
+    Hệ số co rút d được ước lượng khép kín, giúp ma trận luôn khả nghịch kể cả khi số mã
+    gần bằng hoặc lớn hơn số phiên.
+    """
+    x = returns.fillna(0.0).to_numpy(dtype=float)
+    x = x - x.mean(axis=0)
+    n_periods, n_assets = x.shape
+    sample = x.T @ x / n_periods
+    mu = np.trace(sample) / n_assets
+    delta = sample - mu * np.eye(n_assets)
+    d2 = (delta ** 2).sum() / n_assets
+    # b2: phương sai ước lượng của từng phần tử ma trận mẫu
+    x2 = x ** 2
+    b2 = ((x2.T @ x2) / n_periods - sample ** 2).sum() / (n_assets * n_periods)
+    shrinkage = 0.0 if d2 <= 0 else min(b2, d2) / d2
+    shrunk = (1 - shrinkage) * sample + shrinkage * mu * np.eye(n_assets)
+    # Đưa về mẫu số T - 1 cho nhất quán với hiệp phương sai mẫu
+    return shrunk * n_periods / max(n_periods - 1, 1)
+
+
+def ewma_covariance(returns: pd.DataFrame, span: int = DEFAULT_EWMA_SPAN) -> np.ndarray:
+    """Hiệp phương sai trọng số mũ (phiên gần nhất có trọng số lớn nhất)."""
+    x = returns.fillna(0.0).to_numpy(dtype=float)
+    alpha = 2.0 / (span + 1)
+    weights = (1 - alpha) ** np.arange(len(x))[::-1]
+    weights /= weights.sum()
+    mean = weights @ x
+    centered = x - mean
+    return (centered * weights[:, None]).T @ centered
+
+
+def factor_covariance(returns: pd.DataFrame, n_factors: int = DEFAULT_FACTOR_COUNT) -> np.ndarray:
+    """Hiệp phương sai từ K nhân tố thống kê cộng phương sai riêng (xem large_universe)."""
+    from optimization.large_universe import low_rank_covariance
+
+    model = low_rank_covariance(returns.fillna(0.0), n_factors=n_factors, annualize=1)
+    return model.to_dense().to_numpy()
+
+
+def covariance_matrix(prices: pd.DataFrame, estimator: Optional[str] = None,
+                      window: Optional[int] = None, frequency: int = TRADING_DAYS,
+                      span: int = DEFAULT_EWMA_SPAN, n_factors: int = DEFAULT_FACTOR_COUNT) -> pd.DataFrame:
+    """
+    Ma trận hiệp phương sai năm hóa của lợi suất ngày, có cache.
+
+    Args:
+        prices (pd.DataFrame): Giá đóng cửa (phiên x mã)
+        estimator (str): 'sample', 'ledoit_wolf', 'ewma' hoặc 'factor' (mặc định DEFAULT_COVARIANCE_ESTIMATOR)
+        window (int): Chỉ dùng ``window`` phiên gần nhất (mặc định: toàn bộ)
+        frequency (int): Số phiên mỗi năm để năm hóa
+        span (int): Chu kỳ của EWMA
+        n_factors (int): Số nhân tố của bộ ước lượng nhân tố
+
+    Returns:
+        pd.DataFrame: Ma trận N x N theo thứ tự cột của ``prices``. Không sửa trực tiếp
+        ma trận trả về vì nó được dùng chung qua cache.
+    """
+    estimator = estimator or DEFAULT_COVARIANCE_ESTIMATOR
+    if estimator not in COVARIANCE_ESTIMATORS:
+        raise ValueError(f"Bo uoc luong hiep phuong sai khong hop le: {estimator}")
+
+    params = span if estimator == 'ewma' else n_factors if estimator == 'factor' else None
+    key = (prices_hash(prices), estimator, window, frequency, params)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+
+    returns = _returns(prices, window)
+    if estimator == 'sample':
+        matrix = sample_covariance(returns)
+    elif estimator == 'ledoit_wolf':
+        matrix = ledoit_wolf_covariance(returns)
+    elif estimator == 'ewma':
+        matrix = ewma_covariance(returns, span)
+    else:
+        matrix = factor_covariance(returns, n_factors)
+
+    matrix = _make_psd(np.nan_to_num(matrix) * frequency)
+    result = pd.DataFrame(matrix, index=prices.columns, columns=prices.columns)
+
+    _cache[key] = result
+    if len(_cache) > _CACHE_MAXSIZE:
+        _cache.popitem(last=False)
+    return result
+
+
+def correlation_matrix(prices: pd.DataFrame, estimator: Optional[str] = None,
+                       window: Optional[int] = None, **kwargs) -> pd.DataFrame:
+    """Ma trận tương quan suy ra từ cùng ma trận hiệp phương sai của dịch vụ."""
+    cov = covariance_matrix(prices, estimator, window, **kwargs)
+    std = np.sqrt(np.clip(np.diag(cov.to_numpy()), 1e-18, None))
+    corr = cov.to_numpy() / np.outer(std, std)
+    np.fill_diagonal(corr, 1.0)
+    return pd.DataFrame(np.clip(corr, -1.0, 1.0), index=cov.index, columns=cov.columns)
+
+
+def clear_covariance_cache():
+    """Xóa cache hiệp phương sai."""
+    _cache.clear()
+
+
+__all__ = [
+    'COVARIANCE_ESTIMATORS',
+    'DEFAULT_COVARIANCE_ESTIMATOR',
+    'prices_hash',
+    'sample_covariance',
+    'ledoit_wolf_covariance',
+    'ewma_covariance',
+    'factor_covariance',
+    'covariance_matrix',
+    'correlation_matrix',
+    'clear_covariance_cache',
+]
@@ -0,0 +1,150 @@
+"""
+Module factor_model.py
+Mô hình rủi ro nhân tố cấu trúc: nhân tố thị trường + nhân tố ngành ICB + rủi ro riêng.
+
+Mỗi mã chịu tác động của thị trường và đúng một ngành (icb_name trong company_info.csv):
+    r_i = a_i + beta_M_i * f_M + beta_S_i * f_s(i) + e_i
+nên ma trận hệ số tải B chỉ có tối đa 2 phần tử khác 0 mỗi dòng. Hiệp phương sai
+B F B' + D không bao giờ được dựng dày đặc; phương sai và gradient của danh mục tính
+trong O(N*K) với K = 1 + số ngành.
+"""
+
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from optimization.large_universe import TRADING_DAYS, LowRankCovariance, clean_universe_returns
+
+logger = logging.getLogger(__name__)
+
+MARKET_FACTOR = 'Thị trường'
+OTHER_SECTOR = 'Khác'
+# Ngành có ít mã hơn ngưỡng này được gộp vào OTHER_SECTOR (nhân tố ngành 1 mã trùng với chính mã đó)
+MIN_SECTOR_SIZE = 3
+
+
+class SectorFactorModel(LowRankCovariance):
+    """
+    Mô hình thị trường + ngành ICB, dùng chung giao diện với LowRankCovariance.
+
+    Attributes:
+        factors (list): Tên nhân tố, nhân tố đầu tiên là thị trường
+        sectors (dict): Ngành của từng mã sau khi gộp ngành nhỏ
+        factor_returns (pd.DataFrame): Lợi suất ngày của các nhân tố
+    """
+
+    def __init__(self, tickers, loadings, factor_cov, specific_var, factors, sectors,
+                 factor_returns: Optional[pd.DataFrame] = None):
+        super().__init__(tickers, loadings, factor_cov, specific_var)
+        self.factors = list(factors)
+        self.sectors = dict(sectors)
+        self.factor_returns = factor_returns
+
+    @classmethod
+    def fit(cls, returns: pd.DataFrame, sector_map: Dict[str, str],
+            annualize: int = TRADING_DAYS, min_sector_size: int = MIN_SECTOR_SIZE) -> 'SectorFactorModel':
+        """
+        Ước lượng toàn bộ universe bằng các phép toán ma trận (không lặp theo mã).
+
+        Nhân tố thị trường là lợi suất trung bình đồng tỷ trọng; nhân tố ngành là lợi suất
+        trung bình của ngành trừ thị trường. Hệ số tải của mỗi mã là nghiệm OLS hai biến,
+        giải khép kín bằng hệ 2x2 dùng chung cho các mã cùng ngành.
+
+        Args:
+            returns (pd.DataFrame): Lợi suất ngày (phiên x mã), không còn ô trống
+            sector_map (dict): icb_name của từng mã
+            annualize (int): Số phiên mỗi năm
+            min_sector_size (int): Số mã tối thiểu để một ngành có nhân tố riêng
+
+        Returns:
+            SectorFactorModel: Mô hình đã ước lượng
+        """
+        tickers = returns.columns.tolist()
+        r = returns.to_numpy(dtype=float)
+        n_periods, n_assets = r.shape
+
+        labels = pd.Series([sector_map.get(t) or OTHER_SECTOR for t in tickers], index=tickers)
+        counts = labels.value_counts()
+        labels = labels.where(labels.map(counts) >= min_sector_size, OTHER_SECTOR)
+        sector_names, sector_idx = np.unique(labels.to_numpy(), return_inverse=True)
+        n_sectors = len(sector_names)
+
+        # Ma trận thành viên ngành (N x S) chuẩn hóa theo số mã -> lợi suất trung bình ngành
+        membership = np.zeros((n_assets, n_sectors))
+        membership[np.arange(n_assets), sector_idx] = 1.0
+        market = r.mean(axis=1)
+        sector_factors = r @ (membership / membership.sum(axis=0)) - market[:, None]
+
+        rc = r - r.mean(axis=0)
+        mc = market - market.mean()
+        sc = sector_factors - sector_factors.mean(axis=0)
+
+        # Hệ phương trình chuẩn 2x2 cho từng mã: [mm ms; ms ss] [bM; bS] = [m'r; s'r]
+        mm = mc @ mc
+        ms = (mc @ sc)[sector_idx]
+        ss = (sc * sc).sum(axis=0)[sector_idx]
+        mr = mc @ rc
+        sr = (sc.T @ rc)[sector_idx, np.arange(n_assets)]
+        det = mm * ss - ms ** 2
+        has_sector = det > 1e-12 * max(mm, 1e-300) * np.maximum(ss, 1e-300)
+        safe_det = np.where(has_sector, det, 1.0)
+        beta_market = np.where(has_sector, (ss * mr - ms * sr) / safe_det, mr / mm if mm > 0 else 0.0)
+        beta_sector = np.where(has_sector, (mm * sr - ms * mr) / safe_det, 0.0)
+
+        residual = rc - np.outer(mc, beta_market) - sc[:, sector_idx] * beta_sector
+        dof = max(n_periods - 3, 1)
+        specific = (residual ** 2).sum(axis=0) / dof
+        specific = np.maximum(specific, 1e-4 * rc.var(axis=0) + 1e-12)
+
+        loadings = np.zeros((n_assets, 1 + n_sectors))
+        loadings[:, 0] = beta_market
+        loadings[np.arange(n_assets), 1 + sector_idx] = beta_sector
+
+        factor_matrix = np.column_stack([mc, sc])
+        factor_cov = factor_matrix.T @ factor_matrix / max(n_periods - 1, 1)
+
+        factors = [MARKET_FACTOR] + sector_names.tolist()
+        factor_returns = pd.DataFrame(np.column_stack([market, sector_factors]),
+                                      index=returns.index, columns=factors)
+        logger.info(f"[FACTOR_MODEL] {n_assets} ma, {n_sectors} nganh, {n_periods} phien")
+        return cls(tickers, loadings, factor_cov * annualize, specific * annualize,
+                   factors, labels.to_dict(), factor_returns)
+
+    @classmethod
+    def from_prices(cls, prices: pd.DataFrame, sector_map: Dict[str, str],
+                    min_coverage: float = 0.8, **kwargs) -> 'SectorFactorModel':
+        """Ước lượng trực tiếp từ bảng giá (loại mã thiếu dữ liệu như large_universe)."""
+        return cls.fit(clean_universe_returns(prices, min_coverage), sector_map, **kwargs)
+
+    def subset(self, tickers) -> 'SectorFactorModel':
+        base = super().subset(tickers)
+        return SectorFactorModel(base.tickers, base.loadings, self.factor_cov, base.specific_var,
+                                 self.factors, {t: self.sectors[t] for t in base.tickers},
+                                 self.factor_returns)
+
+    def variance_decomposition(self, weights: np.ndarray) -> Dict[str, float]:
+        """Tách phương sai danh mục thành phần thị trường, ngành và riêng."""
+        weights = np.asarray(weights, dtype=float)
+        exposure = self.loadings.T @ weights
+        factor_part = exposure * (self.factor_cov @ exposure)
+        return {
+            'market': float(factor_part[0]),
+            'sector': float(factor_part[1:].sum()),
+            'specific': float(np.dot(self.specific_var, weights ** 2)),
+        }
+
+    def exposures(self, weights: np.ndarray) -> pd.Series:
+        """Phơi nhiễm của danh mục với từng nhân tố (B'w)."""
+        return pd.Series(self.loadings.T @ np.asarray(weights, dtype=float), index=self.factors)
+
+    def __repr__(self) -> str:
+        return f"SectorFactorModel({len(self.tickers)} ma, {len(self.factors) - 1} nganh)"
+
+
+__all__ = [
+    'MARKET_FACTOR',
+    'OTHER_SECTOR',
+    'SectorFactorModel',
+]
@@ -0,0 +1,294 @@
+"""
+Module hrp.py
+Hierarchical Risk Parity bằng numpy.
+
+HRPOpt của PyPortfolioOpt chia đôi cụm bằng các phép .loc của pandas cho từng cụm, chiếm
+phần lớn thời gian khi phải tối ưu lặp lại nhiều lần (walk-forward). Các hàm ở đây cho
+cùng kết quả nhưng làm việc trực tiếp trên mảng.
+
+Cây phân cấp (tương quan, khoảng cách, linkage) của một bộ giá được tính một lần cho mỗi
+(hash giá, bộ ước lượng, phương pháp liên kết) và dùng chung cho mô hình HRP, dendrogram và
+heatmap tương quan. Ma trận khoảng cách được dùng lại giữa các phương pháp liên kết, nên so
+sánh single/ward/average chỉ tốn thêm bước linkage.
+"""
+
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.cluster.hierarchy as sch
+from scipy.spatial.distance import squareform
+
+from optimization.covariance import covariance_matrix, prices_hash
+
+HRP_LINKAGE_METHODS = {
+    'single': 'Single (liên kết đơn)',
+    'average': 'Average (liên kết trung bình)',
+    'complete': 'Complete (liên kết đầy đủ)',
+    'ward': 'Ward (tối thiểu phương sai cụm)',
+}
+DEFAULT_HRP_LINKAGE = 'single'
+COMPARE_LINKAGE_METHODS = ('single', 'ward', 'average')
+
+# Từ kích thước này, chia đôi đệ quy dùng bản vector hóa theo từng cấp của cây
+VECTORIZED_BISECTION_MIN_ASSETS = 64
+
+_CACHE_MAXSIZE = 32
+
+_distance_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_tree_cache: "OrderedDict[tuple, HRPTree]" = OrderedDict()
+
+
+def cov_to_corr(cov: np.ndarray) -> np.ndarray:
+    """Ma trận tương quan từ ma trận hiệp phương sai."""
+    std = np.sqrt(np.clip(np.diag(cov), 1e-18, None))
+    corr = cov / np.outer(std, std)
+    np.fill_diagonal(corr, 1.0)
+    return np.clip(corr, -1.0, 1.0)
+
+
+def correlation_distance(corr: np.ndarray) -> np.ndarray:
+    """Khoảng cách sqrt((1 - rho) / 2) dạng condensed cho scipy.linkage."""
+    matrix = np.sqrt(np.clip((1.0 - corr) / 2.0, 0.0, 1.0))
+    return squareform(matrix, checks=False)
+
+
+def hrp_linkage(cov: np.ndarray, linkage_method: str = 'single') -> Tuple[np.ndarray, np.ndarray]:
+    """Ma trận linkage và thứ tự lá (quasi-diagonal) của cây phân cấp."""
+    linkage = sch.linkage(correlation_distance(cov_to_corr(cov)), linkage_method)
+    return linkage, sch.leaves_list(linkage)
+
+
+def recursive_bisection(cov: np.ndarray, order: np.ndarray) -> np.ndarray:
+    """
+    Chia đôi đệ quy theo thứ tự lá, phân bổ nghịch đảo phương sai giữa hai nửa.
+
+    Trọng số của cả hai nửa ở mọi cấp được cập nhật cùng lúc, nên số vòng lặp Python chỉ
+    bằng độ sâu của cây (log2 N) thay vì số cụm.
+    """
+    n_assets = len(order)
+    weights = np.ones(n_assets)
+    inv_var = 1.0 / np.clip(np.diag(cov), 1e-18, None)
+    clusters = [order]
+    while clusters:
+        next_clusters = []
+        for cluster in clusters:
+            if len(cluster) <= 1:
+                continue
+            half = len(cluster) // 2
+            left, right = cluster[:half], cluster[half:]
+            left_var = _cluster_variance(cov, inv_var, left)
+            right_var = _cluster_variance(cov, inv_var, right)
+            alpha = 1 - left_var / (left_var + right_var)
+            weights[left] *= alpha
+            weights[right] *= 1 - alpha
+            next_clusters.extend((left, right))
+        clusters = next_clusters
+    return weights
+
+
+def _cluster_variance(cov: np.ndarray, inv_var: np.ndarray, members: np.ndarray) -> float:
+    """Phương sai của cụm với tỷ trọng nghịch đảo phương sai trong cụm."""
+    w = inv_var[members] / inv_var[members].sum()
+    return float(w @ cov[np.ix_(members, members)] @ w)
+
+
+def _segment_variances(block_sums: np.ndarray, inv_var_sums: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    Phương sai nghịch đảo phương sai của mọi đoạn liên tiếp [starts[k], starts[k+1]).
+
+    ``block_sums`` là bảng cộng dồn hai chiều của Σ_ij / (σ_i² σ_j²) theo thứ tự lá (có thêm
+    hàng/cột 0 ở đầu), nên tử số của mỗi đoạn là tổng khối vuông trên đường chéo, lấy được
+    bằng bốn phép tra bảng.
+    """
+    ends = np.append(starts[1:], len(inv_var_sums) - 1)
+    numerators = (block_sums[ends, ends] - block_sums[starts, ends]
+                  - block_sums[ends, starts] + block_sums[starts, starts])
+    return numerators / (inv_var_sums[ends] - inv_var_sums[starts]) ** 2
+
+
+def recursive_bisection_vectorized(cov: np.ndarray, order: np.ndarray) -> np.ndarray:
+    """
+    Chia đôi đệ quy như ``recursive_bisection`` nhưng không lặp qua từng cụm.
+
+    Các cụm ở cùng một cấp là các đoạn liên tiếp của thứ tự lá. Sau một lần dựng bảng cộng
+    dồn O(N²), phương sai của tất cả các nửa ở một cấp chỉ tốn O(số cụm), tổng cộng log2 N
+    lượt numpy. Dùng cho universe lớn, nơi vòng lặp Python qua N - 1 cụm và các phép np.ix_
+    chiếm phần lớn thời gian.
+    """
+    order = np.asarray(order)
+    n_assets = len(order)
+    ordered_cov = cov[np.ix_(order, order)]
+    inv_var = 1.0 / np.clip(np.diag(ordered_cov), 1e-18, None)
+    block_sums = np.zeros((n_assets + 1, n_assets + 1))
+    block_sums[1:, 1:] = (ordered_cov * np.outer(inv_var, inv_var)).cumsum(axis=0).cumsum(axis=1)
+    inv_var_sums = np.concatenate([[0.0], inv_var.cumsum()])
+
+    ordered_weights = np.ones(n_assets)
+    starts = np.array([0])
+    while True:
+        lengths = np.diff(np.append(starts, n_assets))
+        splittable = lengths > 1
+        if not splittable.any():
+            break
+        parents = starts[splittable]
+        new_starts = np.sort(np.concatenate([starts, parents + lengths[splittable] // 2]))
+        variances = _segment_variances(block_sums, inv_var_sums, new_starts)
+
+        left = np.searchsorted(new_starts, parents)
+        alpha = 1 - variances[left] / (variances[left] + variances[left + 1])
+        factors = np.ones(len(new_starts))
+        factors[left] = alpha
+        factors[left + 1] = 1 - alpha
+        ordered_weights *= np.repeat(factors, np.diff(np.append(new_starts, n_assets)))
+        starts = new_starts
+
+    weights = np.empty(n_assets)
+    weights[order] = ordered_weights
+    return weights
+
+
+def hrp_weights(cov: np.ndarray, linkage_method: str = 'single', vectorized: Optional[bool] = None) -> np.ndarray:
+    """
+    Trọng số HRP theo thứ tự cột của ``cov``.
+
+    Args:
+        cov: Ma trận hiệp phương sai
+        linkage_method: Phương pháp liên kết của scipy (xem HRP_LINKAGE_METHODS)
+        vectorized: Dùng chia đôi vector hóa; None để tự chọn theo số mã
+    """
+    cov = np.asarray(cov, dtype=float)
+    _, order = hrp_linkage(cov, linkage_method)
+    if vectorized is None:
+        vectorized = len(order) >= VECTORIZED_BISECTION_MIN_ASSETS
+    bisection = recursive_bisection_vectorized if vectorized else recursive_bisection
+    return bisection(cov, order)
+
+
+class HRPTree:
+    """
+    Cây phân cấp của một bộ giá: ma trận hiệp phương sai, tương quan, khoảng cách và linkage.
+
+    Đối tượng được dùng chung qua cache, không sửa các thuộc tính của nó.
+    """
+
+    def __init__(self, cov: pd.DataFrame, corr: pd.DataFrame, distance: np.ndarray,
+                 linkage: np.ndarray, linkage_method: str):
+        self.cov = cov
+        self.corr = corr
+        self.distance = distance
+        self.linkage = linkage
+        self.linkage_method = linkage_method
+        self.order = sch.leaves_list(linkage)
+        self._weights = None
+
+    @property
+    def tickers(self) -> list:
+        return self.cov.columns.tolist()
+
+    @property
+    def ordered_tickers(self) -> list:
+        """Các mã theo thứ tự lá (quasi-diagonal)."""
+        return self.cov.columns[self.order].tolist()
+
+    def weights(self, vectorized: Optional[bool] = None) -> pd.Series:
+        """Trọng số HRP trên cây này (tính một lần)."""
+        if self._weights is None:
+            cov = self.cov.to_numpy()
+            if vectorized is None:
+                vectorized = len(self.order) >= VECTORIZED_BISECTION_MIN_ASSETS
+            bisection = recursive_bisection_vectorized if vectorized else recursive_bisection
+            self._weights = pd.Series(bisection(cov, self.order), index=self.cov.columns)
+        return self._weights
+
+    def dendrogram(self) -> dict:
+        """Tọa độ dendrogram của scipy (không vẽ) với nhãn là mã cổ phiếu."""
+        return sch.dendrogram(self.linkage, labels=self.tickers, no_plot=True)
+
+
+def _distance(key: tuple, cov: pd.DataFrame) -> tuple:
+    """Tương quan và khoảng cách condensed, dùng chung giữa các phương pháp liên kết."""
+    if key in _distance_cache:
+        _distance_cache.move_to_end(key)
+        return _distance_cache[key]
+    corr = pd.DataFrame(cov_to_corr(cov.to_numpy()), index=cov.index, columns=cov.columns)
+    entry = (corr, correlation_distance(corr.to_numpy()))
+    _distance_cache[key] = entry
+    if len(_distance_cache) > _CACHE_MAXSIZE:
+        _distance_cache.popitem(last=False)
+    return entry
+
+
+def hrp_tree(prices: pd.DataFrame, linkage_method: str = DEFAULT_HRP_LINKAGE,
+             cov_estimator: Optional[str] = None, price_key: Optional[str] = None) -> HRPTree:
+    """
+    Cây phân cấp HRP của ``prices``, có cache theo (hash giá, bộ ước lượng, phương pháp liên kết).
+
+    Args:
+        prices (pd.DataFrame): Giá đóng cửa (phiên x mã)
+        linkage_method (str): Phương pháp liên kết (xem HRP_LINKAGE_METHODS)
+        cov_estimator (str): Bộ ước lượng hiệp phương sai (xem optimization.covariance)
+        price_key (str): Hash của ``prices`` nếu đã tính (tránh băm lại khi gọi nhiều phương pháp)
+
+    Returns:
+        HRPTree: Cây dùng chung cho mô hình và các biểu đồ
+    """
+    if linkage_method not in HRP_LINKAGE_METHODS:
+        raise ValueError(f"Phuong phap lien ket khong hop le: {linkage_method}")
+    price_key = price_key or prices_hash(prices)
+    key = (price_key, cov_estimator, linkage_method)
+    if key in _tree_cache:
+        _tree_cache.move_to_end(key)
+        return _tree_cache[key]
+
+    cov = covariance_matrix(prices, cov_estimator)
+    corr, distance = _distance((price_key, cov_estimator), cov)
+    tree = HRPTree(cov, corr, distance, sch.linkage(distance, linkage_method), linkage_method)
+
+    _tree_cache[key] = tree
+    if len(_tree_cache) > _CACHE_MAXSIZE:
+        _tree_cache.popitem(last=False)
+    return tree
+
+
+def compare_linkage_methods(prices: pd.DataFrame, methods: Iterable[str] = COMPARE_LINKAGE_METHODS,
+                            cov_estimator: Optional[str] = None) -> pd.DataFrame:
+    """
+    Trọng số HRP của nhiều phương pháp liên kết trong một lượt.
+
+    Giá chỉ được băm một lần; hiệp phương sai và ma trận khoảng cách được dùng chung, mỗi
+    phương pháp chỉ thêm một lần linkage và một lần chia đôi.
+
+    Returns:
+        pd.DataFrame: Mã x phương pháp liên kết
+    """
+    price_key = prices_hash(prices)
+    return pd.DataFrame({
+        method: hrp_tree(prices, method, cov_estimator, price_key=price_key).weights()
+        for method in methods
+    })
+
+
+def clear_hrp_cache():
+    """Xóa cache cây phân cấp (ví dụ sau khi cập nhật dữ liệu giá)."""
+    _distance_cache.clear()
+    _tree_cache.clear()
+
+
+__all__ = [
+    'HRP_LINKAGE_METHODS',
+    'DEFAULT_HRP_LINKAGE',
+    'COMPARE_LINKAGE_METHODS',
+    'VECTORIZED_BISECTION_MIN_ASSETS',
+    'cov_to_corr',
+    'correlation_distance',
+    'hrp_linkage',
+    'recursive_bisection',
+    'recursive_bisection_vectorized',
+    'hrp_weights',
+    'HRPTree',
+    'hrp_tree',
+    'compare_linkage_methods',
+    'clear_hrp_cache',
+]
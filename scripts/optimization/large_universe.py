@@ -0,0 +1,379 @@
+"""
+Module large_universe.py
+Tối ưu hóa danh mục trên toàn bộ một sàn (500+ mã) thay vì một rổ mã chọn tay.
+
+Ma trận hiệp phương sai N x N dày đặc được thay bằng dạng hạng thấp B F B' + D (nhân tố
+thống kê từ SVD, hoặc thị trường + ngành ICB trong factor_model), nên bài toán QP chỉ có
+N biến trọng số cộng K biến nhân tố. Ràng buộc trần tỷ trọng theo ngành (icb_name) là
+tuyến tính; giới hạn số mã nắm giữ được xử lý bằng cách giải bài toán nới lỏng rồi tỉa
+dần tập mã và giải lại trên tập nhỏ hơn.
+"""
+
+import logging
+import time
+from typing import Dict, Iterable, Optional
+
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+DEFAULT_N_FACTORS = 20
+# Thứ tự solver thử cho bài toán QP cỡ lớn (đều hỗ trợ ma trận thưa)
+LARGE_UNIVERSE_SOLVERS = ('CLARABEL', 'OSQP', 'SCS')
+
+
+class LowRankCovariance:
+    """
+    Hiệp phương sai dạng nhân tố: Sigma = B F B' + diag(d).
+
+    Mọi phép tính rủi ro danh mục chỉ tốn O(N*K) thay vì O(N^2).
+
+    Attributes:
+        tickers (list): Danh sách mã theo thứ tự dòng của B
+        loadings (np.ndarray): Ma trận hệ số tải B (N x K)
+        factor_cov (np.ndarray): Hiệp phương sai nhân tố F (K x K)
+        specific_var (np.ndarray): Phương sai riêng d (N)
+    """
+
+    def __init__(self, tickers, loadings: np.ndarray, factor_cov: np.ndarray, specific_var: np.ndarray):
+        self.tickers = list(tickers)
+        self.loadings = np.asarray(loadings, dtype=float)
+        self.factor_cov = np.asarray(factor_cov, dtype=float)
+        self.specific_var = np.asarray(specific_var, dtype=float)
+
+    @property
+    def n_factors(self) -> int:
+        return self.loadings.shape[1]
+
+    def subset(self, tickers: Iterable[str]) -> 'LowRankCovariance':
+        """Mô hình thu gọn trên một tập con mã."""
+        position = {t: i for i, t in enumerate(self.tickers)}
+        idx = np.array([position[t] for t in tickers], dtype=int)
+        return LowRankCovariance([self.tickers[i] for i in idx], self.loadings[idx],
+                                 self.factor_cov, self.specific_var[idx])
+
+    def portfolio_variance(self, weights: np.ndarray) -> float:
+        """w' Sigma w tính qua phơi nhiễm nhân tố B'w."""
+        weights = np.asarray(weights, dtype=float)
+        exposure = self.loadings.T @ weights
+        return float(exposure @ self.factor_cov @ exposure + np.dot(self.specific_var, weights ** 2))
+
+    def gradient(self, weights: np.ndarray) -> np.ndarray:
+        """Gradient 2 * Sigma w của phương sai danh mục."""
+        weights = np.asarray(weights, dtype=float)
+        exposure = self.loadings.T @ weights
+        return 2.0 * (self.loadings @ (self.factor_cov @ exposure) + self.specific_var * weights)
+
+    def to_dense(self) -> pd.DataFrame:
+        """Ma trận N x N đầy đủ (chỉ nên dùng cho rổ nhỏ)."""
+        dense = self.loadings @ self.factor_cov @ self.loadings.T + np.diag(self.specific_var)
+        return pd.DataFrame(dense, index=self.tickers, columns=self.tickers)
+
+    def __repr__(self) -> str:
+        return f"LowRankCovariance({len(self.tickers)} ma, {self.n_factors} nhan to)"
+
+
+def get_sector_map(tickers: Iterable[str], company_info: pd.DataFrame) -> Dict[str, str]:
+    """Tra ngành (icb_name) của từng mã từ company_info.csv."""
+    if company_info is None or company_info.empty or 'icb_name' not in company_info.columns:
+        return {}
+    mapping = (
+        company_info.assign(symbol=company_info['symbol'].astype(str).str.upper())
+        .drop_duplicates('symbol')
+        .set_index('symbol')['icb_name']
+    )
+    return {t: mapping[t] for t in tickers if t in mapping.index and pd.notna(mapping[t])}
+
+
+def universe_from_company_info(company_info: pd.DataFrame, exchanges=('HOSE',)) -> list:
+    """Toàn bộ mã của các sàn được chọn trong company_info.csv."""
+    mask = company_info['exchange'].astype(str).str.upper().isin([e.upper() for e in exchanges])
+    return company_info.loc[mask, 'symbol'].astype(str).str.upper().drop_duplicates().tolist()
+
+
+def clean_universe_returns(prices: pd.DataFrame, min_coverage: float = 0.8) -> pd.DataFrame:
+    """
+    Lợi suất ngày của các mã có đủ dữ liệu.
+
+    Mã có ít hơn ``min_coverage`` số phiên có giá hoặc giá không đổi bị loại; các ô thiếu
+    còn lại được coi là lợi suất 0 (không giao dịch).
+    """
+    coverage = prices.notna().mean()
+    prices = prices.loc[:, coverage >= min_coverage]
+    returns = prices.ffill().pct_change(fill_method=None).iloc[1:]
+    returns = returns.replace([np.inf, -np.inf], np.nan).fillna(0.0)
+    return returns.loc[:, returns.std() > 0]
+
+
+def low_rank_covariance(returns: pd.DataFrame, n_factors: int = DEFAULT_N_FACTORS,
+                        annualize: int = TRADING_DAYS) -> LowRankCovariance:
+    """
+    Ước lượng Sigma = B F B' + D bằng K thành phần chính của ma trận lợi suất.
+
+    Phương sai riêng là phần phương sai mẫu không được K nhân tố giải thích, nên đường
+    chéo của mô hình khớp đúng phương sai mẫu của từng mã.
+    """
+    x = returns.to_numpy(dtype=float)
+    x = x - x.mean(axis=0)
+    n_periods = max(len(x) - 1, 1)
+    k = int(min(n_factors, min(x.shape) - 1)) if min(x.shape) > 1 else 0
+
+    total_var = (x ** 2).sum(axis=0) / n_periods
+    if k <= 0:
+        return LowRankCovariance(returns.columns, np.zeros((x.shape[1], 0)), np.zeros((0, 0)),
+                                 total_var * annualize)
+
+    # SVD rút gọn: chỉ cần K vector riêng lớn nhất
+    _, singular, vt = np.linalg.svd(x, full_matrices=False)
+    loadings = vt[:k].T
+    factor_var = singular[:k] ** 2 / n_periods
+    explained = (loadings ** 2) @ factor_var
+    specific = np.maximum(total_var - explained, total_var * 1e-3)
+
+    return LowRankCovariance(returns.columns, loadings, np.diag(factor_var) * annualize,
+                             specific * annualize)
+
+
+def _factor_sqrt(factor_cov: np.ndarray) -> np.ndarray:
+    """L với L L' = F (F nửa xác định dương)."""
+    if factor_cov.size == 0:
+        return factor_cov
+    if np.allclose(factor_cov, np.diag(np.diag(factor_cov))):
+        return np.diag(np.sqrt(np.clip(np.diag(factor_cov), 0, None)))
+    eigval, eigvec = np.linalg.eigh(factor_cov)
+    return eigvec * np.sqrt(np.clip(eigval, 0, None))
+
+
+def _sector_slots(sector_cap: float, max_weight: float) -> int:
+    """Số mã của một ngành có thể nhận đủ ``max_weight`` mà không vượt trần ngành."""
+    return int(sector_cap / max_weight + 1e-9)
+
+
+def max_total_weight(sectors: Iterable[str], max_assets: int, max_weight: float,
+                     sector_cap: Optional[float]) -> float:
+    """
+    Tổng tỷ trọng lớn nhất đạt được khi nắm giữ tối đa ``max_assets`` mã.
+
+    Mỗi mã nhận tối đa ``max_weight``, mỗi ngành tối đa ``sector_cap``: trong một ngành,
+    ``sector_cap // max_weight`` mã đầu nhận đủ ``max_weight``, mã kế tiếp chỉ nhận phần
+    trần còn lại; chọn ``max_assets`` phần đóng góp lớn nhất trên mọi ngành.
+
+    Args:
+        sectors (Iterable[str]): Ngành của từng mã trong universe
+    """
+    sectors = list(sectors)
+    if sector_cap is None:
+        return min(max_assets, len(sectors)) * max_weight
+    slots = _sector_slots(sector_cap, max_weight)
+    remainder = sector_cap - slots * max_weight
+    contributions = []
+    for count in pd.Series(sectors, dtype=object).fillna('Khác').value_counts():
+        full = min(count, slots)
+        contributions += [max_weight] * full
+        if count > full and remainder > 1e-9:
+            contributions.append(remainder)
+    return float(sum(sorted(contributions, reverse=True)[:max_assets]))
+
+
+def _solve_qp(model: LowRankCovariance, mu: np.ndarray, risk_aversion: Optional[float],
+              max_weight: float, sectors: Optional[list], sector_cap: Optional[float],
+              solvers=LARGE_UNIVERSE_SOLVERS) -> np.ndarray:
+    """
+    QP dạng nhân tố trên các mã của ``model``:
+        min  risk_aversion / 2 * (||L' B' w||^2 + sum d_i w_i^2) - mu'w   (hoặc chỉ rủi ro)
+        s.t. sum w = 1, 0 <= w <= max_weight, tổng tỷ trọng mỗi ngành <= sector_cap.
+    """
+    n_assets = len(model.tickers)
+    w = cp.Variable(n_assets)
+    risk = cp.sum_squares(cp.multiply(np.sqrt(model.specific_var), w))
+    if model.n_factors:
+        risk = risk + cp.sum_squares((model.loadings @ _factor_sqrt(model.factor_cov)).T @ w)
+
+    objective = risk
+    if risk_aversion is not None and mu is not None:
+        objective = risk_aversion / 2 * risk - mu @ w
+
+    constraints = [cp.sum(w) == 1, w >= 0, w <= max_weight]
+    if sectors is not None and sector_cap is not None:
+        labels = pd.Series(sectors).fillna('Khác')
+        for sector in labels.unique():
+            members = np.flatnonzero((labels == sector).to_numpy())
+            if len(members) * max_weight > sector_cap:
+                constraints.append(cp.sum(w[members]) <= sector_cap)
+
+    problem = cp.Problem(cp.Minimize(objective), constraints)
+    last_error = None
+    for solver in solvers:
+        if solver not in cp.installed_solvers():
+            continue
+        try:
+            problem.solve(solver=solver)
+        except cp.error.SolverError as exc:
+            last_error = exc
+            continue
+        if problem.status in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE) and w.value is not None:
+            weights = np.clip(w.value, 0, None)
+            return weights / weights.sum()
+        last_error = problem.status
+    raise ValueError(f"Khong giai duoc bai toan toi uu co lon: {last_error}")
+
+
+def optimize_large_universe(prices: pd.DataFrame, sector_map: Optional[Dict[str, str]] = None,
+                            max_assets: int = 30, max_weight: float = 0.10,
+                            sector_cap: Optional[float] = 0.30, risk_aversion: Optional[float] = None,
+                            n_factors: int = DEFAULT_N_FACTORS, risk_model: str = 'pca',
+                            min_coverage: float = 0.8,
+                            min_weight: float = 1e-4, max_prune_rounds: int = 10,
+                            risk_free_rate: float = 0.02) -> dict:
+    """
+    Tối ưu danh mục trên toàn bộ universe với giới hạn số mã và trần tỷ trọng ngành.
+
+    Args:
+        prices (pd.DataFrame): Giá đóng cửa (phiên x mã), có thể có ô trống
+        sector_map (dict): Ngành (icb_name) của từng mã
+        max_assets (int): Số mã nắm giữ tối đa
+        max_weight (float): Tỷ trọng tối đa của một mã
+        sector_cap (float): Tổng tỷ trọng tối đa của một ngành (None: không giới hạn)
+        risk_aversion (float): None để tối thiểu hóa rủi ro; số dương để tối ưu
+            trung bình - phương sai (càng lớn càng ưu tiên giảm rủi ro)
+        n_factors (int): Số nhân tố thống kê của ma trận hiệp phương sai
+        risk_model (str): 'pca' (nhân tố thống kê) hoặc 'sector' (thị trường + ngành ICB,
+            xem optimization.factor_model)
+        min_coverage (float): Tỷ lệ phiên có giá tối thiểu để giữ một mã
+        min_weight (float): Ngưỡng coi trọng số là 0
+        max_prune_rounds (int): Số vòng tỉa tập mã tối đa
+        risk_free_rate (float): Lãi suất phi rủi ro để tính Sharpe
+
+    Returns:
+        dict: Trọng số, hiệu suất, phân bổ theo ngành và thời gian từng bước
+    """
+    if max_assets * max_weight < 1 - 1e-9:
+        raise ValueError(f"max_assets * max_weight = {max_assets} * {max_weight:.2%} < 1: "
+                         "khong the dat tong trong so bang 1")
+
+    timings = {}
+    start = time.perf_counter()
+    returns = clean_universe_returns(prices, min_coverage)
+    tickers = returns.columns.tolist()
+    sector_map = sector_map or {}
+    reachable = max_total_weight([sector_map.get(t, 'Khác') for t in tickers], max_assets, max_weight, sector_cap)
+    if reachable < 1 - 1e-9:
+        raise ValueError(
+            f"Khong the dat tong trong so 1: voi max_assets={max_assets}, max_weight={max_weight:.2%}, "
+            f"sector_cap={sector_cap:.2%} va {len(tickers)} ma hop le, tong toi da chi la {reachable:.2%}"
+            if sector_cap is not None else
+            f"Khong the dat tong trong so 1: chi co {len(tickers)} ma hop le, "
+            f"tong toi da {reachable:.2%} voi max_weight={max_weight:.2%}"
+        )
+    mu = returns.mean().to_numpy() * TRADING_DAYS
+    timings["Dữ liệu"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if risk_model == 'sector':
+        from optimization.factor_model import SectorFactorModel
+
+        model = SectorFactorModel.fit(returns, sector_map)
+    elif risk_model == 'pca':
+        model = low_rank_covariance(returns, n_factors)
+    else:
+        raise ValueError(f"Mo hinh rui ro khong hop le: {risk_model}")
+    timings["Hiệp phương sai"] = time.perf_counter() - start
+
+    def solve_on(selected):
+        sub_model = model.subset([tickers[i] for i in selected])
+        sub_sectors = [sector_map.get(tickers[i]) for i in selected] if sector_cap is not None else None
+        return _solve_qp(sub_model, mu[selected], risk_aversion, max_weight, sub_sectors, sector_cap)
+
+    start = time.perf_counter()
+    selected = np.arange(len(tickers))
+    weights = solve_on(selected)
+    timings["Tối ưu nới lỏng"] = time.perf_counter() - start
+
+    slots = _sector_slots(sector_cap, max_weight) if sector_cap is not None else None
+    has_remainder = sector_cap is not None and sector_cap - slots * max_weight > 1e-9
+
+    def top_names(weights, selected, keep):
+        """
+        Các mã có trọng số lớn nhất, mỗi ngành không quá số mã lấp được trần ngành.
+
+        Mã nhận đủ max_weight được ưu tiên; mã chỉ nhận phần trần còn lại của ngành
+        (tối đa một mã mỗi ngành) được thêm vào nếu còn chỗ. Không bổ sung mã vượt trần,
+        nên tập trả về có thể ít hơn ``keep`` mã.
+        """
+        ranked = selected[np.argsort(weights)[::-1]]
+        if sector_cap is None:
+            return np.sort(ranked[:keep])
+        chosen, partial, counts = [], [], {}
+        for idx in ranked:
+            sector = sector_map.get(tickers[idx], 'Khác')
+            count = counts.get(sector, 0)
+            if count < slots:
+                chosen.append(idx)
+            elif count == slots and has_remainder:
+                partial.append(idx)
+            else:
+                continue
+            counts[sector] = count + 1
+            if len(chosen) == keep:
+                break
+        chosen += partial[:keep - len(chosen)]
+        return np.sort(np.array(chosen, dtype=int))
+
+    # Tỉa dần: giữ các mã có trọng số lớn nhất rồi giải lại trên tập nhỏ hơn, cho tới khi
+    # số mã có trọng số dương không vượt quá max_assets
+    start = time.perf_counter()
+    rounds = 0
+    while (weights > min_weight).sum() > max_assets and rounds < max_prune_rounds:
+        rounds += 1
+        n_active = int((weights > min_weight).sum())
+        selected = top_names(weights, selected, max(max_assets, n_active // 2))
+        weights = solve_on(selected)
+    if (weights > min_weight).sum() > max_assets:
+        selected = top_names(weights, selected, max_assets)
+        weights = solve_on(selected)
+    timings["Giới hạn số mã"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    weights = np.where(weights > min_weight, weights, 0.0)
+    weights /= weights.sum()
+    chosen = [tickers[i] for i in selected]
+    weight_dict = {t: float(w) for t, w in zip(chosen, weights) if w > 0}
+    final_model = model.subset(list(weight_dict))
+    final_w = np.array(list(weight_dict.values()))
+    volatility = float(np.sqrt(max(final_model.portfolio_variance(final_w), 0)))
+    expected_return = float(pd.Series(mu, index=tickers)[list(weight_dict)].to_numpy() @ final_w)
+    sector_weights = (
+        pd.Series(weight_dict).groupby(lambda t: sector_map.get(t, 'Khác')).sum()
+        .sort_values(ascending=False).to_dict()
+    )
+    timings["Tổng hợp"] = time.perf_counter() - start
+
+    logger.info(
+        f"[LARGE_UNIVERSE] {len(tickers)} ma -> {len(weight_dict)} ma sau {rounds} vong tia, "
+        f"thoi gian: {', '.join(f'{k}={v:.3f}s' for k, v in timings.items())}"
+    )
+
+    return {
+        "Trọng số danh mục": weight_dict,
+        "Lợi nhuận kỳ vọng": expected_return,
+        "Rủi ro (Độ lệch chuẩn)": volatility,
+        "Tỷ lệ Sharpe": (expected_return - risk_free_rate) / volatility if volatility > 0 else 0.0,
+        "Tỷ trọng theo ngành": sector_weights,
+        "Số mã xét": len(tickers),
+        "Thời gian theo bước": timings,
+    }
+
+
+__all__ = [
+    'LowRankCovariance',
+    'LARGE_UNIVERSE_SOLVERS',
+    'get_sector_map',
+    'universe_from_company_info',
+    'clean_universe_returns',
+    'low_rank_covariance',
+    'max_total_weight',
+    'optimize_large_universe',
+]
@@ -0,0 +1,1013 @@
+"""
+Module models.py
+Lõi tính toán các mô hình tối ưu hóa danh mục đầu tư: Markowitz, Max Sharpe, Min Volatility, Min CVaR, Min CDaR, HRP,
+Risk Parity (ngân sách rủi ro), đường biên lấy mẫu lại (Michaud), tái cân bằng danh mục hiện có và chế độ tối ưu trên toàn bộ sàn (large universe).
+
+Module không import giao diện (streamlit) nên dùng được trong tiến trình con, batch job và benchmark.
+Lỗi được ghi log và mô hình trả về None; lớp giao diện tự quyết định cách thông báo.
+"""
+
+import functools
+import numpy as np
+import pandas as pd
+import logging
+from pypfopt import (
+    EfficientFrontier, 
+    expected_returns, 
+    EfficientCVaR, 
+    EfficientCDaR
+)
+from optimization.price_snapshot import PriceSnapshot
+from optimization import analytics
+from optimization.results import MAX_DRAWDOWN_KEY, OptimizationResult, PortfolioCloud
+from optimization.covariance import covariance_matrix
+from optimization.scenarios import (
+    DEFAULT_SCENARIO_TOL,
+    SCENARIO_REDUCTION_MIN_ROWS,
+    min_cvar_reduced
+)
+from optimization.hrp import COMPARE_LINKAGE_METHODS, DEFAULT_HRP_LINKAGE, compare_linkage_methods, hrp_tree
+from optimization.large_universe import optimize_large_universe
+from optimization.rebalance import DEFAULT_TURNOVER_PENALTY, rebalance_portfolio
+from optimization.resampled import DEFAULT_RESAMPLES, point_frontier, resampled_frontier
+from optimization.risk_budgeting import (
+    aggregate_by_sector,
+    risk_budget_weights,
+    risk_contributions,
+    sector_risk_budgets
+)
+from optimization.allocation import (
+    allocate_shares,
+    get_lot_sizes,
+    round_to_price_step,
+    solve_integer_least_squares,
+    tracking_error
+)
+
+# Cấu hình logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+def _resolve_price_snapshot(price_snapshot, tickers, get_latest_prices_func, reference_prices=None):
+    """Dùng ảnh chụp giá được truyền vào, hoặc chụp mới nếu mô hình được gọi riêng lẻ."""
+    if price_snapshot is None:
+        price_snapshot = PriceSnapshot.capture(tickers, get_latest_prices_func, reference_prices)
+    return price_snapshot
+
+
+def _with_history_metrics(model):
+    """Bổ sung mức sụt giảm tối đa trong mẫu (trọng số tối ưu trên chính dữ liệu giá) vào kết quả."""
+    @functools.wraps(model)
+    def wrapper(data, *args, **kwargs):
+        result = model(data, *args, **kwargs)
+        if isinstance(result, OptimizationResult) and result.weights:
+            try:
+                weights = pd.Series(result.weights, dtype=float)
+                returns = data.reindex(columns=weights.index).ffill().pct_change().iloc[1:]
+                result[MAX_DRAWDOWN_KEY] = analytics.max_drawdown(returns.to_numpy() @ weights.to_numpy())
+            except Exception as e:
+                logger.warning(f"Khong the tinh muc sut giam toi da cho {result.model}: {e}")
+        return result
+    return wrapper
+
+
+def optimize_hrp_allocation(target_weights, prices, total_investment, exchanges=None):
+    """
+    Tối ưu hóa phân bổ cổ phiếu cho HRP bằng cách tối thiểu hóa
+    tổng bình phương sai số giữa trọng số mục tiêu và trọng số thực tế.
+    Bộ giải dùng chung với các mô hình khác qua optimization.allocation.
+    
+    Args:
+        target_weights (dict): Trọng số HRP mục tiêu {ticker: weight}
+        prices (dict): Giá cổ phiếu {ticker: price}
+        total_investment (float): Tổng số tiền đầu tư
+        exchanges (dict): Sàn của từng mã {ticker: exchange}; nếu có, phân bổ theo lô chẵn
+            và giá được làm tròn lên theo bước giá của sàn
+    
+    Returns:
+        tuple: (allocation_dict, leftover)
+    """
+    logger.info("=" * 60)
+    logger.info("BAT DAU TOI UU PHAN BO HRP")
+    logger.info(f"So tien dau tu: {total_investment:,.0f} VND")
+    logger.info(f"Trong so muc tieu: {target_weights}")
+    logger.info(f"Gia co phieu: {prices}")
+    
+    if exchanges:
+        prices = round_to_price_step(prices, exchanges).to_dict()
+    
+    # Chuyển đổi sang mảng numpy
+    tickers = list(target_weights.keys())
+    n = len(tickers)
+    
+    target_w = np.array([target_weights[t] for t in tickers])
+    price_arr = np.array([prices[t] for t in tickers], dtype=float)
+    lot_sizes = get_lot_sizes(exchanges or {})
+    lots = np.array([lot_sizes.get(t, 1) for t in tickers], dtype=float)
+    
+    # Hàm mục tiêu: Minimize Σ [(a_i - shares_i * price_i)^2] với a_i = target_w_i * total_investment
+    # Đây là bài toán knapsack bậc hai có chặn -> giải bằng nới lỏng Lagrange,
+    # cập nhật lợi ích cận biên vector hóa, có cận dưới để chứng nhận chất lượng nghiệm
+    a = target_w * total_investment
+    
+    # Giải theo đơn vị lô: giá lô = giá * kích thước lô
+    lots_optimal, lower_bound = solve_integer_least_squares(a, price_arr * lots, total_investment)
+    gap = tracking_error(lots_optimal, a, price_arr * lots) - lower_bound
+    shares_optimal = (lots_optimal * lots).astype(int)
+    
+    remaining = total_investment - float(np.dot(shares_optimal, price_arr))
+    logger.info(f"Khoang cach toi da toi nghiem toi uu: {max(gap, 0.0) / total_investment ** 2:.2e} (don vi trong so^2)")
+    
+    # Tạo dictionary kết quả
+    allocation = {tickers[i]: int(shares_optimal[i]) for i in range(n) if shares_optimal[i] > 0}
+    leftover = remaining
+    
+    # Validation
+    total_spent_final = sum(allocation[ticker] * prices[ticker] for ticker in allocation)
+    
+    logger.info("-" * 60)
+    logger.info("KET QUA TOI UU HRP:")
+    logger.info(f"Phan bo: {allocation}")
+    logger.info(f"Tong tien da su dung: {total_spent_final:,.0f} VND")
+    logger.info(f"So tien con lai: {leftover:,.0f} VND")
+    logger.info(f"Tong cong: {total_spent_final + leftover:,.0f} VND")
+    
+    # Tính và hiển thị trọng số thực tế
+    actual_weights = {}
+    for ticker in allocation:
+        actual_value = allocation[ticker] * prices[ticker]
+        actual_weights[ticker] = actual_value / total_investment
+    
+    logger.info("-" * 60)
+    logger.info("SO SANH TRONG SO:")
+    for ticker in tickers:
+        target = target_weights.get(ticker, 0)
+        actual = actual_weights.get(ticker, 0)
+        diff = actual - target
+        logger.info(f"{ticker}: Muc tieu={target:.4f}, Thuc te={actual:.4f}, Chenh lech={diff:+.4f}")
+    
+    # Tính tổng bình phương sai số
+    total_squared_error = sum((actual_weights.get(t, 0) - target_weights.get(t, 0))**2 for t in tickers)
+    logger.info(f"Tong binh phuong sai so: {total_squared_error:.6f}")
+    logger.info("=" * 60)
+    
+    return allocation, leftover
+
+
+def run_integer_programming(weights, latest_prices, total_portfolio_value, exchanges=None):
+    """
+    Tối ưu phân bổ số lượng mã cổ phiếu nguyên theo trọng số mục tiêu.
+
+    Dùng bộ giải chính xác (nới lỏng Lagrange + nhánh cận) thay cho MILP ECOS_BB.
+    Nhánh cận bị giới hạn số nút và thời gian (BNB_MAX_NODES, BNB_TIME_LIMIT); khi
+    hết giới hạn, trả về nghiệm tốt nhất đã tìm được (tham lam + tìm kiếm cục bộ).
+    
+    Args:
+    weights (dict): Trọng số của từng mã cổ phiếu
+    latest_prices (pd.Series): Giá mã cổ phiếu mới nhất
+        total_portfolio_value (float): Tổng giá trị danh mục đầu tư
+        exchanges (dict): Sàn của từng mã {ticker: exchange}; nếu có, phân bổ theo lô chẵn
+            và giá được làm tròn lên theo bước giá của sàn
+        
+    Returns:
+        tuple: (allocation_lp, leftover_lp)
+    """
+    # Validation: Kiểm tra số tiền đầu tư
+    if total_portfolio_value <= 0:
+        logger.error(f"So tien dau tu phai lon hon 0. Nhan duoc: {total_portfolio_value:,.0f} VND")
+        raise ValueError(f"So tien dau tu phai lon hon 0. Nhan duoc: {total_portfolio_value:,.0f} VND")
+    
+    logger.info("=" * 60)
+    logger.info("BAT DAU PHAN BO DANH MUC DAU TU")
+    logger.info(f"So tien dau tu: {total_portfolio_value:,.0f} VND")
+    logger.info(f"Trong so nhan duoc: {weights}")
+    logger.info(f"Tong trong so: {sum(weights.values()) if isinstance(weights, dict) else weights.sum():.6f}")
+    logger.info(f"Gia co phieu nhan duoc: {latest_prices.to_dict() if isinstance(latest_prices, pd.Series) else latest_prices}")
+    
+    lot_sizes = None
+    if exchanges:
+        latest_prices = round_to_price_step(latest_prices, exchanges)
+        lot_sizes = get_lot_sizes(exchanges)
+        logger.info(f"Phan bo theo lo: {lot_sizes}")
+    
+    allocation_lp, leftover_lp = allocate_shares(
+        weights, 
+        latest_prices, 
+        total_portfolio_value,
+        lot_sizes=lot_sizes
+    )
+    
+    # Validation: Kiểm tra kết quả phân bổ
+    total_spent = sum(allocation_lp[ticker] * latest_prices[ticker] for ticker in allocation_lp)
+    total_check = total_spent + leftover_lp
+    
+    logger.info("-" * 60)
+    logger.info("KET QUA PHAN BO:")
+    logger.info(f"Tong tien da su dung: {total_spent:,.0f} VND")
+    logger.info(f"So tien con lai: {leftover_lp:,.0f} VND")
+    logger.info(f"Tong cong (kiem tra): {total_check:,.0f} VND")
+    
+    # Kiểm tra tổng tiền có khớp không
+    if abs(total_check - total_portfolio_value) > 1:  # Cho phép sai số 1 VND
+        logger.warning(f"Co su chenh lech: {abs(total_check - total_portfolio_value):,.0f} VND")
+    else:
+        logger.info("PHAN BO DANH MUC THANH CONG!")
+    logger.info("=" * 60)
+    
+    return allocation_lp, leftover_lp
+
+
+@_with_history_metrics
+def markowitz_optimization(price_data, total_investment, get_latest_prices_func, exchanges=None, price_snapshot=None,
+                           cov_estimator=None):
+    """
+    Mô hình Markowitz: Tối ưu hóa giữa lợi nhuận và rủi ro.
+    
+    Args:
+    price_data (pd.DataFrame): Dữ liệu giá mã cổ phiếu
+    total_investment (float): Tổng số tiền đầu tư
+    get_latest_prices_func (function): Hàm lấy giá mã cổ phiếu mới nhất
+    exchanges (dict): Sàn của từng mã để phân bổ theo lô chẵn (mặc định: từng cổ phiếu)
+    price_snapshot (PriceSnapshot): Ảnh chụp giá dùng chung cho cả lượt chạy (mặc định: chụp mới)
+    cov_estimator (str): Bộ ước lượng hiệp phương sai (xem optimization.covariance)
+        
+    Returns:
+        OptimizationResult: Kết quả tối ưu hóa
+    """
+    logger.info(f"[MARKOWITZ] Nhan total_investment: {total_investment:,.0f} VND")
+    
+    # Tiền xử lý dữ liệu giá để đảm bảo là số và có đủ quan sát
+    cleaned_prices = price_data.copy()
+    cleaned_prices = cleaned_prices.apply(pd.to_numeric, errors='coerce')
+    cleaned_prices = cleaned_prices.ffill().bfill()
+    cleaned_prices = cleaned_prices.dropna(axis=1, how='all')
+
+    # Loại bỏ cột không đủ dữ liệu (ít hơn 2 quan sát hữu ích)
+    cleaned_prices = cleaned_prices.loc[:, cleaned_prices.apply(lambda col: col.notna().sum() >= 2)]
+
+    if cleaned_prices.empty or cleaned_prices.shape[0] < 2:
+        logger.error("Du lieu gia khong hop le hoac khong du quan sat de tinh toan")
+        return None
+
+    tickers = cleaned_prices.columns.tolist()
+    num_assets = len(tickers)
+
+    if num_assets == 0:
+        logger.error("Danh sach ma ma co phieu da chon khong hop le")
+        return None
+
+    log_ret = np.log(cleaned_prices / cleaned_prices.shift(1)).dropna()
+    mean_returns = log_ret.mean() * 252  # Lợi nhuận kỳ vọng hàng năm
+    cov_matrix = covariance_matrix(cleaned_prices, cov_estimator)  # Ma trận hiệp phương sai hàng năm
+
+    # 10,000 danh mục ngẫu nhiên (seed cố định); chỉ giữ tham số, mảng được tái tạo khi vẽ biểu đồ
+    cloud = PortfolioCloud(mean_returns.values, cov_matrix.reindex(index=tickers, columns=tickers).values, 0.02)
+    all_weights, ret_arr, vol_arr, sharpe_arr = cloud.generate()
+
+    max_sharpe_idx = int(sharpe_arr.argmax())
+    optimal_weights = all_weights[max_sharpe_idx]
+
+    weight2 = dict(zip(tickers, optimal_weights))
+    price_snapshot = _resolve_price_snapshot(price_snapshot, tickers, get_latest_prices_func, cleaned_prices)
+    latest_prices_series = price_snapshot.series(tickers)
+    
+    logger.info(f"[MARKOWITZ] Truoc khi gan total_portfolio_value: {total_investment:,.0f} VND")
+    total_portfolio_value = total_investment
+    logger.info(f"[MARKOWITZ] Sau khi gan total_portfolio_value: {total_portfolio_value:,.0f} VND")
+    
+    allocation_lp, leftover_lp = run_integer_programming(
+        weight2, 
+        latest_prices_series, 
+        total_portfolio_value,
+        exchanges=exchanges
+    )
+
+    result = OptimizationResult('markowitz', {
+        "Trọng số danh mục": dict(zip(tickers, optimal_weights)),
+        "Lợi nhuận kỳ vọng": ret_arr[max_sharpe_idx],
+        "Rủi ro (Độ lệch chuẩn)": vol_arr[max_sharpe_idx],
+        "Tỷ lệ Sharpe": sharpe_arr[max_sharpe_idx],
+        "Số mã cổ phiếu cần mua": allocation_lp,
+        "Số tiền còn lại": leftover_lp,
+        "Giá mã cổ phiếu": latest_prices_series.to_dict(),
+        # ret_arr, vol_arr, sharpe_arr, all_weights, max_sharpe_idx cho biểu đồ: lấy từ cloud
+    }, cloud=cloud)
+
+    return result
+
+
+@_with_history_metrics
+def max_sharpe(data, total_investment, get_latest_prices_func, exchanges=None, price_snapshot=None,
+               cov_estimator=None):
+    """
+    Mô hình Max Sharpe Ratio: Tối đa hóa tỷ lệ Sharpe.
+    
+    Args:
+        data (pd.DataFrame): Dữ liệu giá cổ phiếu
+        total_investment (float): Tổng số tiền đầu tư
+        get_latest_prices_func (function): Hàm lấy giá cổ phiếu mới nhất
+        exchanges (dict): Sàn của từng mã để phân bổ theo lô chẵn (mặc định: từng cổ phiếu)
+        price_snapshot (PriceSnapshot): Ảnh chụp giá dùng chung cho cả lượt chạy (mặc định: chụp mới)
+        cov_estimator (str): Bộ ước lượng hiệp phương sai (xem optimization.covariance)
+        
+    Returns:
+        OptimizationResult: Kết quả tối ưu hóa
+    """
+    logger.info(f"[MAX_SHARPE] Nhan total_investment: {total_investment:,.0f} VND")
+    
+    try:
+        tickers = data.columns.tolist()
+        
+        # Tính toán mean returns và covariance matrix
+        mean_returns = expected_returns.mean_historical_return(data)
+        cov_matrix = covariance_matrix(data, cov_estimator)
+
+        # Tối ưu hóa Max Sharpe
+        ef = EfficientFrontier(mean_returns, cov_matrix)
+        weights = ef.max_sharpe()
+        performance = ef.portfolio_performance(verbose=False)
+        cleaned_weights = ef.clean_weights()
+        
+        # Đảm bảo trọng số được chuẩn hóa
+        total_weight = sum(cleaned_weights.values())
+        if abs(total_weight - 1.0) > 1e-5:
+            logger.warning(f"[MAX_SHARPE] Tong trong so truoc khi chuan hoa: {total_weight}")
+            cleaned_weights = {k: v / total_weight for k, v in cleaned_weights.items() if v > 1e-5}
+            logger.info(f"[MAX_SHARPE] Da chuan hoa lai trong so. Tong moi: {sum(cleaned_weights.values())}")
+
+        # 10,000 danh mục ngẫu nhiên để vẽ scatter plot, tái tạo khi cần thay vì lưu
+        log_ret = np.log(data / data.shift(1)).dropna()
+        rf = 0.04  # Risk-free rate 4%
+        cloud = PortfolioCloud((log_ret.mean() * 252).values, cov_matrix.reindex(index=tickers, columns=tickers).values, rf)
+
+        price_snapshot = _resolve_price_snapshot(price_snapshot, tickers, get_latest_prices_func, data)
+        latest_prices_series = price_snapshot.series(tickers)
+        total_portfolio_value = total_investment
+        
+        logger.info(f"[MAX_SHARPE] Truoc khi goi run_integer_programming:")
+        logger.info(f"  - total_portfolio_value: {total_portfolio_value:,.0f} VND")
+        logger.info(f"  - Tong trong so: {sum(cleaned_weights.values()):.6f}")
+        
+        allocation_lp, leftover_lp = run_integer_programming(
+            cleaned_weights, 
+            latest_prices_series, 
+            total_portfolio_value,
+            exchanges=exchanges
+        )
+
+        return OptimizationResult('max_sharpe', {
+            "Trọng số danh mục": cleaned_weights,
+            "Lợi nhuận kỳ vọng": performance[0],
+            "Rủi ro (Độ lệch chuẩn)": performance[1],
+            "Tỷ lệ Sharpe": performance[2],
+            "Số mã cổ phiếu cần mua": allocation_lp,
+            "Số tiền còn lại": leftover_lp,
+            "Giá mã cổ phiếu": latest_prices_series.to_dict(),
+            "risk_free_rate": rf
+        }, cloud=cloud)
+    except Exception as e:
+        logger.error(f"Loi trong mo hinh Max Sharpe: {e}")
+        return None
+
+
+@_with_history_metrics
+def min_volatility(data, total_investment, get_latest_prices_func, exchanges=None, price_snapshot=None,
+                   cov_estimator=None):
+    """
+    Mô hình Min Volatility: Tối thiểu hóa độ lệch chuẩn (rủi ro).
+    
+    Args:
+        data (pd.DataFrame): Dữ liệu giá cổ phiếu
+        total_investment (float): Tổng số tiền đầu tư
+        get_latest_prices_func (function): Hàm lấy giá cổ phiếu mới nhất
+        exchanges (dict): Sàn của từng mã để phân bổ theo lô chẵn (mặc định: từng cổ phiếu)
+        price_snapshot (PriceSnapshot): Ảnh chụp giá dùng chung cho cả lượt chạy (mặc định: chụp mới)
+        cov_estimator (str): Bộ ước lượng hiệp phương sai (xem optimization.covariance)
+        
+    Returns:
+        OptimizationResult: Kết quả tối ưu hóa
+    """
+    logger.info(f"[MIN_VOLATILITY] Nhan total_investment: {total_investment:,.0f} VND")
+    
+    try:
+        tickers = data.columns.tolist()
+        
+        mean_returns = expected_returns.mean_historical_return(data)
+        cov_matrix = covariance_matrix(data, cov_estimator)
+
+        # Tối ưu hóa Min Volatility
+        ef = EfficientFrontier(mean_returns, cov_matrix)
+        weights = ef.min_volatility()
+        performance = ef.portfolio_performance(verbose=False)
+        cleaned_weights = ef.clean_weights()
+        
+        # Đảm bảo trọng số được chuẩn hóa
+        total_weight = sum(cleaned_weights.values())
+        if abs(total_weight - 1.0) > 1e-5:
+            logger.warning(f"[MIN_VOLATILITY] Tong trong so truoc khi chuan hoa: {total_weight}")
+            cleaned_weights = {k: v / total_weight for k, v in cleaned_weights.items() if v > 1e-5}
+            logger.info(f"[MIN_VOLATILITY] Da chuan hoa lai trong so. Tong moi: {sum(cleaned_weights.values())}")
+        
+        # Tối ưu hóa Max Sharpe để so sánh
+        ef_sharpe = EfficientFrontier(mean_returns, cov_matrix)
+        weights_sharpe = ef_sharpe.max_sharpe()
+        performance_sharpe = ef_sharpe.portfolio_performance(verbose=False)
+        cleaned_weights_sharpe = ef_sharpe.clean_weights()
+
+        # 10,000 danh mục ngẫu nhiên để vẽ scatter plot, tái tạo khi cần thay vì lưu
+        log_ret = np.log(data / data.shift(1)).dropna()
+        rf = 0.02  # Risk-free rate 2%
+        cloud = PortfolioCloud((log_ret.mean() * 252).values, cov_matrix.reindex(index=tickers, columns=tickers).values, rf)
+
+        price_snapshot = _resolve_price_snapshot(price_snapshot, tickers, get_latest_prices_func, data)
+        latest_prices_series = price_snapshot.series(tickers)
+        total_portfolio_value = total_investment
+        
+        logger.info(f"[MIN_VOLATILITY] Truoc khi goi run_integer_programming:")
+        logger.info(f"  - total_portfolio_value: {total_portfolio_value:,.0f} VND")
+        logger.info(f"  - Tong trong so: {sum(cleaned_weights.values()):.6f}")
+        
+        allocation_lp, leftover_lp = run_integer_programming(
+            cleaned_weights, 
+            latest_prices_series, 
+            total_portfolio_value,
+            exchanges=exchanges
+        )
+
+        return OptimizationResult('min_volatility', {
+            "Trọng số danh mục": cleaned_weights,
+            "Lợi nhuận kỳ vọng": performance[0],
+            "Rủi ro (Độ lệch chuẩn)": performance[1],
+            "Tỷ lệ Sharpe": performance[2],
+            "Số mã cổ phiếu cần mua": allocation_lp,
+            "Số tiền còn lại": leftover_lp,
+            "Giá mã cổ phiếu": latest_prices_series.to_dict(),
+            "risk_free_rate": rf,
+            # Thêm thông tin Max Sharpe để so sánh
+            "max_sharpe_return": performance_sharpe[0],
+            "max_sharpe_volatility": performance_sharpe[1],
+            # Thêm trọng số thực sự của Min Volatility và Max Sharpe
+            "min_vol_weights": cleaned_weights,
+            "max_sharpe_weights": cleaned_weights_sharpe
+        }, cloud=cloud)
+    except Exception as e:
+        logger.error(f"Loi trong mo hinh Min Volatility: {e}")
+        return None
+
+
+@_with_history_metrics
+def min_cvar(data, total_investment, get_latest_prices_func, beta=0.95, exchanges=None, price_snapshot=None,
+             scenario_tol=DEFAULT_SCENARIO_TOL, cov_estimator=None):
+    """
+    Mô hình Min CVaR: Tối thiểu hóa Conditional Value at Risk.
+    
+    Args:
+        data (pd.DataFrame): Dữ liệu giá cổ phiếu
+        total_investment (float): Tổng số tiền đầu tư
+        get_latest_prices_func (function): Hàm lấy giá cổ phiếu mới nhất
+        beta (float): Mức độ tin cậy (mặc định 0.95)
+        exchanges (dict): Sàn của từng mã để phân bổ theo lô chẵn (mặc định: từng cổ phiếu)
+        price_snapshot (PriceSnapshot): Ảnh chụp giá dùng chung cho cả lượt chạy (mặc định: chụp mới)
+        scenario_tol (float): Sai số CVaR cho phép khi rút gọn kịch bản với lịch sử dài
+            (None: luôn giải LP đầy đủ)
+        cov_estimator (str): Bộ ước lượng hiệp phương sai (xem optimization.covariance)
+        
+    Returns:
+        OptimizationResult: Kết quả tối ưu hóa
+    """
+    logger.info(f"[MIN_CVAR] Nhan total_investment: {total_investment:,.0f} VND")
+    
+    try:
+        mean_returns = expected_returns.mean_historical_return(data)
+        returns = expected_returns.returns_from_prices(data).dropna()
+
+        if scenario_tol is not None and len(returns) >= SCENARIO_REDUCTION_MIN_ROWS:
+            # Lịch sử dài: chỉ đưa các kịch bản đuôi vào LP, sai số CVaR <= scenario_tol
+            weights, cvar_value, _ = min_cvar_reduced(returns, beta=beta, tol=scenario_tol)
+            expected_return = float(mean_returns.reindex(returns.columns).values @ np.array(list(weights.values())))
+            performance = (expected_return, cvar_value)
+        else:
+            cvar_optimizer = EfficientCVaR(mean_returns, returns, beta=beta)
+            weights = cvar_optimizer.min_cvar()
+            performance = cvar_optimizer.portfolio_performance()
+
+        # Loại bỏ trọng số cực nhỏ nhưng vẫn giữ đủ cấu trúc cho các hàm khác
+        positive_weights = {k: v for k, v in weights.items() if v > 1e-5}
+        total_weight = sum(positive_weights.values())
+        if total_weight <= 0:
+            logger.error("[MIN_CVAR] Khong co trong so hop le sau khi toi uu hoa")
+            return None
+
+        # Chuẩn hóa lại trọng số tích cực
+        positive_weights = {k: v / total_weight for k, v in positive_weights.items()}
+
+        # Bổ sung các mã có trọng số 0 để phù hợp với giá/DiscreteAllocation
+        tickers = data.columns.tolist()
+        full_weights = {ticker: positive_weights.get(ticker, 0.0) for ticker in tickers}
+
+        active_tickers = [ticker for ticker, weight in full_weights.items() if weight > 0]
+        if not active_tickers:
+            logger.error("[MIN_CVAR] Khong co trong so hop le sau khi toi uu hoa")
+            return None
+
+        # Tính ma trận hiệp phương sai chỉ với các mã có trọng số
+        cov_matrix = covariance_matrix(data, cov_estimator).loc[active_tickers, active_tickers]
+        cov_subset = cov_matrix.values
+
+        # Tính độ lệch chuẩn danh mục với ma trận đã căn chỉnh
+        weights_array = np.array([full_weights[ticker] for ticker in active_tickers])
+        portfolio_var = float(np.dot(weights_array.T, np.dot(cov_subset, weights_array)))
+        portfolio_std = np.sqrt(max(portfolio_var, 0))
+        rf = 0.02
+        sharpe_ratio = (performance[0] - rf) / portfolio_std
+
+        price_snapshot = _resolve_price_snapshot(price_snapshot, tickers, get_latest_prices_func, data)
+        latest_prices_series = price_snapshot.series(tickers)
+        total_portfolio_value = total_investment
+        
+        logger.info(f"[MIN_CVAR] Truoc khi goi run_integer_programming:")
+        logger.info(f"  - total_portfolio_value: {total_portfolio_value:,.0f} VND")
+        logger.info(f"  - Tong trong so: {sum(full_weights.values()):.6f}")
+        
+        allocation_lp, leftover_lp = run_integer_programming(
+            full_weights, 
+            latest_prices_series, 
+            total_portfolio_value,
+            exchanges=exchanges
+        )
+
+        return OptimizationResult('min_cvar', {
+            "Trọng số danh mục": full_weights,
+            "Lợi nhuận kỳ vọng": performance[0],
+            "Rủi ro CVaR": performance[1],
+            "Số mã cổ phiếu cần mua": allocation_lp,
+            "Số tiền còn lại": leftover_lp,
+            "Giá mã cổ phiếu": latest_prices_series.to_dict(),
+            "Rủi ro (Độ lệch chuẩn)": portfolio_std,
+            "Tỷ lệ Sharpe": sharpe_ratio
+        })
+    except Exception as e:
+        logger.error(f"Loi trong mo hinh Min CVaR: {e}")
+        return None
+
+
+@_with_history_metrics
+def min_cdar(data, total_investment, get_latest_prices_func, beta=0.95, exchanges=None, price_snapshot=None,
+             cov_estimator=None):
+    """
+    Mô hình Min CDaR: Tối thiểu hóa Conditional Drawdown at Risk.
+    
+    Args:
+        data (pd.DataFrame): Dữ liệu giá cổ phiếu
+        total_investment (float): Tổng số tiền đầu tư
+        get_latest_prices_func (function): Hàm lấy giá cổ phiếu mới nhất
+        beta (float): Mức độ tin cậy (mặc định 0.95)
+        exchanges (dict): Sàn của từng mã để phân bổ theo lô chẵn (mặc định: từng cổ phiếu)
+        price_snapshot (PriceSnapshot): Ảnh chụp giá dùng chung cho cả lượt chạy (mặc định: chụp mới)
+        cov_estimator (str): Bộ ước lượng hiệp phương sai (xem optimization.covariance)
+        
+    Returns:
+        OptimizationResult: Kết quả tối ưu hóa
+    """
+    logger.info(f"[MIN_CDAR] Nhan total_investment: {total_investment:,.0f} VND")
+    
+    try:
+        mean_returns = expected_returns.mean_historical_return(data)
+        returns = expected_returns.returns_from_prices(data).dropna()
+
+        cdar_optimizer = EfficientCDaR(mean_returns, returns, beta=beta)
+        weights = cdar_optimizer.min_cdar()
+        performance = cdar_optimizer.portfolio_performance()
+
+        positive_weights = {k: v for k, v in weights.items() if v > 1e-5}
+        total_weight = sum(positive_weights.values())
+        if total_weight <= 0:
+            logger.error("[MIN_CDAR] Khong co trong so hop le sau khi toi uu hoa")
+            return None
+
+        positive_weights = {k: v / total_weight for k, v in positive_weights.items()}
+
+        tickers = data.columns.tolist()
+        full_weights = {ticker: positive_weights.get(ticker, 0.0) for ticker in tickers}
+        active_tickers = [ticker for ticker, weight in full_weights.items() if weight > 0]
+
+        if not active_tickers:
+            logger.error("[MIN_CDAR] Khong co trong so hop le sau khi toi uu hoa")
+            return None
+
+        cov_matrix = covariance_matrix(data, cov_estimator).loc[active_tickers, active_tickers]
+        cov_subset = cov_matrix.values
+        weights_array = np.array([full_weights[ticker] for ticker in active_tickers])
+        portfolio_var = float(np.dot(weights_array.T, np.dot(cov_subset, weights_array)))
+        portfolio_std = np.sqrt(max(portfolio_var, 0))
+        rf = 0.02
+        sharpe_ratio = (performance[0] - rf) / portfolio_std
+
+        price_snapshot = _resolve_price_snapshot(price_snapshot, tickers, get_latest_prices_func, data)
+        latest_prices_series = price_snapshot.series(tickers)
+        total_portfolio_value = total_investment
+        
+        logger.info(f"[MIN_CDAR] Truoc khi goi run_integer_programming:")
+        logger.info(f"  - total_portfolio_value: {total_portfolio_value:,.0f} VND")
+        logger.info(f"  - Tong trong so: {sum(full_weights.values()):.6f}")
+        
+        allocation_lp, leftover_lp = run_integer_programming(
+            full_weights, 
+            latest_prices_series, 
+            total_portfolio_value,
+            exchanges=exchanges
+        )
+
+        return OptimizationResult('min_cdar', {
+            "Trọng số danh mục": full_weights,
+            "Lợi nhuận kỳ vọng": performance[0],
+            "Rủi ro CDaR": performance[1],
+            "Số mã cổ phiếu cần mua": allocation_lp,
+            "Số tiền còn lại": leftover_lp,
+            "Giá mã cổ phiếu": latest_prices_series.to_dict(),
+            "Rủi ro (Độ lệch chuẩn)": portfolio_std,
+            "Tỷ lệ Sharpe": sharpe_ratio
+        })
+    except Exception as e:
+        logger.error(f"Loi trong mo hinh Min CDaR: {e}")
+        return None
+
+
+@_with_history_metrics
+def hrp_model(data, total_investment, get_latest_prices_func, exchanges=None, price_snapshot=None,
+              cov_estimator=None, linkage_method=DEFAULT_HRP_LINKAGE):
+    """
+    Mô hình HRP (Hierarchical Risk Parity): Phân bổ rủi ro phân cấp.
+    
+    Args:
+        data (pd.DataFrame): Dữ liệu giá cổ phiếu
+        total_investment (float): Tổng số tiền đầu tư
+        get_latest_prices_func (function): Hàm lấy giá cổ phiếu mới nhất
+        exchanges (dict): Sàn của từng mã để phân bổ theo lô chẵn (mặc định: từng cổ phiếu)
+        price_snapshot (PriceSnapshot): Ảnh chụp giá dùng chung cho cả lượt chạy (mặc định: chụp mới)
+        cov_estimator (str): Bộ ước lượng hiệp phương sai (xem optimization.covariance)
+        linkage_method (str): Phương pháp liên kết của cây phân cấp (xem optimization.hrp)
+        
+    Returns:
+        OptimizationResult: Kết quả tối ưu hóa, kèm trọng số của các phương pháp liên kết khác để so sánh
+    """
+    logger.info(f"[HRP_MODEL] Nhan total_investment: {total_investment:,.0f} VND")
+    
+    try:
+        returns = data.pct_change().dropna(how="all")
+        # Cây phân cấp được cache theo giá và dùng lại cho dendrogram/heatmap tương quan
+        tree = hrp_tree(data, linkage_method, cov_estimator)
+        cov_matrix = tree.cov
+        weights = tree.weights().to_dict()
+        methods = list(dict.fromkeys([linkage_method, *COMPARE_LINKAGE_METHODS]))
+        linkage_comparison = compare_linkage_methods(data, methods, cov_estimator)
+        
+        # Làm sạch weights và chuẩn hóa
+        cleaned_weights = {k: v for k, v in weights.items() if v > 1e-5}
+        total_weight = sum(cleaned_weights.values())
+        if abs(total_weight - 1.0) > 1e-5:
+            logger.warning(f"[HRP_MODEL] Tong trong so truoc khi chuan hoa: {total_weight}")
+            cleaned_weights = {k: v / total_weight for k, v in cleaned_weights.items()}
+            logger.info(f"[HRP_MODEL] Da chuan hoa lai trong so. Tong moi: {sum(cleaned_weights.values())}")
+        
+        # Lợi nhuận kỳ vọng năm hóa từ lợi suất trung bình như HRPOpt.portfolio_performance
+        weights_array = np.array([cleaned_weights.get(t, 0.0) for t in cov_matrix.columns])
+        hrp_return = float(returns.mean().reindex(cov_matrix.columns).fillna(0).values @ weights_array * 252)
+        hrp_volatility = float(np.sqrt(max(weights_array @ cov_matrix.values @ weights_array, 0)))
+        performance = (hrp_return, hrp_volatility, hrp_return / hrp_volatility if hrp_volatility > 0 else 0.0)
+
+        tickers = data.columns.tolist()
+        price_snapshot = _resolve_price_snapshot(price_snapshot, tickers, get_latest_prices_func, data)
+        latest_prices = price_snapshot.as_dict(tickers)
+        
+        # Kiểm tra và log giá cổ phiếu
+        logger.info(f"[HRP_MODEL] Gia co phieu: {latest_prices}")
+        logger.info(f"[HRP_MODEL] Trong so: {cleaned_weights}")
+        
+        total_portfolio_value = total_investment
+        
+        logger.info(f"[HRP_MODEL] Truoc khi goi optimize_hrp_allocation:")
+        logger.info(f"  - total_portfolio_value: {total_portfolio_value:,.0f} VND")
+        logger.info(f"  - Tong trong so: {sum(cleaned_weights.values()):.6f}")
+        
+        # Sử dụng hàm tối ưu hóa HRP mới
+        allocation_lp, leftover_lp = optimize_hrp_allocation(
+            cleaned_weights, 
+            latest_prices, 
+            total_portfolio_value,
+            exchanges=exchanges
+        )
+
+        return OptimizationResult('hrp', {
+            "Trọng số danh mục": cleaned_weights,
+            "Lợi nhuận kỳ vọng": performance[0],
+            "Rủi ro (Độ lệch chuẩn)": performance[1],
+            "Tỷ lệ Sharpe": performance[2],
+            "Số mã cổ phiếu cần mua": allocation_lp,
+            "Số tiền còn lại": leftover_lp,
+            "Giá mã cổ phiếu": latest_prices,
+            "Phương pháp liên kết": linkage_method,
+            "So sánh phương pháp liên kết": linkage_comparison.to_dict()
+        })
+    except Exception as e:
+        logger.error(f"Loi trong mo hinh HRP: {e}")
+        return None
+
+
+@_with_history_metrics
+def risk_parity_model(data, total_investment, get_latest_prices_func, risk_budgets=None, sector_map=None,
+                      exchanges=None, price_snapshot=None, cov_estimator=None):
+    """
+    Mô hình Risk Parity: mỗi mã (hoặc mỗi ngành) đóng góp rủi ro theo đúng ngân sách đặt trước.
+
+    Args:
+        data (pd.DataFrame): Dữ liệu giá cổ phiếu
+        total_investment (float): Tổng số tiền đầu tư
+        get_latest_prices_func (function): Hàm lấy giá cổ phiếu mới nhất
+        risk_budgets (dict): Ngân sách rủi ro của từng mã (mặc định: bằng nhau hoặc theo ngành)
+        sector_map (dict): Ngành (icb_name) của từng mã; nếu có và không truyền risk_budgets thì
+            ngân sách được chia đều giữa các ngành rồi chia đều trong ngành
+        exchanges (dict): Sàn của từng mã để phân bổ theo lô chẵn (mặc định: từng cổ phiếu)
+        price_snapshot (PriceSnapshot): Ảnh chụp giá dùng chung cho cả lượt chạy (mặc định: chụp mới)
+        cov_estimator (str): Bộ ước lượng hiệp phương sai (xem optimization.covariance)
+
+    Returns:
+        OptimizationResult: Kết quả tối ưu hóa, kèm "Đóng góp rủi ro" (và "Đóng góp rủi ro theo ngành" khi có sector_map)
+    """
+    logger.info(f"[RISK_PARITY] Nhan total_investment: {total_investment:,.0f} VND")
+
+    try:
+        tickers = data.columns.tolist()
+        cov_matrix = covariance_matrix(data, cov_estimator)
+
+        if risk_budgets is not None:
+            budgets = pd.Series(risk_budgets, dtype=float).reindex(tickers).fillna(0.0)
+        elif sector_map:
+            budgets = sector_risk_budgets(tickers, sector_map)
+        else:
+            budgets = pd.Series(1.0 / len(tickers), index=tickers)
+
+        weights_array = risk_budget_weights(cov_matrix.values, budgets.values)
+        cleaned_weights = {t: float(w) for t, w in zip(tickers, weights_array) if w > 1e-5}
+        total_weight = sum(cleaned_weights.values())
+        cleaned_weights = {k: v / total_weight for k, v in cleaned_weights.items()}
+        contributions = dict(zip(tickers, risk_contributions(cov_matrix.values, weights_array)))
+
+        # Hiệu suất theo cùng quy ước với Min Volatility (lợi nhuận CAGR, lãi suất phi rủi ro 2%)
+        mean_returns = expected_returns.mean_historical_return(data)
+        rp_return = float(mean_returns.reindex(tickers).fillna(0).values @ weights_array)
+        rp_volatility = float(np.sqrt(max(weights_array @ cov_matrix.values @ weights_array, 0)))
+        rf = 0.02
+        rp_sharpe = (rp_return - rf) / rp_volatility if rp_volatility > 0 else 0.0
+
+        price_snapshot = _resolve_price_snapshot(price_snapshot, tickers, get_latest_prices_func, data)
+        latest_prices_series = price_snapshot.series(tickers)
+
+        logger.info(f"[RISK_PARITY] Truoc khi goi run_integer_programming:")
+        logger.info(f"  - total_portfolio_value: {total_investment:,.0f} VND")
+        logger.info(f"  - Tong trong so: {sum(cleaned_weights.values()):.6f}")
+
+        allocation_lp, leftover_lp = run_integer_programming(
+            cleaned_weights,
+            latest_prices_series,
+            total_investment,
+            exchanges=exchanges
+        )
+
+        result = OptimizationResult('risk_parity', {
+            "Trọng số danh mục": cleaned_weights,
+            "Lợi nhuận kỳ vọng": rp_return,
+            "Rủi ro (Độ lệch chuẩn)": rp_volatility,
+            "Tỷ lệ Sharpe": rp_sharpe,
+            "Số mã cổ phiếu cần mua": allocation_lp,
+            "Số tiền còn lại": leftover_lp,
+            "Giá mã cổ phiếu": latest_prices_series.to_dict(),
+            "Ngân sách rủi ro": budgets.to_dict(),
+            "Đóng góp rủi ro": contributions,
+            "risk_free_rate": rf
+        })
+        if sector_map:
+            result["Đóng góp rủi ro theo ngành"] = aggregate_by_sector(contributions, sector_map)
+        return result
+    except Exception as e:
+        logger.error(f"Loi trong mo hinh Risk Parity: {e}")
+        return None
+
+
+@_with_history_metrics
+def resampled_frontier_model(data, total_investment, get_latest_prices_func, n_resamples=DEFAULT_RESAMPLES,
+                             max_workers=None, exchanges=None, price_snapshot=None, cov_estimator=None):
+    """
+    Mô hình đường biên lấy mẫu lại (Michaud): trung bình trọng số Max Sharpe trên các mẫu bootstrap.
+
+    Args:
+        data (pd.DataFrame): Dữ liệu giá cổ phiếu
+        total_investment (float): Tổng số tiền đầu tư
+        get_latest_prices_func (function): Hàm lấy giá cổ phiếu mới nhất
+        n_resamples (int): Số mẫu bootstrap
+        max_workers (int): Số tiến trình giải song song (mặc định theo số CPU)
+        exchanges (dict): Sàn của từng mã để phân bổ theo lô chẵn (mặc định: từng cổ phiếu)
+        price_snapshot (PriceSnapshot): Ảnh chụp giá dùng chung cho cả lượt chạy (mặc định: chụp mới)
+        cov_estimator (str): Bộ ước lượng hiệp phương sai dùng để đánh giá danh mục (xem optimization.covariance)
+
+    Returns:
+        OptimizationResult: Kết quả tối ưu hóa, kèm đường biên gốc/lấy mẫu lại và độ lệch chuẩn trọng số giữa các mẫu
+    """
+    logger.info(f"[RESAMPLED] Nhan total_investment: {total_investment:,.0f} VND, {n_resamples} mau")
+
+    try:
+        tickers = data.columns.tolist()
+        returns = data.pct_change().dropna(how="any")
+        resampled = resampled_frontier(returns, n_resamples=n_resamples, max_workers=max_workers)
+
+        # Đánh giá trên ước lượng điểm, cùng quy ước với mô hình Max Sharpe
+        rf = 0.02
+        mean_returns = expected_returns.mean_historical_return(data).reindex(tickers).values
+        cov_matrix = covariance_matrix(data, cov_estimator).values
+        weights_array = resampled['weights'].reindex(tickers).fillna(0).values
+        weights_array = np.where(weights_array < 1e-4, 0.0, weights_array)
+        weights_array /= weights_array.sum()
+        cleaned_weights = {t: float(w) for t, w in zip(tickers, weights_array) if w > 0}
+
+        rs_return = float(mean_returns @ weights_array)
+        rs_volatility = float(np.sqrt(max(weights_array @ cov_matrix @ weights_array, 0)))
+        rs_sharpe = (rs_return - rf) / rs_volatility if rs_volatility > 0 else 0.0
+
+        def frontier_points(weights_matrix):
+            vols = np.sqrt(np.clip(np.einsum('ki,ij,kj->k', weights_matrix, cov_matrix, weights_matrix), 0, None))
+            return (weights_matrix @ mean_returns).tolist(), vols.tolist()
+
+        point_weights, point_sharpe = point_frontier(mean_returns, cov_matrix, len(resampled['grid']), rf)
+        point_returns, point_vols = frontier_points(point_weights)
+        rs_returns, rs_vols = frontier_points(resampled['frontier_weights'])
+
+        price_snapshot = _resolve_price_snapshot(price_snapshot, tickers, get_latest_prices_func, data)
+        latest_prices_series = price_snapshot.series(tickers)
+
+        logger.info(f"[RESAMPLED] Truoc khi goi run_integer_programming:")
+        logger.info(f"  - total_portfolio_value: {total_investment:,.0f} VND")
+        logger.info(f"  - Tong trong so: {sum(cleaned_weights.values()):.6f}")
+
+        allocation_lp, leftover_lp = run_integer_programming(
+            cleaned_weights,
+            latest_prices_series,
+            total_investment,
+            exchanges=exchanges
+        )
+
+        return OptimizationResult('resampled_frontier', {
+            "Trọng số danh mục": cleaned_weights,
+            "Lợi nhuận kỳ vọng": rs_return,
+            "Rủi ro (Độ lệch chuẩn)": rs_volatility,
+            "Tỷ lệ Sharpe": rs_sharpe,
+            "Số mã cổ phiếu cần mua": allocation_lp,
+            "Số tiền còn lại": leftover_lp,
+            "Giá mã cổ phiếu": latest_prices_series.to_dict(),
+            "Số mẫu bootstrap": n_resamples,
+            "Độ lệch chuẩn trọng số": resampled['weights_std'].to_dict(),
+            "Trọng số Max Sharpe gốc": dict(zip(tickers, point_sharpe.tolist())),
+            "Đường biên gốc": {"Lợi nhuận": point_returns, "Rủi ro": point_vols},
+            "Đường biên lấy mẫu lại": {"Lợi nhuận": rs_returns, "Rủi ro": rs_vols},
+            "Thời gian theo bước": resampled['timings'],
+            "risk_free_rate": rf
+        })
+    except Exception as e:
+        logger.error(f"Loi trong mo hinh Resampled Frontier: {e}")
+        return None
+
+
+def rebalance_model(data, holdings, cash, get_latest_prices_func, model='max_sharpe',
+                    turnover_penalty=DEFAULT_TURNOVER_PENALTY, min_trade_value=0.0, exchanges=None,
+                    price_snapshot=None, cov_estimator=None):
+    """
+    Tái cân bằng danh mục đang nắm giữ về mô hình được chọn, có tính phí, thuế bán và vòng quay.
+
+    Args:
+        data (pd.DataFrame): Dữ liệu giá cổ phiếu (gồm cả các mã đang nắm giữ)
+        holdings (dict): Số cổ phiếu đang nắm giữ của từng mã
+        cash (float): Tiền mặt hiện có
+        get_latest_prices_func (function): Hàm lấy giá cổ phiếu mới nhất
+        model (str): Mô hình mục tiêu (xem optimization.rebalance.REBALANCE_MODELS)
+        turnover_penalty (float): Phạt thêm trên mỗi đơn vị vòng quay
+        min_trade_value (float): Bỏ các lệnh có giá trị nhỏ hơn ngưỡng (VND)
+        exchanges (dict): Sàn của từng mã để làm tròn theo lô chẵn (mặc định: từng cổ phiếu)
+        price_snapshot (PriceSnapshot): Ảnh chụp giá dùng chung cho cả lượt chạy (mặc định: chụp mới)
+        cov_estimator (str): Bộ ước lượng hiệp phương sai (xem optimization.covariance)
+
+    Returns:
+        OptimizationResult: Lệnh giao dịch, danh mục sau tái cân bằng, chi phí và vòng quay
+    """
+    logger.info(f"[REBALANCE] Tien mat: {cash:,.0f} VND, {len(holdings)} ma dang nam giu, mo hinh {model}")
+
+    try:
+        tickers = data.columns.tolist()
+        price_snapshot = _resolve_price_snapshot(price_snapshot, tickers, get_latest_prices_func, data)
+        return OptimizationResult('rebalance', rebalance_portfolio(
+            data,
+            holdings,
+            cash,
+            price_snapshot.as_dict(tickers),
+            model=model,
+            cov_estimator=cov_estimator,
+            turnover_penalty=turnover_penalty,
+            exchanges=exchanges,
+            min_trade_value=min_trade_value
+        ))
+    except Exception as e:
+        logger.error(f"Loi khi tai can bang danh muc: {e}")
+        return None
+
+
+@_with_history_metrics
+def large_universe_model(data, total_investment, get_latest_prices_func, sector_map=None, max_assets=30,
+                         max_weight=0.10, sector_cap=0.30, risk_aversion=None, risk_model='pca',
+                         exchanges=None, price_snapshot=None):
+    """
+    Mô hình cho universe lớn (500+ mã): hiệp phương sai hạng thấp, giới hạn số mã và trần ngành.
+
+    Args:
+        data (pd.DataFrame): Dữ liệu giá của toàn bộ universe (có thể có ô trống)
+        total_investment (float): Tổng số tiền đầu tư
+        get_latest_prices_func (function): Hàm lấy giá cổ phiếu mới nhất
+        sector_map (dict): Ngành (icb_name) của từng mã
+        max_assets (int): Số mã nắm giữ tối đa
+        max_weight (float): Tỷ trọng tối đa của một mã
+        sector_cap (float): Tổng tỷ trọng tối đa của một ngành
+        risk_aversion (float): None để tối thiểu hóa rủi ro, số dương để tối ưu trung bình - phương sai
+        risk_model (str): 'pca' (nhân tố thống kê) hoặc 'sector' (thị trường + ngành ICB)
+        exchanges (dict): Sàn của từng mã để phân bổ theo lô chẵn (mặc định: từng cổ phiếu)
+        price_snapshot (PriceSnapshot): Ảnh chụp giá dùng chung cho cả lượt chạy (mặc định: chụp mới)
+
+    Returns:
+        OptimizationResult: Kết quả tối ưu hóa, kèm "Thời gian theo bước"
+    """
+    logger.info(f"[LARGE_UNIVERSE] Nhan total_investment: {total_investment:,.0f} VND, {data.shape[1]} ma")
+
+    try:
+        result = optimize_large_universe(
+            data,
+            sector_map=sector_map,
+            max_assets=max_assets,
+            max_weight=max_weight,
+            sector_cap=sector_cap,
+            risk_aversion=risk_aversion,
+            risk_model=risk_model
+        )
+        weights = result["Trọng số danh mục"]
+        tickers = list(weights)
+
+        # Chỉ lấy giá cho các mã được chọn thay vì toàn bộ universe
+        price_snapshot = _resolve_price_snapshot(price_snapshot, tickers, get_latest_prices_func, data[tickers])
+        latest_prices_series = price_snapshot.series(tickers)
+
+        allocation_lp, leftover_lp = run_integer_programming(
+            weights,
+            latest_prices_series,
+            total_investment,
+            exchanges={t: exchanges[t] for t in tickers if t in exchanges} if exchanges else None
+        )
+
+        result.update({
+            "Số mã cổ phiếu cần mua": allocation_lp,
+            "Số tiền còn lại": leftover_lp,
+            "Giá mã cổ phiếu": latest_prices_series.to_dict(),
+        })
+        return OptimizationResult('large_universe', result)
+    except Exception as e:
+        logger.error(f"Loi trong mo hinh large universe: {e}")
+        return None
+
+
+# Các mô hình nhận cùng bộ tham số (dữ liệu giá, số tiền, hàm lấy giá) - dùng cho chế độ chạy tất cả
+MODEL_REGISTRY = {
+    'markowitz': markowitz_optimization,
+    'max_sharpe': max_sharpe,
+    'min_volatility': min_volatility,
+    'min_cvar': min_cvar,
+    'min_cdar': min_cdar,
+    'hrp': hrp_model,
+    'risk_parity': risk_parity_model,
+    'resampled_frontier': resampled_frontier_model,
+}
+
+
+__all__ = [
+    'MODEL_REGISTRY',
+    'optimize_hrp_allocation',
+    'run_integer_programming',
+    'markowitz_optimization',
+    'max_sharpe',
+    'min_volatility',
+    'min_cvar',
+    'min_cdar',
+    'hrp_model',
+    'risk_parity_model',
+    'resampled_frontier_model',
+    'rebalance_model',
+    'large_universe_model',
+]
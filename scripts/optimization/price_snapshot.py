@@ -0,0 +1,157 @@
+"""
+Module price_snapshot.py
+Ảnh chụp giá mới nhất dùng chung cho mọi mô hình và bộ phân bổ trong một lần tối ưu hóa.
+
+Giá được lấy một lần (một lượt gọi mạng), các mã thiếu giá được bù từ giá lịch sử và
+ghi lại trong báo cáo bù giá, để cả sáu mô hình định giá nhất quán tại cùng thời điểm.
+"""
+
+import datetime
+import logging
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def _fallback_prices(reference_prices) -> pd.Series:
+    """Giá cuối cùng của dữ liệu lịch sử, dùng để bù các mã không lấy được giá mới."""
+    fallback_series = pd.Series(dtype=float)
+    if reference_prices is None:
+        return fallback_series
+    try:
+        if isinstance(reference_prices, pd.DataFrame) and not reference_prices.empty:
+            fallback_series = reference_prices.ffill().bfill().iloc[-1]
+        elif isinstance(reference_prices, pd.Series):
+            fallback_series = reference_prices.ffill().bfill()
+        fallback_series = pd.to_numeric(fallback_series, errors='coerce')
+    except Exception as exc:  # pragma: no cover - chỉ log khi có sự cố dữ liệu bất thường
+        logger.warning(f"Khong the tao fallback price series: {exc}")
+        fallback_series = pd.Series(dtype=float)
+    return fallback_series
+
+
+def _needs_fill(val) -> bool:
+    return pd.isna(val) or val <= 0
+
+
+class PriceSnapshot:
+    """
+    Giá mới nhất của một tập mã tại một thời điểm, kèm báo cáo bù giá.
+
+    Attributes:
+        prices (pd.Series): Giá (VND) theo mã
+        timestamp (datetime.datetime): Thời điểm chụp giá
+        filled (dict): Các mã được bù từ giá lịch sử {ticker: giá đã bù}
+        missing (list): Các mã không có cả giá mới lẫn giá lịch sử
+        scale_factor (float | None): Hệ số quy đổi giá lịch sử sang giá mới (trung vị tỷ lệ)
+    """
+
+    def __init__(self, prices: pd.Series, timestamp: datetime.datetime,
+                 filled: Optional[Dict[str, float]] = None,
+                 missing: Optional[List[str]] = None,
+                 scale_factor: Optional[float] = None):
+        self.prices = prices
+        self.timestamp = timestamp
+        self.filled = filled or {}
+        self.missing = missing or []
+        self.scale_factor = scale_factor
+
+    @classmethod
+    def capture(cls, tickers: Iterable[str], get_latest_prices_func: Callable,
+                reference_prices=None) -> 'PriceSnapshot':
+        """
+        Lấy giá mới nhất cho toàn bộ mã trong một lần gọi và bù các mã thiếu giá.
+
+        Args:
+            tickers (list): Danh sách mã cổ phiếu
+            get_latest_prices_func (function): Hàm lấy giá mã cổ phiếu mới nhất
+            reference_prices (pd.DataFrame | pd.Series): Giá lịch sử để bù giá thiếu
+
+        Returns:
+            PriceSnapshot: Ảnh chụp giá
+        """
+        tickers = list(tickers)
+        timestamp = datetime.datetime.now()
+        latest = get_latest_prices_func(tickers) if tickers else {}
+        return cls.from_prices(tickers, latest, reference_prices, timestamp=timestamp)
+
+    @classmethod
+    def from_prices(cls, tickers: Iterable[str], latest_prices_dict,
+                    reference_prices=None,
+                    timestamp: Optional[datetime.datetime] = None) -> 'PriceSnapshot':
+        """Tạo ảnh chụp từ giá đã có sẵn (không gọi mạng)."""
+        tickers = list(tickers)
+        price_series = pd.Series(latest_prices_dict or {}, dtype=float)
+        fallback_series = _fallback_prices(reference_prices)
+
+        overlap = [t for t in tickers if t in price_series.index and t in fallback_series.index]
+        ratios = []
+        for ticker in overlap:
+            latest_val = price_series.get(ticker)
+            fallback_val = fallback_series.get(ticker)
+            if pd.notna(latest_val) and pd.notna(fallback_val) and fallback_val != 0:
+                ratios.append(latest_val / fallback_val)
+
+        scale_factor = float(np.median(ratios)) if ratios else None
+
+        filled = {}
+        for ticker in tickers:
+            if not _needs_fill(price_series.get(ticker)):
+                continue
+            fallback_val = fallback_series.get(ticker) if not fallback_series.empty else None
+            if pd.notna(fallback_val) and fallback_val > 0:
+                adjusted = float(fallback_val)
+                if scale_factor:
+                    adjusted *= scale_factor
+                elif adjusted < 1000:
+                    adjusted *= 1000  # dữ liệu lịch sử thường ở đơn vị nghìn đồng
+                price_series.loc[ticker] = adjusted
+                filled[ticker] = adjusted
+
+        missing = [t for t in tickers if _needs_fill(price_series.get(t))]
+        if filled:
+            logger.warning(f"Bu gia tu du lieu lich su cho cac ma: {', '.join(filled)}")
+
+        return cls(
+            prices=price_series.reindex(tickers),
+            timestamp=timestamp or datetime.datetime.now(),
+            filled=filled,
+            missing=missing,
+            scale_factor=scale_factor,
+        )
+
+    def series(self, tickers: Iterable[str]) -> pd.Series:
+        """Giá của các mã yêu cầu; báo lỗi nếu có mã không có giá hợp lệ."""
+        tickers = list(tickers)
+        invalid = [t for t in tickers if t not in self.prices.index or _needs_fill(self.prices.get(t))]
+        if invalid:
+            message = f"Không thể lấy giá hợp lệ cho các mã: {', '.join(invalid)}"
+            logger.error(message)
+            raise ValueError(message)
+        return self.prices.reindex(tickers)
+
+    def as_dict(self, tickers: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Giá dạng dict (toàn bộ hoặc theo danh sách mã)."""
+        if tickers is None:
+            return self.prices.dropna().to_dict()
+        return self.series(tickers).to_dict()
+
+    def fill_report(self) -> Dict[str, object]:
+        """Tóm tắt việc bù giá để hiển thị / ghi log."""
+        return {
+            'timestamp': self.timestamp,
+            'total': len(self.prices),
+            'filled': dict(self.filled),
+            'missing': list(self.missing),
+            'scale_factor': self.scale_factor,
+        }
+
+    def __repr__(self) -> str:
+        return (f"PriceSnapshot({len(self.prices)} ma, {self.timestamp:%Y-%m-%d %H:%M:%S}, "
+                f"bu={len(self.filled)}, thieu={len(self.missing)})")
+
+
+__all__ = ['PriceSnapshot']
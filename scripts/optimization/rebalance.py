@@ -0,0 +1,249 @@
+"""
+Module rebalance.py
+Tái cân bằng danh mục đang nắm giữ có tính phí giao dịch và vòng quay.
+
+Các mô hình trong optimization.models giả định bắt đầu từ toàn tiền mặt. Ở đây danh mục hiện có
+(số cổ phiếu + tiền mặt) được đưa về gần danh mục mục tiêu của một trong sáu mô hình:
+    1. Trọng số mục tiêu không ma sát w* của mô hình (optimization.walk_forward.optimize_weights).
+    2. Bài toán lồi nhỏ (SOCP) chọn trọng số sau giao dịch w:
+
+           min  ||L'(w - w*)||  +  chi phí(w)  +  λ · Σ|w - w0|
+
+       với ||L'(w - w*)|| là độ lệch chuẩn năm hóa của chênh lệch so với mục tiêu, chi phí gồm
+       phí môi giới cho cả mua và bán cộng thuế 0,1% trên giá trị bán, và tiền mặt sau giao
+       dịch không âm. Số hạng chuẩn L1 tạo vùng không giao dịch: mã đã gần mục tiêu được giữ
+       nguyên thay vì mua/bán lặt vặt.
+    3. Làm tròn chênh lệch số cổ phiếu về lô giao dịch (về phía 0, nên không bán quá số đang
+       có và không mua vượt tiền), bỏ lệnh nhỏ hơn ngưỡng, cắt bớt lệnh mua nếu thiếu tiền và
+       dùng tiền thừa do làm tròn mua thêm lô cho mã đang thiếu nhiều nhất.
+
+Vì chỉ các mã lệch mục tiêu mới được giao dịch, danh sách lệnh ngắn hơn nhiều so với phân bổ
+lại từ đầu, và bài toán chỉ có 3N biến nên giải nhanh cả với danh mục lớn.
+"""
+
+import logging
+from typing import Dict, Mapping, Optional
+
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+
+from optimization.allocation import get_lot_sizes
+from optimization.covariance import covariance_matrix
+from optimization.walk_forward import TRADING_DAYS, WALK_FORWARD_MODELS, optimize_weights
+
+logger = logging.getLogger(__name__)
+
+# Phí môi giới phổ biến của các công ty chứng khoán (mỗi chiều mua/bán)
+BROKERAGE_FEE = 0.0015
+# Thuế thu nhập cá nhân khi bán chứng khoán: 0,1% trên giá trị bán
+SELL_TAX = 0.001
+DEFAULT_TURNOVER_PENALTY = 0.0
+REBALANCE_MODELS = WALK_FORWARD_MODELS
+
+
+def transaction_costs(buy_value: float, sell_value: float, fee: float = BROKERAGE_FEE,
+                      sell_tax: float = SELL_TAX) -> Dict[str, float]:
+    """Phí môi giới hai chiều và thuế bán của một lượt giao dịch (VND)."""
+    fees = fee * (buy_value + sell_value)
+    tax = sell_tax * sell_value
+    return {'Phí môi giới': fees, 'Thuế bán': tax, 'Tổng': fees + tax}
+
+
+def _cholesky(cov: np.ndarray) -> np.ndarray:
+    jitter = 1e-10 * max(np.trace(cov) / len(cov), 1e-12)
+    return np.linalg.cholesky(cov + jitter * np.eye(len(cov)))
+
+
+def rebalance_weights(current: np.ndarray, target: np.ndarray, cov: np.ndarray,
+                      fee: float = BROKERAGE_FEE, sell_tax: float = SELL_TAX,
+                      turnover_penalty: float = DEFAULT_TURNOVER_PENALTY) -> np.ndarray:
+    """
+    Trọng số sau giao dịch cân bằng giữa bám mục tiêu và chi phí.
+
+    Args:
+        current: Trọng số hiện tại theo giá trị tài sản (tổng cùng tiền mặt bằng 1)
+        target: Trọng số mục tiêu không ma sát (tổng bằng 1)
+        cov: Ma trận hiệp phương sai năm hóa
+        fee: Phí môi giới mỗi chiều
+        sell_tax: Thuế trên giá trị bán
+        turnover_penalty: Phạt thêm trên mỗi đơn vị vòng quay (ngoài chi phí thực)
+
+    Returns:
+        np.ndarray: Trọng số cổ phiếu sau giao dịch; phần còn lại là tiền mặt sau phí
+    """
+    n_assets = len(current)
+    w = cp.Variable(n_assets)
+    buy = cp.Variable(n_assets, nonneg=True)
+    sell = cp.Variable(n_assets, nonneg=True)
+    cost = fee * cp.sum(buy + sell) + sell_tax * cp.sum(sell)
+    objective = (cp.norm(_cholesky(cov).T @ (w - target))
+                 + cost + turnover_penalty * cp.sum(buy + sell))
+    constraints = [
+        w == current + buy - sell,
+        w >= 0,
+        # Tiền mặt sau giao dịch (1 - tổng trọng số cổ phiếu - chi phí) không âm
+        cp.sum(w) + cost <= 1,
+    ]
+    problem = cp.Problem(cp.Minimize(objective), constraints)
+    solver = 'CLARABEL' if 'CLARABEL' in cp.installed_solvers() else None
+    problem.solve(solver=solver)
+    if problem.status not in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE):
+        raise ValueError(f"Khong giai duoc bai toan tai can bang: {problem.status}")
+    weights = np.clip(np.asarray(w.value, dtype=float), 0.0, None)
+    # Mã gần như không đổi được giữ nguyên trọng số hiện tại (nhiễu số của bộ giải)
+    weights[np.abs(weights - current) < 1e-7] = current[np.abs(weights - current) < 1e-7]
+    return weights
+
+
+def _round_trades(delta: np.ndarray, holdings: np.ndarray, target_shares: np.ndarray,
+                  lots: np.ndarray) -> np.ndarray:
+    """Làm tròn số cổ phiếu cần mua/bán về bội số lô, về phía 0; bán hết nếu mục tiêu là 0."""
+    trades = np.trunc(delta / lots) * lots
+    exit_all = (target_shares < 0.5) & (holdings > 0)
+    trades[exit_all] = -holdings[exit_all]
+    return np.clip(trades, -holdings, None)
+
+
+def _net_cash(trades: np.ndarray, prices: np.ndarray, cash: float, fee: float, sell_tax: float) -> float:
+    value = trades * prices
+    buy_value = value[value > 0].sum()
+    sell_value = -value[value < 0].sum()
+    return cash - buy_value + sell_value - transaction_costs(buy_value, sell_value, fee, sell_tax)['Tổng']
+
+
+def rebalance_portfolio(prices: pd.DataFrame, holdings: Mapping[str, float], cash: float,
+                        latest_prices: Mapping[str, float], model: str = 'max_sharpe',
+                        cov_estimator: Optional[str] = None, fee: float = BROKERAGE_FEE,
+                        sell_tax: float = SELL_TAX, turnover_penalty: float = DEFAULT_TURNOVER_PENALTY,
+                        exchanges: Optional[Mapping[str, str]] = None, min_trade_value: float = 0.0,
+                        beta: float = 0.95, risk_free_rate: float = 0.02) -> Dict[str, object]:
+    """
+    Danh sách lệnh tối thiểu đưa danh mục hiện có về gần danh mục của ``model``.
+
+    Args:
+        prices (pd.DataFrame): Giá lịch sử (phiên x mã) của các mã được xét, gồm cả mã đang nắm giữ
+        holdings (dict): Số cổ phiếu đang nắm giữ của từng mã
+        cash (float): Tiền mặt hiện có (VND)
+        latest_prices (dict): Giá giao dịch hiện tại của từng mã
+        model (str): Một trong REBALANCE_MODELS
+        cov_estimator (str): Bộ ước lượng hiệp phương sai (xem optimization.covariance)
+        fee (float): Phí môi giới mỗi chiều
+        sell_tax (float): Thuế trên giá trị bán
+        turnover_penalty (float): Phạt thêm trên mỗi đơn vị vòng quay
+        exchanges (dict): Sàn của từng mã để làm tròn theo lô chẵn (mặc định: từng cổ phiếu)
+        min_trade_value (float): Bỏ các lệnh có giá trị nhỏ hơn ngưỡng (VND)
+        beta (float): Mức tin cậy của Min CVaR / Min CDaR
+        risk_free_rate (float): Lãi suất phi rủi ro
+
+    Returns:
+        dict: Lệnh giao dịch, danh mục sau giao dịch, chi phí, vòng quay và hiệu suất kỳ vọng
+    """
+    if model not in REBALANCE_MODELS:
+        raise ValueError(f"Mo hinh khong hop le: {model}")
+    holdings = {str(t).upper(): float(q) for t, q in holdings.items() if q}
+    missing = [t for t in holdings if t not in prices.columns]
+    if missing:
+        raise ValueError(f"Thieu du lieu gia lich su cho ma dang nam giu: {', '.join(missing)}")
+
+    target = optimize_weights(prices, model, cov_estimator, beta, risk_free_rate)
+    tickers = target.index.tolist()
+    dropped = [t for t in holdings if t not in tickers]
+    if dropped:
+        raise ValueError(f"Du lieu gia khong hop le cho ma dang nam giu: {', '.join(dropped)}")
+
+    price_arr = pd.Series(latest_prices, dtype=float).reindex(tickers).to_numpy()
+    if np.any(~np.isfinite(price_arr) | (price_arr <= 0)):
+        raise ValueError("Thieu gia hien tai cho mot so ma")
+    shares = np.array([holdings.get(t, 0.0) for t in tickers])
+    total_value = float(shares @ price_arr + cash)
+    if total_value <= 0:
+        raise ValueError("Tong gia tri danh muc va tien mat phai duong")
+
+    cov = covariance_matrix(prices[tickers], cov_estimator).to_numpy()
+    current = shares * price_arr / total_value
+    weights = rebalance_weights(current, target.to_numpy(), cov, fee, sell_tax, turnover_penalty)
+
+    lot_sizes = get_lot_sizes(exchanges) if exchanges else {}
+    lots = np.array([lot_sizes.get(t, 1) for t in tickers], dtype=float)
+    target_shares = weights * total_value / price_arr
+    trades = _round_trades(target_shares - shares, shares, target_shares, lots)
+    trades[np.abs(trades * price_arr) < min_trade_value] = 0.0
+
+    # Thiếu tiền do làm tròn/phí: bớt từng lô của lệnh mua lớn nhất tới khi đủ
+    while _net_cash(trades, price_arr, cash, fee, sell_tax) < 0 and (trades > 0).any():
+        largest = int(np.argmax(np.where(trades > 0, trades * price_arr, -np.inf)))
+        trades[largest] -= min(lots[largest], trades[largest])
+
+    # Tiền thừa do làm tròn về phía 0: mua thêm từng lô cho mã đang thiếu nhiều nhất so với
+    # trọng số đã tối ưu, chỉ khi phần thiếu còn ít nhất nửa lô (không mua thêm mã đang bán)
+    buyable = trades >= 0
+    while True:
+        shortfall = (target_shares - shares - trades) / lots
+        candidates = buyable & (shortfall >= 0.5)
+        candidates &= lots * price_arr * (1 + fee) <= _net_cash(trades, price_arr, cash, fee, sell_tax)
+        if not candidates.any():
+            break
+        best = int(np.argmax(np.where(candidates, shortfall * lots * price_arr, -np.inf)))
+        trades[best] += lots[best]
+
+    trade_value = trades * price_arr
+    buy_value = float(trade_value[trade_value > 0].sum())
+    sell_value = float(-trade_value[trade_value < 0].sum())
+    costs = transaction_costs(buy_value, sell_value, fee, sell_tax)
+    cash_after = _net_cash(trades, price_arr, cash, fee, sell_tax)
+    shares_after = shares + trades
+
+    orders = []
+    for i in np.flatnonzero(trades):
+        value = abs(trade_value[i])
+        orders.append({
+            'Mã': tickers[i],
+            'Lệnh': 'Mua' if trades[i] > 0 else 'Bán',
+            'Số lượng': int(abs(trades[i])),
+            'Giá': float(price_arr[i]),
+            'Giá trị': float(value),
+            'Phí': float(fee * value),
+            'Thuế': float(sell_tax * value) if trades[i] < 0 else 0.0,
+        })
+    orders.sort(key=lambda row: (row['Lệnh'] != 'Bán', -row['Giá trị']))
+
+    # Hiệu suất của danh mục sau giao dịch (phần cổ phiếu, tiền mặt không sinh lời)
+    value_after = shares_after * price_arr
+    weights_after = value_after / total_value
+    first, last = prices[tickers].bfill().iloc[0].to_numpy(), prices[tickers].ffill().iloc[-1].to_numpy()
+    mu = (last / first) ** (TRADING_DAYS / max(len(prices) - 1, 1)) - 1
+    expected = float(mu @ weights_after)
+    volatility = float(np.sqrt(max(weights_after @ cov @ weights_after, 0)))
+    chol = _cholesky(cov)
+
+    logger.info(f"[REBALANCE] {model}: {len(orders)} lenh, vong quay {(buy_value + sell_value) / total_value:.2%}, "
+                f"chi phi {costs['Tổng']:,.0f} VND")
+    return {
+        'Mô hình': REBALANCE_MODELS[model],
+        'Lệnh giao dịch': orders,
+        'Danh mục sau tái cân bằng': {t: int(q) for t, q in zip(tickers, shares_after) if q > 0},
+        'Trọng số hiện tại': dict(zip(tickers, current)),
+        'Trọng số mục tiêu': target.to_dict(),
+        'Trọng số danh mục': {t: float(w) for t, w in zip(tickers, weights_after) if w > 0},
+        'Lợi nhuận kỳ vọng': expected,
+        'Rủi ro (Độ lệch chuẩn)': volatility,
+        'Tỷ lệ Sharpe': (expected - risk_free_rate) / volatility if volatility > 0 else 0.0,
+        'Vòng quay': (buy_value + sell_value) / total_value,
+        'Chi phí giao dịch': costs,
+        'Tiền mặt sau giao dịch': cash_after,
+        'Tổng giá trị': total_value,
+        'Sai lệch so với mục tiêu': float(np.linalg.norm(chol.T @ (weights_after - target.to_numpy()))),
+        'Sai lệch nếu không giao dịch': float(np.linalg.norm(chol.T @ (current - target.to_numpy()))),
+    }
+
+
+__all__ = [
+    'BROKERAGE_FEE',
+    'SELL_TAX',
+    'DEFAULT_TURNOVER_PENALTY',
+    'REBALANCE_MODELS',
+    'transaction_costs',
+    'rebalance_weights',
+    'rebalance_portfolio',
+]
@@ -0,0 +1,242 @@
+"""
+Module resampled.py
+Đường biên hiệu quả lấy mẫu lại (Michaud): giảm độ nhạy của Max Sharpe / Min Volatility
+với sai số ước lượng bằng cách lấy trung bình trọng số trên nhiều mẫu bootstrap.
+
+Các bước:
+    1. Bootstrap lịch sử lợi suất dạng vector: mỗi mẫu được biểu diễn bằng số lần chọn của
+       từng phiên (ma trận B x T), nên lợi nhuận kỳ vọng và hiệp phương sai của mọi mẫu là
+       các phép nhân ma trận, không tạo lại DataFrame cho từng mẫu.
+    2. Mỗi mẫu giải đường biên (min ½ w'Σw - t μ'w trên một lưới t) và Max Sharpe. Hai bài
+       toán OSQP được dựng một lần cho mỗi tiến trình; mẫu mới chỉ cập nhật dữ liệu của P, q
+       và A, còn các điểm trên cùng đường biên chỉ đổi q nên dùng lại phân tích ma trận.
+    3. Các lô mẫu được giải song song trong process pool, trọng số được lấy trung bình theo
+       từng điểm trên lưới và cho danh mục Max Sharpe.
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import osqp
+import pandas as pd
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+DEFAULT_RESAMPLES = 200
+DEFAULT_FRONTIER_POINTS = 20
+DEFAULT_RESAMPLE_WORKERS = min(4, os.cpu_count() or 1)
+# Dưới số mẫu này chi phí khởi động tiến trình lớn hơn thời gian giải
+PROCESS_POOL_MIN_RESAMPLES = 64
+# Số phần tử tối đa của mảng trung gian B x T x N khi tính hiệp phương sai theo lô
+_MOMENT_CHUNK_ELEMENTS = 4_000_000
+
+
+def frontier_grid(n_points: int = DEFAULT_FRONTIER_POINTS) -> np.ndarray:
+    """Lưới t = 1 / (hệ số e ngại rủi ro): t = 0 là Min Volatility, t lớn tiến tới lợi nhuận cao nhất."""
+    return np.r_[0.0, np.logspace(-3, 1, n_points - 1)]
+
+
+def bootstrap_counts(n_periods: int, n_resamples: int, seed: Optional[int] = 42) -> np.ndarray:
+    """Số lần mỗi phiên được chọn trong từng mẫu bootstrap (B x T, tổng mỗi dòng bằng T)."""
+    rng = np.random.default_rng(seed)
+    draws = rng.integers(0, n_periods, size=(n_resamples, n_periods))
+    flat = draws + (np.arange(n_resamples) * n_periods)[:, None]
+    return np.bincount(flat.ravel(), minlength=n_resamples * n_periods).reshape(n_resamples, n_periods)
+
+
+def bootstrap_moments(returns: np.ndarray, counts: np.ndarray,
+                      frequency: int = TRADING_DAYS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lợi nhuận kỳ vọng (CAGR như mean_historical_return) và hiệp phương sai mẫu năm hóa
+    của mọi mẫu bootstrap.
+
+    Args:
+        returns: Lợi suất ngày (T x N), không có ô trống
+        counts: Số lần chọn của từng phiên (B x T)
+
+    Returns:
+        (mu, cov): mảng B x N và B x N x N
+    """
+    n_resamples, n_periods = counts.shape
+    n_assets = returns.shape[1]
+    weights = counts.astype(float)
+    mu = np.expm1(weights @ np.log1p(returns) * (frequency / n_periods))
+
+    means = weights @ returns / n_periods
+    cov = np.empty((n_resamples, n_assets, n_assets))
+    chunk = max(1, _MOMENT_CHUNK_ELEMENTS // (n_periods * n_assets))
+    for start in range(0, n_resamples, chunk):
+        block = weights[start:start + chunk]
+        second = np.matmul((block[:, :, None] * returns).transpose(0, 2, 1), returns)
+        cov[start:start + chunk] = second
+    cov -= n_periods * means[:, :, None] * means[:, None, :]
+    cov *= frequency / (n_periods - 1)
+    return mu, cov
+
+
+def _upper_pattern(n_assets: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Vị trí (hàng, cột) và indptr của tam giác trên dày đặc theo thứ tự CSC."""
+    rows, cols = np.triu_indices(n_assets)
+    order = np.lexsort((rows, cols))
+    rows, cols = rows[order], cols[order]
+    indptr = np.r_[0, np.cumsum(np.arange(1, n_assets + 1))]
+    return rows, cols, indptr
+
+
+class _FrontierSolver:
+    """
+    Hai workspace OSQP dùng chung cấu trúc cho mọi mẫu: đường biên và Max Sharpe dạng lồi.
+
+    Ma trận P (tam giác trên dày đặc) và A được dựng với đầy đủ phần tử khai báo, nên mẫu
+    mới chỉ thay mảng dữ liệu (Px, Ax) mà không cần setup lại.
+    """
+
+    def __init__(self, n_assets: int, risk_free_rate: float = 0.02):
+        self.n_assets = n_assets
+        self.risk_free_rate = risk_free_rate
+        self.rows, self.cols, indptr = _upper_pattern(n_assets)
+        settings = dict(verbose=False, eps_abs=1e-8, eps_rel=1e-8, polishing=True, max_iter=20000)
+        identity = sparse.eye(n_assets, format='csc')
+        p_init = sparse.csc_matrix((np.where(self.rows == self.cols, 1.0, 0.0), self.rows, indptr),
+                                   shape=(n_assets, n_assets))
+
+        # Đường biên: min ½ w'Σw - t μ'w, sum(w) = 1, 0 <= w <= 1
+        self.frontier = osqp.OSQP()
+        self.frontier.setup(p_init, np.zeros(n_assets),
+                            sparse.vstack([np.ones((1, n_assets)), identity], format='csc'),
+                            np.r_[1.0, np.zeros(n_assets)], np.r_[1.0, np.ones(n_assets)], **settings)
+
+        # Max Sharpe: min y'Σy, (μ - rf)'y = 1, y >= 0; w = y / sum(y). Cột j của A là [μ_j - rf, 1]
+        a_indices = np.column_stack([np.zeros(n_assets, dtype=int), np.arange(1, n_assets + 1)]).ravel()
+        a_indptr = np.arange(0, 2 * n_assets + 1, 2)
+        a_init = sparse.csc_matrix((np.ones(2 * n_assets), a_indices, a_indptr), shape=(n_assets + 1, n_assets))
+        self.sharpe = osqp.OSQP()
+        self.sharpe.setup(p_init, np.zeros(n_assets), a_init,
+                          np.r_[1.0, np.zeros(n_assets)], np.r_[1.0, np.full(n_assets, np.inf)], **settings)
+
+    @staticmethod
+    def _check(result) -> np.ndarray:
+        if result.info.status not in ('solved', 'solved inaccurate'):
+            raise ValueError(f"OSQP khong giai duoc: {result.info.status}")
+        return result.x
+
+    @staticmethod
+    def _normalize(weights: np.ndarray) -> np.ndarray:
+        weights = np.clip(weights, 0.0, None)
+        return weights / weights.sum()
+
+    def solve(self, mu: np.ndarray, cov: np.ndarray, grid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Trọng số trên lưới đường biên (K x N) và trọng số Max Sharpe (N) của một mẫu."""
+        px = cov[self.rows, self.cols]
+        self.frontier.update(Px=px)
+        frontier = np.empty((len(grid), self.n_assets))
+        for k, t in enumerate(grid):
+            # Chỉ đổi q: OSQP giữ nguyên phân tích ma trận, warm start từ điểm trước
+            self.frontier.update(q=-t * mu)
+            frontier[k] = self._normalize(self._check(self.frontier.solve()))
+
+        excess = mu - self.risk_free_rate
+        if (excess > 0).any():
+            a_data = np.column_stack([excess, np.ones(self.n_assets)]).ravel()
+            self.sharpe.update(Px=px, Ax=a_data)
+            sharpe = self._normalize(self._check(self.sharpe.solve()))
+        else:
+            # Không mã nào vượt lãi suất phi rủi ro trong mẫu này: dùng điểm Min Volatility
+            sharpe = frontier[0]
+        return frontier, sharpe
+
+
+def _solve_resamples(mu: np.ndarray, cov: np.ndarray, grid: np.ndarray,
+                     risk_free_rate: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Giải một lô mẫu (chạy trong tiến trình con); dựng workspace một lần cho cả lô."""
+    solver = _FrontierSolver(mu.shape[1], risk_free_rate)
+    frontier = np.empty((len(mu), len(grid), mu.shape[1]))
+    sharpe = np.empty(mu.shape)
+    for b in range(len(mu)):
+        frontier[b], sharpe[b] = solver.solve(mu[b], cov[b], grid)
+    return frontier, sharpe
+
+
+def resampled_frontier(returns: pd.DataFrame, n_resamples: int = DEFAULT_RESAMPLES,
+                       n_points: int = DEFAULT_FRONTIER_POINTS, risk_free_rate: float = 0.02,
+                       max_workers: Optional[int] = None, seed: Optional[int] = 42,
+                       frequency: int = TRADING_DAYS) -> Dict[str, object]:
+    """
+    Đường biên lấy mẫu lại và danh mục Max Sharpe lấy mẫu lại.
+
+    Args:
+        returns (pd.DataFrame): Lợi suất ngày (phiên x mã)
+        n_resamples (int): Số mẫu bootstrap
+        n_points (int): Số điểm trên lưới đường biên
+        risk_free_rate (float): Lãi suất phi rủi ro cho Max Sharpe
+        max_workers (int): Số tiến trình (mặc định DEFAULT_RESAMPLE_WORKERS; 1 để giải tuần tự)
+        seed (int): Hạt giống bootstrap
+        frequency (int): Số phiên mỗi năm
+
+    Returns:
+        dict: 'weights' (Max Sharpe trung bình, pd.Series), 'weights_std' (độ lệch chuẩn trọng số
+        giữa các mẫu), 'frontier_weights' (K x N trung bình), 'grid', 'sample_sharpe_weights'
+        (B x N) và 'timings'
+    """
+    returns = returns.dropna(how='any')
+    tickers = returns.columns
+    values = returns.to_numpy(dtype=float)
+    if len(values) < 2 or values.shape[1] < 2:
+        raise ValueError("Cần ít nhất 2 phiên và 2 mã để lấy mẫu lại đường biên")
+    grid = frontier_grid(n_points)
+    timings = {}
+
+    start = time.perf_counter()
+    counts = bootstrap_counts(len(values), n_resamples, seed)
+    mu, cov = bootstrap_moments(values, counts, frequency)
+    timings['Bootstrap'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    workers = DEFAULT_RESAMPLE_WORKERS if max_workers is None else max_workers
+    if workers <= 1 or n_resamples < PROCESS_POOL_MIN_RESAMPLES:
+        frontier, sharpe = _solve_resamples(mu, cov, grid, risk_free_rate)
+    else:
+        batches = np.array_split(np.arange(n_resamples), workers)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_solve_resamples, mu[idx], cov[idx], grid, risk_free_rate)
+                       for idx in batches if len(idx)]
+            parts = [future.result() for future in futures]
+        frontier = np.concatenate([p[0] for p in parts])
+        sharpe = np.concatenate([p[1] for p in parts])
+    timings['Giải QP'] = time.perf_counter() - start
+    logger.info(f"[RESAMPLED] {n_resamples} mau x {len(grid)} diem, {len(tickers)} ma: "
+                f"bootstrap {timings['Bootstrap']:.2f}s, QP {timings['Giải QP']:.2f}s")
+
+    return {
+        'weights': pd.Series(sharpe.mean(axis=0), index=tickers),
+        'weights_std': pd.Series(sharpe.std(axis=0), index=tickers),
+        'frontier_weights': frontier.mean(axis=0),
+        'grid': grid,
+        'sample_sharpe_weights': sharpe,
+        'timings': timings,
+    }
+
+
+def point_frontier(mu: np.ndarray, cov: np.ndarray, n_points: int = DEFAULT_FRONTIER_POINTS,
+                   risk_free_rate: float = 0.02) -> Tuple[np.ndarray, np.ndarray]:
+    """Đường biên và Max Sharpe từ ước lượng điểm (cùng lưới, để so sánh với bản lấy mẫu lại)."""
+    solver = _FrontierSolver(len(mu), risk_free_rate)
+    return solver.solve(np.asarray(mu, dtype=float), np.asarray(cov, dtype=float), frontier_grid(n_points))
+
+
+__all__ = [
+    'DEFAULT_RESAMPLES',
+    'DEFAULT_FRONTIER_POINTS',
+    'DEFAULT_RESAMPLE_WORKERS',
+    'frontier_grid',
+    'bootstrap_counts',
+    'bootstrap_moments',
+    'resampled_frontier',
+    'point_frontier',
+]
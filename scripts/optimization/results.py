@@ -0,0 +1,210 @@
+"""
+Module results.py
+Kiểu kết quả của lõi tối ưu hóa (không phụ thuộc giao diện).
+
+Giao diện hiện tại đọc kết quả theo khóa tiếng Việt ("Trọng số danh mục", "Số tiền còn lại"...),
+nên OptimizationResult vẫn là một dict với các khóa đó; các thuộc tính có kiểu là lối vào
+cho mã không thuộc giao diện (batch, benchmark, tiến trình con) mà không phải nhớ tên khóa.
+
+Đám mây 10.000 danh mục ngẫu nhiên của Markowitz / Max Sharpe / Min Volatility (ma trận trọng số
+10.000 x N) không được lưu trong kết quả: PortfolioCloud chỉ giữ lợi nhuận kỳ vọng, hiệp phương sai
+và hạt giống, rồi tái tạo các mảng (float32) khi biểu đồ cần tới các khóa "ret_arr", "vol_arr",
+"sharpe_arr", "all_weights", "max_sharpe_idx". Bản lưu vào session (compact) không giữ mảng đã tái tạo.
+"""
+
+import pickle
+from typing import Dict, Mapping, Optional
+
+import numpy as np
+
+WEIGHTS_KEY = "Trọng số danh mục"
+EXPECTED_RETURN_KEY = "Lợi nhuận kỳ vọng"
+VOLATILITY_KEY = "Rủi ro (Độ lệch chuẩn)"
+SHARPE_KEY = "Tỷ lệ Sharpe"
+ALLOCATION_KEY = "Số mã cổ phiếu cần mua"
+LEFTOVER_KEY = "Số tiền còn lại"
+PRICES_KEY = "Giá mã cổ phiếu"
+MAX_DRAWDOWN_KEY = "Mức sụt giảm tối đa"
+REALIZED_METRICS_KEY = "Hiệu suất thực tế"
+
+CLOUD_KEYS = ('ret_arr', 'vol_arr', 'sharpe_arr', 'all_weights', 'max_sharpe_idx')
+DEFAULT_CLOUD_SIZE = 10000
+DEFAULT_CLOUD_SEED = 42
+
+
+class PortfolioCloud:
+    """
+    Đám mây danh mục ngẫu nhiên (trọng số đều trên simplex) để vẽ biểu đồ rủi ro - lợi nhuận.
+
+    Trọng số được sinh lại từ hạt giống, nên giống hệt cách sinh tuần tự cũ
+    (np.random.seed(seed) rồi np.random.random(N) cho từng danh mục).
+
+    Attributes:
+        mean_returns (np.ndarray): Lợi nhuận kỳ vọng năm của từng mã
+        cov (np.ndarray): Ma trận hiệp phương sai năm
+        risk_free_rate (float): Lãi suất phi rủi ro dùng cho tỷ lệ Sharpe
+        n_portfolios (int): Số danh mục
+        seed (int): Hạt giống
+    """
+
+    __slots__ = ('mean_returns', 'cov', 'risk_free_rate', 'n_portfolios', 'seed', '_arrays')
+
+    def __init__(self, mean_returns, cov, risk_free_rate: float, n_portfolios: int = DEFAULT_CLOUD_SIZE,
+                 seed: int = DEFAULT_CLOUD_SEED):
+        self.mean_returns = np.asarray(mean_returns, dtype=float)
+        self.cov = np.asarray(cov, dtype=float)
+        self.risk_free_rate = float(risk_free_rate)
+        self.n_portfolios = int(n_portfolios)
+        self.seed = int(seed)
+        self._arrays = None
+
+    def __reduce__(self):
+        # Không gửi/lưu các mảng đã tái tạo
+        return (self.__class__, (self.mean_returns, self.cov, self.risk_free_rate, self.n_portfolios, self.seed))
+
+    def generate(self):
+        """Tái tạo đám mây ở độ chính xác float64: (trọng số, lợi nhuận, độ lệch chuẩn, Sharpe)."""
+        weights = np.random.RandomState(self.seed).random_sample((self.n_portfolios, len(self.mean_returns)))
+        weights /= weights.sum(axis=1, keepdims=True)
+        returns = weights @ self.mean_returns
+        volatility = np.sqrt(np.einsum('ij,ij->i', weights @ self.cov, weights))
+        sharpe = (returns - self.risk_free_rate) / volatility
+        return weights, returns, volatility, sharpe
+
+    def arrays(self) -> Dict[str, object]:
+        """Các mảng float32 theo khóa cũ của kết quả (tái tạo ở lần gọi đầu, giữ tới khi release)."""
+        if self._arrays is None:
+            weights, returns, volatility, sharpe = self.generate()
+            self._arrays = {
+                'ret_arr': returns.astype(np.float32),
+                'vol_arr': volatility.astype(np.float32),
+                'sharpe_arr': sharpe.astype(np.float32),
+                'all_weights': weights.astype(np.float32),
+                'max_sharpe_idx': int(np.argmax(sharpe)),
+            }
+        return self._arrays
+
+    def release(self) -> None:
+        """Bỏ các mảng đã tái tạo."""
+        self._arrays = None
+
+    def copy(self) -> 'PortfolioCloud':
+        """Bản sao chưa tái tạo mảng (dùng chung lợi nhuận kỳ vọng và hiệp phương sai)."""
+        return self.__class__(self.mean_returns, self.cov, self.risk_free_rate, self.n_portfolios, self.seed)
+
+
+class OptimizationResult(dict):
+    """
+    Kết quả của một mô hình tối ưu hóa.
+
+    Attributes:
+        model (str): Mã mô hình (ví dụ 'max_sharpe')
+        cloud (PortfolioCloud | None): Đám mây danh mục ngẫu nhiên cho biểu đồ, phục vụ các khóa CLOUD_KEYS
+    """
+
+    __slots__ = ('model', 'cloud')
+
+    def __init__(self, model: str, data: Optional[Mapping[str, object]] = None,
+                 cloud: Optional[PortfolioCloud] = None):
+        super().__init__(data or {})
+        self.model = model
+        self.cloud = cloud
+
+    def __reduce__(self):
+        # Giữ model và cloud khi pickle sang tiến trình con
+        return (self.__class__, (self.model, dict(self), self.cloud))
+
+    def __missing__(self, key):
+        if self.cloud is not None and key in CLOUD_KEYS:
+            return self.cloud.arrays()[key]
+        raise KeyError(key)
+
+    def __contains__(self, key) -> bool:
+        return super().__contains__(key) or (self.cloud is not None and key in CLOUD_KEYS)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def compact(self) -> 'OptimizationResult':
+        """Bản để lưu lâu dài (session): cùng dữ liệu, đám mây chưa tái tạo."""
+        return self.__class__(self.model, self, self.cloud.copy() if self.cloud is not None else None)
+
+    def to_bytes(self) -> bytes:
+        """Tuần tự hóa gọn (pickle protocol 5, không kèm đám mây đã tái tạo)."""
+        return pickle.dumps(self, protocol=5)
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> 'OptimizationResult':
+        result = pickle.loads(payload)
+        if not isinstance(result, cls):
+            raise TypeError(f"Dữ liệu không phải {cls.__name__}")
+        return result
+
+    def __repr__(self) -> str:
+        return (f"OptimizationResult(model={self.model!r}, assets={len(self.weights)}, "
+                f"return={self.expected_return:.4f}, volatility={self.volatility:.4f})")
+
+    @property
+    def weights(self) -> Dict[str, float]:
+        return self.get(WEIGHTS_KEY, {})
+
+    @property
+    def expected_return(self) -> float:
+        return float(self.get(EXPECTED_RETURN_KEY, 0.0))
+
+    @property
+    def volatility(self) -> float:
+        return float(self.get(VOLATILITY_KEY, 0.0))
+
+    @property
+    def sharpe(self) -> float:
+        return float(self.get(SHARPE_KEY, 0.0))
+
+    @property
+    def allocation(self) -> Dict[str, int]:
+        return self.get(ALLOCATION_KEY, {})
+
+    @property
+    def leftover(self) -> float:
+        return float(self.get(LEFTOVER_KEY, 0.0))
+
+    @property
+    def max_drawdown(self) -> Optional[float]:
+        """Mức sụt giảm tối đa trong mẫu của trọng số tối ưu (tỷ lệ âm), None với kết quả cũ."""
+        value = self.get(MAX_DRAWDOWN_KEY)
+        return float(value) if value is not None else None
+
+    @property
+    def realized_metrics(self) -> Dict[str, float]:
+        """Chỉ số backtest trên dữ liệu lịch sử (analytics.performance_summary), rỗng nếu chưa backtest."""
+        return self.get(REALIZED_METRICS_KEY, {})
+
+    @property
+    def latest_prices(self) -> Dict[str, float]:
+        return self.get(PRICES_KEY, {})
+
+    @property
+    def invested(self) -> float:
+        prices = self.latest_prices
+        return float(sum(shares * prices.get(ticker, 0.0) for ticker, shares in self.allocation.items()))
+
+
+__all__ = [
+    'WEIGHTS_KEY',
+    'EXPECTED_RETURN_KEY',
+    'VOLATILITY_KEY',
+    'SHARPE_KEY',
+    'ALLOCATION_KEY',
+    'LEFTOVER_KEY',
+    'PRICES_KEY',
+    'MAX_DRAWDOWN_KEY',
+    'REALIZED_METRICS_KEY',
+    'CLOUD_KEYS',
+    'DEFAULT_CLOUD_SIZE',
+    'DEFAULT_CLOUD_SEED',
+    'PortfolioCloud',
+    'OptimizationResult',
+]
@@ -0,0 +1,186 @@
+"""
+Module risk_budgeting.py
+Phân bổ theo ngân sách rủi ro (risk budgeting / risk parity).
+
+Danh mục có đóng góp rủi ro RC_i = w_i (Σw)_i / w'Σw bằng đúng ngân sách b_i là nghiệm
+(sau khi chuẩn hóa tổng bằng 1) của bài toán lồi với hàm chặn log:
+
+    min_y  ½ y'Σy - Σ b_i log(y_i),   y > 0
+
+Điều kiện bậc nhất y_i (Σy)_i = b_i cho phép giải từng tọa độ dưới dạng đóng (nghiệm dương
+của một phương trình bậc hai), nên không cần SLSQP tổng quát vốn chậm và dễ dừng ở nghiệm
+chưa hội tụ khi có trên vài chục mã. Hai bộ giải:
+    - 'ccd': hạ tọa độ tuần hoàn, mỗi vòng O(N²), cập nhật Σy tăng dần.
+    - 'newton': Newton có giảm bước trên cùng hàm mục tiêu, hội tụ bậc hai sau vài chục
+      bước Cholesky; nhanh hơn khi N lên tới hàng trăm mã.
+"""
+
+import logging
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+RISK_BUDGET_SOLVERS = ('newton', 'ccd')
+DEFAULT_RISK_BUDGET_TOL = 1e-10
+
+
+def _risk_budget_residual(cov: np.ndarray, y: np.ndarray, budgets: np.ndarray) -> float:
+    """Sai lệch lớn nhất của điều kiện y_i (Σy)_i = b_i."""
+    return float(np.max(np.abs(y * (cov @ y) - budgets)))
+
+
+def _initial_point(cov: np.ndarray, budgets: np.ndarray) -> np.ndarray:
+    """Điểm xuất phát tỷ lệ b_i / σ_i, co giãn để y'Σy = Σb (đúng với nghiệm)."""
+    x = budgets / np.sqrt(np.diag(cov))
+    return x * np.sqrt(budgets.sum() / (x @ cov @ x))
+
+
+def _solve_ccd(cov: np.ndarray, budgets: np.ndarray, tol: float, max_iter: int) -> Tuple[np.ndarray, int]:
+    """Hạ tọa độ tuần hoàn: y_i là nghiệm dương của Σ_ii y² + c_i y - b_i = 0."""
+    y = _initial_point(cov, budgets)
+    diag = np.diag(cov).copy()
+    sigma_y = cov @ y
+    for iteration in range(1, max_iter + 1):
+        for i in range(len(y)):
+            c = sigma_y[i] - diag[i] * y[i]
+            y_new = (-c + np.sqrt(c * c + 4.0 * diag[i] * budgets[i])) / (2.0 * diag[i])
+            sigma_y += cov[:, i] * (y_new - y[i])
+            y[i] = y_new
+        if np.max(np.abs(y * sigma_y - budgets)) < tol:
+            return y, iteration
+    return y, max_iter
+
+
+def _solve_newton(cov: np.ndarray, budgets: np.ndarray, tol: float, max_iter: int) -> Tuple[np.ndarray, int]:
+    """Newton với bước giữ y > 0 và tìm kiếm lùi Armijo."""
+
+    def objective(v):
+        return 0.5 * v @ cov @ v - budgets @ np.log(v)
+
+    y = _initial_point(cov, budgets)
+    value = objective(y)
+    for iteration in range(1, max_iter + 1):
+        sigma_y = cov @ y
+        if np.max(np.abs(y * sigma_y - budgets)) < tol:
+            return y, iteration - 1
+        gradient = sigma_y - budgets / y
+        hessian = cov + np.diag(budgets / (y * y))
+        step = -np.linalg.solve(hessian, gradient)
+
+        # Bước lớn nhất còn giữ y dương, sau đó giảm dần tới khi hàm mục tiêu giảm đủ
+        negative = step < 0
+        t = min(1.0, 0.99 * float(np.min(-y[negative] / step[negative]))) if negative.any() else 1.0
+        slope = gradient @ step
+        while True:
+            candidate = y + t * step
+            candidate_value = objective(candidate)
+            if candidate_value <= value + 1e-4 * t * slope or t < 1e-12:
+                break
+            t *= 0.5
+        y, value = candidate, candidate_value
+    return y, max_iter
+
+
+def risk_budget_weights(cov, budgets=None, method: str = 'newton', tol: float = DEFAULT_RISK_BUDGET_TOL,
+                        max_iter: int = 500) -> np.ndarray:
+    """
+    Trọng số có đóng góp rủi ro tỷ lệ với ``budgets``.
+
+    Args:
+        cov: Ma trận hiệp phương sai (N x N)
+        budgets: Ngân sách rủi ro không âm của từng mã (mặc định: bằng nhau, tức risk parity).
+            Mã có ngân sách 0 nhận trọng số 0.
+        method: 'newton' hoặc 'ccd'
+        tol: Ngưỡng sai lệch của điều kiện y_i (Σy)_i = b_i (trên ma trận đã chuẩn hóa)
+        max_iter: Số vòng lặp tối đa
+
+    Returns:
+        np.ndarray: Trọng số dài hạn, tổng bằng 1, theo thứ tự cột của ``cov``
+    """
+    if method not in RISK_BUDGET_SOLVERS:
+        raise ValueError(f"method phải là một trong {RISK_BUDGET_SOLVERS}, nhận '{method}'")
+    cov = np.asarray(cov, dtype=float)
+    n_assets = cov.shape[0]
+    budgets = np.full(n_assets, 1.0 / n_assets) if budgets is None else np.asarray(budgets, dtype=float)
+    if budgets.shape != (n_assets,) or np.any(budgets < 0) or budgets.sum() <= 0:
+        raise ValueError("Ngân sách rủi ro phải là vector không âm, cùng số phần tử với ma trận hiệp phương sai")
+
+    active = budgets > 0
+    if np.any(np.diag(cov)[active] <= 0):
+        raise ValueError("Mã có ngân sách rủi ro dương phải có phương sai dương")
+    sub_cov = cov[np.ix_(active, active)]
+    # Chuẩn hóa theo phương sai trung bình để ngưỡng hội tụ không phụ thuộc đơn vị (ngày/năm)
+    sub_cov = sub_cov / np.mean(np.diag(sub_cov))
+    sub_budgets = budgets[active] / budgets.sum()
+
+    solver = _solve_newton if method == 'newton' else _solve_ccd
+    y, iterations = solver(sub_cov, sub_budgets, tol, max_iter)
+    residual = _risk_budget_residual(sub_cov, y, sub_budgets)
+    if residual >= tol:
+        logger.warning(f"[RISK_BUDGET] {method} chua hoi tu sau {iterations} vong, sai lech {residual:.2e}")
+    else:
+        logger.info(f"[RISK_BUDGET] {method} hoi tu sau {iterations} vong ({int(active.sum())} ma)")
+
+    weights = np.zeros(n_assets)
+    weights[active] = y / y.sum()
+    return weights
+
+
+def risk_contributions(cov, weights) -> np.ndarray:
+    """Tỷ lệ đóng góp rủi ro w_i (Σw)_i / w'Σw của từng mã (tổng bằng 1)."""
+    cov = np.asarray(cov, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    marginal = cov @ weights
+    return weights * marginal / (weights @ marginal)
+
+
+def sector_risk_budgets(tickers: Iterable[str], sector_map: Mapping[str, str],
+                        sector_budgets: Optional[Mapping[str, float]] = None,
+                        other_sector: str = 'Khác') -> pd.Series:
+    """
+    Ngân sách rủi ro theo ngành: chia cho từng ngành rồi chia đều cho các mã trong ngành.
+
+    Args:
+        tickers: Danh sách mã
+        sector_map: Ngành (icb_name) của từng mã; mã không có ngành thuộc ``other_sector``
+        sector_budgets: Ngân sách của từng ngành (mặc định: bằng nhau giữa các ngành có mặt).
+            Ngành không được liệt kê nhận ngân sách 0.
+        other_sector: Tên nhóm cho các mã không tra được ngành
+
+    Returns:
+        pd.Series: Ngân sách của từng mã, tổng bằng 1
+    """
+    tickers = list(tickers)
+    sectors = pd.Series([sector_map.get(t, other_sector) for t in tickers], index=tickers)
+    counts = sectors.map(sectors.value_counts())
+    if sector_budgets is None:
+        per_sector = pd.Series(1.0, index=sectors.unique())
+    else:
+        per_sector = pd.Series(dict(sector_budgets), dtype=float)
+    budgets = sectors.map(per_sector).fillna(0.0) / counts
+    if budgets.sum() <= 0:
+        raise ValueError("Không có ngành nào trong danh mục nhận ngân sách rủi ro dương")
+    return budgets / budgets.sum()
+
+
+def aggregate_by_sector(values: Mapping[str, float], sector_map: Mapping[str, str],
+                        other_sector: str = 'Khác') -> Dict[str, float]:
+    """Cộng giá trị (trọng số hoặc đóng góp rủi ro) của các mã theo ngành."""
+    totals: Dict[str, float] = {}
+    for ticker, value in values.items():
+        sector = sector_map.get(ticker, other_sector)
+        totals[sector] = totals.get(sector, 0.0) + float(value)
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+__all__ = [
+    'RISK_BUDGET_SOLVERS',
+    'DEFAULT_RISK_BUDGET_TOL',
+    'risk_budget_weights',
+    'risk_contributions',
+    'sector_risk_budgets',
+    'aggregate_by_sector',
+]
@@ -0,0 +1,99 @@
+"""
+Module runner.py
+Chạy nhiều mô hình tối ưu hóa trên cùng dữ liệu, không phụ thuộc giao diện.
+
+Các mô hình trong optimization.models độc lập với nhau khi đã có chung ảnh chụp giá, nên
+có thể chạy song song trên nhiều tiến trình. Hàm lấy giá mới nhất không được gửi sang tiến
+trình con (thường là closure/hàm gọi mạng, không pickle được) - ảnh chụp giá là bắt buộc.
+Tiến độ được báo qua callback để lớp giao diện tự cập nhật thanh tiến trình.
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+import pandas as pd
+
+from optimization.models import MODEL_REGISTRY
+from optimization.price_snapshot import PriceSnapshot
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_WORKERS = min(4, os.cpu_count() or 1)
+
+# Tên hiển thị -> (mã mô hình trong MODEL_REGISTRY, tham số riêng)
+ModelSpecs = Mapping[str, Tuple[str, Mapping[str, object]]]
+
+
+def _run_model(model_key: str, data: pd.DataFrame, total_investment: float,
+               price_snapshot: PriceSnapshot, kwargs: Mapping[str, object]):
+    """Chạy một mô hình (trong tiến trình hiện tại hoặc tiến trình con)."""
+    return MODEL_REGISTRY[model_key](data, total_investment, None, price_snapshot=price_snapshot, **kwargs)
+
+
+def run_models(data: pd.DataFrame, total_investment: float, models: ModelSpecs,
+               price_snapshot: PriceSnapshot, max_workers: Optional[int] = None,
+               progress_callback: Optional[Callable[[str, object, int, int], None]] = None) -> Dict[str, object]:
+    """
+    Chạy các mô hình và trả về kết quả theo tên hiển thị.
+
+    Args:
+        data (pd.DataFrame): Dữ liệu giá cổ phiếu
+        total_investment (float): Tổng số tiền đầu tư
+        models (dict): {tên hiển thị: (mã mô hình, tham số riêng)}, ví dụ
+            {"Mô hình HRP": ('hrp', {'linkage_method': 'ward'})}
+        price_snapshot (PriceSnapshot): Ảnh chụp giá dùng chung
+        max_workers (int): Số tiến trình (mặc định DEFAULT_MODEL_WORKERS; 1 để chạy tuần tự)
+        progress_callback (callable): Gọi sau mỗi mô hình với (tên, kết quả hoặc None, số đã xong, tổng)
+
+    Returns:
+        dict: {tên hiển thị: OptimizationResult}; mô hình lỗi không có trong kết quả
+    """
+    unknown = [key for key, _ in models.values() if key not in MODEL_REGISTRY]
+    if unknown:
+        raise ValueError(f"Mô hình không tồn tại: {unknown}")
+
+    total = len(models)
+    workers = DEFAULT_MODEL_WORKERS if max_workers is None else max_workers
+    results = {}
+
+    def collect(name, result, done):
+        if result:
+            results[name] = result
+        else:
+            logger.error(f"Khong the chay {name}")
+        if progress_callback is not None:
+            progress_callback(name, result, done, total)
+
+    if workers <= 1 or total <= 1:
+        for done, (name, (key, kwargs)) in enumerate(models.items(), 1):
+            try:
+                result = _run_model(key, data, total_investment, price_snapshot, kwargs)
+            except Exception as e:
+                logger.error(f"Loi khi chay {name}: {e}")
+                result = None
+            collect(name, result, done)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, total)) as pool:
+            futures = {
+                pool.submit(_run_model, key, data, total_investment, price_snapshot, kwargs): name
+                for name, (key, kwargs) in models.items()
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                name = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Loi khi chay {name}: {e}")
+                    result = None
+                collect(name, result, done)
+
+    # Giữ thứ tự khai báo thay vì thứ tự hoàn thành
+    return {name: results[name] for name in models if name in results}
+
+
+__all__ = [
+    'DEFAULT_MODEL_WORKERS',
+    'run_models',
+]
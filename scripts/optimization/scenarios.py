@@ -0,0 +1,185 @@
+"""
+Module scenarios.py
+Tối ưu hóa Min CVaR trên tập kịch bản rút gọn cho chuỗi lịch sử dài, cùng các hàm đo
+CVaR / CDaR của một danh mục trên toàn bộ lịch sử.
+
+Bài toán LP của EfficientCVaR có một ràng buộc cho mỗi quan sát, nên kích thước tăng
+tuyến tính theo (số phiên x số mã). Tuy nhiên chỉ các kịch bản nằm trong đuôi (1 - beta)
+của danh mục tối ưu mới ảnh hưởng tới nghiệm. Module này chọn kịch bản đuôi theo kiểu
+importance sampling (từ danh mục khởi tạo), giải LP trên tập con, rồi bổ sung các kịch bản
+bị vi phạm (sinh ràng buộc) cho tới khi khoảng cách giữa cận dưới (LP rút gọn) và cận trên
+(CVaR đo trên toàn bộ lịch sử) nhỏ hơn sai số cho phép.
+
+CDaR không được rút gọn: drawdown của mỗi phiên phụ thuộc vào đỉnh trước đó nên hầu hết
+các phiên đều phải giữ trong LP, tập rút gọn không nhỏ hơn đáng kể bài toán gốc.
+"""
+
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import linprog
+
+logger = logging.getLogger(__name__)
+
+# Chỉ rút gọn kịch bản khi lịch sử đủ dài; dưới ngưỡng này LP đầy đủ đã đủ nhanh
+SCENARIO_REDUCTION_MIN_ROWS = 500
+DEFAULT_SCENARIO_TOL = 1e-5
+
+
+def tail_mean(losses: np.ndarray, beta: float) -> float:
+    """
+    CVaR_beta của một mẫu tổn thất đồng xác suất, đúng bằng giá trị tối ưu của
+    min_alpha alpha + 1/(T(1-beta)) * sum max(loss - alpha, 0).
+    """
+    losses = np.sort(np.asarray(losses, dtype=float))[::-1]
+    k = len(losses) * (1 - beta)
+    whole = int(np.floor(k))
+    total = losses[:whole].sum()
+    if whole < len(losses):
+        total += (k - whole) * losses[whole]
+    return float(total / k)
+
+
+def portfolio_cvar(returns: np.ndarray, weights: np.ndarray, beta: float = 0.95) -> float:
+    """CVaR của danh mục trên toàn bộ lịch sử lợi suất (định nghĩa như EfficientCVaR)."""
+    return tail_mean(-returns @ weights, beta)
+
+
+def drawdown_path(returns: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Chuỗi drawdown cộng dồn (như EfficientCDaR) và chỉ số đỉnh tương ứng của mỗi phiên.
+
+    Returns:
+        tuple: (drawdown[1..T], peak_index[1..T]) với chỉ số tính trên lưới 0..T
+    """
+    cumulative = np.concatenate(([0.0], np.cumsum(returns @ weights)))
+    running_peak = np.maximum.accumulate(cumulative)
+    # Chỉ số đỉnh: vị trí gần nhất mà giá trị cộng dồn bằng đỉnh hiện tại
+    is_peak = cumulative >= running_peak
+    peak_index = np.maximum.accumulate(np.where(is_peak, np.arange(len(cumulative)), 0))
+    drawdown = running_peak - cumulative
+    return drawdown[1:], peak_index[1:]
+
+
+def portfolio_cdar(returns: np.ndarray, weights: np.ndarray, beta: float = 0.95) -> float:
+    """CDaR của danh mục trên toàn bộ lịch sử lợi suất (định nghĩa như EfficientCDaR)."""
+    drawdown, _ = drawdown_path(returns, weights)
+    return tail_mean(drawdown, beta)
+
+
+def _solve_tail_lp(loss_rows: np.ndarray, groups: np.ndarray, n_periods: int,
+                   beta: float, min_weight: float = 0.0,
+                   max_weight: float = 1.0) -> Tuple[np.ndarray, float, float]:
+    """
+    LP rút gọn: min alpha + 1/(T(1-beta)) * sum_g z_g
+               s.t. z_g >= L_j . w - alpha  (mỗi dòng j thuộc nhóm g),  z >= 0,
+                    sum(w) = 1, min_weight <= w <= max_weight.
+    Bỏ bớt dòng chỉ làm bài toán lỏng hơn, nên giá trị tối ưu là cận dưới của bài toán đầy đủ.
+    """
+    n_rows, n_assets = loss_rows.shape
+    group_ids, group_of_row = np.unique(groups, return_inverse=True)
+    n_groups = len(group_ids)
+
+    selector = sparse.csr_matrix(
+        (-np.ones(n_rows), (np.arange(n_rows), group_of_row)), shape=(n_rows, n_groups)
+    )
+    a_ub = sparse.hstack([
+        sparse.csr_matrix(loss_rows),
+        sparse.csr_matrix(-np.ones((n_rows, 1))),
+        selector,
+    ], format='csr')
+    b_ub = np.zeros(n_rows)
+    a_eq = sparse.csr_matrix(np.concatenate([np.ones(n_assets), np.zeros(1 + n_groups)])[None, :])
+
+    cost = np.concatenate([np.zeros(n_assets), [1.0], np.full(n_groups, 1.0 / (n_periods * (1 - beta)))])
+    bounds = [(min_weight, max_weight)] * n_assets + [(None, None)] + [(0, None)] * n_groups
+
+    result = linprog(cost, A_ub=a_ub, b_ub=b_ub, A_eq=a_eq, b_eq=[1.0], bounds=bounds, method='highs')
+    if result.status != 0:
+        raise ValueError(f"LP rut gon khong giai duoc: {result.message}")
+
+    weights = np.clip(result.x[:n_assets], 0, None)
+    weights /= weights.sum()
+    return weights, float(result.x[n_assets]), float(result.fun)
+
+
+def _initial_weights(returns: np.ndarray) -> np.ndarray:
+    """Danh mục khởi tạo nghịch đảo độ biến động để chọn kịch bản đuôi ban đầu."""
+    vol = returns.std(axis=0)
+    inv = np.where(vol > 0, 1.0 / np.where(vol > 0, vol, 1.0), 0.0)
+    if inv.sum() <= 0:
+        return np.full(returns.shape[1], 1.0 / returns.shape[1])
+    return inv / inv.sum()
+
+
+def min_cvar_reduced(returns: pd.DataFrame, beta: float = 0.95, tol: float = DEFAULT_SCENARIO_TOL,
+                     tail_multiplier: float = 2.0, max_rounds: int = 30,
+                     initial_weights: Optional[np.ndarray] = None, min_weight: float = 0.0,
+                     max_weight: float = 1.0) -> Tuple[Dict[str, float], float, dict]:
+    """
+    Min CVaR với tập kịch bản đuôi được sinh dần.
+
+    Args:
+        returns (pd.DataFrame): Lợi suất hàng ngày (phiên x mã)
+        beta (float): Mức độ tin cậy
+        tol (float): Sai số cho phép giữa cận trên và cận dưới của CVaR tối ưu
+        tail_multiplier (float): Số kịch bản ban đầu = tail_multiplier * (1 - beta) * T
+        max_rounds (int): Số vòng sinh ràng buộc tối đa
+        initial_weights (np.ndarray): Danh mục dùng để chọn kịch bản đuôi ban đầu, ví dụ
+            nghiệm của cửa sổ trước (mặc định: nghịch đảo độ biến động)
+        min_weight (float): Tỷ trọng tối thiểu của một mã
+        max_weight (float): Tỷ trọng tối đa của một mã
+
+    Returns:
+        tuple: (weights_dict, cvar, info) - info gồm số kịch bản, cận dưới/trên, thời gian
+    """
+    start = time.perf_counter()
+    tickers = returns.columns.tolist()
+    r = returns.to_numpy(dtype=float)
+    n_periods = len(r)
+    batch = max(int(np.ceil(tail_multiplier * (1 - beta) * n_periods)), 1)
+
+    seed = _initial_weights(r) if initial_weights is None else np.asarray(initial_weights, dtype=float)
+    losses = -r @ seed
+    active = np.zeros(n_periods, dtype=bool)
+    active[np.argsort(losses)[::-1][:batch]] = True
+
+    weights, lower, upper, rounds = None, -np.inf, np.inf, 0
+    for rounds in range(1, max_rounds + 1):
+        idx = np.flatnonzero(active)
+        weights, alpha, lower = _solve_tail_lp(-r[idx], idx, n_periods, beta, min_weight, max_weight)
+        losses = -r @ weights
+        upper = tail_mean(losses, beta)
+        if upper - lower <= tol:
+            break
+        violated = np.flatnonzero(~active & (losses > alpha))
+        if violated.size == 0:
+            break
+        worst = violated[np.argsort(losses[violated])[::-1][:batch]]
+        active[worst] = True
+
+    info = {
+        'scenarios': int(active.sum()),
+        'observations': n_periods,
+        'rounds': rounds,
+        'lower_bound': lower,
+        'upper_bound': upper,
+        'seconds': time.perf_counter() - start,
+    }
+    logger.info(f"[MIN_CVAR] Rut gon kich ban: {info}")
+    return dict(zip(tickers, weights)), upper, info
+
+
+__all__ = [
+    'SCENARIO_REDUCTION_MIN_ROWS',
+    'DEFAULT_SCENARIO_TOL',
+    'tail_mean',
+    'portfolio_cvar',
+    'portfolio_cdar',
+    'drawdown_path',
+    'min_cvar_reduced',
+]
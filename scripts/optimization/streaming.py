@@ -0,0 +1,289 @@
+"""
+Module streaming.py
+Backtest trên toàn bộ universe (~1.600 mã x 10 năm) mà không dựng ma trận giá/lợi suất dày đặc trong RAM.
+
+ReturnStore giữ ma trận lợi suất (phiên x mã, float32) trong một tệp .npy trên đĩa, kèm tệp
+.meta.npz (phiên, mã, phiên có dữ liệu). build_return_store ghi tệp theo từng khối mã (mỗi lần
+chỉ tải giá của một khối), stream_backtest đọc theo từng cửa sổ phiên:
+    - Mỗi cửa sổ được ánh xạ bộ nhớ riêng (np.memmap có offset) rồi giải phóng ngay, nên số trang
+      thường trú (RSS) chỉ cỡ một cửa sổ, không tăng theo số mã hay số năm.
+    - Chỉ các cột có trọng số được đọc, và được nhân theo khối mã để mảng tạm float64 có kích
+      thước cố định.
+    - Trạng thái mang qua các cửa sổ chỉ là giá trị hiện tại của từng mã đang nắm giữ; kết quả
+      tích lũy là chuỗi lợi suất của danh mục (độ dài bằng số phiên).
+Ô trống (NaN) là phiên mã không giao dịch, coi như lợi suất 0; phiên không mã nào có dữ liệu (nghỉ
+lễ) bị bỏ qua.
+"""
+
+import logging
+import os
+from typing import Callable, Iterator, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from optimization.backtest import BacktestResult, backtest_metrics
+from optimization.walk_forward import rebalance_positions
+
+logger = logging.getLogger(__name__)
+
+STREAM_REBALANCE_OPTIONS = {
+    'ideal': 'Trọng số cố định mỗi phiên (lý thuyết)',
+    'D': 'Hằng ngày',
+    'W': 'Hằng tuần',
+    'M': 'Hằng tháng',
+    'Q': 'Hằng quý',
+    'hold': 'Không tái cân bằng (mua và nắm giữ)',
+}
+DEFAULT_STORE_DTYPE = np.float32
+DEFAULT_CHUNK_ROWS = 256
+DEFAULT_CHUNK_ASSETS = 200
+
+
+def _meta_path(path: str) -> str:
+    return os.path.splitext(path)[0] + '.meta.npz'
+
+
+class ReturnStore:
+    """
+    Ma trận lợi suất ngày (phiên x mã) trên đĩa, đọc theo cửa sổ phiên.
+
+    Attributes:
+        path (str): Tệp .npy chứa ma trận
+        index (pd.DatetimeIndex): Phiên của từng dòng
+        tickers (pd.Index): Mã của từng cột
+        valid (np.ndarray): Dòng có ít nhất một mã có dữ liệu
+        dtype (np.dtype): Kiểu phần tử
+        offset (int): Vị trí bắt đầu dữ liệu trong tệp (sau header .npy)
+    """
+
+    __slots__ = ('path', 'index', 'tickers', 'valid', 'dtype', 'offset', 'writable')
+
+    def __init__(self, path: str, index: pd.DatetimeIndex, tickers: Sequence[str], valid: np.ndarray,
+                 dtype, offset: int, writable: bool = False):
+        self.path = path
+        self.index = pd.DatetimeIndex(index)
+        self.tickers = pd.Index(tickers)
+        self.valid = valid
+        self.dtype = np.dtype(dtype)
+        self.offset = int(offset)
+        self.writable = writable
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.index), len(self.tickers)
+
+    @classmethod
+    def create(cls, path: str, index: pd.DatetimeIndex, tickers: Sequence[str],
+               dtype=DEFAULT_STORE_DTYPE) -> 'ReturnStore':
+        """Tạo tệp mới (toàn NaN) để ghi dần bằng write_prices, kết thúc bằng close()."""
+        header = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(len(index), len(tickers)))
+        store = cls(path, index, tickers, np.zeros(len(index), dtype=bool), dtype, header.offset, writable=True)
+        del header
+        for _, _, window in store.iter_windows(mode='r+'):
+            window[:] = np.nan
+            window.flush()
+        return store
+
+    @classmethod
+    def open(cls, path: str) -> 'ReturnStore':
+        """Mở tệp đã ghi (chỉ đọc header và metadata, không đọc dữ liệu)."""
+        header = np.load(path, mmap_mode='r')
+        meta = np.load(_meta_path(path), allow_pickle=False)
+        store = cls(path, pd.to_datetime(meta['index']), meta['tickers'].astype(str), meta['valid'],
+                    header.dtype, header.offset)
+        if header.shape != store.shape:
+            raise ValueError(f"Metadata không khớp với ma trận: {header.shape} != {store.shape}")
+        del header
+        return store
+
+    def write_prices(self, prices: pd.DataFrame) -> None:
+        """
+        Ghi lợi suất của một khối mã từ giá đóng cửa (phiên x mã, không cần đủ phiên).
+
+        Lợi suất tính trên giá đã điền tiếp (gộp cả khoảng tạm ngừng vào phiên giao dịch lại),
+        nhưng để trống ở phiên mã không có giá.
+        """
+        if not self.writable:
+            raise ValueError("ReturnStore đang ở chế độ chỉ đọc")
+        columns = self.tickers.get_indexer(prices.columns)
+        if (columns < 0).any():
+            raise KeyError(f"Mã không có trong ReturnStore: {list(prices.columns[columns < 0])}")
+        prices = prices.reindex(self.index.union(prices.index)).sort_index()
+        returns = prices.ffill().pct_change(fill_method=None).where(prices.notna())
+        block = returns.reindex(self.index).to_numpy(dtype=self.dtype)
+        for start, stop, window in self.iter_windows(mode='r+'):
+            window[:, columns] = block[start:stop]
+            window.flush()
+        self.valid |= np.isfinite(block).any(axis=1)
+
+    def close(self) -> 'ReturnStore':
+        """Ghi metadata và trả về bản chỉ đọc."""
+        self.writable = False
+        np.savez(_meta_path(self.path), index=self.index.to_numpy(dtype='datetime64[ns]'),
+                 tickers=self.tickers.to_numpy(dtype=str), valid=self.valid)
+        return self
+
+    def window(self, start: int, stop: int, mode: str = 'r') -> np.memmap:
+        """Ánh xạ riêng các dòng [start, stop); bỏ tham chiếu là các trang được giải phóng."""
+        n_assets = len(self.tickers)
+        return np.memmap(self.path, dtype=self.dtype, mode=mode, shape=(stop - start, n_assets),
+                         offset=self.offset + start * n_assets * self.dtype.itemsize)
+
+    def iter_windows(self, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                     mode: str = 'r') -> Iterator[Tuple[int, int, np.memmap]]:
+        """Duyệt ma trận theo cửa sổ phiên: (dòng đầu, dòng cuối, khối dữ liệu)."""
+        for start in range(0, len(self.index), chunk_rows):
+            stop = min(start + chunk_rows, len(self.index))
+            yield start, stop, self.window(start, stop, mode)
+
+
+def build_return_store(path: str, symbols: Sequence[str], start_date, end_date, fetch_stock_data_func: Callable,
+                       index: Optional[pd.DatetimeIndex] = None, chunk_assets: int = DEFAULT_CHUNK_ASSETS,
+                       dtype=DEFAULT_STORE_DTYPE) -> ReturnStore:
+    """
+    Tải giá theo từng khối mã và ghi ma trận lợi suất ra đĩa.
+
+    Args:
+        path (str): Tệp .npy đích (ghi đè nếu đã có)
+        symbols (list): Các mã của universe
+        start_date, end_date: Khoảng thời gian
+        fetch_stock_data_func (function): Hàm lấy dữ liệu giá, trả về (DataFrame, danh sách mã lỗi)
+        index (pd.DatetimeIndex): Lịch phiên; mặc định các ngày làm việc trong khoảng (ngày nghỉ lễ
+            không có dữ liệu được đánh dấu và bỏ qua khi backtest)
+        chunk_assets (int): Số mã mỗi lần tải
+        dtype: Kiểu phần tử lưu trên đĩa
+
+    Returns:
+        ReturnStore: Bản chỉ đọc; mã không tải được để trống
+    """
+    if index is None:
+        index = pd.bdate_range(start_date, end_date)
+    symbols = list(dict.fromkeys(symbols))
+    store = ReturnStore.create(path, index, symbols, dtype=dtype)
+    skipped = []
+    for start in range(0, len(symbols), chunk_assets):
+        batch = symbols[start:start + chunk_assets]
+        prices, skipped_batch = fetch_stock_data_func(batch, start_date, end_date)
+        skipped.extend(skipped_batch or [])
+        if not prices.empty:
+            store.write_prices(prices[[t for t in prices.columns if t in store.tickers]])
+        logger.info(f"[STREAM] Da ghi {min(start + chunk_assets, len(symbols))}/{len(symbols)} ma vao {path}")
+    if skipped:
+        logger.warning(f"[STREAM] Khong tai duoc du lieu: {skipped}")
+    return store.close()
+
+
+def _events(store: ReturnStore, valid_rows: np.ndarray, rebalance: Union[str, int]) -> np.ndarray:
+    """
+    Dòng của store tái cân bằng ở cuối phiên, cùng lịch với simulate_rebalancing trên bảng giá.
+
+    Lịch giá gồm phiên mua ban đầu (phiên ngay trước dòng lợi suất đầu tiên) và các phiên có dữ liệu;
+    vị trí p > 0 trên lịch giá là dòng lợi suất thứ p - 1 (nếu không có phiên trước đó: thứ p).
+    """
+    if rebalance == 'hold' or not len(valid_rows):
+        return np.array([], dtype=int)
+    shift = 1 if valid_rows[0] > 0 else 0
+    calendar = store.index[valid_rows[0] - shift:valid_rows[0]].append(store.index[valid_rows])
+    positions = rebalance_positions(calendar, 1 if rebalance == 'D' else rebalance, 0)
+    return valid_rows[positions[positions > 0] - shift]
+
+
+def stream_backtest(store: ReturnStore, weights: Union[Mapping[str, float], Sequence[float]],
+                    rebalance: Union[str, int] = 'ideal', chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                    chunk_assets: int = DEFAULT_CHUNK_ASSETS, fee: float = 0.0, sell_tax: float = 0.0,
+                    benchmark_returns: Optional[pd.Series] = None) -> BacktestResult:
+    """
+    Backtest danh mục trên ReturnStore, đọc từng cửa sổ phiên.
+
+    Args:
+        store (ReturnStore): Ma trận lợi suất trên đĩa
+        weights: Trọng số mục tiêu (dict theo mã, hoặc danh sách theo thứ tự store.tickers)
+        rebalance: 'ideal' (giữ đúng trọng số mỗi phiên), 'D', 'W', 'M', 'Q', số phiên (int) hoặc 'hold'
+        chunk_rows (int): Số phiên mỗi cửa sổ
+        chunk_assets (int): Số mã mỗi khối nhân
+        fee (float): Phí mỗi chiều trên giá trị giao dịch khi tái cân bằng (bỏ qua với 'ideal')
+        sell_tax (float): Thuế trên giá trị bán
+        benchmark_returns (pd.Series): Lợi suất chỉ số tham chiếu để tính Alpha
+
+    Returns:
+        BacktestResult: Lợi suất, giá trị tích lũy và chỉ số của danh mục
+    """
+    if rebalance not in STREAM_REBALANCE_OPTIONS and not isinstance(rebalance, (int, np.integer)):
+        raise ValueError(f"rebalance phải là một trong {list(STREAM_REBALANCE_OPTIONS)} hoặc số phiên")
+    if isinstance(weights, Mapping):
+        unknown = [t for t, w in weights.items() if w and t not in store.tickers]
+        if unknown:
+            logger.warning(f"[STREAM] Bo qua ma khong co trong ReturnStore: {unknown}")
+        target = pd.Series(weights, dtype=float).reindex(store.tickers).fillna(0.0).to_numpy()
+    else:
+        target = np.asarray(weights, dtype=float)
+    if target.shape != (len(store.tickers),) or np.any(target < 0) or target.sum() <= 0:
+        raise ValueError("Trọng số mục tiêu phải không âm, cùng số phần tử với số mã của ReturnStore")
+
+    # Chỉ đọc các cột đang nắm giữ
+    active = np.flatnonzero(target)
+    target = target[active] / target[active].sum()
+    blocks = [slice(a, min(a + chunk_assets, len(active))) for a in range(0, len(active), chunk_assets)]
+
+    valid_rows = np.flatnonzero(store.valid)
+    index = store.index[valid_rows]
+    events = set(_events(store, valid_rows, rebalance)) if rebalance != 'ideal' else set()
+    portfolio_returns = np.empty(len(valid_rows))
+    values = target * (1 - fee)  # giá trị từng mã sau lần mua đầu (danh mục ban đầu = 1)
+    filled = 0
+
+    for start, stop, window in store.iter_windows(chunk_rows):
+        rows = np.flatnonzero(store.valid[start:stop])
+        if not len(rows):
+            continue
+        data = window if len(rows) == stop - start else window[rows]
+        if rebalance == 'ideal':
+            chunk = np.zeros(len(rows))
+            for block in blocks:
+                chunk += np.nan_to_num(data[:, active[block]].astype(float)) @ target[block]
+            portfolio_returns[filled:filled + len(rows)] = chunk
+            filled += len(rows)
+            continue
+
+        # Tái cân bằng: mỗi đoạn giữa hai kỳ tăng trưởng bằng tích lũy (1 + r), không lặp theo phiên
+        returns = np.nan_to_num(data[:, active].astype(float))
+        cuts = [i + 1 for i, row in enumerate(rows + start) if row in events]
+        for segment_start, segment_stop in zip([0] + cuts, cuts + [len(rows)]):
+            if segment_start == segment_stop:
+                continue
+            previous = values.sum()
+            path = values * np.cumprod(1 + returns[segment_start:segment_stop], axis=0)
+            totals = path.sum(axis=1)
+            values = path[-1]
+            if segment_stop in cuts:
+                # Tái cân bằng ở cuối phiên cuối của đoạn: chi phí trừ vào giá trị của phiên đó
+                trades = target - values / totals[-1]
+                cost = fee * np.abs(trades).sum() + sell_tax * np.clip(-trades, 0, None).sum()
+                totals[-1] *= 1 - cost
+                values = totals[-1] * target
+            segment_returns = totals / np.r_[previous, totals[:-1]] - 1
+            portfolio_returns[filled:filled + len(segment_returns)] = segment_returns
+            filled += len(segment_returns)
+        del returns
+
+    if rebalance != 'ideal' and fee and len(portfolio_returns):
+        # Phí của lần mua đầu tính vào phiên đầu tiên
+        portfolio_returns[0] = (1 + portfolio_returns[0]) * (1 - fee) - 1
+    portfolio_returns = pd.Series(portfolio_returns, index=index)
+    cumulative_returns = (1 + portfolio_returns).cumprod()
+    metrics = backtest_metrics(portfolio_returns, benchmark_returns)
+    logger.info(f"[STREAM] Backtest {len(index)} phien x {len(active)}/{len(store.tickers)} ma, "
+                f"cua so {chunk_rows} phien")
+    return BacktestResult(portfolio_returns, cumulative_returns, {}, metrics)
+
+
+__all__ = [
+    'STREAM_REBALANCE_OPTIONS',
+    'DEFAULT_STORE_DTYPE',
+    'DEFAULT_CHUNK_ROWS',
+    'DEFAULT_CHUNK_ASSETS',
+    'ReturnStore',
+    'build_return_store',
+    'stream_backtest',
+]
@@ -0,0 +1,250 @@
+"""
+Module sweep.py
+Quét tham số: tối ưu rồi backtest trên lưới (mô hình x cửa sổ ước lượng x chu kỳ tái cân bằng x số vốn).
+
+Dữ liệu được chia làm hai phần tại phiên ``split``: mỗi cửa sổ ước lượng gồm ``lookback`` phiên
+ngay trước ``split`` (trọng số chỉ dùng thông tin đã biết), phần từ ``split`` trở đi là giai đoạn
+backtest ngoài mẫu chung cho mọi ô của lưới, nên các ô so sánh được với nhau.
+
+Trọng số chỉ phụ thuộc (mô hình, cửa sổ), nên mỗi cặp là một tác vụ: tối ưu một lần
+(walk_forward.optimize_weights, không phân bổ cổ phiếu nguyên) rồi backtest mọi tổ hợp
+(chu kỳ, số vốn) với trọng số đó. Các tác vụ chạy trên nhiều tiến trình; ma trận giá được đặt
+một lần trong shared memory và các tiến trình con đọc trực tiếp thay vì nhận bản sao qua pickle.
+"""
+
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from optimization.backtest import BACKTEST_REBALANCE_OPTIONS, TRADING_DAYS, backtest_metrics, portfolio_path
+from optimization.walk_forward import WALK_FORWARD_MODELS, optimize_weights
+
+logger = logging.getLogger(__name__)
+
+SWEEP_MODELS = WALK_FORWARD_MODELS
+SWEEP_AXES = ('model', 'lookback', 'rebalance', 'amount')
+DEFAULT_SWEEP_LOOKBACKS = (63, 126, 189, 252, 378, 504)
+DEFAULT_SWEEP_REBALANCES = ('M', 'Q', 'hold')
+DEFAULT_EVALUATION_PERIODS = TRADING_DAYS
+DEFAULT_SWEEP_WORKERS = os.cpu_count() or 1
+
+# Ma trận giá của tiến trình hiện tại (gắn từ shared memory ở tiến trình con)
+_PRICES: Optional[pd.DataFrame] = None
+_SHARED: Optional[shared_memory.SharedMemory] = None
+
+
+class SweepResult:
+    """
+    Khối kết quả quét tham số.
+
+    Attributes:
+        frame (pd.DataFrame): Chỉ số backtest, chỉ mục nhiều cấp (model, lookback, rebalance, amount)
+        weights (pd.DataFrame): Trọng số tối ưu, chỉ mục (model, lookback) x mã
+        axes (dict): Giá trị của từng trục theo thứ tự SWEEP_AXES
+        evaluation (tuple): (ngày bắt đầu, ngày kết thúc) của giai đoạn backtest
+        failed (dict): {(model, lookback): lý do} các ô không chạy được
+        elapsed (float): Thời gian chạy (giây)
+    """
+
+    __slots__ = ('frame', 'weights', 'axes', 'evaluation', 'failed', 'elapsed')
+
+    def __init__(self, frame: pd.DataFrame, weights: pd.DataFrame, axes: Dict[str, list], evaluation: tuple,
+                 failed: Optional[Dict[tuple, str]] = None, elapsed: float = 0.0):
+        self.frame = frame
+        self.weights = weights
+        self.axes = axes
+        self.evaluation = evaluation
+        self.failed = failed or {}
+        self.elapsed = elapsed
+
+    @property
+    def metrics(self) -> List[str]:
+        return self.frame.columns.tolist()
+
+    def cube(self, metric: str) -> np.ndarray:
+        """Mảng 4 chiều của một chỉ số theo thứ tự SWEEP_AXES (NaN ở các ô lỗi)."""
+        full_index = pd.MultiIndex.from_product([self.axes[axis] for axis in SWEEP_AXES], names=SWEEP_AXES)
+        values = self.frame[metric].reindex(full_index).to_numpy(dtype=float)
+        return values.reshape([len(self.axes[axis]) for axis in SWEEP_AXES])
+
+    def table(self, metric: str, rows: str = 'model', columns: str = 'lookback', **fixed) -> pd.DataFrame:
+        """
+        Lát cắt 2 chiều của một chỉ số.
+
+        Các trục còn lại cố định theo ``fixed`` (ví dụ rebalance='M', amount=1e9); trục không được
+        chỉ định lấy giá trị đầu tiên.
+        """
+        frame = self.frame[metric]
+        for axis in SWEEP_AXES:
+            if axis not in (rows, columns):
+                frame = frame.xs(fixed.get(axis, self.axes[axis][0]), level=axis)
+        table = frame.unstack(columns).reindex(index=self.axes[rows], columns=self.axes[columns])
+        if rows == 'model':
+            table.index = [SWEEP_MODELS.get(model, model) for model in table.index]
+        return table
+
+    def best(self, metric: str = 'Sharpe Ratio', top: int = 10, ascending: bool = False) -> pd.DataFrame:
+        """Các tổ hợp tốt nhất theo một chỉ số."""
+        return self.frame.sort_values(metric, ascending=ascending).head(top)
+
+
+def _attach_prices(name: str, shape: tuple, index: pd.Index, columns: pd.Index) -> None:
+    """Khởi tạo tiến trình con: gắn ma trận giá trong shared memory (không sao chép)."""
+    global _PRICES, _SHARED
+    _SHARED = shared_memory.SharedMemory(name=name)
+    values = np.ndarray(shape, dtype=np.float64, buffer=_SHARED.buf)
+    _PRICES = pd.DataFrame(values, index=index, columns=columns, copy=False)
+
+
+def _sweep_cell(model: str, lookback: int, split: int, rebalances: Sequence[Union[str, int]],
+                amounts: Sequence[float], optimize_kwargs: Mapping[str, object],
+                simulation_kwargs: Mapping[str, object]) -> tuple:
+    """Tối ưu một cặp (mô hình, cửa sổ) rồi backtest mọi tổ hợp (chu kỳ, số vốn)."""
+    # Cửa sổ ước lượng: lookback lợi suất tính tới giá đóng cửa phiên split (phiên mua đầu tiên)
+    window = _PRICES.iloc[split - lookback:split + 1]
+    evaluation = _PRICES.iloc[split:]
+    weights = optimize_weights(window, model, **optimize_kwargs)
+
+    rows = []
+    for rebalance in rebalances:
+        metrics = None
+        for amount in amounts:
+            # Trọng số cố định không phụ thuộc số vốn: chỉ tính một lần
+            if metrics is None or rebalance != 'ideal':
+                portfolio_returns, _, simulation = portfolio_path(evaluation, weights, rebalance=rebalance,
+                                                                  initial_value=amount, **simulation_kwargs)
+                metrics = backtest_metrics(portfolio_returns)
+                if simulation is not None:
+                    metrics.update(simulation.summary())
+            rows.append(((model, lookback, rebalance, amount), metrics))
+    return model, lookback, weights, rows
+
+
+def _clean_prices(prices: pd.DataFrame) -> pd.DataFrame:
+    prices = prices.apply(pd.to_numeric, errors='coerce').ffill().bfill().dropna(axis=1, how='any')
+    return prices.astype(np.float64)
+
+
+def run_parameter_sweep(prices: pd.DataFrame, models: Sequence[str] = tuple(SWEEP_MODELS),
+                        lookbacks: Sequence[int] = DEFAULT_SWEEP_LOOKBACKS,
+                        rebalances: Sequence[Union[str, int]] = DEFAULT_SWEEP_REBALANCES,
+                        amounts: Sequence[float] = (1e9,), evaluation_periods: int = DEFAULT_EVALUATION_PERIODS,
+                        cov_estimator: Optional[str] = None, risk_free_rate: float = 0.02, beta: float = 0.95,
+                        max_workers: Optional[int] = None,
+                        progress_callback: Optional[Callable[[int, int], None]] = None,
+                        **simulation_kwargs) -> SweepResult:
+    """
+    Tối ưu rồi backtest trên toàn bộ lưới tham số.
+
+    Args:
+        prices (pd.DataFrame): Giá đóng cửa (phiên x mã) với DatetimeIndex
+        models (list): Các mô hình trong SWEEP_MODELS
+        lookbacks (list): Số phiên của cửa sổ ước lượng
+        rebalances (list): Chế độ tái cân bằng ('ideal' hoặc chế độ của simulate_rebalancing)
+        amounts (list): Các mức vốn ban đầu (VND)
+        evaluation_periods (int): Số phiên cuối dùng để backtest ngoài mẫu
+        cov_estimator (str): Bộ ước lượng hiệp phương sai (None: mẫu)
+        risk_free_rate (float): Lãi suất phi rủi ro cho Markowitz / Max Sharpe
+        beta (float): Mức tin cậy của CVaR / CDaR
+        max_workers (int): Số tiến trình (mặc định DEFAULT_SWEEP_WORKERS; 1 để chạy tuần tự)
+        progress_callback (callable): Gọi sau mỗi cặp (mô hình, cửa sổ) với (số đã xong, tổng)
+        **simulation_kwargs: Tham số khác của simulate_rebalancing (lot_sizes, fee, sell_tax,
+            drift_threshold, cash_rate, integer_shares)
+
+    Returns:
+        SweepResult
+    """
+    global _PRICES
+    unknown = [model for model in models if model not in SWEEP_MODELS]
+    if unknown:
+        raise ValueError(f"Mô hình không hỗ trợ khi quét tham số: {unknown}")
+    unknown = [r for r in rebalances if r not in BACKTEST_REBALANCE_OPTIONS and not isinstance(r, (int, np.integer))]
+    if unknown:
+        raise ValueError(f"Chế độ tái cân bằng không hợp lệ: {unknown}")
+
+    prices = _clean_prices(prices)
+    split = len(prices) - int(evaluation_periods)
+    if split < 1 or evaluation_periods < 2:
+        raise ValueError("Không đủ dữ liệu cho giai đoạn backtest")
+    usable = sorted({int(lookback) for lookback in lookbacks if 2 <= lookback <= split})
+    if len(usable) < len(set(lookbacks)):
+        logger.warning(f"[SWEEP] Bo qua cua so dai hon {split} phien truoc giai doan backtest: "
+                       f"{sorted(set(lookbacks) - set(usable))}")
+    if not usable:
+        raise ValueError("Không có cửa sổ ước lượng nào vừa với dữ liệu")
+
+    axes = {'model': list(models), 'lookback': usable, 'rebalance': list(rebalances),
+            'amount': [float(a) for a in amounts]}
+    cells = list(itertools.product(axes['model'], axes['lookback']))
+    task_args = (split, axes['rebalance'], axes['amount'],
+                 {'cov_estimator': cov_estimator, 'beta': beta, 'risk_free_rate': risk_free_rate},
+                 simulation_kwargs)
+    workers = min(DEFAULT_SWEEP_WORKERS if max_workers is None else max_workers, len(cells))
+
+    start = time.perf_counter()
+    outputs, failed = [], {}
+
+    def collect(cell, compute):
+        try:
+            outputs.append(compute())
+        except Exception as e:
+            logger.error(f"[SWEEP] Loi khi chay {cell}: {e}")
+            failed[cell] = str(e)
+        if progress_callback is not None:
+            progress_callback(len(outputs) + len(failed), len(cells))
+
+    if workers <= 1:
+        _PRICES = prices
+        try:
+            for cell in cells:
+                collect(cell, lambda: _sweep_cell(*cell, *task_args))
+        finally:
+            _PRICES = None
+    else:
+        shared = shared_memory.SharedMemory(create=True, size=max(prices.values.nbytes, 1))
+        try:
+            np.ndarray(prices.shape, dtype=np.float64, buffer=shared.buf)[:] = prices.to_numpy()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach_prices,
+                                     initargs=(shared.name, prices.shape, prices.index, prices.columns)) as pool:
+                futures = {pool.submit(_sweep_cell, *cell, *task_args): cell for cell in cells}
+                for future in as_completed(futures):
+                    collect(futures[future], future.result)
+        finally:
+            shared.close()
+            shared.unlink()
+
+    if not outputs:
+        raise ValueError("Không ô nào của lưới tham số chạy được")
+
+    # Giữ thứ tự của lưới thay vì thứ tự hoàn thành
+    order = {cell: position for position, cell in enumerate(cells)}
+    outputs.sort(key=lambda output: order[output[:2]])
+    rows = [row for output in outputs for row in output[3]]
+    frame = pd.DataFrame([metrics for _, metrics in rows],
+                         index=pd.MultiIndex.from_tuples([key for key, _ in rows], names=SWEEP_AXES))
+    weights = pd.DataFrame([output[2] for output in outputs],
+                           index=pd.MultiIndex.from_tuples([output[:2] for output in outputs],
+                                                           names=SWEEP_AXES[:2]))
+    elapsed = time.perf_counter() - start
+    logger.info(f"[SWEEP] {len(cells)} cap (mo hinh, cua so) x {len(axes['rebalance']) * len(axes['amount'])} "
+                f"to hop, {len(failed)} loi, {workers} tien trinh, {elapsed:.2f}s")
+    return SweepResult(frame, weights, axes, (prices.index[split], prices.index[-1]), failed, elapsed)
+
+
+__all__ = [
+    'SWEEP_MODELS',
+    'SWEEP_AXES',
+    'DEFAULT_SWEEP_LOOKBACKS',
+    'DEFAULT_SWEEP_REBALANCES',
+    'DEFAULT_EVALUATION_PERIODS',
+    'DEFAULT_SWEEP_WORKERS',
+    'SweepResult',
+    'run_parameter_sweep',
+]
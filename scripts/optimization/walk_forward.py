@@ -0,0 +1,391 @@
+"""
+Module walk_forward.py
+Tối ưu hóa cuốn chiếu (walk-forward): tái tối ưu một trong sáu mô hình trên cửa sổ lăn
+hoặc cửa sổ mở rộng tại mỗi kỳ tái cân bằng, rồi nắm giữ danh mục tới kỳ sau để tạo
+đường vốn ngoài mẫu (out-of-sample).
+
+Khác với các hàm trong optimization.models (lấy giá mới nhất, phân bổ cổ phiếu nguyên, mô phỏng
+Monte Carlo để vẽ biểu đồ), mỗi cửa sổ ở đây chỉ tính trọng số:
+    - Hiệp phương sai mẫu được cập nhật tăng dần (cộng phiên mới, trừ phiên rời cửa sổ)
+      thay vì tính lại từ đầu.
+    - Bài toán QP của Max Sharpe / Min Volatility được dựng một lần với tham số cvxpy và
+      giải lại với warm start từ nghiệm cửa sổ trước.
+    - Min CVaR chọn kịch bản đuôi ban đầu từ trọng số cửa sổ trước.
+    - Min CDaR với cửa sổ lăn dựng LP một lần, chỉ thay lợi suất (tham số cvxpy).
+    - HRP dùng bản numpy trong optimization.hrp thay vì HRPOpt.
+    - Markowitz dùng lại cùng một tập 10.000 danh mục ngẫu nhiên cho mọi cửa sổ.
+"""
+
+import logging
+import time
+from typing import Dict, Optional, Union
+
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+
+from optimization.covariance import covariance_matrix
+from optimization.hrp import hrp_weights
+from optimization.scenarios import min_cvar_reduced
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+WALK_FORWARD_MODELS = {
+    'markowitz': 'Mô hình Markowitz',
+    'max_sharpe': 'Mô hình Max Sharpe Ratio',
+    'min_volatility': 'Mô hình Min Volatility',
+    'hrp': 'Mô hình HRP',
+    'min_cvar': 'Mô hình Min CVaR',
+    'min_cdar': 'Mô hình Min CDaR',
+}
+MARKOWITZ_PORTFOLIOS = 10000
+
+
+class RollingCovariance:
+    """
+    Hiệp phương sai mẫu của một cửa sổ lợi suất, cập nhật bằng tổng tích lũy.
+
+    Giữ sum(r) và sum(r r') của các phiên trong cửa sổ; thêm / bớt k phiên tốn O(k * N^2)
+    thay vì O(T * N^2) khi tính lại toàn bộ.
+    """
+
+    def __init__(self, n_assets: int):
+        self.count = 0
+        self.sum = np.zeros(n_assets)
+        self.sum_outer = np.zeros((n_assets, n_assets))
+
+    def add(self, rows: np.ndarray):
+        if len(rows):
+            self.count += len(rows)
+            self.sum += rows.sum(axis=0)
+            self.sum_outer += rows.T @ rows
+
+    def remove(self, rows: np.ndarray):
+        if len(rows):
+            self.count -= len(rows)
+            self.sum -= rows.sum(axis=0)
+            self.sum_outer -= rows.T @ rows
+
+    def covariance(self, frequency: int = TRADING_DAYS) -> np.ndarray:
+        if self.count < 2:
+            raise ValueError("Cua so can it nhat 2 phien de tinh hiep phuong sai")
+        mean = self.sum / self.count
+        cov = (self.sum_outer - self.count * np.outer(mean, mean)) / (self.count - 1)
+        return (cov + cov.T) / 2 * frequency
+
+
+class _WarmStartSolvers:
+    """Bài toán QP có tham số, dựng một lần và giải lại với warm start ở mỗi cửa sổ."""
+
+    def __init__(self, n_assets: int, risk_free_rate: float):
+        self.risk_free_rate = risk_free_rate
+        self.chol = cp.Parameter((n_assets, n_assets))
+        self.excess = cp.Parameter(n_assets)
+
+        w = cp.Variable(n_assets)
+        self.min_vol_w = w
+        self.min_vol = cp.Problem(cp.Minimize(cp.sum_squares(self.chol @ w)), [cp.sum(w) == 1, w >= 0])
+
+        # Max Sharpe dạng lồi: min y'Σy s.t. (mu - rf)'y = 1, y >= 0; w = y / sum(y)
+        y = cp.Variable(n_assets)
+        self.sharpe_y = y
+        self.sharpe = cp.Problem(cp.Minimize(cp.sum_squares(self.chol @ y)), [self.excess @ y == 1, y >= 0])
+
+    def _set_cov(self, cov: np.ndarray):
+        jitter = 1e-10 * max(np.trace(cov) / len(cov), 1e-12)
+        self.chol.value = np.linalg.cholesky(cov + jitter * np.eye(len(cov))).T
+
+    @staticmethod
+    def _solve(problem: cp.Problem):
+        """OSQP với warm start; giải lại bằng Clarabel nếu OSQP chưa hội tụ chính xác."""
+        try:
+            problem.solve(solver='OSQP', warm_start=True, eps_abs=1e-7, eps_rel=1e-7, max_iter=20000)
+        except cp.error.SolverError:
+            pass
+        if problem.status != cp.OPTIMAL:
+            problem.solve(solver='CLARABEL')
+
+    def min_volatility(self, cov: np.ndarray) -> np.ndarray:
+        self._set_cov(cov)
+        self._solve(self.min_vol)
+        return _normalize(self.min_vol_w.value)
+
+    def max_sharpe(self, mu: np.ndarray, cov: np.ndarray) -> np.ndarray:
+        excess = mu - self.risk_free_rate
+        if not (excess > 0).any():
+            # Không mã nào vượt lãi suất phi rủi ro: Max Sharpe không xác định, dùng Min Volatility
+            return self.min_volatility(cov)
+        self._set_cov(cov)
+        self.excess.value = excess
+        self._solve(self.sharpe)
+        return _normalize(self.sharpe_y.value)
+
+
+class _CDaRSolver:
+    """
+    LP Min CDaR (như EfficientCDaR) với lợi suất là tham số cvxpy.
+
+    Với cửa sổ lăn, kích thước không đổi nên bài toán chỉ được dựng một lần và các cửa sổ
+    sau chỉ thay giá trị tham số; cửa sổ mở rộng dựng lại khi số phiên thay đổi.
+    """
+
+    def __init__(self, n_assets: int, beta: float):
+        self.n_assets = n_assets
+        self.beta = beta
+        self.n_periods = None
+
+    def _build(self, n_periods: int):
+        self.n_periods = n_periods
+        self.returns = cp.Parameter((n_periods, self.n_assets))
+        self.w = cp.Variable(self.n_assets)
+        alpha = cp.Variable()
+        u = cp.Variable(n_periods + 1)
+        z = cp.Variable(n_periods)
+        constraints = [
+            z >= u[1:] - alpha, z >= 0,
+            u[1:] >= u[:-1] - self.returns @ self.w, u[0] == 0, u[1:] >= 0,
+            cp.sum(self.w) == 1, self.w >= 0,
+        ]
+        objective = alpha + cp.sum(z) / (n_periods * (1 - self.beta))
+        self.problem = cp.Problem(cp.Minimize(objective), constraints)
+
+    def solve(self, window_returns: np.ndarray) -> np.ndarray:
+        if self.n_periods != len(window_returns):
+            self._build(len(window_returns))
+        self.returns.value = window_returns
+        solver = 'CLARABEL' if 'CLARABEL' in cp.installed_solvers() else None
+        self.problem.solve(solver=solver)
+        return _normalize(self.w.value)
+
+
+def _normalize(weights) -> np.ndarray:
+    weights = np.clip(np.nan_to_num(np.asarray(weights, dtype=float)), 0, None)
+    weights[weights < 1e-6] = 0.0
+    total = weights.sum()
+    return weights / total if total > 0 else np.full(len(weights), 1.0 / len(weights))
+
+
+def rebalance_positions(index: pd.DatetimeIndex, frequency: Union[str, int], start: int) -> np.ndarray:
+    """
+    Vị trí (theo dòng) của các phiên tái cân bằng từ ``start`` trở đi.
+
+    ``frequency`` là số phiên (int) hoặc mã chu kỳ pandas ('W', 'M', 'Q', 'Y'):
+    tái cân bằng vào phiên đầu tiên của mỗi chu kỳ mới.
+    """
+    if isinstance(frequency, (int, np.integer)):
+        return np.arange(start, len(index), int(frequency))
+    periods = pd.DatetimeIndex(index).to_period(frequency)
+    first_of_period = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+    positions = first_of_period[first_of_period >= start]
+    if not len(positions) or positions[0] != start:
+        positions = np.r_[start, positions]
+    return positions
+
+
+class WalkForwardResult:
+    """
+    Kết quả walk-forward.
+
+    Attributes:
+        model (str): Mã mô hình
+        equity (pd.Series): Giá trị danh mục ngoài mẫu theo phiên
+        weights (pd.DataFrame): Trọng số tại mỗi phiên tái cân bằng
+        turnover (pd.Series): Tổng |thay đổi trọng số| tại mỗi phiên tái cân bằng
+        timings (dict): Thời gian từng bước (giây)
+    """
+
+    def __init__(self, model: str, equity: pd.Series, weights: pd.DataFrame,
+                 turnover: pd.Series, timings: Dict[str, float]):
+        self.model = model
+        self.equity = equity
+        self.weights = weights
+        self.turnover = turnover
+        self.timings = timings
+
+    def summary(self, risk_free_rate: float = 0.02) -> Dict[str, float]:
+        """Chỉ số hiệu suất ngoài mẫu của đường vốn."""
+        daily = self.equity.pct_change().dropna()
+        years = max(len(daily) / TRADING_DAYS, 1e-9)
+        total_return = self.equity.iloc[-1] / self.equity.iloc[0] - 1
+        annual_return = (1 + total_return) ** (1 / years) - 1
+        volatility = daily.std() * np.sqrt(TRADING_DAYS)
+        drawdown = self.equity / self.equity.cummax() - 1
+        return {
+            'Tổng lợi nhuận': float(total_return),
+            'Lợi nhuận năm hóa': float(annual_return),
+            'Độ biến động': float(volatility),
+            'Tỷ lệ Sharpe': float((annual_return - risk_free_rate) / volatility) if volatility > 0 else 0.0,
+            'Mức sụt giảm tối đa': float(drawdown.min()),
+            'Vòng quay trung bình': float(self.turnover.mean()) if len(self.turnover) else 0.0,
+            'Số lần tái cân bằng': int(len(self.weights)),
+        }
+
+
+def walk_forward(prices: pd.DataFrame, model: str = 'max_sharpe', lookback: int = TRADING_DAYS,
+                 expanding: bool = False, rebalance: Union[str, int] = 'M',
+                 cov_estimator: Optional[str] = None, beta: float = 0.95,
+                 risk_free_rate: float = 0.02, initial_value: float = 1.0) -> WalkForwardResult:
+    """
+    Tái tối ưu ``model`` tại mỗi kỳ tái cân bằng và ghép đường vốn ngoài mẫu.
+
+    Args:
+        prices (pd.DataFrame): Giá đóng cửa (phiên x mã) với DatetimeIndex
+        model (str): Một trong WALK_FORWARD_MODELS
+        lookback (int): Số phiên của cửa sổ ước lượng (cửa sổ mở rộng: số phiên tối thiểu)
+        expanding (bool): True để dùng toàn bộ lịch sử tới phiên tái cân bằng
+        rebalance (str | int): Chu kỳ tái cân bằng ('W', 'M', 'Q') hoặc số phiên
+        cov_estimator (str): Bộ ước lượng hiệp phương sai; 'sample'/None dùng cập nhật tăng dần
+        beta (float): Mức tin cậy của CVaR / CDaR
+        risk_free_rate (float): Lãi suất phi rủi ro cho Markowitz / Max Sharpe
+        initial_value (float): Giá trị danh mục ban đầu
+
+    Returns:
+        WalkForwardResult: Đường vốn, lịch sử trọng số và thời gian
+    """
+    if model not in WALK_FORWARD_MODELS:
+        raise ValueError(f"Mo hinh khong hop le: {model}")
+
+    prices = prices.apply(pd.to_numeric, errors='coerce').ffill().bfill().dropna(axis=1, how='any')
+    tickers = prices.columns.tolist()
+    price_arr = prices.to_numpy(dtype=float)
+    returns = np.vstack([np.zeros(len(tickers)), price_arr[1:] / price_arr[:-1] - 1])
+    n_assets = len(tickers)
+
+    if len(prices) <= lookback + 1:
+        raise ValueError("Khong du du lieu cho cua so walk-forward dau tien")
+
+    positions = rebalance_positions(prices.index, rebalance, lookback)
+    incremental = cov_estimator in (None, 'sample')
+    rolling_cov = RollingCovariance(n_assets)
+    solvers = None
+    if model in ('max_sharpe', 'min_volatility'):
+        solvers = _WarmStartSolvers(n_assets, risk_free_rate)
+    elif model == 'min_cdar':
+        solvers = _CDaRSolver(n_assets, beta)
+    random_weights = None
+    if model == 'markowitz':
+        rng = np.random.RandomState(42)
+        random_weights = rng.random_sample((MARKOWITZ_PORTFOLIOS, n_assets))
+        random_weights /= random_weights.sum(axis=1, keepdims=True)
+
+    timings = {'Hiệp phương sai': 0.0, 'Tối ưu': 0.0, 'Đường vốn': 0.0}
+    weight_rows, window_start, window_end = [], 1, 1
+    previous = None
+
+    for pos in positions:
+        start = time.perf_counter()
+        new_start = 1 if expanding else max(pos - lookback + 1, 1)
+        # Lợi suất của cửa sổ là các dòng [new_start, pos] (phiên pos đã biết giá đóng cửa)
+        rolling_cov.add(returns[window_end:pos + 1])
+        rolling_cov.remove(returns[window_start:new_start])
+        window_start, window_end = new_start, pos + 1
+        window_returns = returns[window_start:window_end]
+        if incremental:
+            cov = rolling_cov.covariance()
+        else:
+            cov = covariance_matrix(prices.iloc[window_start - 1:window_end], cov_estimator).to_numpy()
+        timings['Hiệp phương sai'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        weights = _solve_window(model, window_returns, price_arr[window_start - 1], price_arr[pos], cov,
+                                tickers, previous, solvers, random_weights, beta, risk_free_rate)
+        timings['Tối ưu'] += time.perf_counter() - start
+        weight_rows.append(weights)
+        previous = weights
+
+    start = time.perf_counter()
+    weights_df = pd.DataFrame(weight_rows, index=prices.index[positions], columns=tickers)
+    equity = _equity_curve(price_arr, positions, np.array(weight_rows), initial_value)
+    equity = pd.Series(equity, index=prices.index[positions[0]:])
+    turnover = weights_df.diff().abs().sum(axis=1).iloc[1:]
+    timings['Đường vốn'] += time.perf_counter() - start
+
+    logger.info(
+        f"[WALK_FORWARD] {model}: {len(positions)} lan tai can bang, "
+        f"thoi gian: {', '.join(f'{k}={v:.3f}s' for k, v in timings.items())}"
+    )
+    return WalkForwardResult(model, equity, weights_df, turnover, timings)
+
+
+def optimize_weights(prices: pd.DataFrame, model: str = 'max_sharpe', cov_estimator: Optional[str] = None,
+                     beta: float = 0.95, risk_free_rate: float = 0.02) -> pd.Series:
+    """
+    Trọng số của ``model`` trên toàn bộ ``prices`` (một cửa sổ), không phân bổ cổ phiếu nguyên.
+
+    Dùng cùng bộ giải với walk_forward; tiện cho các bước cần trọng số mục tiêu không ma sát
+    (ví dụ tái cân bằng danh mục hiện có).
+    """
+    if model not in WALK_FORWARD_MODELS:
+        raise ValueError(f"Mo hinh khong hop le: {model}")
+    prices = prices.apply(pd.to_numeric, errors='coerce').ffill().bfill().dropna(axis=1, how='any')
+    tickers = prices.columns.tolist()
+    price_arr = prices.to_numpy(dtype=float)
+    window_returns = price_arr[1:] / price_arr[:-1] - 1
+    cov = covariance_matrix(prices, cov_estimator).to_numpy()
+
+    solvers = random_weights = None
+    if model in ('max_sharpe', 'min_volatility'):
+        solvers = _WarmStartSolvers(len(tickers), risk_free_rate)
+    elif model == 'min_cdar':
+        solvers = _CDaRSolver(len(tickers), beta)
+    elif model == 'markowitz':
+        rng = np.random.RandomState(42)
+        random_weights = rng.random_sample((MARKOWITZ_PORTFOLIOS, len(tickers)))
+        random_weights /= random_weights.sum(axis=1, keepdims=True)
+
+    weights = _solve_window(model, window_returns, price_arr[0], price_arr[-1], cov, tickers, None,
+                            solvers, random_weights, beta, risk_free_rate)
+    return pd.Series(weights, index=tickers)
+
+
+def _solve_window(model, window_returns, first_prices, last_prices, cov, tickers, previous,
+                  solvers, random_weights, beta, risk_free_rate) -> np.ndarray:
+    """Trọng số tối ưu trên một cửa sổ."""
+    n_periods = len(window_returns)
+    # Lợi nhuận kỳ vọng hình học năm hóa như expected_returns.mean_historical_return
+    mu = (last_prices / first_prices) ** (TRADING_DAYS / n_periods) - 1
+
+    if model == 'min_volatility':
+        return solvers.min_volatility(cov)
+    if model == 'max_sharpe':
+        return solvers.max_sharpe(mu, cov)
+    if model == 'markowitz':
+        log_mu = np.log1p(window_returns).mean(axis=0) * TRADING_DAYS
+        ret = random_weights @ log_mu
+        vol = np.sqrt(np.einsum('ij,jk,ik->i', random_weights, cov, random_weights))
+        return random_weights[np.argmax((ret - risk_free_rate) / vol)]
+    if model == 'hrp':
+        return _normalize(hrp_weights(cov, linkage_method='single'))
+    if model == 'min_cvar':
+        returns_df = pd.DataFrame(window_returns, columns=tickers)
+        weights, _, _ = min_cvar_reduced(returns_df, beta=beta, initial_weights=previous)
+        return _normalize([weights[t] for t in tickers])
+    return solvers.solve(window_returns)
+
+
+def _equity_curve(price_arr: np.ndarray, positions: np.ndarray, weights: np.ndarray,
+                  initial_value: float) -> np.ndarray:
+    """Giá trị danh mục mua và nắm giữ giữa các kỳ tái cân bằng (trọng số trôi theo giá)."""
+    bounds = np.r_[positions, len(price_arr) - 1]
+    segments = [np.array([initial_value])]
+    value = initial_value
+    for k in range(len(positions)):
+        lo, hi = bounds[k], bounds[k + 1]
+        if hi <= lo:
+            continue
+        growth = (price_arr[lo + 1:hi + 1] / price_arr[lo]) @ weights[k]
+        path = value * growth
+        segments.append(path)
+        value = path[-1]
+    return np.concatenate(segments)
+
+
+__all__ = [
+    'WALK_FORWARD_MODELS',
+    'RollingCovariance',
+    'WalkForwardResult',
+    'rebalance_positions',
+    'walk_forward',
+    'optimize_weights',
+]
@@ -9,6 +9,9 @@ import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from optimization.backtest import BACKTEST_REBALANCE_OPTIONS
+from optimization.results import REALIZED_METRICS_KEY
+
 
 def calculate_portfolio_metrics(result):
     """
@@ -58,28 +61,16 @@ def calculate_portfolio_metrics(result):
     metrics['cvar'] = result.get('Rủi ro CVaR', None)
     metrics['cdar'] = result.get('Rủi ro CDaR', None)
     
-    # Maximum Drawdown (MDD)
-    # Tính từ returns data nếu có
-    if 'ret_arr' in result and result['ret_arr'] is not None:
-        try:
-            returns = result['ret_arr']
-            cumulative = (1 + returns).cumprod()
-            peak = np.maximum.accumulate(cumulative)
-            drawdown = (cumulative - peak) / peak
-            metrics['max_drawdown'] = drawdown.min() * 100  # Convert to percentage
-        except:
-            # Nếu không tính được, dùng CDaR làm tham chiếu hoặc estimate
-            if metrics['cdar'] is not None:
-                metrics['max_drawdown'] = metrics['cdar'] * 100
-            else:
-                # Estimate: MDD thường gấp 2-3 lần volatility trong worst case
-                metrics['max_drawdown'] = -metrics['volatility'] * 2.5
+    # Maximum Drawdown (MDD): độ sâu sụt giảm lớn nhất (%, dương) của trọng số tối ưu trên dữ liệu lịch sử,
+    # do mô hình tính khi tối ưu; kết quả cũ không có thì dùng CDaR hoặc ước lượng từ độ biến động
+    max_drawdown = result.get('Mức sụt giảm tối đa')
+    if max_drawdown is not None:
+        metrics['max_drawdown'] = abs(max_drawdown) * 100
+    elif metrics['cdar'] is not None:
+        metrics['max_drawdown'] = metrics['cdar'] * 100
     else:
-        # Nếu không có dữ liệu returns, estimate từ volatility và CDaR
-        if metrics['cdar'] is not None:
-            metrics['max_drawdown'] = metrics['cdar'] * 100
-        else:
-            metrics['max_drawdown'] = -metrics['volatility'] * 2.5
+        # Estimate: MDD thường gấp 2-3 lần volatility trong worst case
+        metrics['max_drawdown'] = metrics['volatility'] * 2.5
     
     # Mức độ đa dạng hóa (Herfindahl Index)
     weights = result.get('Trọng số danh mục', {})
@@ -91,6 +82,14 @@ def calculate_portfolio_metrics(result):
     else:
         metrics['diversification_index'] = 0
     
+    # Hiệu suất thực tế: backtest trọng số trên dữ liệu lịch sử (run_all_models), None nếu chưa có
+    realized = result.get(REALIZED_METRICS_KEY) or {}
+    metrics['has_realized'] = bool(realized)
+    metrics['realized_return'] = realized['Lợi nhuận năm hóa'] * 100 if realized else None
+    metrics['realized_volatility'] = realized['Độ biến động'] * 100 if realized else None
+    metrics['realized_sharpe'] = realized['Tỷ lệ Sharpe'] if realized else None
+    metrics['realized_max_drawdown'] = abs(realized['Mức sụt giảm tối đa']) * 100 if realized else None
+    
     return metrics
 
 
@@ -113,7 +112,7 @@ def create_comparison_table(results_dict):
             
         metrics = calculate_portfolio_metrics(result)
         
-        comparison_data.append({
+        row = {
             'Mô hình': model_name,
             'Lợi nhuận KV (%)': metrics['expected_return'],
             'Rủi ro - Std (%)': metrics['volatility'],
@@ -126,7 +125,15 @@ def create_comparison_table(results_dict):
             'Tổng số cổ phiếu đầu tư': int(metrics['total_shares']),
             'Vốn sử dụng (VND)': metrics['total_invested'],
             'Vốn còn lại (VND)': metrics['leftover']
-        })
+        }
+        if metrics['has_realized']:
+            row.update({
+                'LN thực tế (%)': metrics['realized_return'],
+                'Rủi ro thực tế (%)': metrics['realized_volatility'],
+                'Sharpe thực tế': metrics['realized_sharpe'],
+                'MDD thực tế (%)': metrics['realized_max_drawdown'],
+            })
+        comparison_data.append(row)
     
     return pd.DataFrame(comparison_data)
 
@@ -153,9 +160,13 @@ def highlight_best_values(df):
         'Chỉ số đa dạng hóa': '{:.4f}',
         'Tỷ lệ sử dụng vốn (%)': '{:.2f}',
         'Vốn sử dụng (VND)': '{:,.0f}',
-        'Vốn còn lại (VND)': '{:,.0f}'
+        'Vốn còn lại (VND)': '{:,.0f}',
+        'LN thực tế (%)': '{:.2f}',
+        'Rủi ro thực tế (%)': '{:.2f}',
+        'Sharpe thực tế': '{:.4f}',
+        'MDD thực tế (%)': '{:.2f}'
     }
-    styled = styled.format(format_dict)
+    styled = styled.format({col: fmt for col, fmt in format_dict.items() if col in df.columns}, na_rep='-')
     
     # Hàm highlight MAX (giá trị cao = tốt)
     def highlight_max(col):
@@ -169,14 +180,14 @@ def highlight_best_values(df):
     
     # Highlight MAX cho các chỉ số cao = tốt
     max_cols = ['Lợi nhuận KV (%)', 'Tỷ lệ Sharpe', 'Return/Risk', 
-                'Chỉ số đa dạng hóa', 'Tỷ lệ sử dụng vốn (%)']
+                'Chỉ số đa dạng hóa', 'Tỷ lệ sử dụng vốn (%)', 'LN thực tế (%)', 'Sharpe thực tế']
     
     for col in max_cols:
         if col in df.columns:
             styled = styled.apply(highlight_max, subset=[col])
     
     # Highlight MIN cho rủi ro (thấp = tốt)
-    min_cols = ['Rủi ro - Std (%)', 'Max Drawdown (%)']
+    min_cols = ['Rủi ro - Std (%)', 'Max Drawdown (%)', 'Rủi ro thực tế (%)', 'MDD thực tế (%)']
     for col in min_cols:
         if col in df.columns:
             styled = styled.apply(highlight_min, subset=[col])
@@ -578,13 +589,23 @@ def provide_investment_recommendation(results_dict):
         st.warning("Không có mô hình hợp lệ để đánh giá.")
         return
     
+    # Khi mọi mô hình đã được backtest, Sharpe / Lợi nhuận / Rủi ro lấy theo hiệu suất thực tế
+    # thay cho con số kỳ vọng trong mẫu
+    use_realized = all(m['has_realized'] for m in all_metrics)
+    if use_realized:
+        return_key, volatility_key, sharpe_key = 'realized_return', 'realized_volatility', 'realized_sharpe'
+        return_label = "Lợi nhuận thực tế"
+    else:
+        return_key, volatility_key, sharpe_key = 'expected_return', 'volatility', 'sharpe_ratio'
+        return_label = "Lợi nhuận KV"
+    
     # 2. Xác định Min/Max cho chuẩn hóa
-    min_return = min(m['expected_return'] for m in all_metrics)
-    max_return = max(m['expected_return'] for m in all_metrics)
-    min_volatility = min(m['volatility'] for m in all_metrics)
-    max_volatility = max(m['volatility'] for m in all_metrics)
-    min_sharpe = min(m['sharpe_ratio'] for m in all_metrics)
-    max_sharpe = max(m['sharpe_ratio'] for m in all_metrics)
+    min_return = min(m[return_key] for m in all_metrics)
+    max_return = max(m[return_key] for m in all_metrics)
+    min_volatility = min(m[volatility_key] for m in all_metrics)
+    max_volatility = max(m[volatility_key] for m in all_metrics)
+    min_sharpe = min(m[sharpe_key] for m in all_metrics)
+    max_sharpe = max(m[sharpe_key] for m in all_metrics)
     min_div = min(m['diversification_index'] for m in all_metrics)
     max_div = max(m['diversification_index'] for m in all_metrics)
     min_capital = min(m['capital_utilization'] for m in all_metrics)
@@ -610,9 +631,9 @@ def provide_investment_recommendation(results_dict):
         metrics = calculate_portfolio_metrics(result)
         
         # Chuẩn hóa từng thành phần (0-100)
-        norm_sharpe = normalize_score(metrics['sharpe_ratio'], min_sharpe, max_sharpe)
-        norm_return = normalize_score(metrics['expected_return'], min_return, max_return)
-        norm_volatility = normalize_score(metrics['volatility'], min_volatility, max_volatility, reverse=True)
+        norm_sharpe = normalize_score(metrics[sharpe_key], min_sharpe, max_sharpe)
+        norm_return = normalize_score(metrics[return_key], min_return, max_return)
+        norm_volatility = normalize_score(metrics[volatility_key], min_volatility, max_volatility, reverse=True)
         norm_div = normalize_score(metrics['diversification_index'], min_div, max_div)
         norm_capital = normalize_score(metrics['capital_utilization'], min_capital, max_capital)
         
@@ -626,18 +647,18 @@ def provide_investment_recommendation(results_dict):
         
         scores[model_name] = {
             'total_score': total_score,
-            'sharpe': metrics['sharpe_ratio'],
-            'return': metrics['expected_return'],
-            'risk': metrics['volatility'],
+            'sharpe': metrics[sharpe_key],
+            'return': metrics[return_key],
+            'risk': metrics[volatility_key],
             'diversification': metrics['diversification_index'],
             'capital_util': metrics['capital_utilization']
         }
         
         score_details.append({
             'Mô hình': model_name,
-            'Return (raw)': f"{metrics['expected_return']:.2f}%",
-            'Sharpe (raw)': f"{metrics['sharpe_ratio']:.4f}",
-            'Risk (raw)': f"{metrics['volatility']:.2f}%",
+            'Return (raw)': f"{metrics[return_key]:.2f}%",
+            'Sharpe (raw)': f"{metrics[sharpe_key]:.4f}",
+            'Risk (raw)': f"{metrics[volatility_key]:.2f}%",
             'Div (raw)': f"{metrics['diversification_index']:.4f}",
             'Capital (raw)': f"{metrics['capital_utilization']:.2f}%",
             'Score Return': f"{norm_return:.1f}",
@@ -666,6 +687,8 @@ def provide_investment_recommendation(results_dict):
         st.dataframe(df_scores, use_container_width=True, height=300)
         
         st.caption("💡 Cột 'Score' là điểm chuẩn hóa (0-100), cột 'raw' là giá trị gốc")
+        if use_realized:
+            st.caption("📈 Sharpe, Return và Risk lấy từ backtest trọng số trên dữ liệu lịch sử (hiệu suất thực tế)")
     
     # Sắp xếp theo điểm tổng hợp
     sorted_models = sorted(scores.items(), key=lambda x: x[1]['total_score'], reverse=True)
@@ -684,7 +707,7 @@ def provide_investment_recommendation(results_dict):
             
             with col1:
                 st.metric("Tỷ lệ Sharpe", f"{score_data['sharpe']:.4f}")
-                st.metric("Lợi nhuận KV", f"{score_data['return']:.2f}%")
+                st.metric(return_label, f"{score_data['return']:.2f}%")
             
             with col2:
                 st.metric("Rủi ro (Std)", f"{score_data['risk']:.2f}%")
@@ -702,7 +725,7 @@ def provide_investment_recommendation(results_dict):
             if score_data['sharpe'] == max(s['sharpe'] for s in scores.values()):
                 strengths.append("Tỷ lệ Sharpe cao nhất")
             if score_data['return'] == max(s['return'] for s in scores.values()):
-                strengths.append("Lợi nhuận kỳ vọng cao nhất")
+                strengths.append(f"{return_label} cao nhất")
             if score_data['risk'] == min(s['risk'] for s in scores.values()):
                 strengths.append("Rủi ro thấp nhất")
             if score_data['diversification'] == max(s['diversification'] for s in scores.values()):
@@ -724,6 +747,7 @@ def provide_investment_recommendation(results_dict):
         - **Min Volatility**: Ưu tiên an toàn, ít biến động
         - **Min CVaR / Min CDaR**: Phòng ngừa tổn thất cực đoan
         - **HRP**: Đa dạng hóa thông minh, phân tán rủi ro
+        - **Risk Parity**: Mỗi mã/ngành gánh phần rủi ro như nhau (hoặc theo ngân sách)
         """)
     
     with col2:
@@ -736,13 +760,74 @@ def provide_investment_recommendation(results_dict):
         """)
 
 
-def render_optimization_comparison_tab(results_dict):
+def display_parameter_sweep(sweep_result):
+    """
+    Hiển thị khối kết quả quét tham số (mô hình x cửa sổ ước lượng x chu kỳ x số vốn).
+    
+    Args:
+        sweep_result (SweepResult | None): Kết quả của optimization.sweep.run_parameter_sweep
+    """
+    if sweep_result is None:
+        st.info("Chưa có kết quả quét tham số. Chạy **🧪 Quét tham số** ở thanh bên của tab chọn mã cổ phiếu.")
+        return
+    
+    start, end = sweep_result.evaluation
+    st.caption(f"Backtest ngoài mẫu từ {start:%d/%m/%Y} đến {end:%d/%m/%Y}, "
+               f"{len(sweep_result.frame)} tổ hợp trong {sweep_result.elapsed:.1f} giây")
+    if sweep_result.failed:
+        st.warning("Không chạy được: " + ", ".join(f"{model} ({lookback} phiên)"
+                                                   for model, lookback in sweep_result.failed))
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        metric = st.selectbox("Chỉ số", sweep_result.metrics, key="sweep_metric")
+    with col2:
+        rebalance = st.selectbox("Tái cân bằng", sweep_result.axes['rebalance'],
+                                 format_func=lambda r: BACKTEST_REBALANCE_OPTIONS.get(r, f"{r} phiên"),
+                                 key="sweep_rebalance")
+    with col3:
+        amount = st.selectbox("Số vốn (VND)", sweep_result.axes['amount'],
+                              format_func=lambda a: f"{a:,.0f}", key="sweep_amount")
+    
+    table = sweep_result.table(metric, rebalance=rebalance, amount=amount)
+    fig = go.Figure(go.Heatmap(
+        z=table.to_numpy(),
+        x=[f"{lookback} phiên" for lookback in table.columns],
+        y=table.index.tolist(),
+        colorscale='RdYlGn_r' if metric in ('Volatility',) else 'RdYlGn',
+        text=np.round(table.to_numpy(), 3),
+        texttemplate="%{text}",
+        hovertemplate="%{y}<br>Cửa sổ: %{x}<br>" + metric + ": %{z:.4f}<extra></extra>"
+    ))
+    fig.update_layout(
+        title=f"{metric} theo Mô hình và Cửa sổ ước lượng",
+        xaxis_title="Cửa sổ ước lượng",
+        height=450
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    ascending = metric in ('Volatility', 'Tổng chi phí giao dịch', 'Vòng quay trung bình')
+    st.markdown("#### 🏅 Các tổ hợp tốt nhất")
+    st.dataframe(sweep_result.best(metric, ascending=ascending), use_container_width=True)
+    
+    csv = sweep_result.frame.reset_index().to_csv(index=False, encoding='utf-8-sig')
+    st.download_button(
+        label="📥 Tải xuống kết quả quét tham số (CSV)",
+        data=csv,
+        file_name="quet_tham_so.csv",
+        mime="text/csv",
+        key="sweep_download"
+    )
+
+
+def render_optimization_comparison_tab(results_dict, sweep_result=None):
     """
     Render tab tổng hợp kết quả tối ưu hóa.
     
     Args:
         results_dict (dict): Dictionary chứa kết quả của các mô hình
                            {'Tên mô hình': result_dict}
+        sweep_result (SweepResult | None): Kết quả quét tham số (nếu đã chạy)
     """
     st.title("📊 Tổng hợp & So sánh Kết quả Tối ưu hóa")
     
@@ -760,6 +845,9 @@ def render_optimization_comparison_tab(results_dict):
         - Phân tích rủi ro - lợi nhuận
         - Đưa ra quyết định đầu tư tối ưu
         """)
+        if sweep_result is not None:
+            st.markdown("### 🧪 Quét tham số")
+            display_parameter_sweep(sweep_result)
         return
     
     # Lọc các kết quả hợp lệ
@@ -772,10 +860,11 @@ def render_optimization_comparison_tab(results_dict):
     st.success(f"✅ Đã tải {len(valid_results)} kết quả tối ưu hóa")
     
     # Tab con cho các phần khác nhau
-    tab1, tab2, tab3 = st.tabs([
+    tab1, tab2, tab3, tab4 = st.tabs([
         "📋 Bảng So sánh Tổng quan",
         "📊 Biểu đồ Phân tích",
-        "💡 Khuyến nghị Đầu tư"
+        "💡 Khuyến nghị Đầu tư",
+        "🧪 Quét tham số"
     ])
     
     with tab1:
@@ -795,6 +884,7 @@ def render_optimization_comparison_tab(results_dict):
         - **Tỷ lệ Sharpe**: Hiệu suất điều chỉnh rủi ro (càng cao càng tốt)
         - **Return/Risk**: Tỷ lệ lợi nhuận/rủi ro trực tiếp (càng cao càng tốt)
         - **Chỉ số đa dạng hóa**: 0-1, với 1 là đa dạng hoàn hảo (càng cao càng phân tán)
+        - **Cột "thực tế"**: Backtest trọng số trên dữ liệu lịch sử (khi chạy tất cả mô hình cùng lúc)
         """, unsafe_allow_html=True)
         
         # Nút download
@@ -846,3 +936,7 @@ def render_optimization_comparison_tab(results_dict):
     with tab3:
         # Khuyến nghị
         provide_investment_recommendation(valid_results)
+    
+    with tab4:
+        st.markdown("### 🧪 Quét tham số: Mô hình x Cửa sổ x Tái cân bằng x Số vốn")
+        display_parameter_sweep(sweep_result)
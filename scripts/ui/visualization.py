@@ -11,6 +11,11 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import datetime
 
+from optimization import analytics
+from optimization.backtest import DEFAULT_BACKTEST_REBALANCE, DEFAULT_BENCHMARKS, run_backtest_incremental
+from optimization.bootstrap import DEFAULT_BOOTSTRAP_PATHS, DEFAULT_CONFIDENCE
+from optimization.hrp import DEFAULT_HRP_LINKAGE, HRP_LINKAGE_METHODS, hrp_tree
+
 try:
     import pandas_ta as ta
 except ImportError:
@@ -1087,9 +1092,11 @@ def display_results(original_name, result):
     st.write(f"- **Số tiền còn lại:** {round(result.get('Số tiền còn lại', 0))}")
 
 
-def backtest_portfolio(symbols, weights, start_date, end_date, fetch_stock_data_func, benchmark_symbols=["VNINDEX", "VN30", "HNX30", "HNXINDEX"]):
+def backtest_portfolio(symbols, weights, start_date, end_date, fetch_stock_data_func, benchmark_symbols=DEFAULT_BENCHMARKS,
+                       rebalance=DEFAULT_BACKTEST_REBALANCE, benchmark_loader=None, **simulation_kwargs):
     """
     Hàm backtesting danh mục đầu tư, hỗ trợ nhiều chỉ số benchmark và hiển thị biểu đồ tương tác.
+    Phần tính toán nằm ở optimization.backtest.run_backtest_incremental; hàm này chỉ hiển thị kết quả.
 
     Args:
     symbols (list): Danh sách mã cổ phiếu trong danh mục
@@ -1098,46 +1105,29 @@ def backtest_portfolio(symbols, weights, start_date, end_date, fetch_stock_data_
         end_date (str): Ngày kết thúc (định dạng 'YYYY-MM-DD')
     fetch_stock_data_func (function): Hàm lấy dữ liệu giá mã cổ phiếu
         benchmark_symbols (list): Danh sách các chỉ số benchmark
+        rebalance (str): Chế độ tái cân bằng (xem optimization.backtest.BACKTEST_REBALANCE_OPTIONS)
+        benchmark_loader (function): Tải giá các chỉ số benchmark trong một lượt (xem get_index_closes)
+        **simulation_kwargs: Vốn ban đầu, lô, phí, thuế... cho mô phỏng tái cân bằng
 
     Returns:
         dict: Kết quả backtesting bao gồm Sharpe Ratio, Maximum Drawdown, và lợi suất tích lũy
     """
-    # Lấy dữ liệu giá mã cổ phiếu trong danh mục
-    stock_data, skipped_tickers = fetch_stock_data_func(symbols, start_date, end_date)
-    if skipped_tickers:
-        st.warning(f"Các mã không tải được dữ liệu: {', '.join(skipped_tickers)}")
-
-    if stock_data.empty:
+    # Chế độ 'ideal' chỉ tải và tính thêm các phiên mới khi ngày kết thúc dịch về sau
+    backtest = run_backtest_incremental(symbols, weights, start_date, end_date, fetch_stock_data_func,
+                                        benchmark_symbols, rebalance=rebalance, benchmark_loader=benchmark_loader,
+                                        **simulation_kwargs)
+    if backtest is None:
         st.error("Không có dữ liệu để backtesting.")
         return
-
-    # Tính lợi suất hàng ngày của danh mục
-    returns = stock_data.pct_change().dropna()
-    portfolio_returns = returns.dot(weights)  # Lợi suất danh mục đầu tư
-    cumulative_returns = (1 + portfolio_returns).cumprod()  # Lợi suất tích lũy
-
-    # Lấy dữ liệu benchmark
-    benchmark_data = {}
-    for benchmark in benchmark_symbols:
-        benchmark_df, _ = fetch_stock_data_func([benchmark], start_date, end_date)
-        if not benchmark_df.empty:
-            benchmark_returns = benchmark_df.pct_change().dropna()
-            benchmark_cumulative = (1 + benchmark_returns[benchmark]).cumprod()
-            benchmark_data[benchmark] = benchmark_cumulative
-        else:
-            st.warning(f"Không có dữ liệu benchmark cho {benchmark}.")
-
-    # Gộp dữ liệu lợi suất tích lũy của danh mục và các benchmark
-    results_df = pd.DataFrame({
-        "time": cumulative_returns.index,
-        "Danh mục đầu tư": cumulative_returns.values
-    }).set_index("time")
-
-    for benchmark, benchmark_cumulative in benchmark_data.items():
-        results_df[benchmark] = benchmark_cumulative
+    if backtest.skipped_tickers:
+        st.warning(f"Các mã không tải được dữ liệu: {', '.join(backtest.skipped_tickers)}")
+    for benchmark in backtest.missing_benchmarks:
+        st.warning(f"Không có dữ liệu benchmark cho {benchmark}.")
 
     # Chuyển đổi dữ liệu sang dạng dài (long format) để vẽ biểu đồ
-    results_df = results_df.reset_index().melt(id_vars=["time"], var_name="Danh mục", value_name="Lợi suất tích lũy")
+    results_df = backtest.cumulative_frame().rename_axis("time").reset_index().melt(
+        id_vars=["time"], var_name="Danh mục", value_name="Lợi suất tích lũy"
+    )
 
     # Vẽ biểu đồ lợi suất tích lũy
     fig = px.line(
@@ -1156,50 +1146,9 @@ def backtest_portfolio(symbols, weights, start_date, end_date, fetch_stock_data_
     )
     st.plotly_chart(fig, use_container_width=True)
 
-    # Tính toán chỉ số hiệu suất
-    sharpe_ratio = portfolio_returns.mean() / portfolio_returns.std() * np.sqrt(252)
-    max_drawdown = (cumulative_returns / cumulative_returns.cummax() - 1).min()
-    
-    # Tính toán các chỉ số bổ sung
-    # 1. Total Return (Lợi nhuận tổng)
-    total_return = (cumulative_returns.iloc[-1] - 1) * 100  # Phần trăm
-    
-    # 2. Annualized Return (Lợi nhuận hàng năm)
-    num_days = len(portfolio_returns)
-    num_years = num_days / 252
-    annualized_return = ((cumulative_returns.iloc[-1]) ** (1 / num_years) - 1) * 100 if num_years > 0 else 0
-    
-    # 3. Volatility (Độ biến động hàng năm)
-    volatility = portfolio_returns.std() * np.sqrt(252) * 100  # Phần trăm
-    
-    # 4. Sortino Ratio (chỉ xét độ lệch chuẩn của lợi nhuận âm)
-    negative_returns = portfolio_returns[portfolio_returns < 0]
-    downside_std = negative_returns.std() * np.sqrt(252)
-    sortino_ratio = (portfolio_returns.mean() * 252) / downside_std if downside_std > 0 else 0
-    
-    # 5. Alpha (so với benchmark đầu tiên nếu có)
-    alpha = 0
-    if benchmark_data:
-        first_benchmark = list(benchmark_data.keys())[0]
-        benchmark_returns = benchmark_data[first_benchmark].pct_change().dropna()
-        
-        # Đảm bảo cùng index
-        common_index = portfolio_returns.index.intersection(benchmark_returns.index)
-        portfolio_aligned = portfolio_returns.loc[common_index]
-        benchmark_aligned = benchmark_returns.loc[common_index]
-        
-        # Tính beta
-        covariance = np.cov(portfolio_aligned, benchmark_aligned)[0][1]
-        benchmark_variance = np.var(benchmark_aligned)
-        beta = covariance / benchmark_variance if benchmark_variance > 0 else 0
-        
-        # Tính alpha hàng năm
-        portfolio_annual_return = portfolio_aligned.mean() * 252
-        benchmark_annual_return = benchmark_aligned.mean() * 252
-        alpha = (portfolio_annual_return - benchmark_annual_return) * 100  # Phần trăm
-
     # Tạo bảng thống kê tổng hợp
     st.markdown("### Bảng Thống kê Tổng hợp")
+    metrics = backtest.metrics
     
     metrics_data = {
         "Chỉ số": [
@@ -1212,30 +1161,103 @@ def backtest_portfolio(symbols, weights, start_date, end_date, fetch_stock_data_
             "Maximum Drawdown"
         ],
         "Giá trị": [
-            f"{total_return:.2f}%",
-            f"{annualized_return:.2f}%",
-            f"{volatility:.2f}%",
-            f"{sharpe_ratio:.4f}",
-            f"{sortino_ratio:.4f}",
-            f"{alpha:.2f}%",
-            f"{max_drawdown * 100:.2f}%"
+            f"{metrics['Total Return']:.2f}%",
+            f"{metrics['Annualized Return']:.2f}%",
+            f"{metrics['Volatility']:.2f}%",
+            f"{metrics['Sharpe Ratio']:.4f}",
+            f"{metrics['Sortino Ratio']:.4f}",
+            f"{metrics['Alpha']:.2f}%",
+            f"{metrics['Maximum Drawdown'] * 100:.2f}%"
         ]
     }
     
+    if backtest.simulation is not None:
+        metrics_data["Chỉ số"] += [
+            "Số lần tái cân bằng",
+            "Tổng chi phí giao dịch (phí + thuế)",
+            "Vòng quay trung bình mỗi kỳ",
+            "Tỷ lệ tiền mặt trung bình"
+        ]
+        metrics_data["Giá trị"] += [
+            f"{metrics['Số lần tái cân bằng']}",
+            f"{metrics['Tổng chi phí giao dịch']:,.0f} VND",
+            f"{metrics['Vòng quay trung bình'] * 100:.2f}%",
+            f"{metrics['Tỷ lệ tiền mặt trung bình'] * 100:.2f}%"
+        ]
+        if 'Số phiên có lệnh treo' in metrics:
+            metrics_data["Chỉ số"] += ["Số phiên có lệnh treo (trần/sàn, tạm ngừng)", "Số lệnh bị chặn"]
+            metrics_data["Giá trị"] += [f"{metrics['Số phiên có lệnh treo']}", f"{metrics['Số lệnh bị chặn']}"]
+    
+    # Khoảng tin cậy bootstrap khối dừng cho các chỉ số tính từ chuỗi lợi suất (không có cho Alpha)
+    try:
+        intervals = backtest.confidence_intervals()
+        band_rows = [
+            ("Total Return", "{:.2f}%", 1), ("Annualized Return", "{:.2f}%", 1), ("Volatility", "{:.2f}%", 1),
+            ("Sharpe Ratio", "{:.4f}", 1), ("Sortino Ratio", "{:.4f}", 1), (None, None, None),
+            ("Maximum Drawdown", "{:.2f}%", 100),
+        ]
+        bands = [
+            "" if key is None else
+            f"[{fmt.format(intervals.loc[key, 'Cận dưới'] * scale)}; {fmt.format(intervals.loc[key, 'Cận trên'] * scale)}]"
+            for key, fmt, scale in band_rows
+        ]
+        metrics_data[f"Khoảng tin cậy {DEFAULT_CONFIDENCE:.0%}"] = bands + [""] * (len(metrics_data["Chỉ số"]) - len(bands))
+    except ValueError as e:
+        st.warning(f"Không thể tính khoảng tin cậy: {e}")
+    
     metrics_df = pd.DataFrame(metrics_data)
     st.table(metrics_df)
+    st.caption(f"Khoảng tin cậy: bootstrap khối dừng với {DEFAULT_BOOTSTRAP_PATHS:,} đường mô phỏng từ lợi suất ngày của danh mục.")
 
-    return {
-        "Sharpe Ratio": sharpe_ratio,
-        "Sortino Ratio": sortino_ratio,
-        "Maximum Drawdown": max_drawdown,
-        "Total Return": total_return,
-        "Annualized Return": annualized_return,
-        "Volatility": volatility,
-        "Alpha": alpha,
-        "Cumulative Returns": cumulative_returns,
-        "Skipped Tickers": skipped_tickers,
-    }
+    with st.expander("Phân tích rủi ro chi tiết"):
+        display_risk_analytics(backtest.returns_frame())
+
+    return backtest.to_dict()
+
+
+def display_risk_analytics(returns, window=analytics.DEFAULT_ROLLING_WINDOW):
+    """
+    Hiển thị phân tích rủi ro của nhiều chuỗi lợi suất: bảng chỉ số, mức sụt giảm, chỉ số lăn
+    và các giai đoạn sụt giảm sâu nhất của chuỗi đầu tiên.
+
+    Args:
+        returns (pd.DataFrame): Lợi suất ngày, mỗi cột một danh mục/chỉ số (cột đầu tiên là danh mục chính,
+            cột thứ hai nếu có dùng làm chỉ số tham chiếu cho Beta/Alpha)
+        window (int): Số phiên của cửa sổ lăn
+    """
+    main = returns.columns[0]
+    benchmark = returns.iloc[:, 1] if returns.shape[1] > 1 else None
+    summary = analytics.performance_summary(returns, benchmark)
+    percent_rows = ["Tổng lợi nhuận", "Lợi nhuận năm hóa", "Độ biến động", "Mức sụt giảm tối đa",
+                    "VaR 95%", "CVaR 95%", "Alpha"]
+    formatted = summary.astype(object)
+    for row in summary.index:
+        fmt = "{:.2%}" if row in percent_rows else "{:.0f}" if "phiên" in row else "{:.4f}"
+        formatted.loc[row] = [fmt.format(v) for v in summary.loc[row]]
+    st.markdown("#### Bảng chỉ số rủi ro")
+    st.table(formatted)
+    if benchmark is not None:
+        st.caption(f"Beta và Alpha (Jensen) so với {returns.columns[1]}; VaR/CVaR là mức lỗ một phiên theo dữ liệu lịch sử.")
+
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.08,
+                        subplot_titles=("Mức sụt giảm (Underwater)", f"Tỷ lệ Sharpe lăn {window} phiên"))
+    drawdown = analytics.drawdown_series(returns)
+    rolling = analytics.rolling_sharpe(returns, window)
+    for column in returns.columns:
+        fig.add_trace(go.Scatter(x=drawdown.index, y=drawdown[column] * 100, name=column, legendgroup=column,
+                                 fill='tozeroy' if column == main else None), row=1, col=1)
+        fig.add_trace(go.Scatter(x=rolling.index, y=rolling[column], name=column, legendgroup=column,
+                                 showlegend=False), row=2, col=1)
+    fig.update_yaxes(title_text="Sụt giảm (%)", row=1, col=1)
+    fig.update_yaxes(title_text="Sharpe", row=2, col=1)
+    fig.update_layout(height=600, hovermode="x unified", template="plotly_white")
+    st.plotly_chart(fig, use_container_width=True)
+
+    periods = analytics.underwater_periods(returns[main]).head(5)
+    if not periods.empty:
+        st.markdown(f"#### Các giai đoạn sụt giảm sâu nhất ({main})")
+        periods["Mức sụt giảm"] = periods["Mức sụt giảm"].map("{:.2%}".format)
+        st.dataframe(periods, use_container_width=True)
 
 
 def plot_min_cvar_analysis(result):
@@ -1422,27 +1444,19 @@ def plot_min_cdar_analysis(min_cdar_result, max_sharpe_result, returns_data):
         else:
             returns = returns_data
         
-        # Tính giá trị danh mục tích lũy cho Min CDaR
-        min_cdar_weights_array = np.array([min_cdar_weights.get(ticker, 0) for ticker in returns.columns])
-        min_cdar_portfolio_returns = returns.dot(min_cdar_weights_array)
-        min_cdar_cumulative = (1 + min_cdar_portfolio_returns).cumprod()
+        # Lợi suất của các danh mục (mỗi cột một danh mục) rồi tính giá trị tích lũy và drawdown cùng lúc
+        weight_matrix = pd.DataFrame({'Min CDaR': min_cdar_weights, 'Max Sharpe': max_sharpe_weights}) \
+            .reindex(returns.columns).fillna(0.0)
+        if not max_sharpe_weights:
+            weight_matrix = weight_matrix[['Min CDaR']]
+        portfolio_returns = returns.dot(weight_matrix)
+        cumulative = analytics.cumulative_returns(portfolio_returns)
+        drawdown = analytics.drawdown_series(portfolio_returns)
         
-        # Tính drawdown cho Min CDaR
-        min_cdar_running_max = min_cdar_cumulative.cummax()
-        min_cdar_drawdown = (min_cdar_cumulative - min_cdar_running_max) / min_cdar_running_max
-        
-        # Tính cho Max Sharpe nếu có
-        if max_sharpe_weights:
-            max_sharpe_weights_array = np.array([max_sharpe_weights.get(ticker, 0) for ticker in returns.columns])
-            max_sharpe_portfolio_returns = returns.dot(max_sharpe_weights_array)
-            max_sharpe_cumulative = (1 + max_sharpe_portfolio_returns).cumprod()
-            
-            # Tính drawdown cho Max Sharpe
-            max_sharpe_running_max = max_sharpe_cumulative.cummax()
-            max_sharpe_drawdown = (max_sharpe_cumulative - max_sharpe_running_max) / max_sharpe_running_max
-        else:
-            max_sharpe_cumulative = None
-            max_sharpe_drawdown = None
+        min_cdar_cumulative = cumulative['Min CDaR']
+        min_cdar_drawdown = drawdown['Min CDaR']
+        max_sharpe_cumulative = cumulative['Max Sharpe'] if max_sharpe_weights else None
+        max_sharpe_drawdown = drawdown['Max Sharpe'] if max_sharpe_weights else None
         
         # Tạo biểu đồ so sánh
         st.subheader("Biểu đồ So sánh Mức Sụt Giảm")
@@ -1543,18 +1557,22 @@ def plot_min_cdar_analysis(min_cdar_result, max_sharpe_result, returns_data):
         # Tính toán và hiển thị các chỉ số so sánh
         st.subheader("So sánh Chỉ số Drawdown")
         
+        durations = analytics.max_drawdown_duration(portfolio_returns)
+        underwater_days = (drawdown < 0).sum()
         col1, col2 = st.columns(2)
         
         with col1:
             st.write("**Min CDaR (Kiểm soát tổn thất kéo dài)**")
             st.metric("Max Drawdown", f"{min_cdar_drawdown.min() * 100:.2f}%")
-            st.metric("Số ngày Drawdown trung bình", f"{(min_cdar_drawdown < 0).sum()}")
+            st.metric("Số phiên dưới đỉnh", f"{underwater_days['Min CDaR']}")
+            st.metric("Thời gian sụt giảm dài nhất", f"{durations['Min CDaR']:.0f} phiên")
             
         with col2:
             if max_sharpe_drawdown is not None:
                 st.write("**Max Sharpe (Hiệu suất tối đa)**")
                 st.metric("Max Drawdown", f"{max_sharpe_drawdown.min() * 100:.2f}%")
-                st.metric("Số ngày Drawdown trung bình", f"{(max_sharpe_drawdown < 0).sum()}")
+                st.metric("Số phiên dưới đỉnh", f"{underwater_days['Max Sharpe']}")
+                st.metric("Thời gian sụt giảm dài nhất", f"{durations['Max Sharpe']:.0f} phiên")
     
     # Giải thích mô hình
     with st.expander("Giải thích về mô hình Min CDaR"):
@@ -1587,38 +1605,28 @@ def plot_min_cdar_analysis(min_cdar_result, max_sharpe_result, returns_data):
         """)
 
 
-def plot_hrp_dendrogram(data, weights):
+def plot_hrp_dendrogram(data, weights, cov_estimator=None, linkage_method=DEFAULT_HRP_LINKAGE):
     """
     Vẽ biểu đồ Dendrogram cho mô hình HRP (Hierarchical Risk Parity).
     
     Args:
     data (pd.DataFrame): Dữ liệu giá mã cổ phiếu
         weights (dict): Trọng số danh mục từ mô hình HRP
+        cov_estimator (str): Bộ ước lượng hiệp phương sai đã dùng cho mô hình HRP
+        linkage_method (str): Phương pháp liên kết đã dùng cho mô hình HRP
     """
-    import scipy.cluster.hierarchy as sch
-    from scipy.spatial.distance import squareform
-    
     st.subheader("Biểu đồ Phân Cấp Tài Sản (Dendrogram)")
     
-    # Tính ma trận tương quan
-    returns = data.pct_change().dropna(how="all")
-    corr_matrix = returns.corr()
-    
-    # Chuyển đổi correlation thành distance matrix
-    # Distance = 1 - correlation (tương quan càng cao thì khoảng cách càng nhỏ)
-    distance_matrix = np.sqrt((1 - corr_matrix) / 2)
-    
-    # Chuyển thành dạng condensed distance matrix
-    dist_condensed = squareform(distance_matrix, checks=False)
-    
-    # Thực hiện hierarchical clustering
-    linkage = sch.linkage(dist_condensed, method='single')
+    # Cây phân cấp đã được mô hình HRP tính và cache: dùng lại tương quan, khoảng cách
+    # sqrt((1 - rho) / 2) và linkage thay vì tính lại
+    tree = hrp_tree(data, linkage_method, cov_estimator)
+    corr_matrix = tree.corr
     
     # Tạo dendrogram
     fig = go.Figure()
     
     # Lấy dữ liệu dendrogram từ scipy
-    dendro = sch.dendrogram(linkage, labels=corr_matrix.columns.tolist(), no_plot=True)
+    dendro = tree.dendrogram()
     
     # Vẽ các đường nối trong dendrogram
     icoord = np.array(dendro['icoord'])
@@ -1821,13 +1829,14 @@ def plot_hrp_dendrogram(data, weights):
         """)
 
 
-def visualize_hrp_model(data, result):
+def visualize_hrp_model(data, result, cov_estimator=None):
     """
     Trực quan hóa kết quả mô hình HRP.
     
     Args:
         data (pd.DataFrame): Dữ liệu giá cổ phiếu
         result (dict): Kết quả từ hàm hrp_model()
+        cov_estimator (str): Bộ ước lượng hiệp phương sai đã dùng cho mô hình HRP
     """
     if result is None:
         st.error("Không có kết quả để hiển thị.")
@@ -1861,8 +1870,143 @@ def visualize_hrp_model(data, result):
     
     # Lấy trọng số để truyền vào dendrogram
     weights = result["Trọng số danh mục"]
+    linkage_method = result.get("Phương pháp liên kết", DEFAULT_HRP_LINKAGE)
     
     # Vẽ Dendrogram - Đây là phần quan trọng nhất của HRP
-    plot_hrp_dendrogram(data, weights)
+    plot_hrp_dendrogram(data, weights, cov_estimator, linkage_method)
+    
+    # So sánh trọng số giữa các phương pháp liên kết (tính cùng lượt với mô hình)
+    comparison = result.get("So sánh phương pháp liên kết")
+    if comparison:
+        st.subheader("So Sánh Phương Pháp Liên Kết")
+        comparison_df = pd.DataFrame(comparison)
+        tree = hrp_tree(data, linkage_method, cov_estimator)
+        cov = tree.cov.reindex(index=comparison_df.index, columns=comparison_df.index).values
+        volatility = {m: np.sqrt(comparison_df[m].values @ cov @ comparison_df[m].values) for m in comparison_df}
+        comparison_df.columns = [HRP_LINKAGE_METHODS.get(m, m) for m in comparison_df.columns]
+        st.dataframe(
+            (comparison_df * 100).round(2).style.format("{:.2f}%"),
+            use_container_width=True
+        )
+        st.caption("Độ lệch chuẩn năm hóa: " + ", ".join(
+            f"{HRP_LINKAGE_METHODS.get(m, m)}: {v * 100:.2f}%" for m, v in volatility.items()
+        ))
+
+
 
 
+def plot_risk_contributions(result):
+    """
+    So sánh đóng góp rủi ro thực tế với ngân sách rủi ro của mô hình Risk Parity.
+    
+    Args:
+        result (dict): Kết quả từ hàm risk_parity_model()
+    """
+    if result is None or "Đóng góp rủi ro" not in result:
+        st.error("Không có dữ liệu đóng góp rủi ro để hiển thị.")
+        return
+    
+    st.subheader("Đóng góp rủi ro so với ngân sách")
+    contributions = pd.Series(result["Đóng góp rủi ro"])
+    budgets = pd.Series(result.get("Ngân sách rủi ro", {})).reindex(contributions.index).fillna(0)
+    weights = pd.Series(result["Trọng số danh mục"]).reindex(contributions.index).fillna(0)
+    order = contributions.sort_values(ascending=False).index
+    
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=order, y=weights[order] * 100, name="Trọng số (%)", marker_color="lightsteelblue"))
+    fig.add_trace(go.Bar(x=order, y=contributions[order] * 100, name="Đóng góp rủi ro (%)", marker_color="indianred"))
+    fig.add_trace(go.Scatter(x=order, y=budgets[order] * 100, name="Ngân sách rủi ro (%)",
+                             mode="markers", marker=dict(symbol="line-ew-open", size=18, color="black")))
+    fig.update_layout(barmode="group", xaxis_title="Mã cổ phiếu", yaxis_title="%", height=450)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    sector_contributions = result.get("Đóng góp rủi ro theo ngành")
+    if sector_contributions:
+        st.markdown("**Đóng góp rủi ro theo ngành**")
+        st.dataframe(
+            pd.DataFrame({"Đóng góp rủi ro (%)": pd.Series(sector_contributions) * 100}).round(2),
+            use_container_width=True
+        )
+
+
+def plot_resampled_frontier(result):
+    """
+    Vẽ đường biên gốc và đường biên lấy mẫu lại, kèm độ ổn định trọng số giữa các mẫu.
+    
+    Args:
+        result (dict): Kết quả từ hàm resampled_frontier_model()
+    """
+    if result is None or "Đường biên lấy mẫu lại" not in result:
+        st.error("Không có dữ liệu đường biên lấy mẫu lại để hiển thị.")
+        return
+    
+    st.subheader("Đường biên gốc và đường biên lấy mẫu lại")
+    point, resampled = result["Đường biên gốc"], result["Đường biên lấy mẫu lại"]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=np.array(point["Rủi ro"]) * 100, y=np.array(point["Lợi nhuận"]) * 100,
+                             mode="lines+markers", name="Ước lượng điểm", line=dict(color="gray", dash="dash")))
+    fig.add_trace(go.Scatter(x=np.array(resampled["Rủi ro"]) * 100, y=np.array(resampled["Lợi nhuận"]) * 100,
+                             mode="lines+markers", name=f"Lấy mẫu lại ({result.get('Số mẫu bootstrap', '')} mẫu)",
+                             line=dict(color="royalblue")))
+    fig.add_trace(go.Scatter(x=[result["Rủi ro (Độ lệch chuẩn)"] * 100], y=[result["Lợi nhuận kỳ vọng"] * 100],
+                             mode="markers", name="Danh mục lấy mẫu lại",
+                             marker=dict(color="red", size=14, symbol="star")))
+    fig.update_layout(xaxis_title="Rủi ro (%)", yaxis_title="Lợi nhuận kỳ vọng (%)", height=450)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    st.subheader("Độ ổn định trọng số giữa các mẫu")
+    tickers = list(result["Độ lệch chuẩn trọng số"].keys())
+    weights = pd.Series(result["Trọng số danh mục"]).reindex(tickers).fillna(0)
+    spread = pd.Series(result["Độ lệch chuẩn trọng số"]).reindex(tickers)
+    point_weights = pd.Series(result.get("Trọng số Max Sharpe gốc", {})).reindex(tickers).fillna(0)
+    fig_w = go.Figure()
+    fig_w.add_trace(go.Bar(x=tickers, y=weights * 100, name="Lấy mẫu lại (± độ lệch chuẩn)",
+                           error_y=dict(type="data", array=spread * 100), marker_color="royalblue"))
+    fig_w.add_trace(go.Bar(x=tickers, y=point_weights * 100, name="Max Sharpe ước lượng điểm", marker_color="lightgray"))
+    fig_w.update_layout(barmode="group", xaxis_title="Mã cổ phiếu", yaxis_title="Trọng số (%)", height=450)
+    st.plotly_chart(fig_w, use_container_width=True)
+    st.caption("Thanh sai số lớn cho thấy trọng số Max Sharpe của mã đó thay đổi mạnh khi dữ liệu lịch sử thay đổi nhẹ.")
+
+
+def display_rebalance_results(result):
+    """
+    Hiển thị danh sách lệnh tái cân bằng, chi phí và danh mục sau giao dịch.
+    
+    Args:
+        result (dict): Kết quả từ hàm rebalance_model()
+    """
+    if result is None:
+        st.error("Không có kết quả tái cân bằng để hiển thị.")
+        return
+    
+    st.markdown(f"## Tái cân bằng về {result['Mô hình']}")
+    costs = result["Chi phí giao dịch"]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Số lệnh", len(result["Lệnh giao dịch"]))
+    col2.metric("Vòng quay", f"{result['Vòng quay']:.2%}")
+    col3.metric("Phí + thuế", f"{costs['Tổng']:,.0f} VND")
+    col4.metric("Tiền mặt sau giao dịch", f"{result['Tiền mặt sau giao dịch']:,.0f} VND")
+    st.caption(
+        f"Độ lệch chuẩn của chênh lệch so với danh mục mục tiêu: "
+        f"{result['Sai lệch nếu không giao dịch']:.2%} nếu giữ nguyên → {result['Sai lệch so với mục tiêu']:.2%} sau giao dịch"
+    )
+    
+    if result["Lệnh giao dịch"]:
+        st.markdown("### Danh sách lệnh:")
+        orders = pd.DataFrame(result["Lệnh giao dịch"])
+        st.dataframe(
+            orders.style.format({"Giá": "{:,.0f}", "Giá trị": "{:,.0f}", "Phí": "{:,.0f}", "Thuế": "{:,.0f}"}),
+            use_container_width=True
+        )
+    else:
+        st.success("✅ Danh mục hiện tại đã đủ gần mục tiêu, không cần giao dịch.")
+    
+    st.markdown("### Trọng số trước và sau tái cân bằng:")
+    weights = pd.DataFrame({
+        "Hiện tại (%)": pd.Series(result["Trọng số hiện tại"]) * 100,
+        "Mục tiêu (%)": pd.Series(result["Trọng số mục tiêu"]) * 100,
+        "Sau giao dịch (%)": pd.Series(result["Trọng số danh mục"]) * 100,
+        "Số cổ phiếu sau giao dịch": pd.Series(result["Danh mục sau tái cân bằng"]),
+    }).fillna(0)
+    weights = weights[(weights.drop(columns="Số cổ phiếu sau giao dịch") > 0.005).any(axis=1)]
+    st.dataframe(weights.round(2), use_container_width=True)
@@ -7,6 +7,8 @@ Lưu trữ và khôi phục trạng thái khi người dùng chuyển tab hoặc
 import streamlit as st
 import datetime
 
+from optimization.results import OptimizationResult
+
 
 def initialize_session_state():
     """
@@ -98,6 +100,12 @@ def initialize_session_state():
     # Lưu trữ kết quả tối ưu hóa từ các mô hình (Auto mode)
     if 'auto_optimization_results' not in st.session_state:
         st.session_state.auto_optimization_results = {}
+    
+    # Kết quả quét tham số (SweepResult) của từng chế độ
+    if 'manual_sweep_result' not in st.session_state:
+        st.session_state.manual_sweep_result = None
+    if 'auto_sweep_result' not in st.session_state:
+        st.session_state.auto_sweep_result = None
 
 
 def save_manual_filter_state(exchange, icb_name, start_date, end_date, enable_fundamental_filter):
@@ -234,6 +242,9 @@ def save_optimization_result(model_name, result, mode='manual'):
         result (dict): Kết quả tối ưu hóa
         mode (str): 'manual' hoặc 'auto'
     """
+    # Không giữ đám mây danh mục ngẫu nhiên đã tái tạo trong session (tái tạo lại khi vẽ)
+    if isinstance(result, OptimizationResult):
+        result = result.compact()
     if mode == 'manual':
         st.session_state.manual_optimization_results[model_name] = result
     elif mode == 'auto':
@@ -268,3 +279,30 @@ def clear_optimization_results(mode='manual'):
         st.session_state.manual_optimization_results = {}
     elif mode == 'auto':
         st.session_state.auto_optimization_results = {}
+
+
+def save_sweep_result(sweep_result, mode='manual'):
+    """
+    Lưu kết quả quét tham số.
+    
+    Args:
+        sweep_result (SweepResult | None): Kết quả của run_parameter_sweep (None để xóa)
+        mode (str): 'manual' hoặc 'auto'
+    """
+    if mode in ('manual', 'auto'):
+        st.session_state[f"{mode}_sweep_result"] = sweep_result
+
+
+def get_sweep_result(mode='manual'):
+    """
+    Lấy kết quả quét tham số đã lưu.
+    
+    Args:
+        mode (str): 'manual' hoặc 'auto'
+    
+    Returns:
+        SweepResult | None
+    """
+    if mode in ('manual', 'auto'):
+        return st.session_state.get(f"{mode}_sweep_result")
+    return None